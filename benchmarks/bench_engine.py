@@ -0,0 +1,46 @@
+"""
+Benchmark the per-request latency of small conversions.
+
+Compares pypandoc (which validates formats by spawning pandoc twice before
+every conversion) with the shared engine (one pandoc process per call).
+
+Usage:
+    python benchmarks/bench_engine.py [iterations]
+"""
+
+import statistics
+import sys
+import time
+
+import pypandoc
+
+from mcp_pandoc.engine import get_engine
+
+DOCUMENT = "# Title\n\nSome *emphasis* and a [link](https://example.com).\n\n- one\n- two\n"
+
+
+def measure(label: str, convert, iterations: int) -> None:
+    """Run a conversion repeatedly and print latency percentiles."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        convert()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(
+        f"{label:<10} mean {statistics.mean(samples):7.2f} ms  "
+        f"p50 {samples[len(samples) // 2]:7.2f} ms  "
+        f"p95 {samples[int(len(samples) * 0.95) - 1]:7.2f} ms"
+    )
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    engine = get_engine()
+    print(f"pandoc {engine.version}, markdown -> html, {iterations} iterations")
+    measure("pypandoc", lambda: pypandoc.convert_text(DOCUMENT, "html", format="markdown"), iterations)
+    measure("engine", lambda: engine.convert(DOCUMENT, input_format="markdown", output_format="html"), iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the event bus with per-event coroutines for handing events from worker threads to the loop.
+
+A worker thread publishes progress events that a consumer on the event
+loop reads, once through ``asyncio.run_coroutine_threadsafe(queue.put(...))``
+as the SSE endpoints used to, and once through the callbacks of an event
+bus task. Reports events per second and the time the publishing thread
+spends per event.
+
+Usage:
+    python benchmarks/bench_event_bus.py [events] [subscribers]
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from typing import Callable, List
+
+from fast_mcp_pandoc.events import EventBus
+from fast_mcp_pandoc.models import ConversionRequest
+
+
+def publish_all(publish: Callable[[int], None], events: int, publish_times: List[float]) -> None:
+    """Publish ``events`` events from the calling thread, recording the time spent publishing."""
+    start = time.perf_counter()
+    for index in range(events):
+        publish(index)
+    publish_times.append(time.perf_counter() - start)
+
+
+async def run_queue(events: int, subscribers: int) -> None:
+    """One queue per listener, filled with a coroutine per event and listener."""
+    loop = asyncio.get_running_loop()
+    queues = [asyncio.Queue() for _ in range(subscribers)]
+    publish_times: List[float] = []
+
+    def publish(index: int) -> None:
+        for queue in queues:
+            asyncio.run_coroutine_threadsafe(queue.put(index), loop)
+
+    async def consume(queue: asyncio.Queue) -> None:
+        for _ in range(events):
+            await queue.get()
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=publish_all, args=(publish, events, publish_times))
+    thread.start()
+    await asyncio.gather(*[consume(queue) for queue in queues])
+    elapsed = time.perf_counter() - start
+    thread.join()
+    report("queue", events, elapsed, publish_times[0])
+
+
+async def run_bus(events: int, subscribers: int) -> None:
+    """One bus task with several subscriptions, one call_soon_threadsafe per event."""
+    bus = EventBus(maxsize=events + 1)
+    task = bus.task(ConversionRequest(contents="Text", output_format="html"), "bench")
+    subscriptions = [bus.subscribe("bench") for _ in range(subscribers)]
+    publish_times: List[float] = []
+
+    def publish(index: int) -> None:
+        # Chunk events are never coalesced, so every event reaches every subscriber
+        task.chunk_callback("bench", index, "")
+
+    async def consume(subscription) -> None:
+        for _ in range(events):
+            await subscription.get()
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=publish_all, args=(publish, events, publish_times))
+    thread.start()
+    await asyncio.gather(*[consume(subscription) for subscription in subscriptions])
+    elapsed = time.perf_counter() - start
+    thread.join()
+    report("bus", events, elapsed, publish_times[0])
+
+
+def report(name: str, events: int, elapsed: float, publish_time: float) -> None:
+    """Print a result line."""
+    print(
+        f"{name:6} {events / elapsed:10.0f} events/s  "
+        f"{elapsed / events * 1e6:6.2f} us/event end to end  "
+        f"{publish_time / events * 1e6:6.2f} us/event in the worker thread"
+    )
+
+
+def main() -> None:
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    print(f"{events} events, {subscribers} subscribers")
+    asyncio.run(run_queue(events, subscribers))
+    asyncio.run(run_bus(events, subscribers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare the throughput of small tool calls over /sse and over /mcp.
+
+Starts the server on a local port and runs the same number of small
+markdown -> html calls of convert-contents, with the given number of calls
+in flight, three ways: over /sse as its clients do, with a new connection
+and SSE stream per call; over /sse with a shared keep-alive pool; and over
+the Streamable HTTP endpoint /mcp, as JSON-RPC POSTs within one session
+on a keep-alive pool. Every document differs, so the result cache does not
+answer any call. Reports calls per second and latency percentiles.
+
+Usage:
+    python benchmarks/bench_mcp_http.py [calls] [concurrency]
+"""
+
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+import uvicorn
+
+from fast_mcp_pandoc.server import app
+
+DOCUMENT = (
+    "# Title {index}\n\n"
+    "Some *emphasis* and a [link](https://example.com).\n\n- one\n- two\n"
+)
+
+
+def start_server() -> str:
+    """Serve the app on a free local port in a background thread and return its URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def sse_call(client: httpx.AsyncClient, index: int) -> None:
+    """Run one call over /sse and wait for its complete event."""
+    params = {
+        "tool": "convert-contents",
+        "contents": DOCUMENT.format(index=index),
+        "output_format": "html",
+    }
+    async with client.stream("GET", "/sse", params=params) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            if json.loads(line[len("data: "):]).get("status") in ("complete", "error"):
+                return
+
+
+async def measure(
+    label: str, calls: int, concurrency: int, call: Callable[[int], Awaitable[None]]
+) -> None:
+    """Run the calls with at most ``concurrency`` in flight and print throughput and latency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+
+    async def timed(index: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await call(index)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(index) for index in range(calls)))
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    p50 = samples[len(samples) // 2]
+    p95 = samples[max(int(len(samples) * 0.95) - 1, 0)]
+    print(f"{label:<22} {calls / elapsed:7.1f} calls/s  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+async def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    url = start_server()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    print(f"{calls} calls of convert-contents (markdown -> html), {concurrency} in flight")
+
+    async def sse_new_connection(index: int) -> None:
+        async with httpx.AsyncClient(base_url=url) as client:
+            await sse_call(client, index)
+
+    await measure("sse, new connection", calls, concurrency, sse_new_connection)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        await measure(
+            "sse, keep-alive", calls, concurrency, lambda index: sse_call(client, calls + index)
+        )
+
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        headers = {"Accept": "application/json, text/event-stream"}
+        response = await client.post("/mcp", headers=headers, json={
+            "jsonrpc": "2.0", "id": 0, "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-03-26",
+                "capabilities": {},
+                "clientInfo": {"name": "bench", "version": "1"},
+            },
+        })
+        headers["Mcp-Session-Id"] = response.headers["Mcp-Session-Id"]
+
+        async def mcp_call(index: int) -> None:
+            response = await client.post("/mcp", headers=headers, json={
+                "jsonrpc": "2.0", "id": index, "method": "tools/call",
+                "params": {
+                    "name": "convert-contents",
+                    "arguments": {
+                        "contents": DOCUMENT.format(index=2 * calls + index),
+                        "output_format": "html",
+                    },
+                },
+            })
+            assert not response.json()["result"]["isError"]
+
+        await measure("mcp, one session", calls, concurrency, mcp_call)
+        await client.delete("/mcp", headers=headers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
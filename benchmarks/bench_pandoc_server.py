@@ -0,0 +1,50 @@
+"""
+Compare conversion throughput of the subprocess and pandoc server backends.
+
+Runs the same small markdown -> html conversion from several client threads
+against both engine modes.
+
+Usage:
+    python benchmarks/bench_pandoc_server.py [requests] [threads] [pool_size]
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mcp_pandoc.engine import PandocEngine
+
+DOCUMENT = "# Title\n\nSome *emphasis* and a [link](https://example.com).\n\n- one\n- two\n"
+
+
+def throughput(engine: PandocEngine, requests: int, threads: int) -> float:
+    """Return conversions per second for the given engine."""
+    def convert(_: int) -> str:
+        return engine.convert(DOCUMENT, input_format="markdown", output_format="html")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(convert, range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    subprocess_engine = PandocEngine()
+    server_engine = PandocEngine()
+    if not server_engine.start_server_pool(pool_size):
+        sys.exit("pandoc server is not available")
+
+    try:
+        print(f"pandoc {subprocess_engine.version}, {requests} requests, {threads} threads")
+        print(f"subprocess        {throughput(subprocess_engine, requests, threads):8.1f} conversions/s")
+        print(f"server (pool={pool_size})  {throughput(server_engine, requests, threads):8.1f} conversions/s")
+    finally:
+        server_engine.close()
+
+
+if __name__ == "__main__":
+    main()
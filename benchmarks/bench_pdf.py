@@ -0,0 +1,89 @@
+"""
+Compare PDF latency of pandoc's own LaTeX driver and the PDF builder.
+
+Converts a set of standard documents to PDF several times, once through
+pandoc's ``--pdf-engine`` path and once through the builder with
+precompiled preamble formats and a warm TeX cache, and reports the median
+latency per document. The first builder run of each document builds its
+format and is reported separately. Warm runs are measured with fresh build
+directories ("fresh") and with the .aux/.toc state of the previous render
+("rerender"), together with the LaTeX passes they took.
+
+Usage:
+    python benchmarks/bench_pdf.py [runs] [engine]
+"""
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc.pdf import PdfBuilder
+
+DOCUMENTS: Dict[str, str] = {
+    "short": "# Memo\n\nA short note with *emphasis* and a [link](https://example.com).\n",
+    "report": "---\ntitle: Report\nauthor: Team\n---\n\n" + "".join(
+        f"# Chapter {i}\n\nText of chapter {i} with $x^{i}$ math.\n\n"
+        f"| Key | Value |\n|-----|-------|\n| a   | {i}     |\n\n"
+        f"```python\nprint({i})\n```\n\n"
+        for i in range(20)
+    ),
+    "toc": "---\ntitle: Manual\ntoc: true\n---\n\n" + "".join(
+        f"# Part {i}\n\n## Section {i}.1\n\nSee section [Part 0](#part-0).\n\n" for i in range(30)
+    ),
+    "cyrillic": "# Отчёт\n\n" + "Текст документа с *выделением* и таблицей.\n\n| А | Б |\n|---|---|\n| 1 | 2 |\n\n" * 10,
+}
+
+
+def measure(
+    engine: PandocEngine, source: str, extra_args: List[str], runs: int, output: Path,
+    passes: Optional[List[int]] = None,
+) -> List[float]:
+    """Convert a document several times and return the latencies in seconds, collecting LaTeX passes."""
+    latencies = []
+    for _ in range(runs):
+        report: Dict[str, int] = {}
+        start = time.perf_counter()
+        engine.convert(source, output_format="pdf", output_file=str(output), extra_args=extra_args, report=report)
+        latencies.append(time.perf_counter() - start)
+        if passes is not None and "latex_passes" in report:
+            passes.append(report["latex_passes"])
+    return latencies
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    latex = sys.argv[2] if len(sys.argv) > 2 else "xelatex"
+    extra_args = [f"--pdf-engine={latex}", "-V", "geometry:margin=1in"]
+
+    # Without result cache, so every run builds the PDF
+    engine = PandocEngine()
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "out.pdf"
+        print(f"{latex}, {runs} runs per document, median latency")
+        for name, source in DOCUMENTS.items():
+            engine.pdf = None
+            before = statistics.median(measure(engine, source, extra_args, runs, output))
+
+            engine.pdf = PdfBuilder(engine.pandoc_path, str(Path(tmp) / "tex"), max_build_dirs=0)
+            first = measure(engine, source, extra_args, 1, output)[0]
+            fresh_passes: List[int] = []
+            fresh = statistics.median(measure(engine, source, extra_args, runs, output, fresh_passes))
+
+            engine.pdf = PdfBuilder(engine.pandoc_path, str(Path(tmp) / "tex"))
+            measure(engine, source, extra_args, 1, output)
+            passes: List[int] = []
+            after = statistics.median(measure(engine, source, extra_args, runs, output, passes))
+            print(
+                f"{name:8} pandoc {before * 1000:7.0f} ms  builder first {first * 1000:7.0f} ms  "
+                f"fresh {fresh * 1000:7.0f} ms ({max(fresh_passes, default=0)} passes)  "
+                f"rerender {after * 1000:7.0f} ms ({max(passes, default=0)} passes)  "
+                f"({before / after:4.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
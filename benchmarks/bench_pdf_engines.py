@@ -0,0 +1,50 @@
+"""
+Compare the installed PDF engines on the standard document set.
+
+Converts every document of bench_pdf.DOCUMENTS with every installed engine
+of the automatic selection and reports the median latency, the engine the
+automatic selection picks and the document features it decided on.
+
+Usage:
+    python benchmarks/bench_pdf_engines.py [runs]
+"""
+
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+from bench_pdf import DOCUMENTS, measure
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc.pdf import AUTO_PDF_ENGINES, document_features, installed_pdf_engines, select_pdf_engine
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    installed = [engine for engine in AUTO_PDF_ENGINES if engine in installed_pdf_engines()]
+    if not installed:
+        print("No PDF engine installed")
+        return
+
+    # Without result cache and PDF builder, so every run measures the plain engine
+    engine = PandocEngine()
+    print(f"{runs} runs per document, median latency in ms")
+    print(f"{'document':10}" + "".join(f"{name:>13}" for name in installed) + "  auto")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "out.pdf"
+        for name, source in DOCUMENTS.items():
+            cells = []
+            for pdf_engine in installed:
+                args = [f"--pdf-engine={pdf_engine}", "-V", "geometry:margin=1in"]
+                try:
+                    cells.append(f"{statistics.median(measure(engine, source, args, runs, output)) * 1000:13.0f}")
+                except RuntimeError:
+                    cells.append(f"{'failed':>13}")
+            features = document_features(engine.parse(source), ["-V", "geometry:margin=1in"])
+            choice = select_pdf_engine(features, installed)
+            print(f"{name:10}" + "".join(cells) + f"  {choice} (math {features.math}, tables {features.tables}, "
+                  f"non-latin {features.non_latin})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Hold many idle SSE streams and measure the CPU time they cost.
+
+Opens the given number of streams that send one event and then wait for a
+conversion that never reports, once as the server used to serve them (an
+EventSourceResponse with its own ping task and a generator sending a
+heartbeat after every timeout of ``asyncio.wait_for``) and once through the
+connection manager. The ASGI send of every stream only counts the bytes,
+so the numbers show the cost of the server side alone. Reports the CPU
+time per second of each measuring window, which stays flat for a flat
+profile, the timers on the event loop and the memory per stream.
+
+Usage:
+    python benchmarks/bench_sse_connections.py [streams] [heartbeat interval] [seconds]
+"""
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from sse_starlette.sse import EventSourceResponse
+
+from fast_mcp_pandoc.connections import ConnectionManager
+from fast_mcp_pandoc.models import ConversionHeartbeat
+
+SCOPE = {"type": "http"}
+
+
+class Client:
+    """ASGI receive and send of a client that reads everything and never disconnects."""
+
+    received = 0
+
+    def __init__(self, disconnect: asyncio.Event):
+        self.disconnect = disconnect
+
+    async def receive(self) -> Dict[str, Any]:
+        await self.disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        Client.received += len(message.get("body", b""))
+
+
+async def queue_stream(interval: float) -> AsyncIterator[str]:
+    """The former /convert/stream loop: a timeout and a freshly encoded heartbeat per interval."""
+    queue: asyncio.Queue = asyncio.Queue()
+    yield json.dumps({"event": "progress", "data": {"percentage": 0}})
+    while True:
+        try:
+            yield json.dumps(await asyncio.wait_for(queue.get(), timeout=interval))
+        except asyncio.TimeoutError:
+            yield json.dumps(ConversionHeartbeat(data={"timestamp": datetime.now().isoformat()}).dict())
+
+
+async def quiet_stream(release: asyncio.Event) -> AsyncIterator[str]:
+    """A stream served by the connection manager, which sends the heartbeats."""
+    yield json.dumps({"event": "progress", "data": {"percentage": 0}})
+    await release.wait()
+
+
+def rss_mb() -> float:
+    """Return the resident set size of the process in MB (Linux)."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+async def measure(name: str, streams: int, seconds: int, open_stream: Callable[[Client], Any]) -> None:
+    """Open the streams, then report the CPU time of every one-second window."""
+    disconnect = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(open_stream(Client(disconnect))) for _ in range(streams)]
+    await asyncio.sleep(0.5)
+    print(f"{name}: {streams} streams open in {time.perf_counter() - start - 0.5:.2f} s, "
+          f"{(rss_mb() - rss_before) * 1024 / streams:.1f} KB each, {len(loop._scheduled)} timers")
+
+    windows: List[float] = []
+    received = Client.received
+    for _ in range(seconds):
+        cpu = time.process_time()
+        await asyncio.sleep(1.0)
+        windows.append((time.process_time() - cpu) * 1000)
+    print(f"{name}: CPU ms per second " + " ".join(f"{window:.0f}" for window in windows))
+    print(f"{name}: mean {sum(windows) / len(windows):.1f} ms/s, max {max(windows):.1f} ms/s, "
+          f"{(Client.received - received) / seconds / 1024:.0f} KB/s written")
+
+    disconnect.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main() -> None:
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    seconds = int(sys.argv[3]) if len(sys.argv) > 3 else 15
+
+    print(f"{streams} idle streams, heartbeat every {interval:g} s, {seconds} s")
+    await measure(
+        "sse-starlette", streams, seconds,
+        lambda client: EventSourceResponse(queue_stream(interval), ping=interval)(SCOPE, client.receive, client.send),
+    )
+    manager = ConnectionManager(max_connections=streams, heartbeat_interval=interval)
+    release = asyncio.Event()
+    await measure(
+        "manager", streams, seconds,
+        lambda client: manager.response(quiet_stream(release))(SCOPE, client.receive, client.send),
+    )
+    stats = manager.stats()
+    print(f"manager: {stats['heartbeats']} heartbeats in {stats['ticks']} ticks")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+Compare the thread and asyncio modes of the worker pool under high concurrency.
+
+Submits many small markdown -> html conversions at once and reports
+throughput, latency percentiles and the peak number of OS threads.
+
+Usage:
+    python benchmarks/bench_worker_modes.py [requests] [max_workers]
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from typing import List
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool
+
+DOCUMENT = "# Title\n\nSome *emphasis* and a [link](https://example.com).\n\n- one\n- two\n"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the value below which the given fraction of the sorted values lies."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(mode: str, requests: int, max_workers: int) -> None:
+    """Run the load against one worker pool mode and print a result line."""
+    pool = WorkerPool(max_workers=max_workers, max_queue_depth=requests, max_queue_wait=3600, mode=mode)
+    latencies: List[float] = []
+    peak_threads = threading.active_count()
+
+    async def one(index: int) -> None:
+        nonlocal peak_threads
+        # Distinct inputs so the result cache does not answer the requests
+        task = ConversionTask(
+            request=ConversionRequest(contents=f"{DOCUMENT}\n{index}\n", output_format="html"),
+            task_id=f"{mode}-{index}",
+            progress_callback=lambda task_id, percentage, message: None
+        )
+        start = time.perf_counter()
+        await (await pool.submit_task(task))
+        latencies.append(time.perf_counter() - start)
+        peak_threads = max(peak_threads, threading.active_count())
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - start
+    await pool.shutdown()
+
+    latencies.sort()
+    print(
+        f"{mode:8} {requests / elapsed:8.1f} conversions/s  "
+        f"p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  "
+        f"peak threads {peak_threads}"
+    )
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    print(f"{requests} concurrent requests, {max_workers} workers per mode")
+    asyncio.run(run(MODE_THREAD, requests, max_workers))
+    asyncio.run(run(MODE_ASYNCIO, requests, max_workers))
+
+
+if __name__ == "__main__":
+    main()
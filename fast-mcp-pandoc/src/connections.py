@@ -0,0 +1,394 @@
+"""
+Central management of the open Server-Sent Events streams.
+
+Every SSE response of the server is registered with the
+:class:`ConnectionManager`. Instead of a ping timer per stream, a single
+ticker writes a heartbeat frame, encoded once per tick, to every stream
+that has been quiet for a heartbeat interval. Streams are kept in the
+order of their last write, so a tick only visits the streams that are due
+and an idle stream costs no CPU time between its heartbeats. A tick sends
+at most twice its share of the heartbeats of an interval, so streams
+opened at the same time drift apart instead of getting their heartbeats in
+one burst.
+
+Each stream is written by one writer: the event generator runs in its own
+task and hands every frame over to the writer, waiting until it has been
+sent, so a slow client still slows down the generator and the events pile
+up in the generator's subscription, which is bounded by the memory budget
+of the connection. The manager also enforces the global connection limit
+and reports the open streams by state.
+
+A response whose request body is streamed into pandoc while the events are
+sent only starts listening for the disconnect of its client once the body
+has been read, as both arrive through the same ASGI ``receive``.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterable, Dict, List, Optional, Tuple
+
+from mcp_pandoc.streams import InputStream
+from sse_starlette.event import ensure_bytes
+from sse_starlette.sse import AppStatus, EventSourceResponse
+from starlette.types import Receive, Scope, Send
+
+from .models import ConversionHeartbeat
+from .worker import AdmissionError
+
+logger = logging.getLogger("pandoc-connections")
+
+# States of an open stream
+CONNECTION_STREAMING = "streaming"  # sent an event within the last heartbeat interval
+CONNECTION_IDLE = "idle"  # kept open by heartbeats only
+CONNECTION_BLOCKED = "blocked"  # a write has been waiting for the client for a heartbeat interval
+
+# Heartbeats as JSON heartbeat event (/convert/stream, /jobs) or as SSE comment ignored by clients (/sse)
+HEARTBEAT_EVENT = "event"
+HEARTBEAT_COMMENT = "comment"
+
+SEPARATOR = "\r\n"
+COMMENT_FRAME = f": ping{SEPARATOR}{SEPARATOR}".encode()
+
+# Longest sleep of the ticker, so shutdown is noticed quickly
+MAX_TICK = 1.0
+
+
+class ConnectionLimitError(AdmissionError):
+    """Raised when a stream would exceed the maximum number of open connections."""
+    status_code = 503
+
+
+class SSEConnection:
+    """An open stream and the frame waiting to be written to it."""
+
+    __slots__ = (
+        "connection_id", "kind", "heartbeat", "opened_at", "last_data", "last_write", "write_started",
+        "pending", "closed", "_frame", "_beat", "_waiter", "_written",
+    )
+
+    def __init__(self, kind: str, heartbeat: str):
+        """
+        Initialize the connection; use ConnectionManager.response instead.
+
+        Args:
+            kind: The endpoint serving the stream, for statistics.
+            heartbeat: HEARTBEAT_EVENT or HEARTBEAT_COMMENT.
+        """
+        self.connection_id = str(uuid.uuid4())
+        self.kind = kind
+        self.heartbeat = heartbeat
+        now = time.monotonic()
+        self.opened_at = now
+        self.last_data = now
+        self.last_write = now
+        self.write_started = 0.0
+        self.pending = 0
+        self.closed = False
+        self._frame: Optional[bytes] = None
+        self._beat: Optional[bytes] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._written: Optional[asyncio.Future] = None
+
+    def state(self, now: float, interval: float) -> str:
+        """Return the state of the stream."""
+        if self.write_started and now - self.write_started >= interval:
+            return CONNECTION_BLOCKED
+        if now - self.last_data < interval:
+            return CONNECTION_STREAMING
+        return CONNECTION_IDLE
+
+    async def put(self, frame: bytes) -> None:
+        """Hand an event frame to the writer and wait until it has been sent."""
+        self._frame = frame
+        self.pending = len(frame)
+        self._written = asyncio.get_running_loop().create_future()
+        self._wake()
+        await self._written
+
+    async def next_frame(self) -> Optional[Tuple[bytes, bool]]:
+        """Wait for the next frame and whether it is an event; None once the stream is closed."""
+        while True:
+            if self.closed:
+                return None
+            if self._frame is not None:
+                frame, self._frame = self._frame, None
+                return frame, True
+            if self._beat is not None:
+                frame, self._beat = self._beat, None
+                return frame, False
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def close(self) -> None:
+        """End the stream after the frame being written."""
+        self.closed = True
+        self._wake()
+
+    def _sent(self, is_event: bool) -> None:
+        """Record a finished write and release the generator waiting for it."""
+        now = time.monotonic()
+        self.write_started = 0.0
+        self.last_write = now
+        if is_event:
+            self.last_data = now
+            self.pending = 0
+            if self._written is not None and not self._written.done():
+                self._written.set_result(None)
+
+    def _wake(self) -> None:
+        """Wake up the writer waiting in next_frame."""
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class ManagedEventSourceResponse(EventSourceResponse):
+    """
+    SSE response written by its connection instead of per-stream ping and shutdown tasks.
+
+    Created by :meth:`ConnectionManager.response`, which reserved a
+    connection slot for it.
+    """
+
+    def __init__(
+        self,
+        manager: "ConnectionManager",
+        content: AsyncIterable[Any],
+        kind: str,
+        heartbeat: str,
+        body: Optional[InputStream] = None,
+    ):
+        """
+        Initialize the response.
+
+        Args:
+            manager: The manager the stream is registered with.
+            content: Async iterable yielding the events, as for EventSourceResponse.
+            kind: The endpoint serving the stream, for statistics.
+            heartbeat: HEARTBEAT_EVENT or HEARTBEAT_COMMENT.
+            body: The request body the events are produced from, read while they are sent.
+        """
+        super().__init__(content, ping=0, sep=SEPARATOR)
+        self.manager = manager
+        self.kind = kind
+        self.heartbeat = heartbeat
+        self.body = body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Write the events and heartbeats of the stream until it ends or the client disconnects."""
+        connection = self.manager._open(self.kind, self.heartbeat)
+        producer: Optional[asyncio.Task] = None
+        listener: Optional[asyncio.Task] = None
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            producer = asyncio.ensure_future(self._produce(connection))
+            listener = asyncio.ensure_future(self._listen(connection, receive))
+            while True:
+                item = await connection.next_frame()
+                if item is None:
+                    break
+                frame, is_event = item
+                connection.write_started = time.monotonic()
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+                connection._sent(is_event)
+                self.manager._touch(connection)
+            if not listener.done():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.active = False
+            for task in (producer, listener):
+                if task is not None and not task.done():
+                    task.cancel()
+            # A generator cut off by a disconnect cleans up in its finally block
+            if producer is not None:
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await producer
+            self.manager._close(connection)
+        if self.background is not None:
+            await self.background()
+
+    async def _produce(self, connection: SSEConnection) -> None:
+        """Encode the events of the generator and hand them to the writer one by one."""
+        try:
+            async for data in self.body_iterator:
+                await connection.put(ensure_bytes(data, self.sep))
+        except Exception:
+            logger.exception(f"Event stream {connection.connection_id} failed")
+            raise
+        finally:
+            connection.close()
+
+    async def _listen(self, connection: SSEConnection, receive: Receive) -> None:
+        """Close the connection when the client disconnects."""
+        if self.body is not None:
+            # Until then a disconnect fails reading the body
+            await self.body.wait_done()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                connection.close()
+                return
+
+
+class ConnectionManager:
+    """
+    Registry of the open SSE streams with a shared heartbeat ticker.
+
+    Not thread-safe: all methods run on the event loop serving the streams.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10000,
+        heartbeat_interval: float = 15.0,
+        memory_budget_kb: int = 1024,
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            max_connections: Maximum number of open streams; further streams are rejected.
+            heartbeat_interval: Seconds without a write after which a stream gets a heartbeat.
+            memory_budget_kb: Maximum size of the events buffered for one stream.
+        """
+        self.max_connections = max_connections
+        self.heartbeat_interval = heartbeat_interval
+        self.memory_budget = memory_budget_kb * 1024
+        # Open streams by ID, in the order of their last write
+        self._connections: "OrderedDict[str, SSEConnection]" = OrderedDict()
+        self._reserved = 0
+        self._ticker: Optional[asyncio.Task] = None
+        self._counters = {"opened": 0, "rejected": 0, "heartbeats": 0, "ticks": 0}
+
+    def response(
+        self,
+        content: AsyncIterable[Any],
+        kind: str = "sse",
+        heartbeat: str = HEARTBEAT_EVENT,
+        body: Optional[InputStream] = None,
+    ) -> ManagedEventSourceResponse:
+        """
+        Create the SSE response of a stream, reserving its connection slot.
+
+        Args:
+            content: Async iterable yielding the events, as for EventSourceResponse.
+            kind: The endpoint serving the stream, for statistics.
+            heartbeat: HEARTBEAT_EVENT or HEARTBEAT_COMMENT.
+            body: The streamed request body the events are produced from, if any.
+
+        Raises:
+            ConnectionLimitError: If the maximum number of connections is open.
+        """
+        if len(self._connections) + self._reserved >= self.max_connections:
+            self._counters["rejected"] += 1
+            raise ConnectionLimitError(
+                f"Too many open streams ({self.max_connections})",
+                retry_after=max(1, int(self.heartbeat_interval)),
+            )
+        self._reserved += 1
+        return ManagedEventSourceResponse(self, content, kind, heartbeat, body)
+
+    def close_all(self) -> None:
+        """End every open stream, e.g. on shutdown."""
+        for connection in list(self._connections.values()):
+            connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the open streams by state and kind, the limits and counters."""
+        now = time.monotonic()
+        states = {state: 0 for state in (CONNECTION_STREAMING, CONNECTION_IDLE, CONNECTION_BLOCKED)}
+        kinds: Dict[str, int] = {}
+        for connection in self._connections.values():
+            states[connection.state(now, self.heartbeat_interval)] += 1
+            kinds[connection.kind] = kinds.get(connection.kind, 0) + 1
+        return {
+            "connections": len(self._connections),
+            "max_connections": self.max_connections,
+            "states": states,
+            "kinds": kinds,
+            "pending_bytes": sum(connection.pending for connection in self._connections.values()),
+            "memory_budget": self.memory_budget,
+            "heartbeat_interval": self.heartbeat_interval,
+            **self._counters,
+        }
+
+    def _open(self, kind: str, heartbeat: str) -> SSEConnection:
+        """Register a stream whose response starts, turning its reservation into a connection."""
+        self._reserved = max(0, self._reserved - 1)
+        connection = SSEConnection(kind, heartbeat)
+        self._connections[connection.connection_id] = connection
+        self._counters["opened"] += 1
+        loop = asyncio.get_running_loop()
+        if self._ticker is None or self._ticker.done() or self._ticker.get_loop() is not loop:
+            self._ticker = loop.create_task(self._tick())
+        return connection
+
+    def _close(self, connection: SSEConnection) -> None:
+        """Unregister a stream that has ended."""
+        connection.close()
+        self._connections.pop(connection.connection_id, None)
+        if not self._connections and self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+
+    def _touch(self, connection: SSEConnection) -> None:
+        """Move a stream that has just been written to the end of the heartbeat order."""
+        if connection.connection_id in self._connections:
+            self._connections.move_to_end(connection.connection_id)
+
+    async def _tick(self) -> None:
+        """Send heartbeats to the quiet streams and end all streams on server shutdown."""
+        tick = min(MAX_TICK, self.heartbeat_interval)
+        while self._connections:
+            await asyncio.sleep(tick)
+            if AppStatus.should_exit:
+                self.close_all()
+                return
+            self._heartbeat(time.monotonic())
+
+    def _heartbeat(self, now: float) -> None:
+        """Hand a heartbeat frame to every stream not written for a heartbeat interval."""
+        self._counters["ticks"] += 1
+        tick = min(MAX_TICK, self.heartbeat_interval)
+        share = max(1, math.ceil(2 * len(self._connections) * tick / self.heartbeat_interval))
+        due: List[SSEConnection] = []
+        threshold = now - self.heartbeat_interval
+        for connection in self._connections.values():
+            if connection.last_write > threshold or len(due) >= share:
+                break
+            # A stream still waiting for its last write needs no heartbeat
+            if not connection.write_started and connection._beat is None:
+                due.append(connection)
+        event_frame: Optional[bytes] = None
+        for connection in due:
+            if connection.heartbeat == HEARTBEAT_COMMENT:
+                frame = COMMENT_FRAME
+            else:
+                if event_frame is None:
+                    # Encoded once per tick and shared by all streams
+                    heartbeat = ConversionHeartbeat(data={"timestamp": datetime.now().isoformat()}).dict()
+                    event_frame = ensure_bytes(json.dumps(heartbeat), SEPARATOR)
+                frame = event_frame
+            connection._beat = frame
+            connection.last_write = now
+            self._connections.move_to_end(connection.connection_id)
+            connection._wake()
+            self._counters["heartbeats"] += 1
+
+
+# Global connection manager
+connection_manager = ConnectionManager(
+    max_connections=int(os.environ.get("MAX_SSE_CONNECTIONS", "10000")),
+    heartbeat_interval=float(os.environ.get("SSE_HEARTBEAT_INTERVAL", "15")),
+    memory_budget_kb=int(os.environ.get("SSE_CONNECTION_MEMORY_KB", "1024")),
+)
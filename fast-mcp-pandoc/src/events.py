@@ -0,0 +1,317 @@
+"""
+Publish/subscribe bus for the events of conversion tasks.
+
+Worker threads report progress through the callbacks of a
+:class:`ConversionTask`. The callbacks of tasks created with
+:meth:`EventBus.task` publish each update with a single non-blocking
+``loop.call_soon_threadsafe`` to the loop that created the task; no
+coroutine or future is created per event. On the loop the event is
+handed to every subscription of the task: SSE connections, the job
+store, monitoring.
+
+Every subscription has a bounded buffer, limited in events and optionally
+in bytes. While an update is still waiting to be read, a newer progress
+update for the same task or target replaces it, so a slow consumer only
+ever sees the latest progress. Progress updates that find the buffer full
+are dropped. Events that cannot be dropped (chunks of the output, results,
+errors) overflow the subscription instead: it is closed and its consumer
+gets :class:`SubscriptionOverflow` after the buffered events. The final
+event of a task is exempt from the byte limit, as its size is bounded by
+the output limit of the conversion.
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Set
+
+from .models import ConversionRequest
+from .worker import ConversionTask
+
+logger = logging.getLogger("pandoc-events")
+
+# Kinds of task events
+EVENT_PROGRESS = "progress"
+EVENT_TARGET = "target"
+EVENT_CHUNK = "chunk"
+EVENT_COMPLETE = "complete"
+EVENT_ERROR = "error"
+
+# Events a subscription buffers before it drops progress and overflows on other events
+DEFAULT_MAX_EVENTS = 1024
+
+
+class TaskEvent(NamedTuple):
+    """
+    An update of a conversion task.
+
+    ``percentage`` and ``message`` follow the progress callback of
+    ConversionTask: the result at 100, the error at -1. Target events
+    carry the target index, chunk events the chunk index in ``index``.
+    """
+    kind: str
+    task_id: str
+    percentage: int = 0
+    message: Any = None
+    index: Optional[int] = None
+    eta: Optional[float] = None
+
+    @property
+    def final(self) -> bool:
+        """True for the complete or error event that ends a task."""
+        return self.kind in (EVENT_COMPLETE, EVENT_ERROR)
+
+    def coalesce_key(self) -> Any:
+        """Return the key under which newer events replace this one, None if it must be delivered."""
+        if self.kind == EVENT_PROGRESS:
+            return EVENT_PROGRESS
+        if self.kind == EVENT_TARGET and 0 <= self.percentage < 100:
+            return self.index
+        return None
+
+    def size(self) -> int:
+        """Return the approximate number of bytes the event holds."""
+        return len(self.message) if isinstance(self.message, str) else 0
+
+
+class SubscriptionOverflow(RuntimeError):
+    """Raised to the consumer of a subscription that could not keep up with its task's events."""
+
+
+class Subscription:
+    """
+    The events of one task for one consumer.
+
+    Buffered subscriptions are read with :meth:`get`; subscriptions with a
+    callback receive every event right away on the event loop instead.
+    """
+
+    def __init__(
+        self,
+        bus: "EventBus",
+        task_id: str,
+        maxsize: int = DEFAULT_MAX_EVENTS,
+        callback: Optional[Callable[[TaskEvent], None]] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        Initialize the subscription; use EventBus.subscribe instead.
+
+        Args:
+            bus: The bus delivering the events.
+            task_id: The task whose events are delivered.
+            maxsize: Maximum number of buffered events.
+            callback: Receives the events instead of the buffer.
+            max_bytes: Maximum size of the buffered events, unlimited if None.
+        """
+        self.bus = bus
+        self.task_id = task_id
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.buffered_bytes = 0
+        self.callback = callback
+        self.closed = False
+        self.overflowed = False
+        self.coalesced = 0
+        self.dropped = 0
+        # Slots are one-element lists, so a coalesced event replaces a buffered one in place
+        self._buffer: Deque[List[TaskEvent]] = deque()
+        self._pending: Dict[Any, List[TaskEvent]] = {}
+        self._waiter: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        """Return the number of buffered events."""
+        return len(self._buffer)
+
+    async def get(self, timeout: Optional[float] = None) -> TaskEvent:
+        """
+        Return the next event, waiting for it if necessary.
+
+        Raises:
+            asyncio.TimeoutError: If no event arrives within ``timeout`` seconds.
+            SubscriptionOverflow: If the subscription overflowed and its buffered events have been read.
+            RuntimeError: If the subscription was closed and its buffered events have been read.
+        """
+        while not self._buffer:
+            if self.overflowed:
+                raise SubscriptionOverflow(
+                    f"Events of task {self.task_id} were not read fast enough ({self.maxsize} buffered)"
+                )
+            if self.closed:
+                raise RuntimeError(f"Subscription to task {self.task_id} is closed")
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            finally:
+                self._waiter = None
+        slot = self._buffer.popleft()
+        self.buffered_bytes -= slot[0].size()
+        key = slot[0].coalesce_key()
+        if key is not None and self._pending.get(key) is slot:
+            del self._pending[key]
+        return slot[0]
+
+    def close(self) -> None:
+        """Stop receiving events."""
+        if not self.closed:
+            self.closed = True
+            self.bus._unsubscribe(self)
+            self._wake()
+
+    def _deliver(self, event: TaskEvent) -> None:
+        """Buffer or hand over an event; runs on the event loop."""
+        if self.callback is not None:
+            self.callback(event)
+            return
+        key = event.coalesce_key()
+        size = event.size()
+        if key is not None:
+            slot = self._pending.get(key)
+            if slot is not None:
+                self.buffered_bytes += size - slot[0].size()
+                slot[0] = event
+                self.coalesced += 1
+                return
+            if self._full(size):
+                self.dropped += 1
+                return
+            slot = [event]
+            self._pending[key] = slot
+        else:
+            if len(self._buffer) >= self.maxsize or (not event.final and self._full(size)):
+                logger.warning(f"Subscription to task {self.task_id} overflowed, closing it")
+                self.overflowed = True
+                self.close()
+                return
+            slot = [event]
+        self._buffer.append(slot)
+        self.buffered_bytes += size
+        self._wake()
+
+    def _full(self, size: int) -> bool:
+        """Return whether an event of ``size`` bytes does not fit into the buffer."""
+        if len(self._buffer) >= self.maxsize:
+            return True
+        # A single event is always buffered, however large, so every event can be read
+        return self.max_bytes is not None and bool(self._buffer) and self.buffered_bytes + size > self.max_bytes
+
+    def _wake(self) -> None:
+        """Wake up a consumer waiting in get."""
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class EventBus:
+    """
+    Delivers the events of conversion tasks to their subscriptions.
+
+    Not thread-safe except for publishing through the callbacks of tasks
+    created with :meth:`task`; all other methods run on the event loop.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAX_EVENTS):
+        """
+        Initialize the bus.
+
+        Args:
+            maxsize: Default buffer size of new subscriptions.
+        """
+        self.maxsize = maxsize
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._counters = {"published": 0, "delivered": 0, "overflowed": 0}
+        self._coalesced = 0
+        self._dropped = 0
+
+    def subscribe(
+        self,
+        task_id: str,
+        maxsize: Optional[int] = None,
+        callback: Optional[Callable[[TaskEvent], None]] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Subscription:
+        """
+        Subscribe to the events of a task.
+
+        Args:
+            task_id: The task; subscribe before submitting it to receive all of its events.
+            maxsize: Buffer size, the bus default if omitted.
+            callback: Called with every event on the event loop instead of buffering it.
+            max_bytes: Maximum size of the buffered events, e.g. the memory budget of an SSE connection.
+        """
+        subscription = Subscription(self, task_id, maxsize or self.maxsize, callback, max_bytes)
+        self._subscriptions.setdefault(task_id, set()).add(subscription)
+        return subscription
+
+    def task(self, request: ConversionRequest, task_id: str) -> ConversionTask:
+        """
+        Create a conversion task whose callbacks publish its events on this bus.
+
+        The events are delivered on the event loop running this call,
+        whichever thread the callbacks run on.
+        """
+        call_soon = asyncio.get_running_loop().call_soon_threadsafe
+        dispatch = self._dispatch
+
+        def progress_callback(task_id: str, percentage: int, message: Any) -> None:
+            kind = EVENT_COMPLETE if percentage == 100 else EVENT_ERROR if percentage == -1 else EVENT_PROGRESS
+            call_soon(dispatch, TaskEvent(kind, task_id, percentage, message, None, task.eta))
+
+        def target_callback(task_id: str, index: int, percentage: int, message: str) -> None:
+            call_soon(dispatch, TaskEvent(EVENT_TARGET, task_id, percentage, message, index))
+
+        def chunk_callback(task_id: str, index: int, text: str) -> None:
+            call_soon(dispatch, TaskEvent(EVENT_CHUNK, task_id, 0, text, index))
+
+        task = ConversionTask(
+            request=request,
+            task_id=task_id,
+            progress_callback=progress_callback,
+            target_callback=target_callback,
+            chunk_callback=chunk_callback,
+        )
+        return task
+
+    def publish(self, event: TaskEvent) -> None:
+        """Deliver an event to the subscriptions of its task; runs on the event loop."""
+        self._dispatch(event)
+
+    def _dispatch(self, event: TaskEvent) -> None:
+        """Hand an event to every subscription of its task."""
+        self._counters["published"] += 1
+        subscriptions = self._subscriptions.get(event.task_id)
+        if not subscriptions:
+            return
+        for subscription in list(subscriptions):
+            subscription._deliver(event)
+        self._counters["delivered"] += len(subscriptions)
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a closed subscription, keeping its counters."""
+        subscriptions = self._subscriptions.get(subscription.task_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.task_id]
+        self._coalesced += subscription.coalesced
+        self._dropped += subscription.dropped
+        if subscription.overflowed:
+            self._counters["overflowed"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of subscriptions and event counters."""
+        subscriptions = [subscription for group in self._subscriptions.values() for subscription in group]
+        return {
+            "tasks": len(self._subscriptions),
+            "subscriptions": len(subscriptions),
+            "buffered": sum(len(subscription) for subscription in subscriptions),
+            "buffered_bytes": sum(subscription.buffered_bytes for subscription in subscriptions),
+            **self._counters,
+            "coalesced": self._coalesced + sum(subscription.coalesced for subscription in subscriptions),
+            "dropped": self._dropped + sum(subscription.dropped for subscription in subscriptions),
+        }
+
+
+# Global event bus
+event_bus = EventBus(maxsize=int(os.environ.get("EVENT_BUFFER_SIZE", str(DEFAULT_MAX_EVENTS))))
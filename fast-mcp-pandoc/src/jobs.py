@@ -0,0 +1,288 @@
+"""
+Durable conversion jobs that outlive the connection which started them.
+
+A job submitted through ``POST /jobs`` runs on the worker pool regardless
+of who listens. Its events are kept in a bounded per-job log with
+increasing sequence numbers, so a client that lost its SSE connection
+resumes with ``Last-Event-ID`` instead of submitting the conversion again.
+Finished jobs keep their result for a TTL; results beyond the memory
+budget are spilled to disk, oldest first.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .models import ConversionRequest
+
+logger = logging.getLogger("pandoc-jobs")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETE = "complete"
+JOB_ERROR = "error"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = (JOB_COMPLETE, JOB_ERROR, JOB_CANCELLED)
+
+# Events kept per job for replay; older progress events are dropped first
+DEFAULT_EVENT_LOG = 256
+
+
+@dataclass
+class Job:
+    """
+    A conversion job and the events it has produced.
+
+    Events are (sequence number, event) pairs; the final complete or error
+    event is always the newest one and never dropped. The result of a
+    finished job is either held in result or spilled to spill_path.
+    """
+    job_id: str
+    request: ConversionRequest
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    events: Deque[Tuple[int, Dict[str, Any]]] = field(default_factory=lambda: deque(maxlen=DEFAULT_EVENT_LOG))
+    last_event_id: int = 0
+    result: Any = None
+    result_size: int = 0
+    spill_path: Optional[Path] = None
+    error: Optional[str] = None
+    info: Dict[str, Any] = field(default_factory=dict)
+    idempotency_key: Optional[str] = None
+    _expires_at: float = field(default=0.0, init=False, repr=False)
+    _updated: asyncio.Event = field(default_factory=asyncio.Event, init=False, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        """True once the job has completed, failed or been cancelled."""
+        return self.status in FINISHED_STATES
+
+    def events_after(self, event_id: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return the retained events newer than ``event_id``."""
+        return [(seq, event) for seq, event in self.events if seq > event_id]
+
+    async def wait(self, event_id: int, timeout: Optional[float]) -> bool:
+        """
+        Wait until the job has events newer than ``event_id`` or has finished.
+
+        Args:
+            event_id: The last event the listener has seen.
+            timeout: Seconds to wait at most, None to wait without a timer.
+
+        Returns:
+            False if the timeout passed first.
+        """
+        while self.last_event_id <= event_id and not self.finished:
+            try:
+                await asyncio.wait_for(self._updated.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Append an event to the log and wake up its listeners; runs on the event loop."""
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, event))
+        if self.status == JOB_QUEUED and event.get("event") == "progress":
+            self.status = JOB_RUNNING
+        self._notify()
+
+    def _notify(self) -> None:
+        """Wake up the current listeners; later ones wait on a fresh event."""
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+
+class JobStore:
+    """
+    Jobs by ID, with their event logs and retained results.
+
+    Not thread-safe: all methods run on the event loop. Worker threads hand
+    events over with ``loop.call_soon_threadsafe(job.publish, event)``.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        memory_mb: int = 64,
+        max_jobs: int = 10000,
+        spill_dir: Optional[str] = None,
+        event_log: int = DEFAULT_EVENT_LOG,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            ttl: Seconds a finished job and its result are kept.
+            memory_mb: Total size of the results held in memory; beyond it results are spilled to disk.
+            max_jobs: Maximum number of jobs kept; the oldest finished ones are dropped first.
+            spill_dir: Directory for spilled results, created on first use.
+            event_log: Number of events kept per job for replay.
+        """
+        self.ttl = ttl
+        self.memory_budget = memory_mb * 1024 * 1024
+        self.max_jobs = max_jobs
+        self.spill_dir = Path(spill_dir or os.path.join(tempfile.gettempdir(), "fast-mcp-pandoc-jobs"))
+        self.event_log = event_log
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._idempotency_keys: Dict[str, str] = {}
+        self._memory = 0
+        self._counters = {"created": 0, "deduplicated": 0, "spilled": 0, "expired": 0}
+
+    def create(self, request: ConversionRequest, idempotency_key: Optional[str] = None) -> Tuple[Job, bool]:
+        """
+        Create a job for a request.
+
+        Args:
+            request: The conversion request.
+            idempotency_key: Client-chosen key; a retried submission with the same key returns the existing job.
+
+        Returns:
+            The job and whether it was newly created.
+        """
+        self.sweep()
+        if idempotency_key is not None:
+            job = self._jobs.get(self._idempotency_keys.get(idempotency_key, ""))
+            if job is not None:
+                self._counters["deduplicated"] += 1
+                return job, False
+        job = Job(
+            job_id=str(uuid.uuid4()),
+            request=request,
+            events=deque(maxlen=self.event_log),
+            idempotency_key=idempotency_key,
+        )
+        self._jobs[job.job_id] = job
+        if idempotency_key is not None:
+            self._idempotency_keys[idempotency_key] = job.job_id
+        self._counters["created"] += 1
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job that has not expired yet."""
+        self.sweep()
+        return self._jobs.get(job_id)
+
+    def finish(
+        self,
+        job: Job,
+        status: str,
+        event: Dict[str, Any],
+        result: Any = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Record the outcome of a job and publish its final event.
+
+        Args:
+            job: The finished job.
+            status: JOB_COMPLETE, JOB_ERROR or JOB_CANCELLED.
+            event: The final event, without the result (which is attached when it is sent).
+            result: The conversion result of a completed job.
+            error: The error message of a failed or cancelled job.
+        """
+        job.status = status
+        job.finished_at = time.time()
+        job.error = error
+        job.result = result
+        job.result_size = len(result if isinstance(result, str) else json.dumps(result)) if result is not None else 0
+        job._expires_at = time.monotonic() + self.ttl
+        self._memory += job.result_size
+        job.publish(event)
+        self.sweep()
+
+    def result(self, job: Job) -> Any:
+        """Return the result of a finished job, reading it back from disk if it was spilled."""
+        if job.spill_path is None:
+            return job.result
+        try:
+            return json.loads(job.spill_path.read_text(encoding="utf-8"))["result"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read spilled result of job {job.job_id}: {e}")
+            return None
+
+    def abandon(self, job: Job) -> None:
+        """Forget a job whose conversion could not be submitted, so a retry with its key starts anew."""
+        if self._jobs.get(job.job_id) is job and not job.finished:
+            self._drop(job)
+
+    def discard(self, job_id: str) -> bool:
+        """Forget a finished job and its result; returns False for unknown or unfinished jobs."""
+        job = self._jobs.get(job_id)
+        if job is None or not job.finished:
+            return False
+        self._drop(job)
+        return True
+
+    def sweep(self) -> None:
+        """Drop expired jobs, enforce the job limit and spill results beyond the memory budget."""
+        now = time.monotonic()
+        for job in [job for job in self._jobs.values() if job.finished and job._expires_at <= now]:
+            self._counters["expired"] += 1
+            self._drop(job)
+        if len(self._jobs) > self.max_jobs:
+            for job in [job for job in self._jobs.values() if job.finished][:len(self._jobs) - self.max_jobs]:
+                self._drop(job)
+        if self._memory > self.memory_budget:
+            for job in list(self._jobs.values()):
+                if self._memory <= self.memory_budget:
+                    break
+                if job.finished and job.spill_path is None and job.result is not None:
+                    self._spill(job)
+
+    def _spill(self, job: Job) -> None:
+        """Move the result of a job from memory to disk."""
+        path = self.spill_dir / f"{job.job_id}.json"
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"result": job.result}), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Could not spill result of job {job.job_id}: {e}")
+            return
+        job.spill_path = path
+        job.result = None
+        self._memory -= job.result_size
+        self._counters["spilled"] += 1
+
+    def _drop(self, job: Job) -> None:
+        """Remove a job and its spilled result."""
+        del self._jobs[job.job_id]
+        if job.idempotency_key is not None:
+            self._idempotency_keys.pop(job.idempotency_key, None)
+        if job.spill_path is not None:
+            job.spill_path.unlink(missing_ok=True)
+        else:
+            self._memory -= job.result_size
+
+    def stats(self) -> Dict[str, Any]:
+        """Return job counts by state, result memory and counters."""
+        states = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING, *FINISHED_STATES)}
+        for job in self._jobs.values():
+            states[job.status] += 1
+        return {
+            "jobs": len(self._jobs),
+            "states": states,
+            "result_memory": self._memory,
+            "result_memory_budget": self.memory_budget,
+            **self._counters,
+        }
+
+
+# Global job store
+job_store = JobStore(
+    ttl=float(os.environ.get("JOB_RESULT_TTL", "3600")),
+    memory_mb=int(os.environ.get("JOB_RESULT_MEMORY_MB", "64")),
+    max_jobs=int(os.environ.get("MAX_JOBS", "10000")),
+    spill_dir=os.environ.get("JOB_SPILL_DIR"),
+    event_log=int(os.environ.get("JOB_EVENT_LOG", str(DEFAULT_EVENT_LOG))),
+)
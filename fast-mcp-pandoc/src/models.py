@@ -9,23 +9,78 @@ import os
 from enum import Enum
 from typing import Any, Dict, List, Optional, Union
 
+from mcp_pandoc.pdf import PDF_ENGINES
 from pydantic import BaseModel, Field, validator
 
 
+SUPPORTED_FORMATS = {"markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"}
+ADVANCED_FORMATS = {"pdf", "docx", "rst", "latex", "epub"}
+INCREMENTAL_FORMATS = {"markdown", "html", "rst", "latex", "txt"}
+STREAMING_FORMATS = {"markdown", "html", "rst", "latex", "txt"}
+
+ARTIFACT_DESCRIPTION = (
+    "Store the output in the artifact store and return a download reference instead of a server path"
+)
+
+
+class ConversionTarget(BaseModel):
+    """One output of a multi-target conversion."""
+    output_format: str = Field(..., description="Desired output format")
+    artifact: bool = Field(False, description=ARTIFACT_DESCRIPTION)
+    output_file: Optional[str] = Field(None, description="Path where to save the output")
+
+    @validator("output_format")
+    def validate_format(cls, v: str) -> str:
+        """Validate that the format is supported."""
+        if v.lower() not in SUPPORTED_FORMATS:
+            raise ValueError(f"Format '{v}' not supported. Supported formats: {', '.join(SUPPORTED_FORMATS)}")
+        return v.lower()
+
+    @validator("output_file", always=True)
+    def validate_output_file(cls, v: Optional[str], values: Dict[str, Any]) -> Optional[str]:
+        """Validate that output_file is provided for advanced formats unless the output is an artifact."""
+        if values.get("artifact"):
+            if v:
+                raise ValueError("output_file cannot be combined with artifact")
+            return v
+        if values.get("output_format") in ADVANCED_FORMATS and not v:
+            raise ValueError(f"output_file is required for {values['output_format']} format")
+        return v
+
+
 class ConversionRequest(BaseModel):
     """Request model for conversion with either content or input_file."""
     contents: Optional[str] = Field(None, description="The content to be converted")
     input_file: Optional[str] = Field(None, description="Path to the input file")
     input_format: str = Field("markdown", description="Source format of the content")
     output_format: str = Field("markdown", description="Desired output format")
+    artifact: bool = Field(False, description=ARTIFACT_DESCRIPTION)
     output_file: Optional[str] = Field(None, description="Path where to save the output")
+    targets: Optional[List[ConversionTarget]] = Field(
+        None,
+        description="Several outputs rendered from a single parse; replaces output_format/output_file",
+    )
+    document_id: Optional[str] = Field(
+        None,
+        description=(
+            "Identifies successive versions of a document; only changed blocks are converted again, "
+            "PDF builds reuse the LaTeX state of the previous version"
+        ),
+    )
+    pdf_engine: Optional[str] = Field(
+        None,
+        description="PDF engine; 'auto' (default) picks the fastest installed engine that renders the document",
+    )
+    stream: bool = Field(
+        False,
+        description="Emit the converted text as ordered chunk events; the complete event only carries length and checksum",
+    )
 
     @validator("input_format", "output_format")
     def validate_formats(cls, v: str) -> str:
         """Validate that the formats are supported."""
-        supported_formats = {"markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"}
-        if v.lower() not in supported_formats:
-            raise ValueError(f"Format '{v}' not supported. Supported formats: {', '.join(supported_formats)}")
+        if v.lower() not in SUPPORTED_FORMATS:
+            raise ValueError(f"Format '{v}' not supported. Supported formats: {', '.join(SUPPORTED_FORMATS)}")
         return v.lower()
 
     @validator("contents", "input_file")
@@ -37,13 +92,68 @@ class ConversionRequest(BaseModel):
 
     @validator("output_file", always=True)
     def validate_output_file(cls, v: Optional[str], values: Dict[str, Any]) -> Optional[str]:
-        """Validate that output_file is provided for advanced formats."""
+        """Validate that output_file is provided for advanced formats unless the output is an artifact."""
+        if values.get("artifact"):
+            if v:
+                raise ValueError("output_file cannot be combined with artifact")
+            return v
         if "output_format" in values:
-            advanced_formats = {"pdf", "docx", "rst", "latex", "epub"}
-            if values["output_format"] in advanced_formats and not v:
+            if values["output_format"] in ADVANCED_FORMATS and not v:
                 raise ValueError(f"output_file is required for {values['output_format']} format")
         return v
 
+    @validator("targets")
+    def validate_targets(
+        cls, v: Optional[List[ConversionTarget]], values: Dict[str, Any]
+    ) -> Optional[List[ConversionTarget]]:
+        """Validate that multi-target conversions choose artifact outputs per target."""
+        if v and values.get("artifact"):
+            raise ValueError("artifact cannot be combined with targets, set it on the targets instead")
+        return v
+
+    @validator("document_id")
+    def validate_document_id(cls, v: Optional[str], values: Dict[str, Any]) -> Optional[str]:
+        """Validate that incremental conversions have contents and a text or PDF output format."""
+        if v is None:
+            return v
+        if values.get("targets"):
+            raise ValueError("document_id cannot be combined with targets")
+        if values.get("output_format") == "pdf":
+            # Keys the LaTeX build directory, any input works
+            return v
+        if not values.get("contents"):
+            raise ValueError("document_id requires 'contents'")
+        if values.get("output_format") not in INCREMENTAL_FORMATS:
+            formats = ", ".join(sorted(INCREMENTAL_FORMATS | {"pdf"}))
+            raise ValueError(f"document_id is only supported for these output formats: {formats}")
+        return v
+
+    @validator("pdf_engine")
+    def validate_pdf_engine(cls, v: Optional[str]) -> Optional[str]:
+        """Validate that the PDF engine is known."""
+        if v is not None and v.lower() not in PDF_ENGINES:
+            raise ValueError(f"PDF engine '{v}' not supported. Supported engines: {', '.join(sorted(PDF_ENGINES))}")
+        return v.lower() if v else v
+
+    @validator("stream")
+    def validate_stream(cls, v: bool, values: Dict[str, Any]) -> bool:
+        """Validate that streamed conversions return text to the client."""
+        if not v:
+            return v
+        if values.get("output_file") or values.get("artifact") or values.get("targets") or values.get("document_id"):
+            raise ValueError("stream cannot be combined with output_file, artifact, targets or document_id")
+        if values.get("output_format") not in STREAMING_FORMATS:
+            raise ValueError(
+                f"stream is only supported for these output formats: {', '.join(sorted(STREAMING_FORMATS))}"
+            )
+        return v
+
+
+class BatchConversionRequest(BaseModel):
+    """Request model for converting many documents in one call."""
+    items: List[ConversionRequest] = Field(..., description="The conversions of the batch")
+    concurrency: int = Field(4, ge=1, le=64, description="Maximum number of items converted at the same time")
+
 
 class ConversionEvent(BaseModel):
     """Base model for SSE events."""
@@ -69,6 +179,48 @@ class ConversionComplete(ConversionEvent):
     data: Dict[str, Any]
 
 
+class ConversionChunk(ConversionEvent):
+    """Model for a piece of the output of a streamed conversion."""
+    event: str = "chunk"
+    data: Dict[str, Any]
+
+
+class ConversionTargetProgress(ConversionEvent):
+    """Model for progress updates of one target of a multi-target conversion."""
+    event: str = "target_progress"
+    data: Dict[str, Any]
+
+
+class ConversionTargetComplete(ConversionEvent):
+    """Model for the completion of one target of a multi-target conversion."""
+    event: str = "target_complete"
+    data: Dict[str, Any]
+
+
+class ConversionTargetError(ConversionEvent):
+    """Model for the failure of one target of a multi-target conversion."""
+    event: str = "target_error"
+    data: Dict[str, Any]
+
+
+class BatchItemComplete(ConversionEvent):
+    """Model for a finished item of a batch conversion."""
+    event: str = "item_complete"
+    data: Dict[str, Any]
+
+
+class BatchItemError(ConversionEvent):
+    """Model for a failed item of a batch conversion."""
+    event: str = "item_error"
+    data: Dict[str, Any]
+
+
+class BatchSummary(ConversionEvent):
+    """Model for the summary that closes a batch conversion stream."""
+    event: str = "summary"
+    data: Dict[str, Any]
+
+
 class ConversionHeartbeat(ConversionEvent):
     """Model for heartbeat events to keep the connection alive."""
     event: str = "heartbeat"
@@ -92,6 +244,22 @@ class MCPTool(BaseModel):
     description: str
     parameters: List[MCPToolParameter]
 
+    def input_schema(self) -> Dict[str, Any]:
+        """Return the parameters as JSON Schema, the ``inputSchema`` of MCP's tools/list."""
+        properties: Dict[str, Any] = {}
+        for parameter in self.parameters:
+            schema: Dict[str, Any] = {"type": parameter.type, "description": parameter.description}
+            if parameter.default is not None:
+                schema["default"] = parameter.default
+            if parameter.enum:
+                schema["enum"] = parameter.enum
+            properties[parameter.name] = schema
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": [parameter.name for parameter in self.parameters if parameter.required],
+        }
+
 
 class MCPToolInvocation(BaseModel):
     """Model for an MCP tool invocation."""
@@ -104,6 +272,7 @@ class MCPErrorDetail(BaseModel):
     message: str
     code: Optional[str] = None
     stack: Optional[str] = None
+    retry_after: Optional[int] = None
 
 
 class MCPStatus(str, Enum):
@@ -0,0 +1,333 @@
+"""
+Cost-aware scheduling of conversion jobs onto separate worker lanes.
+
+A PDF build can hold a worker thread for tens of seconds while a small
+markdown to HTML conversion takes milliseconds. Jobs are therefore routed
+by estimated cost to lanes that share one worker budget by weight, each
+with its own concurrency limit, so heavy jobs never hold every worker and
+workers a lane leaves idle are lent to the others.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import fields, replace
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from mcp_pandoc.engine import BINARY_OUTPUT_FORMATS, base_format, normalize_format
+from mcp_pandoc.limits import ResourceLimits
+from mcp_pandoc.pandoc_server import TEXT_FORMATS
+
+logger = logging.getLogger("pandoc-scheduler")
+
+# Fast text to text conversions
+LANE_TEXT = "text"
+# Zip packaged binary formats (docx, epub, ...) and very large text inputs
+LANE_PACKAGE = "package"
+# PDF typesetting through a LaTeX engine
+LANE_TYPESET = "typeset"
+
+LANES = (LANE_TEXT, LANE_PACKAGE, LANE_TYPESET)
+
+# Rough fixed cost per job and cost per KiB of input in milliseconds, per lane
+LANE_COSTS = {
+    LANE_TEXT: (15.0, 0.5),
+    LANE_PACKAGE: (80.0, 1.0),
+    LANE_TYPESET: (3000.0, 20.0),
+}
+
+# Shares of the worker budget per lane while all lanes have jobs waiting
+LANE_WEIGHTS = {
+    LANE_TEXT: 4.0,
+    LANE_PACKAGE: 2.0,
+    LANE_TYPESET: 1.0,
+}
+
+# Fixed cost of a text conversion on a warm pandoc server instead of a fresh process
+SERVER_TEXT_COST = 2.0
+
+# Text jobs estimated above this cost run in the package lane so they do not block small ones
+HEAVY_TEXT_COST = 500.0
+
+# Resource limits of a single job per lane. The address space is not limited by default:
+# LaTeX engines map large font and format files and the GHC runtime reserves address space up front.
+DEFAULT_LANE_LIMITS = {
+    LANE_TEXT: ResourceLimits(wall_time=120, cpu_time=120, heap_mb=2048, output_mb=256, input_mb=64),
+    LANE_PACKAGE: ResourceLimits(wall_time=300, cpu_time=300, heap_mb=4096, output_mb=512, input_mb=256),
+    LANE_TYPESET: ResourceLimits(wall_time=600, cpu_time=600, heap_mb=2048, output_mb=512, input_mb=64),
+}
+
+
+def estimate_cost(output_format: str, input_size: int, use_server: bool = False) -> float:
+    """
+    Estimate the runtime of a conversion in milliseconds.
+
+    Args:
+        output_format: The requested output format.
+        input_size: Size of the input in bytes.
+        use_server: Whether text conversions run on the warm pandoc server pool.
+
+    Returns:
+        The estimated cost; only meaningful relative to other estimates.
+    """
+    fmt = base_format(normalize_format(output_format))
+    if fmt == "pdf":
+        lane = LANE_TYPESET
+    elif fmt in BINARY_OUTPUT_FORMATS:
+        lane = LANE_PACKAGE
+    else:
+        lane = LANE_TEXT
+    fixed, per_kib = LANE_COSTS[lane]
+    if lane == LANE_TEXT and use_server and fmt in TEXT_FORMATS:
+        fixed = SERVER_TEXT_COST
+    return fixed + per_kib * input_size / 1024
+
+
+def classify(output_format: str, input_size: int, use_server: bool = False) -> str:
+    """
+    Return the lane a conversion should run in.
+
+    Args:
+        output_format: The requested output format.
+        input_size: Size of the input in bytes.
+        use_server: Whether text conversions run on the warm pandoc server pool.
+    """
+    fmt = base_format(normalize_format(output_format))
+    if fmt == "pdf":
+        return LANE_TYPESET
+    if fmt in BINARY_OUTPUT_FORMATS:
+        return LANE_PACKAGE
+    if estimate_cost(fmt, input_size, use_server) > HEAVY_TEXT_COST:
+        return LANE_PACKAGE
+    return LANE_TEXT
+
+
+def default_lane_workers(max_workers: int) -> Dict[str, int]:
+    """
+    Return the per-lane concurrency limits within a worker budget.
+
+    The limits cap how much of the shared budget a lane may borrow: light
+    jobs may use all of it, packaging and typesetting smaller parts because
+    each of their jobs occupies a core for much longer.
+    """
+    return {
+        LANE_TEXT: max(1, max_workers),
+        LANE_PACKAGE: max(1, max_workers // 2),
+        LANE_TYPESET: max(1, max_workers // 4),
+    }
+
+
+def lane_workers_from_env(max_workers: int) -> Dict[str, int]:
+    """Return the per-lane limits, overridable through MAX_WORKERS_<LANE> environment variables."""
+    workers = default_lane_workers(max_workers)
+    for lane in LANES:
+        value = os.environ.get(f"MAX_WORKERS_{lane.upper()}")
+        if value:
+            workers[lane] = max(1, int(value))
+    return workers
+
+
+def lane_limits_from_env() -> Dict[str, ResourceLimits]:
+    """
+    Return the per-lane resource limits, overridable through <LIMIT>_<LANE> environment variables.
+
+    For example CPU_TIME_TYPESET=900 or HEAP_MB_TEXT=1024; a value of 0
+    disables the limit.
+    """
+    limits = dict(DEFAULT_LANE_LIMITS)
+    for lane in LANES:
+        for limit in fields(ResourceLimits):
+            value = os.environ.get(f"{limit.name.upper()}_{lane.upper()}")
+            if value:
+                number = float(value) if limit.name == "wall_time" else int(value)
+                limits[lane] = replace(limits[lane], **{limit.name: number or None})
+    return limits
+
+
+class LaneScheduler:
+    """
+    Weighted fair admission of the jobs of all lanes to one worker budget.
+
+    At most ``max_workers`` jobs run at a time across the lanes, and at
+    most ``lane_workers[lane]`` within a lane. Whenever a worker is free,
+    the waiting lane with the fewest running jobs per unit of weight goes
+    next: under contention the lanes share the budget in proportion to
+    their weights, and workers a lane leaves idle are lent to the others.
+    While the budget has more than one worker, the heavy lanes together
+    keep one free for the text lane, so PDF builds never hold all of them.
+
+    Admitted jobs run on a thread pool per lane; coroutines run through
+    :meth:`run_async` wait on the event loop instead of occupying a
+    thread. All methods except :meth:`run_async` are thread-safe.
+    """
+
+    def __init__(
+        self,
+        lane_workers: Dict[str, int],
+        max_workers: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            lane_workers: Maximum number of concurrent jobs per lane.
+            max_workers: Maximum number of concurrent jobs of all lanes, the
+                largest lane limit if omitted.
+            weights: Share of each lane under contention, LANE_WEIGHTS if omitted.
+        """
+        self.lane_workers = {lane: lane_workers.get(lane, 1) for lane in LANES}
+        self.max_workers = max(1, max_workers or max(self.lane_workers.values()))
+        self.weights = {lane: (weights or LANE_WEIGHTS).get(lane, 1.0) for lane in LANES}
+        self.executors = {
+            lane: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"pandoc-{lane}")
+            for lane, workers in self.lane_workers.items()
+        }
+        self._lock = threading.Lock()
+        # Per lane: (start, handle) of the waiting jobs; start runs the job once it is admitted
+        self._waiting: Dict[str, Deque[Tuple[Callable[[], None], Any]]] = {lane: deque() for lane in LANES}
+        self._running = 0
+        self._counters = {lane: {"queued": 0, "running": 0, "completed": 0} for lane in LANES}
+        logger.info(
+            f"Scheduler budget {self.max_workers}, lanes: "
+            + ", ".join(
+                f"{lane}={workers} (weight {self.weights[lane]:g})" for lane, workers in self.lane_workers.items()
+            )
+        )
+
+    def _admissible(self, lane: str) -> bool:
+        """Return True if a job of the lane may start now; the lock is held."""
+        if self._running >= self.max_workers or self._counters[lane]["running"] >= self.lane_workers[lane]:
+            return False
+        if lane != LANE_TEXT and self.max_workers > 1:
+            heavy = self._running - self._counters[LANE_TEXT]["running"]
+            return heavy < self.max_workers - 1
+        return True
+
+    def _admit(self) -> None:
+        """Start waiting jobs while workers are free, the lane furthest below its share first; the lock is held."""
+        while True:
+            lanes = [lane for lane in LANES if self._waiting[lane] and self._admissible(lane)]
+            if not lanes:
+                return
+            lane = min(lanes, key=lambda candidate: self._counters[candidate]["running"] / self.weights[candidate])
+            start, _ = self._waiting[lane].popleft()
+            self._counters[lane]["queued"] -= 1
+            self._counters[lane]["running"] += 1
+            self._running += 1
+            start()
+
+    def _enqueue(self, lane: str, entry: Tuple[Callable[[], None], Any]) -> None:
+        with self._lock:
+            self._counters[lane]["queued"] += 1
+            self._waiting[lane].append(entry)
+            self._admit()
+
+    def _dequeue(self, lane: str, entry: Tuple[Callable[[], None], Any]) -> bool:
+        """Remove a job that was cancelled while waiting; False if it was admitted already."""
+        with self._lock:
+            if entry not in self._waiting[lane]:
+                return False
+            self._waiting[lane].remove(entry)
+            self._counters[lane]["queued"] -= 1
+            return True
+
+    def _release(self, lane: str, completed: bool = True) -> None:
+        """Give the worker of a finished job back and admit the next waiting jobs."""
+        with self._lock:
+            self._counters[lane]["running"] -= 1
+            if completed:
+                self._counters[lane]["completed"] += 1
+            self._running -= 1
+            self._admit()
+
+    def submit(self, lane: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Run a function in a lane.
+
+        Args:
+            lane: One of LANES.
+            fn: The function to run on a worker thread of the lane.
+            args: Positional arguments for fn.
+
+        Returns:
+            A concurrent future resolving to the function's result.
+        """
+        future: Future = Future()
+
+        def run() -> None:
+            # Cancelled between admission and the start of the thread
+            if not future.set_running_or_notify_cancel():
+                self._release(lane, completed=False)
+                return
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                self._release(lane)
+                future.set_exception(e)
+            else:
+                self._release(lane)
+                future.set_result(result)
+
+        entry = (lambda: self.executors[lane].submit(run), future)
+
+        def dequeue_cancelled(done: Future) -> None:
+            # Cancelled before it was admitted, run never starts
+            if done.cancelled():
+                self._dequeue(lane, entry)
+
+        future.add_done_callback(dequeue_cancelled)
+        self._enqueue(lane, entry)
+        return future
+
+    async def run_async(self, lane: str, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Run a coroutine function in a lane on the event loop.
+
+        Args:
+            lane: One of LANES.
+            fn: The coroutine function to run once the lane has capacity.
+            args: Positional arguments for fn.
+
+        Returns:
+            The coroutine's result.
+        """
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def start() -> None:
+            # Jobs of other lanes may finish on worker threads
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        entry = (start, admitted)
+        self._enqueue(lane, entry)
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if not self._dequeue(lane, entry):
+                self._release(lane, completed=False)
+            raise
+        try:
+            return await fn(*args)
+        finally:
+            self._release(lane)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return concurrency limit, weight and queued, running and completed jobs per lane."""
+        with self._lock:
+            return {
+                lane: {"max_workers": self.lane_workers[lane], "weight": self.weights[lane], **self._counters[lane]}
+                for lane in LANES
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancel the jobs still waiting and shut down the thread pools of all lanes."""
+        with self._lock:
+            waiting = [handle for lane in LANES for _, handle in self._waiting[lane]]
+        for handle in waiting:
+            handle.cancel()
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
@@ -6,6 +6,7 @@ streaming capability for document conversion using Pandoc.
 """
 
 import asyncio
+import contextlib
 import json
 import os
 import tempfile
@@ -13,20 +14,31 @@ import time
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import pypandoc
 import uvicorn
 from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from mcp_pandoc.pdf import PDF_ENGINES
+from mcp_pandoc.streams import InputStream
 from pydantic import BaseModel, Field, validator
 from sse_starlette.sse import EventSourceResponse
 
-from .models import (ConversionComplete, ConversionError, ConversionProgress,
-                    ConversionRequest, ConversionHeartbeat, MCPEvent, MCPErrorDetail,
+from .models import (BatchConversionRequest, BatchItemComplete, BatchItemError,
+                    BatchSummary, ConversionChunk, ConversionComplete, ConversionError, ConversionProgress,
+                    ConversionRequest, ConversionTarget,
+                    ConversionTargetComplete, ConversionTargetError,
+                    ConversionTargetProgress, MCPEvent, MCPErrorDetail,
                     MCPStatus, MCPTool, MCPToolParameter, MCPToolInvocation,
                     MCPToolsDiscovery)
-from .worker import ConversionTask, worker_pool
+from .connections import HEARTBEAT_COMMENT, connection_manager
+from .events import (EVENT_CHUNK, EVENT_COMPLETE, EVENT_ERROR, EVENT_PROGRESS, EVENT_TARGET, SubscriptionOverflow,
+                     TaskEvent, event_bus)
+from .jobs import JOB_CANCELLED, JOB_COMPLETE, JOB_ERROR, Job, job_store
+from .sessions import PROTOCOL_VERSIONS, SESSION_HEADER, MCPSession, session_store
+from .uploads import UploadError, request_body
+from .worker import AdmissionError, ConversionTask, JobCancelledError, limit_breach, worker_pool
 
 app = FastAPI(
     title="Fast MCP Pandoc",
@@ -34,12 +46,78 @@ app = FastAPI(
     version="0.1.0",
 )
 
-# Dictionary to store active SSE connections and their progress updates
+# Offene SSE-Verbindungen: Task-ID -> Subscription auf dem Event-Bus
 active_connections = {}
 
+# Sekunden ohne Event, nach denen /convert/stream die Konvertierung abbricht
+STREAM_IDLE_TIMEOUT = 300.0
+
 # Alle Modellklassen wurden in models.py verschoben und werden von dort importiert
 
 
+def admission_error_response(error: AdmissionError) -> JSONResponse:
+    """Build the 429/503 response for a task the worker pool did not admit."""
+    return JSONResponse(
+        status_code=error.status_code,
+        headers={"Retry-After": str(error.retry_after)},
+        content={"status": "error", "message": str(error), "retry_after": error.retry_after},
+    )
+
+
+def conversion_event(event: TaskEvent, task: ConversionTask) -> Dict[str, Any]:
+    """Format a task event as /convert/stream and job event."""
+    request = task.request
+    if event.kind == EVENT_COMPLETE:
+        # Gestreamte Ergebnisse kamen bereits als Chunks
+        data = {"message": "Conversion complete", "result": event.message, **task.info}
+        if request.stream:
+            del data["result"]
+        return ConversionComplete(data=data).dict()
+    if event.kind == EVENT_ERROR:
+        return ConversionError(
+            data={"message": f"Error during conversion: {event.message}", "error": event.message}
+        ).dict()
+    if event.kind == EVENT_TARGET:
+        base_data = {"index": event.index, "output_format": request.targets[event.index].output_format}
+        if event.percentage == 100:
+            return ConversionTargetComplete(data={**base_data, "result": event.message}).dict()
+        if event.percentage == -1:
+            return ConversionTargetError(data={**base_data, "error": event.message}).dict()
+        return ConversionTargetProgress(
+            data={**base_data, "percentage": event.percentage, "message": event.message}
+        ).dict()
+    if event.kind == EVENT_CHUNK:
+        return ConversionChunk(data={"index": event.index, "text": event.message}).dict()
+    # Fortschritts-Update, mit geschätzter Restdauer sobald bekannt
+    data = {"percentage": event.percentage, "message": event.message}
+    if event.eta is not None:
+        data["eta"] = round(event.eta, 1)
+    return ConversionProgress(data=data).dict()
+
+
+def parse_targets(targets: Optional[str]) -> Optional[List[ConversionTarget]]:
+    """Parse the JSON list of output targets passed as query parameter."""
+    if not targets:
+        return None
+    try:
+        return [ConversionTarget(**target) for target in json.loads(targets)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid targets: {e}")
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    """Locate pandoc and read its format tables once before serving requests."""
+    _ = worker_pool.engine
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    """Stop background pandoc processes and end open streams."""
+    connection_manager.close_all()
+    worker_pool.engine.close()
+
+
 @app.get("/health")
 async def health_check() -> Dict[str, str]:
     """Health check endpoint."""
@@ -53,163 +131,126 @@ async def convert_contents(request: ConversionRequest) -> JSONResponse:
     
     This endpoint provides backward compatibility with the original MCP-Pandoc API.
     For streaming conversion progress, use the /convert/stream endpoint.
+    Requests with ``targets`` return one result entry per target.
     """
+    if request.stream:
+        return JSONResponse(
+            status_code=422,
+            content={"status": "error", "message": "stream requires /convert/stream or the /sse endpoint"},
+        )
     try:
         # Erstelle eine einzigartige Task-ID
         task_id = str(uuid.uuid4())
         
-        # Führe die Konvertierung synchron durch
-        result_future = asyncio.Future()
-        
-        # Definiere den Callback für Fortschrittsupdates
-        def progress_callback(task_id: str, percentage: int, message: str):
-            if percentage == 100:
-                # Bei 100% setzen wir das Ergebnis der Future
-                if not result_future.done():
-                    result_future.set_result(message)
-            elif percentage == -1:
-                # Bei Fehler (-1) setzen wir die Exception
-                if not result_future.done():
-                    result_future.set_exception(ValueError(message))
-        
-        # Erstelle und starte die Konvertierungsaufgabe
+        # Erstelle und starte die Konvertierungsaufgabe; das Ergebnis liefert die Future des Worker-Pools
         task = ConversionTask(
             request=request,
             task_id=task_id,
-            progress_callback=progress_callback
+            progress_callback=lambda task_id, percentage, message: None
         )
         
-        await worker_pool.submit_task(task)
+        future = await worker_pool.submit_task(task)
         
         # Warte auf das Ergebnis der Konvertierung
-        result = await result_future
+        result = await future
         
-        return JSONResponse(content={"status": "success", "result": result})
+        # Details der Verarbeitung (wiederverwendete Blöcke, verwendete PDF-Engine) mitliefern
+        return JSONResponse(content={"status": "success", "result": result, **task.info})
+    except AdmissionError as e:
+        # Überlast: schnell ablehnen, der Client soll später erneut versuchen
+        return admission_error_response(e)
+    except JobCancelledError as e:
+        # Über DELETE /jobs/{job_id} abgebrochen
+        return JSONResponse(status_code=e.status_code, content={"status": "error", "message": str(e)})
     except Exception as e:
+        # Ressourcenlimit überschritten: zu große Eingabe (413) oder zu teures Dokument (422)
+        breach = limit_breach(e)
+        if breach is not None:
+            return JSONResponse(
+                status_code=413 if breach.limit == "input_mb" else 422,
+                content={"status": "error", "message": str(breach), "limit": breach.limit},
+            )
         return JSONResponse(
             status_code=500,
             content={"status": "error", "message": str(e)},
         )
 
 
-@app.get("/convert/stream")
-async def stream_conversion(
-    request: Request,
-    contents: Optional[str] = None,
-    input_file: Optional[str] = None,
-    input_format: str = "markdown",
-    output_format: str = "markdown",
-    output_file: Optional[str] = None,
-) -> EventSourceResponse:
-    """
-    Stream the conversion progress using Server-Sent Events.
-    
-    This endpoint provides real-time updates on the conversion process.
-    """
-    # Create a ConversionRequest model from the parameters
-    conversion_request = ConversionRequest(
-        contents=contents,
-        input_file=input_file,
-        input_format=input_format,
-        output_format=output_format,
-        output_file=output_file,
-    )
+def conversion_stream_response(
+    conversion_request: ConversionRequest, body: Optional[InputStream] = None
+) -> Union[EventSourceResponse, JSONResponse]:
+    """Start a conversion and return the SSE response of /convert/stream, converting ``body`` if given."""
+    # Bei voller Warteschlange sofort ablehnen statt einen Stream zu öffnen
+    try:
+        worker_pool.check_admission()
+    except AdmissionError as e:
+        return admission_error_response(e)
     
     # Erstelle eine einzigartige Task-ID
     task_id = str(uuid.uuid4())
     
-    # Erstelle einen Event-Queue für diese Verbindung
-    queue = asyncio.Queue()
-    
-    # Registriere die Verbindung im aktiven Verbindungspool
-    active_connections[task_id] = queue
-    
     async def event_generator():
         """Generate SSE events for the conversion process."""
+        # Abonniere die Events der Aufgabe, bevor sie startet
+        task = event_bus.task(conversion_request, task_id)
+        task.body = body
+        # Nicht gelesene Events zählen zum Speicherbudget der Verbindung
+        subscription = event_bus.subscribe(task_id, max_bytes=connection_manager.memory_budget)
+        # Registriere die Verbindung im aktiven Verbindungspool
+        active_connections[task_id] = subscription
+        # Bleibt False, wenn der Client vor dem Ende die Verbindung trennt
+        finished = False
         try:
-            # Initial progress event
+            # Initial progress event; mit der job_id kann der Client per DELETE /jobs/{job_id} abbrechen
             yield json.dumps(
                 ConversionProgress(
-                    data={"percentage": 0, "message": "Starting conversion..."}
+                    data={"percentage": 0, "message": "Starting conversion...", "job_id": task_id}
                 ).dict()
             )
             
-            # Definiere den Callback für Fortschrittsupdates
-            def progress_callback(task_id: str, percentage: int, message: str):
-                # Füge ein Fortschrittsevent zur Queue hinzu
-                event_data = None
-                
-                if percentage == 100:
-                    # Konvertierung abgeschlossen
-                    event_data = ConversionComplete(
-                        data={
-                            "message": "Conversion complete",
-                            "result": message,
-                        }
-                    ).dict()
-                elif percentage == -1:
-                    # Fehler bei der Konvertierung
-                    event_data = ConversionError(
-                        data={
-                            "message": f"Error during conversion: {message}",
-                            "error": message
-                        }
-                    ).dict()
-                else:
-                    # Fortschritts-Update
-                    event_data = ConversionProgress(
-                        data={"percentage": percentage, "message": message}
-                    ).dict()
-                
-                # Füge das Event zur Queue hinzu, falls vorhanden
-                if event_data and task_id in active_connections:
-                    asyncio.run_coroutine_threadsafe(
-                        active_connections[task_id].put(event_data),
-                        asyncio.get_event_loop()
-                    )
-            
-            # Erstelle und starte die Konvertierungsaufgabe
-            task = ConversionTask(
-                request=conversion_request,
-                task_id=task_id,
-                progress_callback=progress_callback
-            )
-            
             # Starte die Konvertierung asynchron
             await worker_pool.submit_task(task)
             
-            # Warte auf Events vom Worker und sende sie an den Client
-            heartbeat_timer = 0
+            # Warte auf Events vom Worker und sende sie an den Client;
+            # Heartbeats schreibt der Verbindungsmanager für alle Streams gemeinsam
             while True:
-                # Entweder erhalte ein Event aus der Queue oder sende ein Heartbeat alle 15 Sekunden
                 try:
-                    event_data = await asyncio.wait_for(queue.get(), timeout=15.0)
-                    yield json.dumps(event_data)
-                    
-                    # Prüfe, ob es ein CompleteEvent oder ErrorEvent war
-                    if event_data.get("event") in ["complete", "error"]:
-                        # Konvertierung abgeschlossen oder Fehler aufgetreten, beende den Stream
-                        break
+                    event = await subscription.get(timeout=STREAM_IDLE_TIMEOUT)
                 except asyncio.TimeoutError:
-                    # Sende ein Heartbeat-Event nach Timeout
-                    heartbeat_data = ConversionHeartbeat(
-                        data={"timestamp": datetime.now().isoformat()}
-                    ).dict()
-                    yield json.dumps(heartbeat_data)
-                    heartbeat_timer += 15
-                    
-                    # Beende nach 5 Minuten ohne Aktivität
-                    if heartbeat_timer >= 300:
-                        yield json.dumps(
-                            ConversionError(
-                                data={
-                                    "message": "Conversion timed out after 5 minutes of inactivity",
-                                    "error": "timeout"
-                                }
-                            ).dict()
-                        )
-                        break
+                    # Beende nach 5 Minuten ohne Aktivität und stoppe Pandoc
+                    worker_pool.cancel(task_id, "no progress for 5 minutes")
+                    finished = True
+                    yield json.dumps(
+                        ConversionError(
+                            data={
+                                "message": "Conversion timed out after 5 minutes of inactivity",
+                                "error": "timeout"
+                            }
+                        ).dict()
+                    )
+                    break
+                yield json.dumps(conversion_event(event, task))
+                
+                # Prüfe, ob es ein CompleteEvent oder ErrorEvent war
+                if event.final:
+                    # Konvertierung abgeschlossen oder Fehler aufgetreten, beende den Stream
+                    finished = True
+                    break
                     
+        except AdmissionError as e:
+            # Die Warteschlange wurde zwischenzeitlich voll
+            yield json.dumps(
+                ConversionError(
+                    data={
+                        "message": str(e),
+                        "error": "queue_full",
+                        "retry_after": str(e.retry_after)
+                    }
+                ).dict()
+            )
+        except SubscriptionOverflow as e:
+            # Der Client liest zu langsam; die Konvertierung wird im finally abgebrochen
+            yield json.dumps(ConversionError(data={"message": str(e), "error": "slow_consumer"}).dict())
         except Exception as e:
             # Send error event
             yield json.dumps(
@@ -221,17 +262,428 @@ async def stream_conversion(
                 ).dict()
             )
         finally:
+            # Bei Verbindungsabbruch läuft die Konvertierung für niemanden weiter
+            if not finished:
+                worker_pool.cancel(task_id, "client disconnected")
             # Bereinige die Verbindung nach Abschluss
-            if task_id in active_connections:
-                del active_connections[task_id]
+            subscription.close()
+            active_connections.pop(task_id, None)
+    
+    # Bei zu vielen offenen Streams ablehnen
+    try:
+        return connection_manager.response(event_generator(), kind="convert", body=body)
+    except AdmissionError as e:
+        return admission_error_response(e)
+
+
+@app.get("/convert/stream")
+async def stream_conversion(
+    request: Request,
+    contents: Optional[str] = None,
+    input_file: Optional[str] = None,
+    input_format: str = "markdown",
+    output_format: str = "markdown",
+    output_file: Optional[str] = None,
+    artifact: bool = False,
+    targets: Optional[str] = None,
+    document_id: Optional[str] = None,
+    pdf_engine: Optional[str] = None,
+    stream: bool = False,
+) -> EventSourceResponse:
+    """
+    Stream the conversion progress using Server-Sent Events.
+    
+    This endpoint provides real-time updates on the conversion process.
+    With ``targets`` (a JSON list of {output_format, output_file}) the input
+    is parsed once and rendered into every target, each reporting its own
+    target_* events before the aggregate complete event. With ``document_id``
+    only the blocks changed since the previous version are converted; PDF
+    builds reuse the LaTeX state of the previous version. With ``stream``
+    the converted text arrives in ordered chunk events while it is
+    produced, and the complete event only carries its length and checksum.
+    With ``artifact`` the output goes to the artifact store instead of
+    ``output_file``, and the complete event carries its reference.
+    """
+    # Create a ConversionRequest model from the parameters
+    conversion_request = ConversionRequest(
+        contents=contents,
+        input_file=input_file,
+        input_format=input_format,
+        output_format=output_format,
+        output_file=output_file,
+        artifact=artifact,
+        targets=parse_targets(targets),
+        document_id=document_id,
+        pdf_engine=pdf_engine,
+        stream=stream,
+    )
     
-    return EventSourceResponse(event_generator())
+    return conversion_stream_response(conversion_request)
+
+
+@app.post("/convert/stream")
+async def stream_body_conversion(
+    request: Request,
+    input_format: str = "markdown",
+    output_format: str = "markdown",
+    output_file: Optional[str] = None,
+    artifact: bool = False,
+    targets: Optional[str] = None,
+    document_id: Optional[str] = None,
+    pdf_engine: Optional[str] = None,
+    stream: bool = False,
+) -> EventSourceResponse:
+    """
+    Stream the conversion of the document sent as request body using Server-Sent Events.
+    
+    Takes the same query parameters and sends the same events as
+    GET /convert/stream, but the document is the raw request body or the
+    ``file`` field of a multipart form. The body is piped into pandoc while
+    it is received; only input formats pandoc has to seek in (docx, epub,
+    odt, ...) and PDF output are spooled to a temporary file first.
+    """
+    conversion_request = ConversionRequest(
+        input_format=input_format,
+        output_format=output_format,
+        output_file=output_file,
+        artifact=artifact,
+        targets=parse_targets(targets),
+        document_id=document_id,
+        pdf_engine=pdf_engine,
+        stream=stream,
+    )
+    try:
+        body = request_body(request)
+    except UploadError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    
+    return conversion_stream_response(conversion_request, body)
+
+
+async def batch_event_generator(batch: BatchConversionRequest):
+    """Generate one event per finished batch item and a closing summary."""
+    batch_id = str(uuid.uuid4())
+    start_time = time.time()
+    items = []
+    
+    # aclosing bricht die restlichen Elemente ab, wenn der Client die Verbindung trennt
+    async with contextlib.aclosing(worker_pool.run_batch(batch.items, batch.concurrency, batch_id)) as results:
+        async for item in results:
+            items.append({"index": item.index, "status": item.status, "runtime": item.runtime})
+            if item.status == "complete":
+                event = BatchItemComplete(data={"index": item.index, "result": item.result, "runtime": item.runtime})
+            else:
+                event = BatchItemError(data={"index": item.index, "error": item.error, "runtime": item.runtime})
+            yield json.dumps(event.dict())
+    
+    succeeded = sum(1 for item in items if item["status"] == "complete")
+    yield json.dumps(
+        BatchSummary(
+            data={
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded,
+                "runtime": time.time() - start_time,
+                "items": sorted(items, key=lambda item: item["index"]),
+            }
+        ).dict()
+    )
+
+
+@app.post("/convert/batch")
+async def convert_batch(request: Request, batch: BatchConversionRequest):
+    """
+    Convert a batch of documents with a single request.
+    
+    Items are scheduled on the worker pool with at most ``concurrency`` items
+    in flight. Each result is streamed as soon as the item finishes (in
+    completion order, with its index); failed items do not abort the batch.
+    A final summary event lists the runtime of every item. The stream is
+    NDJSON unless the client accepts ``text/event-stream``.
+    """
+    if "text/event-stream" in request.headers.get("accept", ""):
+        try:
+            return connection_manager.response(batch_event_generator(batch), kind="batch")
+        except AdmissionError as e:
+            return admission_error_response(e)
+    
+    async def ndjson_lines():
+        async for event in batch_event_generator(batch):
+            yield event + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
 
 
 # Konvertierungsfunktion wurde in den worker.py-Modul verschoben
 # und wird jetzt durch den Worker-Pool verarbeitet
 
 
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    """Runtime counters of the conversion engine."""
+    engine = worker_pool.engine
+    return {
+        "pandoc_version": engine.version,
+        "queue": worker_pool.stats(),
+        "cache": engine.cache.stats() if engine.cache is not None else None,
+        "pdf": engine.pdf.stats() if engine.pdf is not None else None,
+        "incremental": worker_pool.incremental.stats(),
+        "jobs": job_store.stats(),
+        "events": event_bus.stats(),
+        "connections": connection_manager.stats(),
+        "artifacts": worker_pool.artifact_store.stats(),
+        "sessions": session_store.stats(),
+    }
+
+
+async def start_job(job: Job) -> None:
+    """
+    Submit the conversion of a job, recording its events in the job's log.
+    
+    Raises:
+        AdmissionError: If the worker pool does not admit the conversion.
+        ResourceLimitError: If the input exceeds the input size limit.
+    """
+    task = event_bus.task(job.request, job.job_id)
+    
+    def record(event: TaskEvent) -> None:
+        # Ergebnis und Fehler kommen aus der Future (finish_job), nicht aus dem Event
+        if not event.final:
+            job.publish(conversion_event(event, task))
+    
+    subscription = event_bus.subscribe(job.job_id, callback=record)
+    try:
+        future = await worker_pool.submit_task(task)
+    except BaseException:
+        subscription.close()
+        raise
+    
+    def done(future: asyncio.Future) -> None:
+        # Alle Events der Aufgabe sind vor dem Abschluss der Future zugestellt
+        subscription.close()
+        finish_job(job, task, future)
+    
+    future.add_done_callback(done)
+
+
+def finish_job(job: Job, task: ConversionTask, future: asyncio.Future) -> None:
+    """Store the outcome of a job's conversion and publish its final event."""
+    if future.cancelled() or isinstance(future.exception(), JobCancelledError):
+        message = str(future.exception()) if not future.cancelled() else "Conversion cancelled"
+        event = ConversionError(data={"message": message, "error": "cancelled"}).dict()
+        job_store.finish(job, JOB_CANCELLED, event, error=message)
+    elif future.exception() is not None:
+        error = future.exception()
+        data = {"message": f"Error during conversion: {error}", "error": str(error)}
+        breach = limit_breach(error)
+        if breach is not None:
+            data["limit"] = breach.limit
+        job_store.finish(job, JOB_ERROR, ConversionError(data=data).dict(), error=str(error))
+    else:
+        job.info = task.info
+        # Das Ergebnis wird erst beim Senden angehängt und liegt nur einmal im Speicher (oder auf Platte)
+        event = ConversionComplete(data={"message": "Conversion complete", "job_id": job.job_id, **task.info}).dict()
+        job_store.finish(job, JOB_COMPLETE, event, result=future.result())
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, conversion_request: ConversionRequest) -> JSONResponse:
+    """
+    Start a conversion that outlives the connection.
+    
+    Returns the job ID at once. The status and result are available from
+    ``GET /jobs/{job_id}`` and the events from ``GET /jobs/{job_id}/events``
+    until the result expires. A retried submission with the same
+    ``Idempotency-Key`` header returns the existing job instead of
+    converting again.
+    """
+    if conversion_request.stream:
+        return JSONResponse(
+            status_code=422,
+            content={"status": "error", "message": "stream is not supported for jobs, use /convert/stream"},
+        )
+    try:
+        worker_pool.check_admission()
+    except AdmissionError as e:
+        return admission_error_response(e)
+    
+    job, created = job_store.create(conversion_request, request.headers.get("idempotency-key"))
+    if created:
+        try:
+            await start_job(job)
+        except AdmissionError as e:
+            job_store.abandon(job)
+            return admission_error_response(e)
+        except Exception as e:
+            job_store.abandon(job)
+            breach = limit_breach(e)
+            return JSONResponse(
+                status_code=413 if breach is not None and breach.limit == "input_mb" else 500,
+                content={"status": "error", "message": str(e)},
+            )
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": f"/jobs/{job.job_id}"},
+        content={
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.job_id}",
+            "events_url": f"/jobs/{job.job_id}/events",
+        },
+    )
+
+
+def job_not_found(job_id: str) -> JSONResponse:
+    """Build the 404 response for an unknown or expired job."""
+    return JSONResponse(
+        status_code=404,
+        content={"status": "error", "message": f"No job with ID {job_id}"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> JSONResponse:
+    """Return the status of a job, with its result once it has completed."""
+    job = job_store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    content = {
+        "job_id": job.job_id,
+        "status": job.status,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "last_event_id": job.last_event_id,
+    }
+    # Letzter Fortschritt für Clients, die nur pollen
+    progress = next((event["data"] for _, event in reversed(job.events) if event["event"] == "progress"), None)
+    if progress is not None:
+        content["progress"] = progress
+    if job.status == JOB_COMPLETE:
+        # Ausgelagerte Ergebnisse werden im Thread von der Platte gelesen
+        content["result"] = await asyncio.to_thread(job_store.result, job) if job.spill_path else job.result
+        content.update(job.info)
+    elif job.error is not None:
+        content["error"] = job.error
+    return JSONResponse(content=content)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    request: Request,
+    job_id: str,
+    last_event_id: Optional[int] = Query(None, description="Resume after this event; the Last-Event-ID header wins"),
+) -> EventSourceResponse:
+    """
+    Stream the events of a job using Server-Sent Events.
+    
+    Every event carries its sequence number as SSE ``id``. A reconnecting
+    client sends the last one it received as ``Last-Event-ID`` header (or
+    ``last_event_id`` parameter) and gets the newer events replayed from
+    the job's log; the stream ends after the final complete or error
+    event. Disconnecting does not cancel the job. Only the newest events
+    are kept per job, so a client that was away for long may miss old
+    progress events, never the final one.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    header = request.headers.get("last-event-id")
+    try:
+        resume_after = int(header) if header else (last_event_id or 0)
+    except ValueError:
+        resume_after = 0
+    
+    async def event_generator():
+        sent = resume_after
+        while True:
+            for seq, event in job.events_after(sent):
+                if event["event"] == "complete":
+                    result = await asyncio.to_thread(job_store.result, job) if job.spill_path else job.result
+                    event = {**event, "data": {**event["data"], "result": result}}
+                yield {"id": str(seq), "data": json.dumps(event)}
+                sent = seq
+            if job.finished and sent >= job.last_event_id:
+                break
+            # Heartbeats ohne ID schreibt der Verbindungsmanager, Last-Event-ID bleibt beim letzten echten Event
+            await job.wait(sent, None)
+    
+    try:
+        return connection_manager.response(event_generator(), kind="job")
+    except AdmissionError as e:
+        return admission_error_response(e)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> JSONResponse:
+    """
+    Cancel a queued or running conversion.
+    
+    The pandoc and LaTeX processes of the job are killed and its worker is
+    freed at once; a client still listening receives an error event.
+    The job ID is the ``job_id`` of the first /convert/stream event, the
+    event ``id`` of /sse or the ID returned by POST /jobs. For a finished
+    job of POST /jobs the stored result is deleted instead.
+    """
+    if worker_pool.cancel(job_id):
+        return JSONResponse(content={"status": "cancelled", "job_id": job_id})
+    if job_store.discard(job_id):
+        return JSONResponse(content={"status": "deleted", "job_id": job_id})
+    return JSONResponse(
+        status_code=404,
+        content={"status": "error", "message": f"No running job with ID {job_id}"},
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Return True if an If-None-Match header matches an entity tag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+@app.api_route("/artifacts/{artifact_id}", methods=["GET", "HEAD"])
+async def get_artifact(request: Request, artifact_id: str) -> Response:
+    """
+    Download a conversion output stored as artifact.
+    
+    The file is streamed in chunks, or handed to the server for a zero-copy
+    send where it supports the ASGI pathsend extension. Range requests are
+    answered with 206 and the requested ranges, a matching If-None-Match
+    with 304. Artifacts never change, so clients may cache them until they
+    expire.
+    """
+    artifact = worker_pool.artifact_store.get(artifact_id)
+    if artifact is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Artifact {artifact_id} not found or expired"},
+        )
+    headers = {
+        "ETag": artifact.etag,
+        "Cache-Control": f"private, max-age={max(0, int(artifact.expires_at - time.time()))}, immutable",
+    }
+    if etag_matches(request.headers.get("if-none-match"), artifact.etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(artifact.path, media_type=artifact.media_type, filename=artifact.filename, headers=headers)
+
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """
+    Readiness probe for load balancers.
+    
+    Returns 503 while the conversion queue is full so traffic can be shed
+    before requests are rejected.
+    """
+    queue = worker_pool.stats()
+    is_ready = queue["queued"] < queue["max_queue_depth"]
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "queued": queue["queued"], "running": queue["running"]},
+    )
+
+
 @app.get("/heartbeat")
 async def heartbeat() -> Dict[str, bool]:
     """Heartbeat endpoint for SSE reconnection."""
@@ -245,7 +697,14 @@ async def mcp_sse_endpoint(
     contents: Optional[str] = None,
     input_format: Optional[str] = None,
     output_format: Optional[str] = None,
-    output_file: Optional[str] = None
+    output_file: Optional[str] = None,
+    artifact: bool = False,
+    targets: Optional[str] = None,
+    document_id: Optional[str] = None,
+    pdf_engine: Optional[str] = None,
+    stream: bool = False,
+    items: Optional[str] = None,
+    concurrency: Optional[int] = None
 ) -> EventSourceResponse:
     """
     MCP Protocol SSE endpoint for tool discovery and tool invocation.
@@ -257,6 +716,12 @@ async def mcp_sse_endpoint(
     if not tool:
         return EventSourceResponse(mcp_tool_discovery_generator())
     
+    # Bei voller Warteschlange sofort ein Fehler-Event senden
+    try:
+        worker_pool.check_admission()
+    except AdmissionError as e:
+        return EventSourceResponse(mcp_error_generator(str(e), tool=tool, code="queue_full", retry_after=e.retry_after))
+    
     # Wenn das Tool "convert-contents" ist, rufen wir die Konvertierung auf
     if tool == "convert-contents":
         # Erstellen einer Conversion-Request aus den Parametern
@@ -265,21 +730,90 @@ async def mcp_sse_endpoint(
             input_file=None,  # Im MCP-Protokoll unterstützen wir zunächst nur Inhalte direkt
             input_format=input_format or "markdown",
             output_format=output_format or "html",
-            output_file=output_file
+            output_file=output_file,
+            artifact=artifact,
+            targets=parse_targets(targets),
+            document_id=document_id,
+            pdf_engine=pdf_engine,
+            stream=stream
         )
         
-        return EventSourceResponse(mcp_convert_generator(request, conversion_request))
+        generator = mcp_convert_generator(request, conversion_request)
+    elif tool == "convert-batch":
+        generator = mcp_batch_generator(items, concurrency)
     else:
         # Unbekanntes Tool
         return EventSourceResponse(mcp_error_generator(f"Unknown tool: {tool}"))
+    
+    # Heartbeats als SSE-Kommentar, damit MCP-Clients nur MCP-Events sehen
+    try:
+        return connection_manager.response(generator, kind="mcp", heartbeat=HEARTBEAT_COMMENT)
+    except AdmissionError as e:
+        return EventSourceResponse(
+            mcp_error_generator(str(e), tool=tool, code="connection_limit", retry_after=e.retry_after)
+        )
 
 
-async def mcp_tool_discovery_generator():
+@app.post("/sse")
+async def mcp_sse_body_endpoint(
+    request: Request,
+    tool: Optional[str] = None,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    output_file: Optional[str] = None,
+    artifact: bool = False,
+    targets: Optional[str] = None,
+    document_id: Optional[str] = None,
+    pdf_engine: Optional[str] = None,
+    stream: bool = False,
+) -> EventSourceResponse:
     """
-    Generator für MCP Tool Discovery Events.
+    MCP SSE endpoint invoking convert-contents on the document sent as request body.
     
-    Gibt die verfügbaren Tools im MCP-Format zurück.
+    Parameters are passed as for GET /sse; the document is the raw request
+    body or the ``file`` field of a multipart form and is piped into pandoc
+    while it is received.
     """
+    tool = tool or "convert-contents"
+    if tool != "convert-contents":
+        return EventSourceResponse(mcp_error_generator(f"Tool {tool} does not take a request body", tool=tool))
+    
+    # Bei voller Warteschlange sofort ein Fehler-Event senden
+    try:
+        worker_pool.check_admission()
+    except AdmissionError as e:
+        return EventSourceResponse(mcp_error_generator(str(e), tool=tool, code="queue_full", retry_after=e.retry_after))
+    
+    conversion_request = ConversionRequest(
+        input_format=input_format or "markdown",
+        output_format=output_format or "html",
+        output_file=output_file,
+        artifact=artifact,
+        targets=parse_targets(targets),
+        document_id=document_id,
+        pdf_engine=pdf_engine,
+        stream=stream
+    )
+    try:
+        body = request_body(request)
+    except UploadError as e:
+        return EventSourceResponse(mcp_error_generator(str(e), tool=tool, code="invalid_body"))
+    
+    try:
+        return connection_manager.response(
+            mcp_convert_generator(request, conversion_request, body),
+            kind="mcp",
+            heartbeat=HEARTBEAT_COMMENT,
+            body=body,
+        )
+    except AdmissionError as e:
+        return EventSourceResponse(
+            mcp_error_generator(str(e), tool=tool, code="connection_limit", retry_after=e.retry_after)
+        )
+
+
+def mcp_tools() -> List[MCPTool]:
+    """Describe the tools offered over /sse and /mcp."""
     # Definiere die Parameter für das convert-contents Tool
     convert_tool_params = [
         MCPToolParameter(
@@ -309,6 +843,56 @@ async def mcp_tool_discovery_generator():
             description="Pfad zur Ausgabedatei (erforderlich für pdf, docx, rst, latex, epub)",
             type="string",
             required=False
+        ),
+        MCPToolParameter(
+            name="artifact",
+            description=(
+                "Ausgabe im Artefakt-Speicher ablegen statt in output_file; das Ergebnis enthält "
+                "die Download-URL /artifacts/{id} und die Ressource artifact://{id}"
+            ),
+            type="boolean",
+            required=False,
+            default=False
+        ),
+        MCPToolParameter(
+            name="targets",
+            description=(
+                "JSON-Liste mehrerer Ausgabeziele [{\"output_format\": ..., \"output_file\": ...}]; "
+                "der Inhalt wird nur einmal geparst und ersetzt output_format/output_file"
+            ),
+            type="string",
+            required=False
+        ),
+        MCPToolParameter(
+            name="document_id",
+            description=(
+                "Kennung eines wiederholt konvertierten Dokuments; nur seit der letzten Version "
+                "geänderte Blöcke werden neu konvertiert (markdown, html, rst, latex, txt); "
+                "PDF-Builds übernehmen den LaTeX-Zustand (aux, toc) der letzten Version"
+            ),
+            type="string",
+            required=False
+        ),
+        MCPToolParameter(
+            name="pdf_engine",
+            description=(
+                "PDF-Engine; auto wählt die schnellste installierte Engine, "
+                "die das Dokument korrekt setzt"
+            ),
+            type="string",
+            required=False,
+            default="auto",
+            enum=sorted(PDF_ENGINES)
+        ),
+        MCPToolParameter(
+            name="stream",
+            description=(
+                "Konvertierten Text in geordneten Teilen senden, sobald er entsteht "
+                "(markdown, html, rst, latex, txt); das Abschluss-Event enthält nur Länge und Prüfsumme"
+            ),
+            type="boolean",
+            required=False,
+            default=False
         )
     ]
     
@@ -319,14 +903,59 @@ async def mcp_tool_discovery_generator():
         parameters=convert_tool_params
     )
     
+    # Erstelle das convert-batch Tool
+    batch_tool = MCPTool(
+        name="convert-batch",
+        description=(
+            "Konvertiert viele Dokumente in einem Aufruf; Ergebnisse werden in Abschlussreihenfolge "
+            "mit ihrem Index gestreamt, gefolgt von einer Zusammenfassung mit Laufzeiten"
+        ),
+        parameters=[
+            MCPToolParameter(
+                name="items",
+                description="JSON-Liste von Konvertierungen mit den Parametern von convert-contents",
+                type="string",
+                required=True
+            ),
+            MCPToolParameter(
+                name="concurrency",
+                description="Maximale Anzahl gleichzeitig laufender Konvertierungen",
+                type="integer",
+                required=False,
+                default=4
+            )
+        ]
+    )
+    
+    return [convert_tool, batch_tool]
+
+
+async def mcp_tool_discovery_generator():
+    """
+    Generator für MCP Tool Discovery Events.
+    
+    Gibt die verfügbaren Tools im MCP-Format zurück.
+    """
     # Erstelle die Tool Discovery Response
-    tools_discovery = MCPToolsDiscovery(tools=[convert_tool])
+    tools_discovery = MCPToolsDiscovery(tools=mcp_tools())
     
     # Sende die Tool Discovery als Event
     yield json.dumps({"type": "discovery", "data": tools_discovery.dict()})
 
 
-async def mcp_convert_generator(request: Request, conversion_request: ConversionRequest):
+def mcp_output(event: TaskEvent, task: ConversionTask) -> Any:
+    """Return the output of a completed convert-contents call."""
+    # Gestreamte Ergebnisse melden nur Länge und Prüfsumme, Artefakte ihre Referenz
+    if task.request.stream:
+        return task.info["stream"]
+    if "artifact" in task.info:
+        return {"message": event.message, "artifact": task.info["artifact"]}
+    return event.message
+
+
+async def mcp_convert_generator(
+    request: Request, conversion_request: ConversionRequest, body: Optional[InputStream] = None
+):
     """
     Generator für MCP-konforme Konvertierungs-Events.
     
@@ -336,57 +965,66 @@ async def mcp_convert_generator(request: Request, conversion_request: Conversion
     event_id = str(uuid.uuid4())
     start_time = time.time()
     created_at = datetime.now().isoformat()
+    # Bleibt False, wenn der Client vor dem Ende die Verbindung trennt
+    finished = False
+    # Abonniere die Events der Aufgabe, bevor sie startet
+    task = event_bus.task(conversion_request, event_id)
+    # Im Request-Body gesendetes Dokument (POST /sse)
+    task.body = body
+    subscription = event_bus.subscribe(event_id, max_bytes=connection_manager.memory_budget)
+    active_connections[event_id] = subscription
     
-    try:
-        # Erstelle eine Queue für Fortschrittsupdates
-        queue = asyncio.Queue()
-        
-        # Registriere die Verbindung
-        active_connections[event_id] = queue
-        
-        # Definiere den Callback für Fortschrittsupdates
-        def progress_callback(task_id: str, percentage: int, message: str):
-            # MCP-Event erstellen
-            if percentage == 100:
-                # Conversion complete
-                event_data = MCPEvent(
-                    id=event_id,
-                    status=MCPStatus.COMPLETE,
-                    tool="convert-contents",
-                    created_at=created_at,
-                    output=message,
-                    runtime=time.time() - start_time
-                ).dict()
-                
-            elif percentage == -1:
-                # Conversion error
-                error_detail = MCPErrorDetail(message=message)
-                event_data = MCPEvent(
-                    id=event_id,
-                    status=MCPStatus.ERROR,
-                    tool="convert-contents",
-                    created_at=created_at,
-                    error=error_detail,
-                    runtime=time.time() - start_time
-                ).dict()
-                
+    def mcp_event(event: TaskEvent) -> Dict[str, Any]:
+        """Format a task event as MCP event."""
+        if event.kind == EVENT_COMPLETE:
+            # Conversion complete
+            return MCPEvent(
+                id=event_id,
+                status=MCPStatus.COMPLETE,
+                tool="convert-contents",
+                created_at=created_at,
+                output=mcp_output(event, task),
+                runtime=time.time() - start_time
+            ).dict()
+        if event.kind == EVENT_ERROR:
+            return MCPEvent(
+                id=event_id,
+                status=MCPStatus.ERROR,
+                tool="convert-contents",
+                created_at=created_at,
+                error=MCPErrorDetail(message=event.message),
+                runtime=time.time() - start_time
+            ).dict()
+        if event.kind == EVENT_TARGET:
+            # Update eines einzelnen Ziels (Multi-Target)
+            target = conversion_request.targets[event.index]
+            output = {"target": event.index, "output_format": target.output_format}
+            if event.percentage == 100:
+                output.update(status="complete", result=event.message)
+            elif event.percentage == -1:
+                output.update(status="error", error=event.message)
             else:
-                # Progress update
-                event_data = MCPEvent(
-                    id=event_id,
-                    status=MCPStatus.RUNNING if percentage > 0 else MCPStatus.CREATED,
-                    tool="convert-contents",
-                    created_at=created_at,
-                    output={"percentage": percentage, "message": message}
-                ).dict()
-            
-            # Event zur Queue hinzufügen
-            if event_data and event_id in active_connections:
-                asyncio.run_coroutine_threadsafe(
-                    active_connections[event_id].put(event_data),
-                    asyncio.get_event_loop()
-                )
-        
+                output.update(status="running", percentage=event.percentage, message=event.message)
+            status = MCPStatus.RUNNING
+        elif event.kind == EVENT_CHUNK:
+            # Teil der Ausgabe (stream=true)
+            output = {"chunk": event.index, "text": event.message}
+            status = MCPStatus.RUNNING
+        else:
+            # Progress update, mit geschätzter Restdauer sobald bekannt
+            output = {"percentage": event.percentage, "message": event.message}
+            if event.eta is not None:
+                output["eta"] = round(event.eta, 1)
+            status = MCPStatus.RUNNING if event.percentage > 0 else MCPStatus.CREATED
+        return MCPEvent(
+            id=event_id,
+            status=status,
+            tool="convert-contents",
+            created_at=created_at,
+            output=output
+        ).dict()
+    
+    try:
         # Sende initial created event
         initial_event = MCPEvent(
             id=event_id,
@@ -397,28 +1035,32 @@ async def mcp_convert_generator(request: Request, conversion_request: Conversion
         )
         yield json.dumps(initial_event.dict())
         
-        # Erstelle und starte die Konvertierungsaufgabe
-        task = ConversionTask(
-            request=conversion_request,
-            task_id=event_id,
-            progress_callback=progress_callback
-        )
-        
+        # Starte die Konvertierungsaufgabe
         await worker_pool.submit_task(task)
         
+        # Die Frist richtet sich nach der erwarteten Dauer, bis zum Start zuzüglich der Wartezeit in der Queue
+        timeout = worker_pool.idle_timeout(conversion_request) + worker_pool.max_queue_wait
+        
         # Warte auf Events vom Worker und sende sie an den Client
         try:
             while True:
-                event_data = await asyncio.wait_for(queue.get(), timeout=60.0)
-                yield json.dumps(event_data)
+                event = await subscription.get(timeout=timeout)
+                yield json.dumps(mcp_event(event))
                 
                 # Beende den Generator nach complete oder error event
-                if event_data.get("status") in [MCPStatus.COMPLETE, MCPStatus.ERROR]:
+                if event.final:
+                    finished = True
                     break
+                # Jeder Fortschritt verlängert die Frist anhand der gemeldeten Restdauer
+                timeout = worker_pool.idle_timeout(conversion_request, task.eta)
                     
         except asyncio.TimeoutError:
-            # Timeout - sende ein Error-Event
-            error_detail = MCPErrorDetail(message="Conversion timed out after 60 seconds")
+            # Timeout - stoppe Pandoc und sende ein Error-Event
+            worker_pool.cancel(event_id, f"no progress for {timeout:.0f} seconds")
+            finished = True
+            error_detail = MCPErrorDetail(
+                message=f"Conversion timed out after {timeout:.0f} seconds without progress"
+            )
             timeout_event = MCPEvent(
                 id=event_id,
                 status=MCPStatus.ERROR,
@@ -431,7 +1073,14 @@ async def mcp_convert_generator(request: Request, conversion_request: Conversion
     
     except Exception as e:
         # Bei Ausnahmen ein Error-Event senden
-        error_detail = MCPErrorDetail(message=str(e))
+        if isinstance(e, AdmissionError):
+            error_detail = MCPErrorDetail(message=str(e), code="queue_full", retry_after=e.retry_after)
+        elif isinstance(e, SubscriptionOverflow):
+            error_detail = MCPErrorDetail(message=str(e), code="slow_consumer")
+        elif limit_breach(e) is not None:
+            error_detail = MCPErrorDetail(message=str(limit_breach(e)), code="resource_limit")
+        else:
+            error_detail = MCPErrorDetail(message=str(e))
         error_event = MCPEvent(
             id=event_id,
             status=MCPStatus.ERROR,
@@ -443,26 +1092,86 @@ async def mcp_convert_generator(request: Request, conversion_request: Conversion
         yield json.dumps(error_event.dict())
     
     finally:
+        # Bei Verbindungsabbruch läuft die Konvertierung für niemanden weiter
+        if not finished:
+            worker_pool.cancel(event_id, "client disconnected")
         # Verbindung bereinigen
-        if event_id in active_connections:
-            del active_connections[event_id]
+        subscription.close()
+        active_connections.pop(event_id, None)
+
+
+async def mcp_batch_generator(items: Optional[str], concurrency: Optional[int]):
+    """
+    Generator für MCP-konforme Batch-Konvertierungs-Events.
+    
+    Sendet pro abgeschlossenem Element ein Event und zum Schluss eine Zusammenfassung.
+    """
+    event_id = str(uuid.uuid4())
+    created_at = datetime.now().isoformat()
+    start_time = time.time()
+    
+    try:
+        batch = BatchConversionRequest(items=json.loads(items or "[]"), concurrency=concurrency or 4)
+    except (ValueError, TypeError) as e:
+        error_event = MCPEvent(
+            id=event_id,
+            status=MCPStatus.ERROR,
+            tool="convert-batch",
+            created_at=created_at,
+            error=MCPErrorDetail(message=f"Invalid batch: {e}")
+        )
+        yield json.dumps(error_event.dict())
+        return
+    
+    yield json.dumps(
+        MCPEvent(
+            id=event_id,
+            status=MCPStatus.CREATED,
+            tool="convert-batch",
+            created_at=created_at,
+            output={"total": len(batch.items)}
+        ).dict()
+    )
+    
+    async for event in batch_event_generator(batch):
+        event_data = json.loads(event)
+        # Die Zusammenfassung schließt den Batch ab, alle anderen Events sind Zwischenergebnisse
+        is_summary = event_data["event"] == "summary"
+        yield json.dumps(
+            MCPEvent(
+                id=event_id,
+                status=MCPStatus.COMPLETE if is_summary else MCPStatus.RUNNING,
+                tool="convert-batch",
+                created_at=created_at,
+                output=event_data["data"] if is_summary else {**event_data["data"], "status": event_data["event"]},
+                runtime=time.time() - start_time if is_summary else None
+            ).dict()
+        )
 
 
-async def mcp_error_generator(error_message: str):
+async def mcp_error_generator(
+    error_message: str,
+    tool: str = "",
+    code: Optional[str] = None,
+    retry_after: Optional[int] = None
+):
     """
     Generator für MCP-Fehler-Events.
     
     Args:
         error_message: Die Fehlermeldung
+        tool: Name des aufgerufenen Tools (leer bei unbekanntem Tool)
+        code: Maschinenlesbarer Fehlercode, z.B. "queue_full"
+        retry_after: Empfohlene Wartezeit in Sekunden vor einem neuen Versuch
     """
     event_id = str(uuid.uuid4())
     created_at = datetime.now().isoformat()
     
-    error_detail = MCPErrorDetail(message=error_message)
+    error_detail = MCPErrorDetail(message=error_message, code=code, retry_after=retry_after)
     error_event = MCPEvent(
         id=event_id,
         status=MCPStatus.ERROR,
-        tool="",  # Leerer Tool-Name, da kein gültiges Tool
+        tool=tool,  # Leerer Tool-Name, falls kein gültiges Tool
         created_at=created_at,
         error=error_detail
     )
@@ -470,6 +1179,355 @@ async def mcp_error_generator(error_message: str):
     yield json.dumps(error_event.dict())
 
 
+# JSON-RPC-Fehlercodes von /mcp
+JSONRPC_PARSE_ERROR = -32700
+JSONRPC_INVALID_REQUEST = -32600
+JSONRPC_METHOD_NOT_FOUND = -32601
+JSONRPC_INVALID_PARAMS = -32602
+JSONRPC_INTERNAL_ERROR = -32603
+JSONRPC_SERVER_BUSY = -32000
+JSONRPC_SESSION_NOT_FOUND = -32001
+
+# Argumente von convert-contents über /mcp; wie bei /sse nur Inhalte, keine Eingabedateien
+MCP_CALL_FIELDS = (
+    "contents", "input_format", "output_format", "output_file", "artifact", "targets", "document_id", "pdf_engine"
+)
+
+
+class JSONRPCError(Exception):
+    """A JSON-RPC error answered to a request of /mcp."""
+
+    def __init__(self, code: int, message: str, data: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+def jsonrpc_result(request_id: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a JSON-RPC response."""
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+def jsonrpc_error(request_id: Any, code: int, message: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build a JSON-RPC error response."""
+    error: Dict[str, Any] = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+
+def mcp_tool_schemas() -> List[Dict[str, Any]]:
+    """Describe the tools in the format of MCP's tools/list."""
+    schemas = []
+    for tool in mcp_tools():
+        # /mcp liefert den Text im Ergebnis, Chunks (stream) gibt es nur über /sse
+        tool = tool.copy(update={"parameters": [p for p in tool.parameters if p.name != "stream"]})
+        schemas.append({"name": tool.name, "description": tool.description, "inputSchema": tool.input_schema()})
+    return schemas
+
+
+def mcp_progress(token: Any, notify: Callable[[Dict[str, Any]], None]) -> Callable[..., None]:
+    """Return a function sending notifications/progress for ``token``, only when the progress increases."""
+    last = [-1.0]
+    
+    def report(progress: float, total: float, message: Optional[str] = None) -> None:
+        if progress <= last[0]:
+            return
+        last[0] = progress
+        params: Dict[str, Any] = {"progressToken": token, "progress": progress, "total": total}
+        if message:
+            params["message"] = message
+        notify({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+    
+    return report
+
+
+async def mcp_call_convert(
+    session: MCPSession, request_id: Any, arguments: Dict[str, Any], report: Optional[Callable[..., None]]
+) -> Optional[Dict[str, Any]]:
+    """Run convert-contents on the worker pool and return the tool result, or None if the client cancelled the call."""
+    values = {key: arguments[key] for key in MCP_CALL_FIELDS if key in arguments}
+    values.setdefault("input_format", "markdown")
+    values.setdefault("output_format", "html")
+    try:
+        if isinstance(values.get("targets"), str):
+            values["targets"] = json.loads(values["targets"])
+        conversion_request = ConversionRequest(**values)
+    except (ValueError, TypeError) as e:
+        raise JSONRPCError(JSONRPC_INVALID_PARAMS, f"Invalid arguments: {e}")
+    
+    task_id = str(uuid.uuid4())
+    task = event_bus.task(conversion_request, task_id)
+    subscription = None
+    if report is not None:
+        def forward(event: TaskEvent) -> None:
+            if event.kind == EVENT_PROGRESS:
+                report(event.percentage, 100, event.message if isinstance(event.message, str) else None)
+        
+        subscription = event_bus.subscribe(task_id, callback=forward)
+    # Über notifications/cancelled und DELETE /mcp abbrechbar
+    session.calls[request_id] = task_id
+    try:
+        future = await worker_pool.submit_task(task)
+        # shield: bei Verbindungsabbruch bricht worker_pool.cancel auch Pandoc ab
+        result = await asyncio.shield(future)
+    except AdmissionError as e:
+        raise JSONRPCError(JSONRPC_SERVER_BUSY, str(e), {"code": "queue_full", "retry_after": e.retry_after})
+    except asyncio.CancelledError:
+        worker_pool.cancel(task_id, "client disconnected")
+        raise
+    except Exception as e:
+        if request_id in session.cancelled:
+            return None
+        # Fehler der Konvertierung sind ein Ergebnis des Tools, kein Protokollfehler
+        breach = limit_breach(e)
+        return {"content": [{"type": "text", "text": f"Error during conversion: {breach or e}"}], "isError": True}
+    finally:
+        session.calls.pop(request_id, None)
+        session.cancelled.discard(request_id)
+        if subscription is not None:
+            subscription.close()
+    
+    content = [{"type": "text", "text": result if isinstance(result, str) else json.dumps(result)}]
+    if "artifact" in task.info:
+        content.append({"type": "text", "text": json.dumps(task.info["artifact"])})
+    return {"content": content, "isError": False}
+
+
+async def mcp_call_batch(arguments: Dict[str, Any], report: Optional[Callable[..., None]]) -> Dict[str, Any]:
+    """Run convert-batch and return the item events and the summary as tool result."""
+    items = arguments.get("items") or []
+    try:
+        batch = BatchConversionRequest(
+            items=json.loads(items) if isinstance(items, str) else items,
+            concurrency=arguments.get("concurrency") or 4,
+        )
+    except (ValueError, TypeError) as e:
+        raise JSONRPCError(JSONRPC_INVALID_PARAMS, f"Invalid batch: {e}")
+    
+    events = []
+    async for event in batch_event_generator(batch):
+        events.append(json.loads(event))
+        if report is not None and len(events) <= len(batch.items):
+            report(len(events), len(batch.items))
+    return {"content": [{"type": "text", "text": json.dumps(events)}], "isError": False}
+
+
+async def mcp_request(
+    session: MCPSession, message: Dict[str, Any], notify: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Answer a JSON-RPC request of a session; ``notify`` receives its progress notifications.
+    
+    Returns None for a request the client cancelled, which gets no response.
+    """
+    request_id = message.get("id")
+    method = message.get("method")
+    params = message.get("params") or {}
+    try:
+        if method == "ping":
+            return jsonrpc_result(request_id, {})
+        if method == "tools/list":
+            return jsonrpc_result(request_id, {"tools": mcp_tool_schemas()})
+        if method != "tools/call":
+            raise JSONRPCError(JSONRPC_METHOD_NOT_FOUND, f"Method not found: {method}")
+        
+        token = (params.get("_meta") or {}).get("progressToken")
+        report = mcp_progress(token, notify) if notify is not None and token is not None else None
+        arguments = params.get("arguments") or {}
+        if params.get("name") == "convert-contents":
+            result = await mcp_call_convert(session, request_id, arguments, report)
+            return None if result is None else jsonrpc_result(request_id, result)
+        if params.get("name") == "convert-batch":
+            return jsonrpc_result(request_id, await mcp_call_batch(arguments, report))
+        raise JSONRPCError(JSONRPC_INVALID_PARAMS, f"Unknown tool: {params.get('name')}")
+    except JSONRPCError as e:
+        return jsonrpc_error(request_id, e.code, str(e), e.data)
+    except Exception as e:
+        return jsonrpc_error(request_id, JSONRPC_INTERNAL_ERROR, str(e))
+
+
+def mcp_notification(session: MCPSession, message: Dict[str, Any]) -> None:
+    """Handle a JSON-RPC notification of a session."""
+    params = message.get("params") or {}
+    if message.get("method") == "notifications/initialized":
+        session.initialized = True
+    elif message.get("method") == "notifications/cancelled":
+        task_id = session.calls.get(params.get("requestId"))
+        if task_id is not None and worker_pool.cancel(task_id, params.get("reason") or "cancelled by client"):
+            # Auf abgebrochene Anfragen antwortet der Server nicht
+            session.cancelled.add(params.get("requestId"))
+
+
+async def mcp_http_stream(session: MCPSession, messages: List[Dict[str, Any]]):
+    """
+    Answer the requests of a POST to /mcp as SSE stream.
+    
+    The requests run concurrently; every response is sent when it is ready,
+    after the progress notifications of its call, and the stream ends with
+    the last response. Requests the client cancelled get no response.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def answer(message: Dict[str, Any]) -> None:
+        queue.put_nowait(await mcp_request(session, message, queue.put_nowait))
+    
+    tasks = [asyncio.ensure_future(answer(message)) for message in messages]
+    pending = len(tasks)
+    try:
+        while pending:
+            item = await queue.get()
+            if item is None or "method" not in item:
+                pending -= 1
+            if item is not None:
+                yield json.dumps(item)
+    finally:
+        # Bei Verbindungsabbruch die noch laufenden Aufrufe abbrechen
+        for task in tasks:
+            task.cancel()
+
+
+async def mcp_answer(
+    request: Request, session: MCPSession, messages: List[Dict[str, Any]]
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Answer the requests of a POST to /mcp concurrently for a JSON response.
+    
+    Returns:
+        The responses in request order, without those of requests the client
+        cancelled, or None if the client disconnected first; its running
+        calls are then cancelled.
+    """
+    calls = asyncio.ensure_future(asyncio.gather(*(mcp_request(session, message) for message in messages)))
+    
+    async def listen() -> None:
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+    
+    listener = asyncio.ensure_future(listen())
+    try:
+        await asyncio.wait({calls, listener}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        listener.cancel()
+        disconnected = not calls.done()
+        if disconnected:
+            # Bricht über mcp_call_convert auch die Konvertierungen im Worker-Pool ab
+            calls.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await calls
+    return None if disconnected else [response for response in calls.result() if response is not None]
+
+
+def mcp_http_error(status_code: int, code: int, message: str, request_id: Any = None) -> JSONResponse:
+    """Build an HTTP error of /mcp with a JSON-RPC error as body."""
+    return JSONResponse(status_code=status_code, content=jsonrpc_error(request_id, code, message))
+
+
+def mcp_initialize(message: Dict[str, Any]) -> JSONResponse:
+    """Open a session and answer the initialize request with its ID in the Mcp-Session-Id header."""
+    params = message.get("params") or {}
+    requested = params.get("protocolVersion")
+    version = requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0]
+    try:
+        session = session_store.create(version, params.get("clientInfo"))
+    except AdmissionError as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            headers={"Retry-After": str(e.retry_after)},
+            content=jsonrpc_error(message.get("id"), JSONRPC_SERVER_BUSY, str(e), {"retry_after": e.retry_after}),
+        )
+    result = {
+        "protocolVersion": version,
+        "capabilities": {"tools": {"listChanged": False}},
+        "serverInfo": {"name": "fast-mcp-pandoc", "version": app.version},
+    }
+    return JSONResponse(content=jsonrpc_result(message.get("id"), result), headers={SESSION_HEADER: session.session_id})
+
+
+@app.post("/mcp")
+async def mcp_http_endpoint(request: Request) -> Response:
+    """
+    MCP Streamable HTTP endpoint: JSON-RPC messages over POST within a session.
+    
+    ``initialize`` opens a session whose ID is returned in the
+    ``Mcp-Session-Id`` header; every later POST carries it. A POST holds
+    one message or a batch; its requests run concurrently on the worker
+    pool, and any number of POSTs of a session may run at the same time
+    over keep-alive connections. Responses are a JSON body, or an SSE
+    stream with the notifications/progress of the calls followed by their
+    responses, if the client accepts text/event-stream and a tools/call
+    carries a progressToken. Notifications only are answered with 202.
+    """
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        return mcp_http_error(400, JSONRPC_PARSE_ERROR, "Parse error")
+    messages = payload if isinstance(payload, list) else [payload]
+    if not messages or not all(isinstance(message, dict) and message.get("jsonrpc") == "2.0" for message in messages):
+        return mcp_http_error(400, JSONRPC_INVALID_REQUEST, "Invalid JSON-RPC message")
+    
+    # initialize eröffnet die Sitzung und kommt allein
+    if any(message.get("method") == "initialize" for message in messages):
+        if len(messages) != 1 or "id" not in messages[0]:
+            return mcp_http_error(400, JSONRPC_INVALID_REQUEST, "initialize must be sent as a single request")
+        return mcp_initialize(messages[0])
+    
+    session_id = request.headers.get(SESSION_HEADER)
+    if not session_id:
+        return mcp_http_error(400, JSONRPC_INVALID_REQUEST, f"Missing {SESSION_HEADER} header")
+    session = session_store.get(session_id)
+    if session is None:
+        # Der Client muss eine neue Sitzung mit initialize eröffnen
+        return mcp_http_error(404, JSONRPC_SESSION_NOT_FOUND, "Session not found")
+    
+    requests = [message for message in messages if "method" in message and "id" in message]
+    for message in messages:
+        if "method" in message and "id" not in message:
+            mcp_notification(session, message)
+    if not requests:
+        return Response(status_code=202)
+    
+    # Fortschritt gibt es nur als SSE-Stream, und nur wenn ein Aufruf ihn anfordert
+    wants_progress = any(
+        message.get("method") == "tools/call"
+        and ((message.get("params") or {}).get("_meta") or {}).get("progressToken") is not None
+        for message in requests
+    )
+    if wants_progress and "text/event-stream" in request.headers.get("accept", ""):
+        try:
+            return connection_manager.response(
+                mcp_http_stream(session, requests), kind="mcp-http", heartbeat=HEARTBEAT_COMMENT
+            )
+        except AdmissionError as e:
+            return admission_error_response(e)
+    
+    responses = await mcp_answer(request, session, requests)
+    if responses is None:
+        # Der Client ist weg, niemand liest die Antwort
+        return Response(status_code=204)
+    if not responses:
+        # Alle Anfragen hat der Client abgebrochen
+        return Response(status_code=202)
+    return JSONResponse(content=responses if isinstance(payload, list) else responses[0])
+
+
+@app.get("/mcp")
+async def mcp_http_listen() -> Response:
+    """The server sends no requests of its own, so there is no stream to listen to."""
+    return Response(status_code=405, headers={"Allow": "POST, DELETE"})
+
+
+@app.delete("/mcp")
+async def mcp_http_close(request: Request) -> Response:
+    """Close a session and cancel its running tool calls."""
+    session = session_store.close(request.headers.get(SESSION_HEADER, ""))
+    if session is None:
+        return mcp_http_error(404, JSONRPC_SESSION_NOT_FOUND, "Session not found")
+    for task_id in list(session.calls.values()):
+        worker_pool.cancel(task_id, "session closed")
+    return Response(status_code=204)
+
+
 def main():
     """Run the FastAPI server."""
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,145 @@
+"""
+Sessions of the MCP Streamable HTTP transport.
+
+A client opens a session with an ``initialize`` request to ``POST /mcp``
+and sends the returned ``Mcp-Session-Id`` header with every later
+request, over as many keep-alive connections as it likes. Tool calls of a
+session run concurrently on the worker pool; the session records which
+conversion task serves which JSON-RPC request, so
+``notifications/cancelled`` and ``DELETE /mcp`` stop the right
+conversions. Sessions without running calls expire after a TTL without
+requests, and the least recently used idle sessions make room once the
+session limit is reached.
+"""
+
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Union
+
+from .worker import AdmissionError
+
+logger = logging.getLogger("pandoc-sessions")
+
+SESSION_HEADER = "Mcp-Session-Id"
+
+# Protocol versions of the transport, newest first
+PROTOCOL_VERSIONS = ("2025-03-26", "2024-11-05")
+
+RequestId = Union[str, int]
+
+
+class SessionLimitError(AdmissionError):
+    """Raised when a new session would exceed the session limit while all sessions are busy."""
+    status_code = 503
+
+
+@dataclass
+class MCPSession:
+    """An MCP session, the conversion tasks of its running tool calls and which of them the client cancelled."""
+    session_id: str
+    protocol_version: str
+    client_info: Dict[str, Any] = field(default_factory=dict)
+    initialized: bool = False
+    created_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+    calls: Dict[RequestId, str] = field(default_factory=dict)
+    cancelled: Set[RequestId] = field(default_factory=set)
+
+    @property
+    def busy(self) -> bool:
+        """True while tool calls of the session are running."""
+        return bool(self.calls)
+
+
+class SessionStore:
+    """
+    Open MCP sessions by ID, least recently used first.
+
+    Not thread-safe: all methods run on the event loop.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_sessions: int = 10000):
+        """
+        Initialize the store.
+
+        Args:
+            ttl: Seconds without requests after which an idle session expires.
+            max_sessions: Maximum number of open sessions.
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, MCPSession]" = OrderedDict()
+        self._counters = {"created": 0, "closed": 0, "expired": 0, "evicted": 0, "rejected": 0}
+
+    def create(self, protocol_version: str, client_info: Optional[Dict[str, Any]] = None) -> MCPSession:
+        """
+        Open a session.
+
+        Raises:
+            SessionLimitError: If the session limit is reached and every session has running calls.
+        """
+        self.sweep()
+        if len(self._sessions) >= self.max_sessions:
+            idle = next((session for session in self._sessions.values() if not session.busy), None)
+            if idle is None:
+                self._counters["rejected"] += 1
+                raise SessionLimitError(f"Too many open sessions ({self.max_sessions})", retry_after=1)
+            self._counters["evicted"] += 1
+            del self._sessions[idle.session_id]
+        session = MCPSession(
+            session_id=uuid.uuid4().hex,
+            protocol_version=protocol_version,
+            client_info=client_info or {},
+        )
+        self._sessions[session.session_id] = session
+        self._counters["created"] += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[MCPSession]:
+        """Return an open session and mark it as used."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str) -> Optional[MCPSession]:
+        """Close a session; the caller cancels its running calls."""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._counters["closed"] += 1
+        return session
+
+    def sweep(self) -> None:
+        """Drop the idle sessions that have not been used for the TTL."""
+        deadline = time.monotonic() - self.ttl
+        expired: List[MCPSession] = []
+        for session in self._sessions.values():
+            if session.last_seen > deadline:
+                break
+            if not session.busy:
+                expired.append(session)
+        for session in expired:
+            del self._sessions[session.session_id]
+            self._counters["expired"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of open sessions, their running calls and counters."""
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "running_calls": sum(len(session.calls) for session in self._sessions.values()),
+            **self._counters,
+        }
+
+
+# Global session store
+session_store = SessionStore(
+    ttl=float(os.environ.get("MCP_SESSION_TTL", "3600")),
+    max_sessions=int(os.environ.get("MAX_MCP_SESSIONS", "10000")),
+)
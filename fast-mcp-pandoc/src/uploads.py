@@ -0,0 +1,131 @@
+"""
+Documents uploaded as request body.
+
+The POST variants of /convert/stream and /sse take the document as request
+body instead of the ``contents`` query parameter, either raw (any content
+type but ``multipart/form-data``) or as the ``file`` field of a multipart
+form. The body is never read into memory as a whole: :func:`request_body`
+returns an :class:`~mcp_pandoc.streams.InputStream` that receives the next
+chunk of the body only when pandoc has consumed the previous one. Multipart
+bodies are parsed on the fly and only the data of the file field is passed
+on.
+"""
+
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import Request
+from mcp_pandoc.streams import InputStream
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    try:  # python-multipart before 0.0.13
+        from multipart.multipart import MultipartParser, parse_options_header
+    except ImportError:
+        MultipartParser = None
+
+# Form field holding the document of a multipart body
+UPLOAD_FIELD = "file"
+
+
+class UploadError(ValueError):
+    """Raised for a request body that does not carry a document."""
+
+
+class _FieldReader:
+    """Callbacks of a streaming multipart parser collecting the data of one field."""
+
+    def __init__(self, field: str):
+        self.field = field.encode()
+        self.data: List[bytes] = []
+        self.found = False
+        self.complete = False
+        self._in_field = False
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+
+    def callbacks(self) -> Dict[str, Callable[..., None]]:
+        """Return the callbacks for MultipartParser."""
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self) -> None:
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self._in_field = not self.found and options.get(b"name") == self.field
+        self.found = self.found or self._in_field
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_field:
+            self.data.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._in_field:
+            self._in_field = False
+            self.complete = True
+
+
+async def _multipart_chunks(request: Request, boundary: bytes, field: str) -> AsyncIterator[bytes]:
+    """Yield the data of one field of a multipart body as the body arrives."""
+    reader = _FieldReader(field)
+    parser = MultipartParser(boundary, reader.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+        if reader.data:
+            data = b"".join(reader.data)
+            reader.data.clear()
+            yield data
+        if reader.complete:
+            # The rest of the body is drained by the connection
+            return
+    parser.finalize()
+    if not reader.found:
+        raise UploadError(f"The multipart body has no '{field}' field")
+
+
+def request_body(request: Request, field: str = UPLOAD_FIELD) -> InputStream:
+    """
+    Return the document sent as body of a request as input stream.
+
+    Args:
+        request: The request, whose body has not been read yet.
+        field: The form field holding the document of a multipart body.
+
+    Raises:
+        UploadError: If a multipart body has no boundary or python-multipart is not installed.
+    """
+    length = request.headers.get("content-length")
+    # For multipart bodies the announced size includes the form around the document
+    size = int(length) if length and length.isdigit() else None
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip().lower() != "multipart/form-data":
+        return InputStream(request.stream(), size=size)
+    if MultipartParser is None:
+        raise UploadError("Multipart bodies need python-multipart, send the document as raw body")
+    _, options = parse_options_header(content_type)
+    boundary: Optional[bytes] = options.get(b"boundary")
+    if not boundary:
+        raise UploadError("The multipart body has no boundary")
+    return InputStream(_multipart_chunks(request, boundary, field), size=size)
@@ -6,18 +6,33 @@ asynchronously with progress updates via callbacks.
 """
 
 import asyncio
+import contextvars
+import functools
+import hashlib
 import logging
+import math
 import os
-import tempfile
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
 
-import pypandoc
+from mcp_pandoc.artifacts import Artifact, ArtifactStore, get_artifact_store
+from mcp_pandoc.cancel import CancelScope, cancel_scope
+from mcp_pandoc.chunking import (MARKDOWN_INPUT_FORMATS, can_chunk, count_anonymous_code_blocks, join_chunks,
+                                 renumber_code_blocks, split_ast, split_markdown)
+from mcp_pandoc.engine import PandocEngine, base_format, default_extra_args, get_engine, normalize_format
+from mcp_pandoc.incremental import IncrementalConverter, IncrementalResult, get_incremental_converter
+from mcp_pandoc.limits import LIMIT_NAMES, MB, ResourceLimitError, ResourceLimits, resource_limits
+from mcp_pandoc.progress import ThroughputTracker
+from mcp_pandoc.streams import SEEKING_INPUT_FORMATS, InputStream
 from pydantic import BaseModel
 
-from .models import ConversionRequest
+from .models import INCREMENTAL_FORMATS, ConversionRequest, ConversionTarget
+from .scheduler import (DEFAULT_LANE_LIMITS, LANE_TEXT, LANES, LaneScheduler, classify, default_lane_workers,
+                        lane_limits_from_env, lane_workers_from_env)
 
 # Configure logging
 logging.basicConfig(
@@ -26,56 +41,667 @@ logging.basicConfig(
 )
 logger = logging.getLogger("pandoc-worker")
 
+# Conversions run on the thread pools of the scheduler lanes
+MODE_THREAD = "thread"
+# Conversions run as asyncio child processes on the event loop
+MODE_ASYNCIO = "asyncio"
+
+# Percentages between which the progress parsed from pandoc and LaTeX output is reported
+CONVERT_PROGRESS_START = 50
+CONVERT_PROGRESS_END = 75
+
+# Minimum seconds a client waits for the next event of a conversion
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+# Inputs at least this large (in bytes) are split into chunks converted in parallel
+DEFAULT_CHUNK_THRESHOLD = 1024 * 1024
+
+# Input formats inferred from the extension of input files that can be chunked
+CHUNKED_FILE_FORMATS = {".md": "markdown", ".markdown": "markdown", ".htm": "html", ".html": "html"}
+
+# Maximum number of characters of one chunk event of a streamed conversion
+DEFAULT_STREAM_CHUNK_SIZE = 16 * 1024
+
+# Streamed inputs are converted in sections of about this many bytes, at most STREAM_MAX_SECTIONS
+STREAM_SECTION_SIZE = 64 * 1024
+STREAM_MAX_SECTIONS = 64
+
+
+class AdmissionError(RuntimeError):
+    """Raised when the worker pool sheds a task; carries a retry hint in seconds."""
+    status_code = 503
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(AdmissionError):
+    """Raised when the admission queue has reached its maximum depth."""
+    status_code = 429
+
+
+class QueueTimeoutError(AdmissionError):
+    """Raised when a task waited longer than the maximum queue wait time."""
+    status_code = 503
+
+
+class JobCancelledError(RuntimeError):
+    """Raised by the future of a task that was cancelled through WorkerPool.cancel."""
+    status_code = 409
+
+
+def limit_breach(error: BaseException) -> Optional[ResourceLimitError]:
+    """Return the ResourceLimitError behind a conversion error, if a limit was exceeded."""
+    while error is not None:
+        if isinstance(error, ResourceLimitError):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one item of a batch conversion."""
+    index: int
+    status: str
+    runtime: float
+    result: Any = None
+    error: Optional[str] = None
+
 
 @dataclass
 class ConversionTask:
-    """Represents a document conversion task."""
+    """
+    Represents a document conversion task.
+    
+    The progress callback receives the result instead of a message at 100%
+    (a list of per-target results for multi-target requests) and the error
+    message at -1. Multi-target requests additionally report each target
+    through target_callback as (task_id, target_index, percentage, message).
+    Streamed requests emit their output in order through chunk_callback as
+    (task_id, chunk_index, text); their result is empty.
+    Details about how the task was processed, such as the block reuse of
+    incremental conversions, are collected in info. While pandoc or the
+    LaTeX engine runs, eta holds the estimated seconds until it finishes.
+    The processes of the task run in cancel_scope, which kills them when
+    the task is cancelled, and under limits, which the worker pool sets
+    from the lane of the request unless given. A task with a body reads
+    its input from that stream instead of the contents of the request.
+    Outputs requested as artifacts are written to the reserved artifacts,
+    keyed by path in artifacts, and reported by reference in info.
+    """
     request: ConversionRequest
     task_id: str
-    progress_callback: Callable[[str, int, str], None]
+    progress_callback: Callable[[str, int, Any], None]
+    target_callback: Optional[Callable[[str, int, int, str], None]] = None
+    info: Dict[str, Any] = field(default_factory=dict)
+    chunk_callback: Optional[Callable[[str, int, str], None]] = None
+    eta: Optional[float] = None
+    cancel_scope: CancelScope = field(default_factory=CancelScope)
+    limits: Optional[ResourceLimits] = None
+    body: Optional[InputStream] = None
+    artifacts: Dict[str, Artifact] = field(default_factory=dict)
+
+
+class _ProgressReporter:
+    """Maps the progress parsed from pandoc and LaTeX output onto task percentages and an ETA."""
+    
+    def __init__(self, task: ConversionTask, estimate: Optional[float]):
+        self.task = task
+        self.estimate = estimate
+        self.percentage = CONVERT_PROGRESS_START
+        self.updates = 0
+        self.started = time.monotonic()
+        task.eta = estimate
+    
+    def __call__(self, fraction: Optional[float], message: str) -> None:
+        """Report a completed fraction of the conversion (None if unknown) with a message."""
+        elapsed = time.monotonic() - self.started
+        self.updates += 1
+        if fraction:
+            # Never go back and never reach the percentage of the finalizing update
+            span = CONVERT_PROGRESS_END - CONVERT_PROGRESS_START
+            percentage = CONVERT_PROGRESS_START + int(min(fraction, 1.0) * span)
+            self.percentage = max(self.percentage, min(percentage, CONVERT_PROGRESS_END - 1))
+            self.task.eta = max(elapsed / fraction - elapsed, 0.0)
+        elif self.estimate is not None:
+            self.task.eta = max(self.estimate - elapsed, 0.0)
+        self.task.progress_callback(self.task.task_id, self.percentage, message)
+    
+    def finish(self, throughput: ThroughputTracker, key: str, size: int) -> None:
+        """Record the duration of the finished conversion if pandoc actually ran."""
+        # Cache hits, pandoc server requests and incremental updates report nothing and
+        # would make the estimates for full conversions too optimistic
+        if self.updates and "incremental" not in self.task.info:
+            throughput.record(key, size, time.monotonic() - self.started)
+        self.task.eta = None
+
+
+class _ChunkEmitter:
+    """Cuts the output of a streamed task into bounded chunks, counting and hashing it."""
+    
+    def __init__(self, task: ConversionTask, chunk_size: int):
+        self.task = task
+        self.chunk_size = chunk_size
+        self.chunks = 0
+        self.length = 0
+        self._digest = hashlib.sha256()
+    
+    def emit(self, text: str) -> None:
+        """Send text to the task's chunk callback in pieces of at most chunk_size characters."""
+        for start in range(0, len(text), self.chunk_size):
+            piece = text[start:start + self.chunk_size]
+            self._digest.update(piece.encode("utf-8"))
+            self.length += len(piece)
+            if self.task.chunk_callback is not None:
+                self.task.chunk_callback(self.task.task_id, self.chunks, piece)
+            self.chunks += 1
+    
+    def summary(self) -> Dict[str, Any]:
+        """Return the chunk count, the length in characters and the SHA-256 of the UTF-8 text."""
+        return {"chunks": self.chunks, "length": self.length, "sha256": self._digest.hexdigest()}
 
 
 class WorkerPool:
     """
     A pool of workers for processing document conversion tasks.
     
-    This class manages a thread pool to handle document conversion tasks
-    asynchronously while providing progress updates.
+    This class routes document conversion tasks by estimated cost to the
+    lanes of a LaneScheduler, so PDF builds cannot delay small text
+    conversions, while providing progress updates. In thread mode every
+    conversion occupies a lane thread; in asyncio mode pandoc runs as a
+    child process of the event loop and queued jobs cost no thread at all.
     """
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(
+        self,
+        max_workers: int = 4,
+        engine: Optional[PandocEngine] = None,
+        max_queue_depth: int = 64,
+        max_queue_wait: float = 60.0,
+        lane_workers: Optional[Dict[str, int]] = None,
+        mode: str = MODE_THREAD,
+        chunk_threshold: int = DEFAULT_CHUNK_THRESHOLD,
+        incremental: Optional[IncrementalConverter] = None,
+        stream_chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+        limits: Optional[Dict[str, ResourceLimits]] = None,
+        artifact_store: Optional[ArtifactStore] = None
+    ):
         """
         Initialize the worker pool.
         
         Args:
             max_workers: Maximum number of concurrent worker threads.
+            engine: Pandoc engine to use, the shared engine is created lazily if omitted.
+            max_queue_depth: Maximum number of tasks waiting for a worker before new ones are rejected.
+            max_queue_wait: Maximum seconds a task may wait for a worker before it is dropped.
+            lane_workers: Concurrency limit per scheduler lane, derived from max_workers if omitted.
+            mode: MODE_THREAD or MODE_ASYNCIO.
+            chunk_threshold: Input size in bytes from which text conversions are chunked, 0 disables chunking.
+            incremental: Converter for requests with a document_id, created lazily on the engine if omitted.
+            stream_chunk_size: Maximum number of characters per chunk of streamed conversions.
+            limits: Resource limits of a single task per scheduler lane, DEFAULT_LANE_LIMITS if omitted.
+            artifact_store: Store of outputs requested as artifacts, the shared store if omitted.
         """
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        if mode not in (MODE_THREAD, MODE_ASYNCIO):
+            raise ValueError(f"Unknown worker mode: '{mode}'")
+        self._engine = engine
+        self._incremental = incremental
+        self._artifact_store = artifact_store
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.max_queue_wait = max_queue_wait
+        self.mode = mode
+        self.chunk_threshold = chunk_threshold
+        self.stream_chunk_size = stream_chunk_size
+        self.scheduler = LaneScheduler(lane_workers or default_lane_workers(max_workers), max_workers)
+        self.limits = limits if limits is not None else dict(DEFAULT_LANE_LIMITS)
         self.tasks: Dict[str, asyncio.Future] = {}
-        logger.info(f"Worker pool initialized with {max_workers} workers")
+        # Task and inner future of every unfinished task, for cancellation
+        self._jobs: Dict[str, Tuple[ConversionTask, asyncio.Future]] = {}
+        # Durations of finished conversions, for ETAs and client timeouts
+        self.throughput = ThroughputTracker()
+        # Timers stopping running tasks at their wall time limit, armed from any thread on the loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wall_clocks: Dict[str, asyncio.TimerHandle] = {}
+        
+        # Admission accounting, updated from the event loop and the worker threads
+        self._lock = threading.Lock()
+        self._submitted_at: Dict[str, float] = {}
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._expired = 0
+        self._cancelled = 0
+        self._cancelled_running = 0
+        self._processes_killed = 0
+        self._seconds_saved = 0.0
+        self._limit_breaches = {limit: 0 for limit in LIMIT_NAMES}
+        self._finish_times: Deque[float] = deque(maxlen=50)
+        logger.info(f"Worker pool initialized with {max_workers} workers in {mode} mode")
+    
+    @property
+    def engine(self) -> PandocEngine:
+        """The pandoc engine used for conversions."""
+        if self._engine is None:
+            self._engine = get_engine()
+        return self._engine
+    
+    @property
+    def incremental(self) -> IncrementalConverter:
+        """The converter keeping rendered blocks of documents with a document_id."""
+        if self._incremental is None:
+            # The shared engine goes with the shared converter
+            self._incremental = (
+                get_incremental_converter() if self._engine is None else IncrementalConverter(self._engine)
+            )
+        return self._incremental
     
-    async def submit_task(self, task: ConversionTask) -> None:
+    @property
+    def artifact_store(self) -> ArtifactStore:
+        """The store of outputs requested as artifacts."""
+        if self._artifact_store is None:
+            self._artifact_store = get_artifact_store()
+        return self._artifact_store
+    
+    async def submit_task(self, task: ConversionTask) -> asyncio.Future:
         """
         Submit a conversion task to the worker pool.
         
         Args:
             task: The conversion task to process.
+            
+        Returns:
+            A future resolving to the conversion result.
+            
+        Raises:
+            QueueFullError: If the queue has reached its maximum depth.
+            ResourceLimitError: If the input exceeds the input size limit of the task.
         """
         logger.info(f"Submitting task {task.task_id}")
+        self._loop = asyncio.get_running_loop()
+        if task.limits is None:
+            task.limits = self.limits_for(task.request)
         
-        # Create a future for this task
-        loop = asyncio.get_event_loop()
-        future = loop.run_in_executor(
-            self.executor,
-            self._process_conversion,
-            task
-        )
+        # Reject early instead of letting the executor queue grow without bound
+        self.check_admission()
+        if not task.artifacts:
+            self._reserve_artifacts(task)
+        size = self._task_input_size(task)
+        if task.body is not None:
+            # Streamed input is checked against the limit while it is read
+            task.body.limits = task.limits
+        if task.limits is not None and task.limits.input_mb and size > task.limits.input_mb * MB:
+            self._count_breach("input_mb")
+            raise ResourceLimitError("input_mb", task.limits, f"{size / MB:.1f} MB input")
+        with self._lock:
+            self._queued += 1
+            self._submitted_at[task.task_id] = time.monotonic()
+        
+        # Create a future for this task; its coroutines and lane threads inherit the cancel scope and limits
+        with cancel_scope(task.cancel_scope), resource_limits(task.limits):
+            if task.request.targets:
+                job = asyncio.ensure_future(self._process_multi_conversion(task))
+            elif task.request.stream:
+                job = asyncio.ensure_future(self._process_streaming_conversion(task))
+            elif self._should_chunk(task.request):
+                job = asyncio.ensure_future(self._process_chunked_conversion(task))
+            else:
+                lane = self.lane_for(task.request, task.request.output_format, size)
+                job = asyncio.ensure_future(
+                    self._run_in_lane(lane, self._run_admitted, self._run_admitted_async, task)
+                )
+        self._jobs[task.task_id] = (task, job)
+        future = asyncio.ensure_future(self._await_job(task, job))
         self.tasks[task.task_id] = future
         
         # Set up cleanup when the future completes
         future.add_done_callback(
             lambda f: self._task_done(task.task_id, f)
         )
+        return future
+    
+    @staticmethod
+    async def _await_job(task: ConversionTask, job: asyncio.Future) -> Any:
+        """
+        Wait for the inner future of a task, turning its cancellation into JobCancelledError.
+        
+        Tasks stopped at their wall time limit raise ResourceLimitError instead.
+        """
+        try:
+            return await job
+        except (asyncio.CancelledError, Exception):
+            # A coroutine cancelled between two awaits ends with the error of its killed process instead
+            if not task.cancel_scope.cancelled:
+                raise
+            if task.cancel_scope.error is not None:
+                task.progress_callback(task.task_id, -1, f"Error: {task.cancel_scope.error}")
+                raise task.cancel_scope.error
+            message = f"Conversion cancelled: {task.cancel_scope.reason}"
+            task.progress_callback(task.task_id, -1, f"Error: {message}")
+            raise JobCancelledError(message)
+    
+    def cancel(self, task_id: str, reason: str = "cancelled by client") -> bool:
+        """
+        Cancel a queued or running task.
+        
+        The process groups of the task's pandoc and LaTeX processes are
+        killed at once, which frees its worker, and the task's future
+        raises JobCancelledError after an error update to its callback.
+        
+        Args:
+            task_id: The ID of the task.
+            reason: Why the task is cancelled, part of the error message.
+            
+        Returns:
+            True if the task was cancelled, False if it is unknown or already finished.
+        """
+        job = self._jobs.get(task_id)
+        if job is None or job[1].done() or job[0].cancel_scope.cancelled:
+            return False
+        task, future = job
+        with self._lock:
+            queued = task_id in self._submitted_at
+        # The work saved is the remaining time of a running task, the whole conversion for a queued one
+        saved = task.eta if not queued and task.eta is not None else self.estimate(task.request)
+        killed = task.cancel_scope.cancel(reason)
+        future.cancel()
+        with self._lock:
+            self._cancelled += 1
+            if not queued:
+                self._cancelled_running += 1
+            self._processes_killed += killed
+            self._seconds_saved += saved or 0.0
+        logger.info(f"Cancelled {'queued' if queued else 'running'} task {task_id} ({reason}), "
+                    f"killed {killed} processes")
+        return True
+    
+    def _start_wall_clock(self, task: ConversionTask) -> None:
+        """Arm the wall time limit of a task that has just started running; runs on the event loop."""
+        job = self._jobs.get(task.task_id)
+        if job is None or job[1].done() or not task.limits or not task.limits.wall_time:
+            return
+        self._wall_clocks[task.task_id] = self._loop.call_later(task.limits.wall_time, self._expire, task)
+    
+    def _expire(self, task: ConversionTask) -> None:
+        """Stop a task that ran into its wall time limit, killing its processes."""
+        self._wall_clocks.pop(task.task_id, None)
+        job = self._jobs.get(task.task_id)
+        if job is None or job[1].done():
+            return
+        error = ResourceLimitError("wall_time", task.limits, "conversion stopped")
+        killed = task.cancel_scope.cancel(str(error), error)
+        job[1].cancel()
+        with self._lock:
+            self._processes_killed += killed
+        logger.warning(f"Task {task.task_id} exceeded its wall time limit, killed {killed} processes")
+    
+    def _count_breach(self, limit: str) -> None:
+        """Count a task that exceeded one of its resource limits."""
+        with self._lock:
+            self._limit_breaches[limit] += 1
+    
+    def limits_for(self, request: ConversionRequest) -> Optional[ResourceLimits]:
+        """Return the resource limits of a request, those of the heaviest lane among its targets."""
+        formats = [target.output_format for target in request.targets] if request.targets else [request.output_format]
+        lane = max((self.lane_for(request, fmt) for fmt in formats), key=LANES.index)
+        return self.limits.get(lane)
+    
+    def lane_for(self, request: ConversionRequest, output_format: str, input_size: Optional[int] = None) -> str:
+        """
+        Return the scheduler lane for converting a request's input to an output format.
+        
+        Args:
+            request: The conversion request, whose input size is part of the cost.
+            output_format: The output format of the conversion or target.
+            input_size: Size of the input if it is not part of the request, e.g. a streamed body.
+        """
+        if input_size is None:
+            input_size = self._input_size(request)
+        return classify(output_format, input_size, self.engine.server_pool is not None)
+    
+    @staticmethod
+    def _input_size(request: ConversionRequest) -> int:
+        """Return the size of a request's input in bytes (characters for inline contents)."""
+        if request.input_file:
+            try:
+                return os.path.getsize(request.input_file)
+            except OSError:
+                return 0
+        return len(request.contents or "")
+    
+    def _task_input_size(self, task: ConversionTask) -> int:
+        """Return the size of a task's input, the announced size (or what was read) of a body."""
+        if task.body is not None:
+            return task.body.size or task.body.read_bytes
+        return self._input_size(task.request)
+    
+    @staticmethod
+    def _needs_spool(request: ConversionRequest) -> bool:
+        """Return True if the streamed input of a request has to be written to a file before converting it."""
+        if base_format(normalize_format(request.input_format, output=False)) in SEEKING_INPUT_FORMATS:
+            return True
+        # PDF builds parse the document before rendering it; targets are rendered from a single parse
+        return not request.targets and base_format(normalize_format(request.output_format)) == "pdf"
+    
+    def _body_input(self, task: ConversionTask) -> Dict[str, Any]:
+        """Return the engine arguments reading a task's body, spooling it to a file first if needed."""
+        if task.body.path is None and self._needs_spool(task.request):
+            task.body.spool()
+        return self._body_arguments(task)
+    
+    async def _abody_input(self, task: ConversionTask) -> Dict[str, Any]:
+        """Asyncio variant of _body_input."""
+        if task.body.path is None and self._needs_spool(task.request):
+            await task.body.aspool()
+        return self._body_arguments(task)
+    
+    @staticmethod
+    def _body_arguments(task: ConversionTask) -> Dict[str, Any]:
+        """Return the engine arguments for the body of a task, from its spool file once spooled."""
+        if task.body.path is not None:
+            return {"source": None, "input_file": task.body.path, "input_format": task.request.input_format}
+        return {"source": task.body, "input_file": None, "input_format": task.request.input_format}
+    
+    @staticmethod
+    def throughput_key(request: ConversionRequest) -> str:
+        """Return the key under which the throughput of a request's conversion is tracked."""
+        output_format = base_format(normalize_format(request.output_format))
+        if output_format == "pdf":
+            return f"pdf/{request.pdf_engine or 'auto'}"
+        return output_format
+    
+    def estimate(self, request: ConversionRequest) -> Optional[float]:
+        """Return the expected seconds for converting a request, None without history for its format."""
+        return self.throughput.estimate(self.throughput_key(request), self._input_size(request))
+    
+    def idle_timeout(self, request: ConversionRequest, eta: Optional[float] = None) -> float:
+        """
+        Return how many seconds a client should wait for the next event of a conversion.
+        
+        Args:
+            request: The conversion request, whose format and size give the expected duration.
+            eta: The remaining seconds reported by the running conversion, if any.
+        """
+        expected = [DEFAULT_IDLE_TIMEOUT]
+        estimate = self.estimate(request)
+        if estimate is not None:
+            expected.append(2 * estimate)
+        if eta is not None:
+            expected.append(2 * eta)
+        return max(expected)
+    
+    def _should_chunk(self, request: ConversionRequest) -> bool:
+        """Return True if a request is large enough and suitable for chunked conversion."""
+        if not self.chunk_threshold or self._input_size(request) < self.chunk_threshold:
+            return False
+        # Incremental conversions only render the changed blocks anyway
+        if request.document_id:
+            return False
+        if request.input_file and Path(request.input_file).suffix.lower() not in CHUNKED_FILE_FORMATS:
+            return False
+        return can_chunk(request.output_format, default_extra_args(request.output_format, request.pdf_engine))
+    
+    def check_admission(self) -> None:
+        """
+        Check whether a new task would be admitted.
+        
+        Raises:
+            QueueFullError: If the queue has reached its maximum depth.
+        """
+        with self._lock:
+            if self._queued < self.max_queue_depth:
+                return
+            self._rejected += 1
+        raise QueueFullError(
+            f"Conversion queue is full ({self.max_queue_depth} tasks waiting)",
+            self.retry_after()
+        )
+    
+    def retry_after(self) -> int:
+        """Estimate in seconds when a rejected client should retry, from the recent drain rate."""
+        with self._lock:
+            queued = self._queued
+            finish_times = list(self._finish_times)
+        if len(finish_times) < 2 or finish_times[-1] <= finish_times[0]:
+            return max(1, min(int(self.max_queue_wait), 30))
+        drain_rate = (len(finish_times) - 1) / (finish_times[-1] - finish_times[0])
+        return max(1, min(math.ceil((queued + 1) / drain_rate), 300))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, concurrency and admission counters."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "max_queue_depth": self.max_queue_depth,
+                "max_queue_wait": self.max_queue_wait,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "expired": self._expired,
+                "cancelled": self._cancelled,
+                "cancelled_running": self._cancelled_running,
+                "processes_killed": self._processes_killed,
+                "seconds_saved": round(self._seconds_saved, 1),
+                "limit_breaches": dict(self._limit_breaches),
+                "lanes": self.scheduler.stats(),
+                "throughput": self.throughput.stats(),
+            }
+    
+    def _begin_task(self, task: ConversionTask) -> None:
+        """
+        Move a task from the queue to the running set.
+        
+        Raises:
+            QueueTimeoutError: If the task waited longer than max_queue_wait.
+            ConversionCancelled: If the task was cancelled while it waited.
+        """
+        # The queue accounting of cancelled tasks is settled in _task_done
+        task.cancel_scope.check()
+        with self._lock:
+            submitted_at = self._submitted_at.pop(task.task_id, None)
+            if submitted_at is not None:
+                self._queued -= 1
+            waited = time.monotonic() - submitted_at if submitted_at is not None else 0.0
+            expired = waited > self.max_queue_wait
+            if expired:
+                self._expired += 1
+            else:
+                self._running += 1
+        if not expired:
+            self._loop.call_soon_threadsafe(self._start_wall_clock, task)
+        if expired:
+            message = f"Task waited {waited:.1f}s for a worker (limit {self.max_queue_wait:.0f}s)"
+            logger.warning(f"Dropping task {task.task_id}: {message}")
+            task.progress_callback(task.task_id, -1, f"Error: {message}")
+            raise QueueTimeoutError(message, self.retry_after())
+    
+    def _end_task(self) -> None:
+        """Record a finished task for the drain rate estimate."""
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+            self._finish_times.append(time.monotonic())
+    
+    def _run_admitted(self, task: ConversionTask) -> str:
+        """Run a conversion in a worker thread with admission accounting."""
+        self._begin_task(task)
+        try:
+            return self._process_conversion(task)
+        finally:
+            self._end_task()
+    
+    async def _run_admitted_async(self, task: ConversionTask) -> str:
+        """Run a conversion on the event loop with admission accounting."""
+        self._begin_task(task)
+        try:
+            return await self._process_conversion_async(task)
+        finally:
+            self._end_task()
+    
+    def _run_in_lane(
+        self,
+        lane: str,
+        fn: Callable[..., Any],
+        async_fn: Callable[..., Awaitable[Any]],
+        *args: Any
+    ) -> Awaitable[Any]:
+        """Run fn on a lane thread, or async_fn on the event loop in asyncio mode."""
+        if self.mode == MODE_ASYNCIO:
+            return self.scheduler.run_async(lane, async_fn, *args)
+        # The thread runs in a copy of this context, so it sees the task's cancel scope
+        context = contextvars.copy_context()
+        return asyncio.wrap_future(self.scheduler.submit(lane, context.run, fn, *args))
+    
+    async def run_batch(
+        self,
+        requests: List[ConversionRequest],
+        concurrency: int = 4,
+        batch_id: str = "batch"
+    ) -> AsyncIterator[BatchItemResult]:
+        """
+        Run a batch of conversions and yield the results in completion order.
+        
+        At most ``concurrency`` items of the batch are in the pool at a time.
+        A failing item is reported as such and does not abort the batch.
+        
+        Args:
+            requests: The conversion requests of the batch.
+            concurrency: Maximum number of items converted at the same time.
+            batch_id: Prefix for the task IDs of the items.
+            
+        Yields:
+            One result per item, as soon as the item finishes.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_item(index: int, request: ConversionRequest) -> BatchItemResult:
+            async with semaphore:
+                start_time = time.monotonic()
+                task = ConversionTask(
+                    request=request,
+                    task_id=f"{batch_id}-{index}",
+                    progress_callback=lambda task_id, percentage, message: None
+                )
+                try:
+                    result = await (await self.submit_task(task))
+                    return BatchItemResult(index, "complete", time.monotonic() - start_time, result=result)
+                except Exception as e:
+                    return BatchItemResult(index, "error", time.monotonic() - start_time, error=str(e))
+        
+        items = [asyncio.ensure_future(run_item(i, r)) for i, r in enumerate(requests)]
+        try:
+            for next_done in asyncio.as_completed(items):
+                yield await next_done
+        finally:
+            # A batch whose results are no longer read stops converting
+            for index, item in enumerate(items):
+                if not item.done():
+                    self.cancel(f"{batch_id}-{index}", "batch cancelled")
+                    item.cancel()
     
     def _process_conversion(self, task: ConversionTask) -> str:
         """
@@ -98,118 +724,634 @@ class WorkerPool:
             # Update progress: Starting
             progress_callback(task_id, 0, "Starting conversion process")
             
-            # Prepare extra arguments for pandoc
-            extra_args = []
-            
-            # Configure PDF-specific options if needed
-            if request.output_format == "pdf":
-                extra_args.extend([
-                    "--pdf-engine=xelatex",
-                    "-V", "geometry:margin=1in"
-                ])
+            # Prepare extra arguments for pandoc (PDF engine and geometry)
+            extra_args = default_extra_args(request.output_format, request.pdf_engine)
+            # Filled by the engine for PDF builds (engine used, LaTeX passes)
+            report: Dict[str, Any] = {}
+            # Receives the progress the engine parses from pandoc and LaTeX output
+            reporter = _ProgressReporter(task, self.estimate(request))
             
             # Update progress: Preparing
             progress_callback(task_id, 25, "Preparing document for conversion")
             
-            # Case 1: Convert from file to file
-            if request.input_file and request.output_file:
-                if not os.path.exists(request.input_file):
-                    raise ValueError(f"Input file not found: {request.input_file}")
-                
-                # Ensure output directory exists
+            # Ensure output directory exists
+            if request.output_file:
                 output_dir = os.path.dirname(request.output_file)
                 if output_dir and not os.path.exists(output_dir):
                     os.makedirs(output_dir)
+            
+            if request.input_file:
+                if not os.path.exists(request.input_file):
+                    raise ValueError(f"Input file not found: {request.input_file}")
                 
                 # Update progress: Converting
                 progress_callback(task_id, 50, f"Converting {request.input_file} to {request.output_format}")
                 
-                pypandoc.convert_file(
-                    request.input_file,
-                    request.output_format,
-                    outputfile=request.output_file,
-                    extra_args=extra_args
+                # The input format is inferred from the file extension
+                result = self.engine.convert(
+                    input_file=request.input_file,
+                    input_format=None,
+                    output_format=request.output_format,
+                    output_file=request.output_file,
+                    extra_args=extra_args,
+                    report=report,
+                    document_id=request.document_id,
+                    progress=reporter
                 )
+            elif task.body is not None:
+                # Update progress: Converting
+                progress_callback(task_id, 50, f"Converting request body to {request.output_format}")
                 
-                # Update progress: Finalizing
-                progress_callback(task_id, 75, "Finalizing conversion")
+                # The body is piped to pandoc's stdin while it is received
+                result = self.engine.convert(
+                    **self._body_input(task),
+                    output_format=request.output_format,
+                    output_file=request.output_file,
+                    extra_args=extra_args,
+                    report=report,
+                    document_id=request.document_id,
+                    progress=reporter
+                )
+            elif request.document_id and request.output_format in INCREMENTAL_FORMATS:
+                # Update progress: Converting
+                progress_callback(task_id, 50, f"Converting changed blocks of {request.document_id}")
                 
-                result = f"Content successfully converted and saved to: {request.output_file}"
+                result = self._finish_incremental(task, self.incremental.convert(
+                    request.document_id,
+                    request.contents,
+                    input_format=request.input_format,
+                    output_format=request.output_format,
+                    extra_args=extra_args
+                ))
+            else:
+                # Update progress: Converting
+                progress_callback(task_id, 50, f"Converting content to {request.output_format}")
                 
-            # Case 2: Convert from file to string
-            elif request.input_file:
+                # Content is piped to pandoc's stdin, no temporary input file needed
+                result = self.engine.convert(
+                    request.contents,
+                    input_format=request.input_format,
+                    output_format=request.output_format,
+                    output_file=request.output_file,
+                    extra_args=extra_args,
+                    report=report,
+                    document_id=request.document_id,
+                    progress=reporter
+                )
+            
+            reporter.finish(self.throughput, self.throughput_key(request), self._task_input_size(task))
+            if request.output_file:
+                result = self._saved_message(task, request.output_file, task.info)
+            if report:
+                task.info["pdf"] = report
+            
+            # Update progress: Finalizing
+            progress_callback(task_id, 75, self._finalizing_message(task))
+            
+            # Update progress: Complete (the message carries the result)
+            progress_callback(task_id, 100, result)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error in task {task_id}: {str(e)}")
+            # Report the error through the callback; cancelled tasks have already reported theirs
+            if not task.cancel_scope.cancelled:
+                progress_callback(task_id, -1, f"Error: {str(e)}")
+            raise ValueError(f"Error during conversion: {str(e)}")
+    
+    async def _process_conversion_async(self, task: ConversionTask) -> str:
+        """
+        Process a document conversion task on the event loop.
+        
+        Same progress updates, result and errors as _process_conversion.
+        """
+        request = task.request
+        task_id = task.task_id
+        progress_callback = task.progress_callback
+        
+        try:
+            progress_callback(task_id, 0, "Starting conversion process")
+            extra_args = default_extra_args(request.output_format, request.pdf_engine)
+            # Filled by the engine for PDF builds (engine used, LaTeX passes)
+            report: Dict[str, Any] = {}
+            reporter = _ProgressReporter(task, self.estimate(request))
+            progress_callback(task_id, 25, "Preparing document for conversion")
+            
+            if request.output_file:
+                output_dir = os.path.dirname(request.output_file)
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+            
+            if request.input_file:
                 if not os.path.exists(request.input_file):
                     raise ValueError(f"Input file not found: {request.input_file}")
-                
-                # Update progress: Converting
                 progress_callback(task_id, 50, f"Converting {request.input_file} to {request.output_format}")
-                
-                result = pypandoc.convert_file(
-                    request.input_file,
-                    request.output_format,
-                    extra_args=extra_args
+                result = await self.engine.aconvert(
+                    input_file=request.input_file,
+                    input_format=None,
+                    output_format=request.output_format,
+                    output_file=request.output_file,
+                    extra_args=extra_args,
+                    report=report,
+                    document_id=request.document_id,
+                    progress=reporter
                 )
-                
-                # Update progress: Finalizing
-                progress_callback(task_id, 75, "Finalizing conversion")
-                
-            # Case 3: Convert from string to file
-            elif request.contents and request.output_file:
-                # Create a temporary file for the input content
-                with tempfile.NamedTemporaryFile(mode="w", suffix=f".{request.input_format}", delete=False) as temp:
-                    temp.write(request.contents)
-                    temp_path = temp.name
-                
-                try:
-                    # Ensure output directory exists
-                    output_dir = os.path.dirname(request.output_file)
-                    if output_dir and not os.path.exists(output_dir):
-                        os.makedirs(output_dir)
-                    
-                    # Update progress: Converting
-                    progress_callback(task_id, 50, f"Converting content to {request.output_format}")
-                    
-                    pypandoc.convert_file(
-                        temp_path,
-                        request.output_format,
-                        outputfile=request.output_file,
-                        extra_args=extra_args
-                    )
-                    
-                    # Update progress: Finalizing
-                    progress_callback(task_id, 75, "Finalizing conversion")
-                    
-                    result = f"Content successfully converted and saved to: {request.output_file}"
-                finally:
-                    # Clean up the temporary file
-                    if os.path.exists(temp_path):
-                        os.unlink(temp_path)
-                
-            # Case 4: Convert from string to string
+            elif task.body is not None:
+                progress_callback(task_id, 50, f"Converting request body to {request.output_format}")
+                result = await self.engine.aconvert(
+                    **await self._abody_input(task),
+                    output_format=request.output_format,
+                    output_file=request.output_file,
+                    extra_args=extra_args,
+                    report=report,
+                    document_id=request.document_id,
+                    progress=reporter
+                )
+            elif request.document_id and request.output_format in INCREMENTAL_FORMATS:
+                progress_callback(task_id, 50, f"Converting changed blocks of {request.document_id}")
+                result = self._finish_incremental(task, await self.incremental.aconvert(
+                    request.document_id,
+                    request.contents,
+                    input_format=request.input_format,
+                    output_format=request.output_format,
+                    extra_args=extra_args
+                ))
             else:
-                # Update progress: Converting
                 progress_callback(task_id, 50, f"Converting content to {request.output_format}")
-                
-                result = pypandoc.convert_text(
+                result = await self.engine.aconvert(
                     request.contents,
+                    input_format=request.input_format,
+                    output_format=request.output_format,
+                    output_file=request.output_file,
+                    extra_args=extra_args,
+                    report=report,
+                    document_id=request.document_id,
+                    progress=reporter
+                )
+            
+            reporter.finish(self.throughput, self.throughput_key(request), self._task_input_size(task))
+            if request.output_file:
+                result = self._saved_message(task, request.output_file, task.info)
+            if report:
+                task.info["pdf"] = report
+            
+            progress_callback(task_id, 75, self._finalizing_message(task))
+            progress_callback(task_id, 100, result)
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error in task {task_id}: {str(e)}")
+            # Report the error through the callback; cancelled tasks have already reported theirs
+            if not task.cancel_scope.cancelled:
+                progress_callback(task_id, -1, f"Error: {str(e)}")
+            raise ValueError(f"Error during conversion: {str(e)}")
+    
+    @staticmethod
+    def _finish_incremental(task: ConversionTask, incremental: IncrementalResult) -> str:
+        """Record the block reuse of an incremental conversion and write its output file."""
+        task.info["incremental"] = incremental.stats()
+        if task.request.output_file:
+            Path(task.request.output_file).write_text(incremental.output, encoding="utf-8")
+        return incremental.output
+    
+    def _reserve_artifacts(self, task: ConversionTask) -> None:
+        """Point the outputs a request wants as artifacts at reserved files of the artifact store."""
+        request = task.request
+        if request.artifact:
+            artifact = self.artifact_store.reserve(request.output_format)
+            task.artifacts[artifact.path] = artifact
+            task.request = request.copy(update={"output_file": artifact.path})
+        elif request.targets and any(target.artifact for target in request.targets):
+            targets = []
+            for target in request.targets:
+                if target.artifact:
+                    artifact = self.artifact_store.reserve(target.output_format)
+                    task.artifacts[artifact.path] = artifact
+                    target = target.copy(update={"output_file": artifact.path})
+                targets.append(target)
+            task.request = request.copy(update={"targets": targets})
+    
+    def _saved_message(self, task: ConversionTask, output_file: str, info: Dict[str, Any]) -> str:
+        """
+        Return the result of an output written to a file.
+        
+        An artifact is committed instead and its reference added to info,
+        so its path on the server is not reported.
+        """
+        artifact = task.artifacts.get(output_file)
+        if artifact is None:
+            return f"Content successfully converted and saved to: {output_file}"
+        self.artifact_store.commit(artifact)
+        info["artifact"] = artifact.reference()
+        return f"Content successfully converted, download it from {artifact.url}"
+    
+    @staticmethod
+    def _finalizing_message(task: ConversionTask) -> str:
+        """Return the progress message before completion, with the block reuse if any."""
+        incremental = task.info.get("incremental")
+        if incremental:
+            return f"Finalizing conversion (reused {incremental['reused']} of {incremental['blocks']} blocks)"
+        pdf = task.info.get("pdf")
+        if pdf and "latex_passes" in pdf:
+            return f"Finalizing conversion (PDF engine {pdf['pdf_engine']}, {pdf['latex_passes']} LaTeX passes)"
+        if pdf:
+            return f"Finalizing conversion (PDF engine {pdf['pdf_engine']})"
+        return "Finalizing conversion"
+    
+    async def _process_multi_conversion(self, task: ConversionTask) -> List[Dict[str, Any]]:
+        """
+        Process a multi-target conversion task.
+        
+        The input is parsed once into pandoc's JSON AST, then every target is
+        rendered from the AST in parallel, each in the lane of its output format.
+        
+        Args:
+            task: The conversion task to process.
+            
+        Returns:
+            One result entry per target, in request order.
+            
+        Raises:
+            ValueError: If the input cannot be parsed or every target failed.
+        """
+        request = task.request
+        task_id = task.task_id
+        progress_callback = task.progress_callback
+        
+        self._begin_task(task)
+        try:
+            progress_callback(task_id, 0, "Starting conversion process")
+            
+            if request.input_file and not os.path.exists(request.input_file):
+                raise ValueError(f"Input file not found: {request.input_file}")
+            
+            progress_callback(task_id, 25, "Parsing input into pandoc AST")
+            if task.body is not None:
+                # Parsed once from the stream, or from its spool file for formats that need seeking
+                arguments = await self._abody_input(task)
+                ast = await self._run_in_lane(
+                    self.lane_for(request, "json", self._task_input_size(task)),
+                    functools.partial(self.engine.parse, **arguments),
+                    functools.partial(self.engine.aparse, **arguments)
+                )
+            else:
+                ast = await self._run_in_lane(
+                    self.lane_for(request, "json"), self._parse_input, self._parse_input_async, request
+                )
+            
+            targets = request.targets
+            progress_callback(task_id, 50, f"Rendering {len(targets)} targets")
+            reports: List[Dict[str, Any]] = [{} for _ in targets]
+            renders = {
+                asyncio.ensure_future(
+                    self._run_in_lane(
+                        self.lane_for(request, target.output_format),
+                        self._render_target,
+                        self._render_target_async,
+                        ast,
+                        target,
+                        request.pdf_engine,
+                        reports[index]
+                    )
+                ): index
+                for index, target in enumerate(targets)
+            }
+            for index, target in enumerate(targets):
+                self._report_target(task, index, 0, f"Rendering {target.output_format}")
+            
+            results: List[Dict[str, Any]] = [{} for _ in targets]
+            pending = set(renders)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    index = renders[future]
+                    target = targets[index]
+                    entry = {"output_format": target.output_format, "output_file": target.output_file}
+                    try:
+                        entry.update(status="complete", result=future.result(), **reports[index])
+                        if target.output_file in task.artifacts:
+                            # The path in the artifact store stays private
+                            entry["output_file"] = None
+                            entry["result"] = self._saved_message(task, target.output_file, entry)
+                        self._report_target(task, index, 100, entry["result"])
+                    except Exception as e:
+                        logger.error(f"Error in task {task_id}, target {index}: {str(e)}")
+                        entry.update(status="error", error=str(e))
+                        self._report_target(task, index, -1, str(e))
+                    results[index] = entry
+            
+            if all(entry["status"] == "error" for entry in results):
+                raise ValueError("All targets failed: " + "; ".join(entry["error"] for entry in results))
+            
+            progress_callback(task_id, 75, "Finalizing conversion")
+            progress_callback(task_id, 100, results)
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error in task {task_id}: {str(e)}")
+            # Report the error through the callback; cancelled tasks have already reported theirs
+            if not task.cancel_scope.cancelled:
+                progress_callback(task_id, -1, f"Error: {str(e)}")
+            raise ValueError(f"Error during conversion: {str(e)}")
+        finally:
+            self._end_task()
+    
+    async def _process_chunked_conversion(self, task: ConversionTask) -> str:
+        """
+        Process a large text conversion as chunks converted in parallel.
+        
+        Markdown is split at its top-level headings; other inputs, and
+        markdown that cannot be split safely as text, are parsed once and
+        the AST is split instead. The chunks run in the scheduler lanes and
+        their outputs are joined in order.
+        
+        Args:
+            task: The conversion task to process.
+            
+        Returns:
+            The conversion result or output file message.
+            
+        Raises:
+            ValueError: If there is an error during conversion.
+        """
+        request = task.request
+        task_id = task.task_id
+        progress_callback = task.progress_callback
+        
+        self._begin_task(task)
+        try:
+            progress_callback(task_id, 0, "Starting conversion process")
+            
+            if request.input_file:
+                if not os.path.exists(request.input_file):
+                    raise ValueError(f"Input file not found: {request.input_file}")
+                source = await asyncio.to_thread(Path(request.input_file).read_text, encoding="utf-8")
+                input_format = CHUNKED_FILE_FORMATS[Path(request.input_file).suffix.lower()]
+            else:
+                source = request.contents
+                input_format = request.input_format
+            
+            progress_callback(task_id, 25, "Splitting document into chunks")
+            parts = max(2, self.scheduler.lane_workers[LANE_TEXT])
+            chunks = None
+            chunk_format = input_format
+            if base_format(normalize_format(input_format, output=False)) in MARKDOWN_INPUT_FORMATS:
+                chunks = split_markdown(source, parts, request.output_format)
+            if chunks is None:
+                ast = await self._run_in_lane(
+                    self.lane_for(request, "json"), self.engine.parse, self.engine.aparse, source, input_format
+                )
+                chunks = split_ast(ast, parts, request.output_format)
+                chunk_format = "json"
+            
+            progress_callback(task_id, 50, f"Converting {len(chunks)} chunks in parallel")
+            use_server = self.engine.server_pool is not None
+            outputs = await asyncio.gather(*[
+                self._run_in_lane(
+                    classify(request.output_format, len(chunk), use_server),
+                    self.engine.convert,
+                    self.engine.aconvert,
+                    chunk,
                     request.output_format,
-                    format=request.input_format,
-                    extra_args=extra_args
+                    chunk_format
                 )
-                
-                # Update progress: Finalizing
-                progress_callback(task_id, 75, "Finalizing conversion")
+                for chunk in chunks
+            ])
+            result = join_chunks(outputs, request.output_format, chunks if chunk_format == "json" else ())
             
-            # Update progress: Complete
-            progress_callback(task_id, 100, "Conversion complete")
+            if request.output_file:
+                output_dir = os.path.dirname(request.output_file)
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+                await asyncio.to_thread(Path(request.output_file).write_text, result, encoding="utf-8")
+                result = self._saved_message(task, request.output_file, task.info)
             
+            progress_callback(task_id, 75, "Finalizing conversion")
+            progress_callback(task_id, 100, result)
             return result
+        
+        except Exception as e:
+            logger.error(f"Error in task {task_id}: {str(e)}")
+            # Report the error through the callback; cancelled tasks have already reported theirs
+            if not task.cancel_scope.cancelled:
+                progress_callback(task_id, -1, f"Error: {str(e)}")
+            raise ValueError(f"Error during conversion: {str(e)}")
+        finally:
+            self._end_task()
+    
+    async def _process_streaming_conversion(self, task: ConversionTask) -> str:
+        """
+        Process a text conversion whose output is emitted through the chunk callback.
+        
+        Large inputs that can be cut at their headings are converted in
+        sections on the scheduler lanes; every section is emitted as soon as
+        it and all sections before it are done. Other inputs stream pandoc's
+        stdout while it is written. The length and checksum of the streamed
+        text are put in task.info["stream"].
+        
+        Args:
+            task: The conversion task to process.
+            
+        Returns:
+            An empty string, the output went to the chunk callback.
+            
+        Raises:
+            ValueError: If there is an error during conversion.
+        """
+        request = task.request
+        task_id = task.task_id
+        progress_callback = task.progress_callback
+        emitter = _ChunkEmitter(task, self.stream_chunk_size)
+        
+        self._begin_task(task)
+        try:
+            progress_callback(task_id, 0, "Starting conversion process")
+            if request.input_file and not os.path.exists(request.input_file):
+                raise ValueError(f"Input file not found: {request.input_file}")
+            
+            progress_callback(task_id, 25, "Preparing document for streaming")
+            # A streamed body cannot be split, pandoc converts it in one piece
+            sections = await self._stream_sections(request) if task.body is None else None
+            if sections is None or len(sections[0]) == 1:
+                progress_callback(task_id, 50, f"Streaming {request.output_format} output")
+                arguments = self._stream_arguments(request)
+                if task.body is not None:
+                    arguments.update(await self._abody_input(task))
+                if sections is not None:
+                    # Already parsed, stream the render of the AST
+                    arguments.update(source=sections[0][0], input_file=None, input_format=sections[1])
+                await self._run_in_lane(
+                    self.lane_for(request, request.output_format, self._task_input_size(task)),
+                    self._stream_whole,
+                    self._stream_whole_async,
+                    arguments,
+                    emitter
+                )
+            else:
+                chunks, chunk_format = sections
+                progress_callback(task_id, 50, f"Streaming {len(chunks)} sections")
+                await self._stream_sectioned(request, chunks, chunk_format, emitter)
             
+            task.info["stream"] = emitter.summary()
+            progress_callback(task_id, 75, f"Finalizing conversion ({emitter.chunks} chunks streamed)")
+            progress_callback(task_id, 100, "")
+            return ""
+        
         except Exception as e:
             logger.error(f"Error in task {task_id}: {str(e)}")
-            # Report the error through the callback
-            progress_callback(task_id, -1, f"Error: {str(e)}")
+            # Report the error through the callback; cancelled tasks have already reported theirs
+            if not task.cancel_scope.cancelled:
+                progress_callback(task_id, -1, f"Error: {str(e)}")
             raise ValueError(f"Error during conversion: {str(e)}")
+        finally:
+            self._end_task()
+    
+    async def _stream_sections(self, request: ConversionRequest) -> Optional[Tuple[List[str], str]]:
+        """Split a large streamed input into sections, returning (chunks, chunk_format) or None if it is small."""
+        if self._input_size(request) < 2 * STREAM_SECTION_SIZE:
+            return None
+        if request.input_file and Path(request.input_file).suffix.lower() not in CHUNKED_FILE_FORMATS:
+            return None
+        if not can_chunk(request.output_format):
+            return None
+        
+        if request.input_file:
+            source = await asyncio.to_thread(Path(request.input_file).read_text, encoding="utf-8")
+            input_format = CHUNKED_FILE_FORMATS[Path(request.input_file).suffix.lower()]
+        else:
+            source = request.contents
+            input_format = request.input_format
+        parts = min(STREAM_MAX_SECTIONS, math.ceil(len(source) / STREAM_SECTION_SIZE))
+        if base_format(normalize_format(input_format, output=False)) in MARKDOWN_INPUT_FORMATS:
+            chunks = split_markdown(source, parts, request.output_format)
+            if chunks is not None:
+                return chunks, input_format
+        ast = await self._run_in_lane(
+            self.lane_for(request, "json"), self.engine.parse, self.engine.aparse, source, input_format
+        )
+        # A single part (no top-level headings) is streamed from one render
+        return split_ast(ast, parts, request.output_format), "json"
+    
+    async def _stream_sectioned(
+        self,
+        request: ConversionRequest,
+        chunks: List[str],
+        chunk_format: str,
+        emitter: _ChunkEmitter
+    ) -> None:
+        """Convert sections in parallel and emit their outputs in document order, joined like join_chunks."""
+        use_server = self.engine.server_pool is not None
+        is_html = base_format(normalize_format(request.output_format)).startswith("html")
+        futures = [
+            asyncio.ensure_future(self._run_in_lane(
+                classify(request.output_format, len(chunk), use_server),
+                self.engine.convert,
+                self.engine.aconvert,
+                chunk,
+                request.output_format,
+                chunk_format
+            ))
+            for chunk in chunks
+        ]
+        try:
+            offset = 0
+            for index, (chunk, future) in enumerate(zip(chunks, futures)):
+                output = await future
+                if is_html:
+                    emitter.emit(renumber_code_blocks(output, offset))
+                    if chunk_format == "json":
+                        offset += count_anonymous_code_blocks(chunk)
+                else:
+                    emitter.emit(output if index == 0 else "\n" + output)
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def _stream_whole(self, arguments: Dict[str, Any], emitter: _ChunkEmitter) -> None:
+        """Stream the output of a single pandoc process in a worker thread."""
+        for text in self.engine.stream(**arguments):
+            emitter.emit(text)
+    
+    async def _stream_whole_async(self, arguments: Dict[str, Any], emitter: _ChunkEmitter) -> None:
+        """Asyncio variant of _stream_whole."""
+        async for text in self.engine.astream(**arguments):
+            emitter.emit(text)
+    
+    def _stream_arguments(self, request: ConversionRequest) -> Dict[str, Any]:
+        """Return the engine.stream arguments of a request, reading pandoc's output in chunk-sized pieces."""
+        return {
+            "source": request.contents,
+            "input_file": request.input_file,
+            # The input format of files is inferred from their extension
+            "input_format": None if request.input_file else request.input_format,
+            "output_format": request.output_format,
+            "chunk_size": self.stream_chunk_size,
+        }
+    
+    def _parse_input(self, request: ConversionRequest) -> str:
+        """Parse the request input into pandoc's JSON AST."""
+        if request.input_file:
+            # The input format is inferred from the file extension
+            return self.engine.parse(input_file=request.input_file, input_format=None)
+        return self.engine.parse(request.contents, input_format=request.input_format)
+    
+    def _render_target(
+        self,
+        ast: str,
+        target: ConversionTarget,
+        pdf_engine: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Render one target of a multi-target conversion from the parsed AST, filling in the PDF report."""
+        if target.output_file:
+            output_dir = os.path.dirname(target.output_file)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+        result = self.engine.render(
+            ast,
+            target.output_format,
+            output_file=target.output_file,
+            extra_args=default_extra_args(target.output_format, pdf_engine),
+            report=report
+        )
+        if target.output_file:
+            return f"Content successfully converted and saved to: {target.output_file}"
+        return result
+    
+    async def _parse_input_async(self, request: ConversionRequest) -> str:
+        """Asyncio variant of _parse_input."""
+        if request.input_file:
+            return await self.engine.aparse(input_file=request.input_file, input_format=None)
+        return await self.engine.aparse(request.contents, input_format=request.input_format)
+    
+    async def _render_target_async(
+        self,
+        ast: str,
+        target: ConversionTarget,
+        pdf_engine: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Asyncio variant of _render_target."""
+        if target.output_file:
+            output_dir = os.path.dirname(target.output_file)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+        result = await self.engine.arender(
+            ast,
+            target.output_format,
+            output_file=target.output_file,
+            extra_args=default_extra_args(target.output_format, pdf_engine),
+            report=report
+        )
+        if target.output_file:
+            return f"Content successfully converted and saved to: {target.output_file}"
+        return result
+    
+    def _report_target(self, task: ConversionTask, index: int, percentage: int, message: str) -> None:
+        """Forward a per-target update to the task's target callback, if any."""
+        if task.target_callback is not None:
+            task.target_callback(task.task_id, index, percentage, message)
     
     def _task_done(self, task_id: str, future: asyncio.Future) -> None:
         """
@@ -223,23 +1365,55 @@ class WorkerPool:
         if task_id in self.tasks:
             del self.tasks[task_id]
             logger.info(f"Task {task_id} completed and removed from pool")
+        job = self._jobs.pop(task_id, None)
+        if job is not None and job[0].body is not None:
+            # Deletes the spool file and stops reading a body the conversion did not consume
+            job[0].body.close()
+        if job is not None:
+            # Outputs of failed or cancelled conversions are never committed
+            for artifact in job[0].artifacts.values():
+                if not artifact.ready:
+                    self.artifact_store.discard(artifact)
+        wall_clock = self._wall_clocks.pop(task_id, None)
+        if wall_clock is not None:
+            wall_clock.cancel()
+        # Tasks cancelled before they started never left the queue
+        with self._lock:
+            if self._submitted_at.pop(task_id, None) is not None:
+                self._queued -= 1
         
         # Check for exceptions
-        if future.exception():
+        if future.cancelled():
+            logger.info(f"Task {task_id} was cancelled")
+        elif future.exception():
             logger.error(f"Task {task_id} failed with error: {future.exception()}")
+            breach = limit_breach(future.exception())
+            if breach is not None:
+                self._count_breach(breach.limit)
     
     async def shutdown(self) -> None:
         """Shutdown the worker pool and wait for all tasks to complete."""
         logger.info("Shutting down worker pool")
-        # Cancel all pending tasks
+        # Kill the processes of running tasks and cancel all pending ones
+        for task_id in list(self._jobs):
+            self.cancel(task_id, "worker pool shut down")
         for task_id, future in self.tasks.items():
             if not future.done():
                 future.cancel()
         
-        # Shutdown the executor
-        self.executor.shutdown(wait=True)
+        # Shutdown the thread pools of all lanes
+        self.scheduler.shutdown(wait=True)
         logger.info("Worker pool shutdown complete")
 
 
 # Global worker pool instance
-worker_pool = WorkerPool()
+worker_pool = WorkerPool(
+    max_workers=int(os.environ.get("MAX_WORKERS", "4")),
+    max_queue_depth=int(os.environ.get("MAX_QUEUE_DEPTH", "64")),
+    max_queue_wait=float(os.environ.get("MAX_QUEUE_WAIT", "60")),
+    lane_workers=lane_workers_from_env(int(os.environ.get("MAX_WORKERS", "4"))),
+    mode=os.environ.get("WORKER_MODE", MODE_THREAD),
+    chunk_threshold=int(os.environ.get("CHUNK_THRESHOLD", str(DEFAULT_CHUNK_THRESHOLD))),
+    stream_chunk_size=int(os.environ.get("STREAM_CHUNK_SIZE", str(DEFAULT_STREAM_CHUNK_SIZE))),
+    limits=lane_limits_from_env(),
+)
@@ -0,0 +1,97 @@
+"""
+Test suite for admission control of the worker pool.
+"""
+
+import asyncio
+from typing import List, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import (ConversionTask, QueueFullError,
+                                    QueueTimeoutError, WorkerPool, worker_pool)
+
+
+def make_task(task_id: str, updates: Optional[List[int]] = None) -> ConversionTask:
+    """Create a small markdown to HTML task that records its progress updates."""
+    updates = updates if updates is not None else []
+    return ConversionTask(
+        request=ConversionRequest(contents="# Queued", output_format="html"),
+        task_id=task_id,
+        progress_callback=lambda task_id, percentage, message: updates.append(percentage)
+    )
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_task() -> None:
+    """Test that a task is rejected with a retry hint once the queue is full."""
+    pool = WorkerPool(max_workers=1, max_queue_depth=0)
+    try:
+        with pytest.raises(QueueFullError) as exc_info:
+            await pool.submit_task(make_task("rejected"))
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.retry_after >= 1
+        assert pool.stats()["rejected"] == 1
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stale_task_is_dropped() -> None:
+    """Test that a task that waited longer than max_queue_wait is not converted."""
+    pool = WorkerPool(max_workers=1, max_queue_wait=-1)
+    updates = []
+    try:
+        future = await pool.submit_task(make_task("stale", updates))
+        with pytest.raises(QueueTimeoutError):
+            await future
+        assert updates == [-1]
+        stats = pool.stats()
+        assert stats["expired"] == 1
+        assert stats["queued"] == 0
+        assert stats["running"] == 0
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_accounting_after_completion() -> None:
+    """Test that queue and running counters return to zero after the tasks finish."""
+    pool = WorkerPool(max_workers=2, max_queue_depth=8)
+    try:
+        futures = [await pool.submit_task(make_task(f"task-{i}")) for i in range(4)]
+        results = await asyncio.gather(*futures)
+        assert all("<h1" in result for result in results)
+        stats = pool.stats()
+        assert stats["completed"] == 4
+        assert stats["queued"] == 0
+        assert stats["running"] == 0
+        assert pool.retry_after() >= 1
+    finally:
+        await pool.shutdown()
+
+
+def test_convert_endpoint_returns_429(test_client: TestClient, monkeypatch) -> None:
+    """Test that /convert answers 429 with Retry-After while the queue is full."""
+    monkeypatch.setattr(worker_pool, "max_queue_depth", 0)
+
+    response = test_client.post("/convert", json={"contents": "# Test", "output_format": "html"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["status"] == "error"
+
+    ready = test_client.get("/ready")
+    assert ready.status_code == 503
+    assert ready.json()["ready"] is False
+
+
+def test_ready_and_stats(test_client: TestClient) -> None:
+    """Test the readiness probe and the queue statistics."""
+    response = test_client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+
+    queue = test_client.get("/stats").json()["queue"]
+    assert queue["max_queue_depth"] == worker_pool.max_queue_depth
+    assert queue["queued"] >= 0
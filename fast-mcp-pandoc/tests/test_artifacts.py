@@ -0,0 +1,220 @@
+"""
+Test suite for conversion outputs stored as artifacts and downloaded by reference.
+"""
+
+import asyncio
+import threading
+import time
+import zipfile
+from io import BytesIO
+from typing import Any, Dict, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from fast_mcp_pandoc.models import ConversionRequest, ConversionTarget
+from fast_mcp_pandoc.server import worker_pool
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool
+from mcp_pandoc import server as stdio_server
+from mcp_pandoc.artifacts import ArtifactStore
+from mcp_pandoc.engine import PandocEngine
+
+SOURCE = "# Report\n\nA document stored as **artifact**.\n"
+
+
+@pytest.fixture
+def store(tmp_path: Any) -> ArtifactStore:
+    """Create an artifact store in a temporary directory."""
+    return ArtifactStore(directory=str(tmp_path / "artifacts"), ttl=60)
+
+
+@pytest.fixture
+def server_store(store: ArtifactStore, monkeypatch: pytest.MonkeyPatch) -> Iterator[ArtifactStore]:
+    """Use the temporary store for the server's worker pool and the stdio server."""
+    monkeypatch.setattr(worker_pool, "_artifact_store", store)
+    monkeypatch.setattr(stdio_server, "get_artifact_store", lambda: store)
+    yield store
+
+
+def write(store: ArtifactStore, data: bytes, output_format: str = "pdf") -> Any:
+    """Store data as committed artifact."""
+    artifact = store.reserve(output_format)
+    with open(artifact.path, "wb") as f:
+        f.write(data)
+    return store.commit(artifact)
+
+
+def test_store_expires_and_evicts(tmp_path: Any) -> None:
+    """Test TTL expiry, size-based eviction and discarded reservations."""
+    store = ArtifactStore(directory=str(tmp_path), ttl=60, max_mb=1)
+    first = write(store, b"x" * 600 * 1024)
+    second = write(store, b"y" * 600 * 1024)
+    # The oldest artifact makes room for the newest
+    assert store.get(first.artifact_id) is None and store.get(second.artifact_id) is second
+    assert store.read(second.artifact_id, 10, 5) == b"yyyyy"
+
+    reserved = store.reserve("docx")
+    store.discard(reserved)
+    second.expires_at = time.time() - 1
+    store.sweep()
+    assert store.list() == [] and list(tmp_path.iterdir()) == []
+    assert store.stats()["evicted"] == 1 and store.stats()["expired"] == 1
+
+
+def test_artifact_validation() -> None:
+    """Test that artifacts replace output_file and do not mix with it, targets or streaming."""
+    assert ConversionRequest(contents="x", output_format="docx", artifact=True).output_file is None
+    assert ConversionTarget(output_format="pdf", artifact=True).output_file is None
+    with pytest.raises(ValidationError):
+        ConversionRequest(contents="x", output_format="docx", output_file="a.docx", artifact=True)
+    with pytest.raises(ValidationError):
+        ConversionRequest(contents="x", artifact=True, targets=[ConversionTarget(output_format="html")])
+    with pytest.raises(ValidationError):
+        ConversionRequest(contents="x", output_format="html", artifact=True, stream=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_stores_artifacts(store: ArtifactStore, mode: str) -> None:
+    """Test that single and multi-target outputs are committed and reported by reference only."""
+    pool = WorkerPool(max_workers=2, engine=PandocEngine(), mode=mode, artifact_store=store)
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(contents=SOURCE, output_format="docx", artifact=True),
+            task_id="artifact",
+            progress_callback=lambda task_id, percentage, message: None,
+        )
+        result = await (await pool.submit_task(task))
+        multi = ConversionTask(
+            request=ConversionRequest(contents=SOURCE, targets=[
+                ConversionTarget(output_format="html"),
+                ConversionTarget(output_format="epub", artifact=True),
+            ]),
+            task_id="targets",
+            progress_callback=lambda task_id, percentage, message: None,
+        )
+        entries = await (await pool.submit_task(multi))
+    finally:
+        await pool.shutdown()
+
+    reference = task.info["artifact"]
+    assert reference["url"] in result and store.directory not in result
+    artifact = store.get(reference["artifact_id"])
+    assert zipfile.is_zipfile(artifact.path) and reference["size"] == artifact.size
+    assert "artifact" not in entries[0] and entries[0]["status"] == "complete"
+    assert entries[1]["output_file"] is None and store.get(entries[1]["artifact"]["artifact_id"]) is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_conversion_discards_reservation(store: ArtifactStore) -> None:
+    """Test that the reserved artifact of a failed conversion is deleted."""
+    pool = WorkerPool(max_workers=1, engine=PandocEngine(), artifact_store=store)
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(input_file="/nonexistent/input.md", output_format="docx", artifact=True),
+            task_id="failing",
+            progress_callback=lambda task_id, percentage, message: None,
+        )
+        with pytest.raises(ValueError):
+            await (await pool.submit_task(task))
+    finally:
+        await pool.shutdown()
+
+    assert store.stats()["discarded"] == 1 and store.list() == []
+
+
+def test_artifact_download(test_client: TestClient, server_store: ArtifactStore) -> None:
+    """Test the download endpoint with Range, If-None-Match, HEAD and unknown artifacts."""
+    response = test_client.post("/convert", json={"contents": SOURCE, "output_format": "docx", "artifact": True})
+    assert response.status_code == 200
+    reference: Dict[str, Any] = response.json()["artifact"]
+
+    response = test_client.get(reference["url"])
+    assert response.status_code == 200
+    assert response.headers["content-type"] == reference["media_type"]
+    assert int(response.headers["content-length"]) == reference["size"]
+    assert zipfile.is_zipfile(BytesIO(response.content))
+    etag = response.headers["etag"]
+
+    partial = test_client.get(reference["url"], headers={"Range": "bytes=0-3"})
+    assert partial.status_code == 206 and partial.content == b"PK\x03\x04"
+    assert partial.headers["content-range"] == f"bytes 0-3/{reference['size']}"
+
+    assert test_client.get(reference["url"], headers={"If-None-Match": etag}).status_code == 304
+    head = test_client.head(reference["url"])
+    assert head.status_code == 200 and head.content == b"" and head.headers["etag"] == etag
+    assert test_client.get("/artifacts/unknown").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stdio_server_returns_resources(server_store: ArtifactStore) -> None:
+    """Test that the stdio server returns a resource URI and serves the artifact as resource."""
+    contents = await stdio_server.handle_call_tool(
+        "convert-contents", {"contents": SOURCE, "output_format": "html", "artifact": True}
+    )
+    artifact = server_store.list()[0]
+    assert artifact.uri in contents[0].text and server_store.directory not in contents[0].text
+
+    resources = await stdio_server.handle_list_resources()
+    assert [str(resource.uri) for resource in resources] == [artifact.uri]
+    text = await stdio_server.handle_read_resource(resources[0].uri)
+    assert "<strong>artifact</strong>" in text
+
+
+@pytest.mark.asyncio
+async def test_large_stdio_results_become_paged_resources(
+    server_store: ArtifactStore, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that large results are streamed into a resource that reads back in pages, small ones stay inline."""
+    monkeypatch.setattr(stdio_server, "INLINE_RESULT_LIMIT", 4096)
+    monkeypatch.setattr(stdio_server, "RESOURCE_PAGE_SIZE", 1000)
+    source = "".join(f"## Abschnitt {i}\n\nÜber **Größe** und Maß — {i}.\n\n" for i in range(200))
+
+    contents = await stdio_server.handle_call_tool("convert-contents", {"contents": source, "output_format": "html"})
+    artifact = server_store.list()[0]
+    assert artifact.uri in contents[0].text and len(contents[0].text) < 2 * stdio_server.PREVIEW_CHARS
+    pages = server_store.pages(artifact, 1000)
+    assert f"{artifact.uri}?page={pages - 1}" in contents[0].text
+    text = "".join([await stdio_server.handle_read_resource(f"{artifact.uri}?page={page}") for page in range(pages)])
+    assert text == PandocEngine().convert(source, output_format="html")
+    with pytest.raises(ValueError):
+        await stdio_server.handle_read_resource(f"{artifact.uri}?page={pages}")
+
+    small = await stdio_server.handle_call_tool("convert-contents", {"contents": SOURCE, "output_format": "html"})
+    assert "<strong>artifact</strong>" in small[0].text and len(server_store.list()) == 1
+
+
+@pytest.mark.asyncio
+async def test_stdio_inline_limit_counts_bytes(server_store: ArtifactStore, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a streamed result under the limit in characters but over it in UTF-8 bytes becomes a resource."""
+    monkeypatch.setattr(stdio_server, "INLINE_RESULT_LIMIT", 4096)
+    # Trailing blanks make the input large enough to be streamed, pandoc drops them
+    source = "Ä" * 2100 + " " * 2000
+    contents = await stdio_server.handle_call_tool("convert-contents", {"contents": source, "output_format": "html"})
+    artifact = server_store.list()[0]
+    assert artifact.uri in contents[0].text and artifact.size > 4096
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stdio_call_discards_its_reservation(
+    server_store: ArtifactStore, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that cancelling a call writing into an artifact releases the reservation."""
+    started, release = threading.Event(), threading.Event()
+
+    def convert(*args: Any, **kwargs: Any) -> str:
+        started.set()
+        release.wait(5)
+        return ""
+
+    monkeypatch.setattr(stdio_server.get_engine(), "convert", convert)
+    call = asyncio.ensure_future(
+        stdio_server.handle_call_tool("convert-contents", {"contents": SOURCE, "output_format": "html", "artifact": True})
+    )
+    await asyncio.to_thread(started.wait, 5)
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    release.set()
+    assert server_store.stats()["discarded"] == 1 and not server_store.list()
@@ -0,0 +1,80 @@
+"""
+Test suite for batch conversions.
+"""
+
+import json
+from typing import Any, Dict, List
+
+from fastapi.testclient import TestClient
+
+
+def batch_items(test_markdown_content: str, output_file: str) -> List[Dict[str, Any]]:
+    """Two valid items and one whose input file does not exist."""
+    return [
+        {"contents": test_markdown_content, "output_format": "html"},
+        {"input_file": "/path/to/nonexistent/file.md", "output_format": "html"},
+        {"contents": "# Second", "output_format": "rst", "output_file": output_file},
+    ]
+
+
+def test_batch_endpoint_streams_ndjson(test_client: TestClient, test_markdown_content: str, tmp_path) -> None:
+    """Test that every item is reported and failures do not abort the batch."""
+    response = test_client.post(
+        "/convert/batch",
+        json={"items": batch_items(test_markdown_content, str(tmp_path / "batch.rst")), "concurrency": 2},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+
+    item_events = events[:-1]
+    assert sorted(e["data"]["index"] for e in item_events) == [0, 1, 2]
+    assert [e["data"]["index"] for e in item_events if e["event"] == "item_error"] == [1]
+
+    summary = events[-1]
+    assert summary["event"] == "summary"
+    assert summary["data"]["succeeded"] == 2
+    assert summary["data"]["failed"] == 1
+    assert [item["index"] for item in summary["data"]["items"]] == [0, 1, 2]
+    assert all(item["runtime"] >= 0 for item in summary["data"]["items"])
+
+
+def test_batch_endpoint_streams_sse(test_client: TestClient, test_markdown_content: str, tmp_path) -> None:
+    """Test the SSE variant of the batch endpoint."""
+    events = []
+    with test_client.stream(
+        "POST",
+        "/convert/batch",
+        json={"items": batch_items(test_markdown_content, str(tmp_path / "batch.rst"))},
+        headers={"Accept": "text/event-stream"},
+    ) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+
+    assert len(events) == 4
+    assert events[-1]["event"] == "summary"
+
+
+def test_mcp_convert_batch_tool(test_client: TestClient) -> None:
+    """Test the convert-batch MCP tool."""
+    events = []
+    with test_client.stream(
+        "GET",
+        "/sse",
+        params={
+            "tool": "convert-batch",
+            "items": json.dumps([{"contents": "# One"}, {"contents": "# Two"}]),
+            "concurrency": 2,
+        },
+    ) as response:
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+
+    assert events[0]["status"] == "created"
+    assert [e["status"] for e in events[1:-1]] == ["running", "running"]
+    assert events[-1]["status"] == "complete"
+    assert events[-1]["output"]["succeeded"] == 2
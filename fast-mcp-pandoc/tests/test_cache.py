@@ -0,0 +1,185 @@
+"""
+Test suite for the conversion result cache.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import List, Tuple
+
+import pytest
+
+from mcp_pandoc.cache import CachedResult, ConversionCache
+from mcp_pandoc.cancel import CancelScope, ConversionCancelled, cancel_scope
+from mcp_pandoc.engine import PandocEngine
+
+
+@pytest.fixture
+def engine() -> PandocEngine:
+    """Create an engine with an in-memory result cache."""
+    engine = PandocEngine()
+    engine.cache = ConversionCache(max_entries=8)
+    return engine
+
+
+def test_memory_tier_is_lru_bounded() -> None:
+    """Test that the memory tier evicts the least recently used entry."""
+    cache = ConversionCache(max_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, CachedResult.from_text(key))
+    assert cache.get("a") is not None
+    cache.put("c", CachedResult.from_text("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_evicts_by_size(tmp_path) -> None:
+    """Test that the disk tier keeps within its byte budget."""
+    cache = ConversionCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=250)
+    for index, key in enumerate(("a", "b", "c")):
+        cache.put(key, CachedResult.from_text(str(index) * 100))
+        time.sleep(0.01)
+    assert cache.stats()["disk_bytes"] <= 250
+    assert not os.path.exists(tmp_path / "a.text")
+    assert cache.get("c").text() == "2" * 100
+
+
+def test_concurrent_requests_are_coalesced() -> None:
+    """Test that identical concurrent requests run the computation once."""
+    cache = ConversionCache()
+    calls: List[int] = []
+    results: List[str] = []
+
+    def compute() -> CachedResult:
+        calls.append(1)
+        time.sleep(0.2)
+        return CachedResult.from_text("result")
+
+    def worker() -> None:
+        result, _ = cache.run("key", compute)
+        results.append(result.text())
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["result"] * 5
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_cancelled_leader_does_not_fail_coalesced_requests() -> None:
+    """Test that a waiting request takes over when the request it waits for is cancelled."""
+    cache = ConversionCache()
+    scope = CancelScope()
+    waiting = threading.Event()
+    errors: List[BaseException] = []
+    results: List[Tuple[str, bool]] = []
+
+    def cancelled() -> CachedResult:
+        waiting.wait(5)
+        time.sleep(0.05)
+        scope.cancel("client disconnected")
+        scope.check()
+
+    def compute() -> CachedResult:
+        return CachedResult.from_text("result")
+
+    def leader() -> None:
+        with cancel_scope(scope):
+            try:
+                cache.run("key", cancelled)
+            except ConversionCancelled as e:
+                errors.append(e)
+
+    def follower() -> None:
+        waiting.set()
+        result, computed = cache.run("key", compute)
+        results.append((result.text(), computed))
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=follower))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 1
+    assert results == [("result", True)]
+    assert cache.stats()["coalesced"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_engine_caches_text_results(engine: PandocEngine) -> None:
+    """Test that repeated conversions are served from the cache."""
+    first = engine.convert("# Cached", input_format="markdown", output_format="html")
+    second = engine.convert("# Cached", input_format="markdown", output_format="html")
+    assert first == second
+    assert engine.cache.stats()["hits"] == 1
+    assert engine.cache.stats()["misses"] == 1
+
+
+def test_engine_materializes_cached_files(engine: PandocEngine, tmp_path) -> None:
+    """Test that a cache hit copies the artifact to a new output file."""
+    first, second = tmp_path / "first.docx", tmp_path / "second.docx"
+    engine.convert("# Cached", input_format="markdown", output_format="docx", output_file=str(first))
+    engine.convert("# Cached", input_format="markdown", output_format="docx", output_file=str(second))
+    assert engine.cache.stats()["hits"] == 1
+    assert first.read_bytes() == second.read_bytes()
+
+
+def test_input_file_changes_invalidate_key(tmp_path) -> None:
+    """Test that editing an input file changes its cache key."""
+    input_file = tmp_path / "input.md"
+    input_file.write_text("# One")
+    first = ConversionCache.make_key("3.0", None, str(input_file), None, "html")
+    input_file.write_text("# Two, longer")
+    second = ConversionCache.make_key("3.0", None, str(input_file), None, "html")
+    assert first != second
+
+
+@pytest.mark.asyncio
+async def test_async_requests_are_coalesced() -> None:
+    """Test that identical concurrent requests on one event loop run the computation once."""
+    cache = ConversionCache()
+    calls: List[int] = []
+
+    async def compute() -> CachedResult:
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return CachedResult.from_text("result")
+
+    results = await asyncio.gather(*[cache.arun("key", compute) for _ in range(5)])
+
+    assert len(calls) == 1
+    assert [result.text() for result, _ in results] == ["result"] * 5
+    assert [computed for _, computed in results].count(True) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_async_leader_does_not_cancel_coalesced_requests() -> None:
+    """Test that only the cancelled request of two coalesced ones is cancelled."""
+    cache = ConversionCache()
+    calls: List[int] = []
+
+    async def compute() -> CachedResult:
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return CachedResult.from_text("result")
+
+    leader = asyncio.create_task(cache.arun("key", compute))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(cache.arun("key", compute))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    result, computed = await follower
+    assert result.text() == "result" and computed
+    assert leader.cancelled()
+    assert len(calls) == 2
+    assert cache.stats()["coalesced"] == 1
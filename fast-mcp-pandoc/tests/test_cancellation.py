@@ -0,0 +1,183 @@
+"""
+Test suite for cancelling conversions and killing their processes.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, JobCancelledError, WorkerPool
+from mcp_pandoc.cancel import CancelScope, ConversionCancelled, cancel_scope
+from mcp_pandoc.engine import PandocEngine
+
+# Blocks pandoc in a child process whose PID is written to the file named by $SLOW_FILTER_PID
+SLOW_FILTER = 'function Pandoc(doc) os.execute("echo $$ > \\"$SLOW_FILTER_PID\\"; exec sleep 60") return doc end\n'
+
+
+def is_running(pid: int) -> bool:
+    """Return True if a process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(") ", 1)[1][0] != "Z"
+    except OSError:
+        return False
+
+
+def has_exited(pid: int, timeout: float = 5.0) -> bool:
+    """Wait for a killed process to exit; SIGKILL is delivered asynchronously."""
+    deadline = time.monotonic() + timeout
+    while is_running(pid):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@pytest.fixture
+def slow_engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> PandocEngine:
+    """Create an engine whose conversions hang in a filter until they are killed."""
+    script = tmp_path / "slow.lua"
+    script.write_text(SLOW_FILTER)
+    monkeypatch.setenv("SLOW_FILTER_PID", str(tmp_path / "filter.pid"))
+    engine = PandocEngine()
+    build_args = engine.build_args
+    monkeypatch.setattr(engine, "build_args", lambda *args: build_args(*args) + [f"--lua-filter={script}"])
+    return engine
+
+
+def filter_pid(tmp_path: Path, timeout: float = 10.0) -> int:
+    """Wait for the slow filter to start and return the PID of its sleep."""
+    path = tmp_path / "filter.pid"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists() and path.read_text().strip():
+            return int(path.read_text())
+        time.sleep(0.05)
+    raise AssertionError("slow filter did not start")
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_cancel_scope_kills_process_group(slow_engine: PandocEngine, tmp_path: Path) -> None:
+    """Test that cancelling a scope kills pandoc and the processes it started."""
+    scope = CancelScope()
+    errors: List[Exception] = []
+
+    def convert() -> None:
+        with cancel_scope(scope):
+            try:
+                slow_engine.convert("Text", output_format="html")
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=convert)
+    thread.start()
+    pid = filter_pid(tmp_path)
+    assert scope.cancel("test") == 1
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert isinstance(errors[0], ConversionCancelled) and "test" in str(errors[0])
+    assert has_exited(pid)
+
+    # Nothing starts in a cancelled scope
+    with cancel_scope(scope), pytest.raises(ConversionCancelled):
+        slow_engine.convert("Text", output_format="html")
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_cancels_tasks(slow_engine: PandocEngine, tmp_path: Path, mode: str) -> None:
+    """Test that running and queued tasks are cancelled at once and counted."""
+    pool = WorkerPool(max_workers=1, engine=slow_engine, mode=mode, lane_workers={"text": 1})
+    updates: List[Any] = []
+    try:
+        tasks = [
+            ConversionTask(
+                request=ConversionRequest(contents="Text", output_format="html"),
+                task_id=task_id,
+                progress_callback=lambda task_id, percentage, message: updates.append((task_id, percentage, message))
+            )
+            for task_id in ("running", "queued")
+        ]
+        futures = [await pool.submit_task(task) for task in tasks]
+        pid = await asyncio.to_thread(filter_pid, tmp_path)
+
+        assert pool.cancel("queued")
+        with pytest.raises(JobCancelledError):
+            await futures[1]
+        assert pool.cancel("running", "test")
+        with pytest.raises(JobCancelledError, match="test"):
+            await asyncio.wait_for(futures[0], timeout=10)
+        assert not pool.cancel("running") and not pool.cancel("unknown")
+
+        # The worker is free as soon as its processes are gone
+        for _ in range(100):
+            if pool.stats()["running"] == 0:
+                break
+            await asyncio.sleep(0.05)
+        stats = pool.stats()
+        assert await asyncio.to_thread(has_exited, pid)
+        assert (stats["running"], stats["queued"], stats["lanes"]["text"]["queued"]) == (0, 0, 0)
+        assert stats["cancelled"] == 2 and stats["cancelled_running"] == 1 and stats["processes_killed"] == 1
+        errors = [(task_id, message) for task_id, percentage, message in updates if percentage == -1]
+        assert sorted(task_id for task_id, _ in errors) == ["queued", "running"]
+        assert all("cancelled" in message for _, message in errors)
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+@pytest.mark.parametrize("stream", [False, True])
+async def test_cancelled_task_reports_one_error(mode: str, stream: bool) -> None:
+    """Test that a task whose conversion fails after it was cancelled reports only the cancellation."""
+    updates: List[Any] = []
+
+    class KilledEngine(PandocEngine):
+        """Cancels the task mid-conversion, then fails like a pandoc process killed by the cancel."""
+
+        def convert(self, *args: Any, **kwargs: Any) -> str:
+            asyncio.run_coroutine_threadsafe(cancel(), loop).result()
+            raise RuntimeError("pandoc exited with signal 9")
+
+        async def aconvert(self, *args: Any, **kwargs: Any) -> str:
+            await cancel()
+            raise RuntimeError("pandoc exited with signal 9")
+
+        def stream(self, *args: Any, **kwargs: Any) -> Iterator[str]:
+            yield self.convert(*args, **kwargs)
+
+        async def astream(self, *args: Any, **kwargs: Any) -> AsyncIterator[str]:
+            yield await self.aconvert(*args, **kwargs)
+
+    async def cancel() -> None:
+        assert pool.cancel("killed", "test")
+
+    loop = asyncio.get_running_loop()
+    pool = WorkerPool(max_workers=1, engine=KilledEngine(), mode=mode)
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(contents="Text", output_format="html", stream=stream),
+            task_id="killed",
+            progress_callback=lambda task_id, percentage, message: updates.append((percentage, message))
+        )
+        with pytest.raises(JobCancelledError, match="test"):
+            await asyncio.wait_for(await pool.submit_task(task), timeout=10)
+        await asyncio.sleep(0.1)
+        errors = [message for percentage, message in updates if percentage == -1]
+        assert errors == ["Error: Conversion cancelled: test"]
+    finally:
+        await pool.shutdown()
+
+
+def test_delete_unknown_job(test_client: TestClient) -> None:
+    """Test that cancelling an unknown or finished job is a 404."""
+    response = test_client.delete("/jobs/unknown")
+    assert response.status_code == 404
@@ -0,0 +1,150 @@
+"""
+Test suite for parallel section-chunked conversion of large documents.
+"""
+
+import re
+from typing import Dict, List
+
+import pytest
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool
+from mcp_pandoc.chunking import join_chunks, split_ast, split_markdown
+from mcp_pandoc.engine import PandocEngine
+
+
+def chapter(index: int, footnotes: bool = False) -> str:
+    """One chapter exercising headings, reference links, code, tables and lists."""
+    note = f" A claim.[^n{index}]" if footnotes else ""
+    return f"""# Chapter {index}
+
+Intro to chapter {index} with a [reference link][ref{index % 3}] and *emphasis*.{note}
+
+## Section {index}.1
+
+```python
+# not a heading
+print({index})
+```
+
+| Key | Value |
+|-----|-------|
+| a   | {index} |
+
+Section {index}.2
+=================
+
+1. first
+2. second
+
+- see [the shared site][shared]
+
+"""
+
+
+def corpus(chapters: int = 12, footnotes: bool = False) -> str:
+    """A book-like markdown document with definitions at the end."""
+    text = "---\ntitle: Corpus\n---\n\n" + "".join(chapter(i, footnotes) for i in range(chapters))
+    text += "".join(f"[ref{i}]: https://example.com/{i}\n" for i in range(3))
+    text += "[shared]: https://example.com/shared \"Shared\"\n"
+    if footnotes:
+        text += "".join(f"\n[^n{i}]: Footnote {i}.\n\n    Continued paragraph {i}.\n" for i in range(chapters))
+    return text
+
+
+# Corpus variants: plain, with footnotes; the others need the AST split
+CORPORA: Dict[str, str] = {
+    "plain": corpus(),
+    "footnotes": corpus(footnotes=True),
+    "repeated-headings": re.sub(r"## Section \d+\.1", "## Summary", corpus()),
+    "colliding-identifiers": corpus().replace("## Section 2.1", "## Foo!").replace("## Section 7.1", "## Foo?"),
+    "repeated-setext-headings": corpus().replace("## Section 3.1\n", "Bar\n---\n").replace(
+        "## Section 8.1\n", "Bar\n---\n"
+    ),
+    "implicit-reference": corpus().replace("Intro to chapter 9 with", "Intro to chapter 9, after [Section 1.2], with"),
+}
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+def test_split_markdown_carries_definitions() -> None:
+    """Test that every chunk gets the front matter and the link definitions."""
+    chunks = split_markdown(corpus(), 4, "latex")
+    assert chunks is not None and len(chunks) >= 3
+    assert all(chunk.startswith("---\ntitle: Corpus\n---\n") for chunk in chunks)
+    assert all("[shared]: https://example.com/shared" in chunk for chunk in chunks)
+    # The heading-like line in the code block is not a split point
+    assert not any(chunk.lstrip("-\ntitle: Corpus").startswith("# not a heading") for chunk in chunks)
+
+
+def test_split_markdown_refuses_unsafe_documents() -> None:
+    """Test that documents depending on document-wide numbering are not split as text."""
+    for name in ("repeated-headings", "colliding-identifiers", "repeated-setext-headings", "implicit-reference"):
+        assert split_markdown(CORPORA[name], 4, "html") is None
+    assert split_markdown(CORPORA["footnotes"], 4, "html") is None
+    assert split_markdown(CORPORA["footnotes"], 4, "latex") is not None
+    assert split_markdown(corpus() + "\n(@) example\n", 4, "html") is None
+
+
+@pytest.mark.parametrize("name", sorted(CORPORA))
+@pytest.mark.parametrize("output_format", ["html", "markdown", "rst", "latex", "txt"])
+def test_chunked_matches_single_pass(engine: PandocEngine, name: str, output_format: str) -> None:
+    """Test that converting chunks and joining them gives the single-pass output."""
+    source = CORPORA[name]
+    expected = engine.convert(source, output_format=output_format, input_format="markdown")
+
+    chunks = split_markdown(source, 4, output_format)
+    if chunks is not None:
+        outputs = [engine.convert(chunk, output_format=output_format, input_format="markdown") for chunk in chunks]
+        assert join_chunks(outputs, output_format) == expected
+
+    # The AST split must match as well, for every variant
+    ast_chunks = split_ast(engine.parse(source, input_format="markdown"), 4, output_format)
+    outputs = [engine.convert(chunk, output_format=output_format, input_format="json") for chunk in ast_chunks]
+    assert join_chunks(outputs, output_format, ast_chunks) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_chunks_large_inputs(engine: PandocEngine, mode: str, tmp_path) -> None:
+    """Test that the worker pool chunks inputs above the threshold, also from files."""
+    source = CORPORA["plain"]
+    expected = engine.convert(source, output_format="html", input_format="markdown")
+    input_file = tmp_path / "book.md"
+    input_file.write_text(source)
+
+    pool = WorkerPool(max_workers=4, mode=mode, chunk_threshold=1024)
+    progress: List[str] = []
+    try:
+        requests = [
+            ConversionRequest(contents=source, output_format="html"),
+            ConversionRequest(input_file=str(input_file), output_format="html"),
+        ]
+        assert all(pool._should_chunk(request) for request in requests)
+        for index, request in enumerate(requests):
+            task = ConversionTask(
+                request=request,
+                task_id=f"chunked-{index}",
+                progress_callback=lambda task_id, percentage, message: progress.append(str(message))
+            )
+            assert await (await pool.submit_task(task)) == expected
+        assert any("chunks in parallel" in message for message in progress)
+        assert pool.stats()["lanes"]["text"]["completed"] >= 4
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.parametrize("output_format", ["markdown", "rst", "html"])
+def test_chunked_html_input_matches_single_pass(engine: PandocEngine, output_format: str) -> None:
+    """Test that HTML input is split through the AST with the single-pass result."""
+    source = engine.convert(CORPORA["plain"], output_format="html", input_format="markdown")
+    expected = engine.convert(source, output_format=output_format, input_format="html")
+
+    chunks = split_ast(engine.parse(source, input_format="html"), 4, output_format)
+    assert len(chunks) > 1
+    outputs = [engine.convert(chunk, output_format=output_format, input_format="json") for chunk in chunks]
+    assert join_chunks(outputs, output_format, chunks) == expected
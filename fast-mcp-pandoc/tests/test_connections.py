@@ -0,0 +1,143 @@
+"""
+Test suite for the connection manager serving the SSE streams.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.connections import (CONNECTION_BLOCKED, CONNECTION_IDLE, CONNECTION_STREAMING,
+                                         ConnectionLimitError, ConnectionManager, connection_manager)
+from fast_mcp_pandoc.events import EVENT_CHUNK, EVENT_COMPLETE, EVENT_PROGRESS, EventBus, TaskEvent
+from fast_mcp_pandoc.server import app
+
+SCOPE = {"type": "http"}
+
+
+class FakeClient:
+    """The ASGI receive and send callables of one client, recording the body frames it gets."""
+
+    def __init__(self, blocked: Optional[asyncio.Event] = None):
+        self.frames: List[bytes] = []
+        self.disconnected = asyncio.Event()
+        # While set, writes of the stream wait as for a client that does not read
+        self.blocked = blocked
+
+    async def receive(self) -> Dict[str, Any]:
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.body" and message["body"]:
+            if self.blocked is not None:
+                await self.blocked.wait()
+            self.frames.append(message["body"])
+
+
+async def idle_stream(index: int, release: asyncio.Event, cleaned: List[int]) -> AsyncIterator[str]:
+    """Send one event, then stay quiet until released."""
+    try:
+        yield json.dumps({"event": "progress", "data": {"index": index}})
+        await release.wait()
+    finally:
+        cleaned.append(index)
+
+
+@pytest.mark.asyncio
+async def test_single_ticker_sends_shared_heartbeats_to_idle_streams() -> None:
+    """Test that idle streams get one shared heartbeat frame per tick without timers of their own."""
+    manager = ConnectionManager(heartbeat_interval=0.1)
+    release = asyncio.Event()
+    cleaned: List[int] = []
+    clients = [FakeClient() for _ in range(500)]
+    streams = [
+        asyncio.ensure_future(manager.response(idle_stream(index, release, cleaned))(SCOPE, client.receive, client.send))
+        for index, client in enumerate(clients)
+    ]
+    await asyncio.sleep(0.05)
+    assert manager.stats()["states"][CONNECTION_STREAMING] == 500
+    # Only the ticker sleeps, not every stream
+    assert len(asyncio.get_running_loop()._scheduled) < 10
+
+    await asyncio.sleep(0.4)
+    stats = manager.stats()
+    assert stats["connections"] == 500 and stats["states"][CONNECTION_IDLE] == 500
+    heartbeats = [client.frames[1] for client in clients]
+    assert all(json.loads(frame.decode()[6:])["event"] == "heartbeat" for frame in heartbeats)
+    assert len({id(frame) for frame in heartbeats}) <= 2
+    assert stats["heartbeats"] >= 1000 and stats["ticks"] <= 6
+
+    # Disconnected clients end their streams and run the cleanup of the generators
+    for client in clients[:250]:
+        client.disconnected.set()
+    await asyncio.gather(*streams[:250])
+    assert sorted(cleaned) == list(range(250)) and manager.stats()["connections"] == 250
+
+    # Finished generators end their streams properly
+    release.set()
+    await asyncio.gather(*streams[250:])
+    assert manager.stats()["connections"] == 0 and manager._ticker is None
+
+
+@pytest.mark.asyncio
+async def test_connection_limit_and_blocked_streams() -> None:
+    """Test that streams beyond the limit are rejected and that stalled writes get no heartbeats."""
+    manager = ConnectionManager(max_connections=2, heartbeat_interval=0.1)
+    release = asyncio.Event()
+    cleaned: List[int] = []
+    blocked = asyncio.Event()
+    slow, fast = FakeClient(blocked), FakeClient()
+    first = manager.response(idle_stream(0, release, cleaned))
+    second = manager.response(idle_stream(1, release, cleaned))
+    with pytest.raises(ConnectionLimitError) as error:
+        manager.response(idle_stream(2, release, cleaned))
+    assert error.value.status_code == 503 and manager.stats()["rejected"] == 1
+
+    streams = [
+        asyncio.ensure_future(first(SCOPE, slow.receive, slow.send)),
+        asyncio.ensure_future(second(SCOPE, fast.receive, fast.send)),
+    ]
+    await asyncio.sleep(0.35)
+    stats = manager.stats()
+    assert stats["states"][CONNECTION_BLOCKED] == 1 and stats["pending_bytes"] > 0
+    assert slow.frames == [] and len(fast.frames) >= 2
+
+    blocked.set()
+    release.set()
+    await asyncio.gather(*streams)
+    assert manager.response(idle_stream(3, release, cleaned)) is not None
+
+
+@pytest.mark.asyncio
+async def test_memory_budget_of_subscriptions() -> None:
+    """Test that the byte budget drops progress and overflows on output, but never on the result."""
+    bus = EventBus()
+    subscription = bus.subscribe("task", max_bytes=100)
+    bus.publish(TaskEvent(EVENT_CHUNK, "task", 0, "a" * 60, index=0))
+    bus.publish(TaskEvent(EVENT_PROGRESS, "task", 50, "b" * 50))
+    bus.publish(TaskEvent(EVENT_COMPLETE, "task", 100, "c" * 1000))
+    assert subscription.dropped == 1 and not subscription.overflowed
+    assert bus.stats()["buffered_bytes"] == 1060
+    assert [(await subscription.get()).kind for _ in range(2)] == [EVENT_CHUNK, EVENT_COMPLETE]
+    assert subscription.buffered_bytes == 0
+
+    subscription = bus.subscribe("task", max_bytes=100)
+    bus.publish(TaskEvent(EVENT_CHUNK, "task", 0, "a" * 60, index=0))
+    bus.publish(TaskEvent(EVENT_CHUNK, "task", 0, "a" * 60, index=1))
+    assert subscription.overflowed
+
+
+def test_endpoints_reject_streams_beyond_the_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the 503 of /convert/stream and the connection_limit event of /sse."""
+    monkeypatch.setattr(connection_manager, "max_connections", 0)
+    client = TestClient(app)
+    response = client.get("/convert/stream", params={"contents": "# Test", "output_format": "html"})
+    assert response.status_code == 503 and "retry-after" in response.headers
+
+    response = client.get("/sse", params={"tool": "convert-contents", "contents": "# Test"})
+    event = json.loads(next(line for line in response.iter_lines() if line.startswith("data:"))[5:])
+    assert event["status"] == "error" and event["error"]["code"] == "connection_limit"
+    assert client.get("/stats").json()["connections"]["rejected"] >= 2
@@ -0,0 +1,110 @@
+"""
+Test suite for the shared pandoc conversion engine.
+"""
+
+import asyncio
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from mcp_pandoc.engine import PandocEngine, normalize_format
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+def test_normalize_format_aliases() -> None:
+    """Test that MCP format aliases map onto pandoc format names."""
+    assert normalize_format("txt") == "plain"
+    assert normalize_format("txt", output=False) == "markdown"
+    assert normalize_format("MD+smart") == "markdown+smart"
+    assert normalize_format("html") == "html"
+
+
+def test_engine_reads_format_tables(engine: PandocEngine) -> None:
+    """Test that the engine caches pandoc's format tables."""
+    assert engine.version
+    assert "markdown" in engine.input_formats
+    assert "html" in engine.output_formats
+    assert "smart" in engine.extensions
+
+
+def test_validate_rejects_unknown_formats(engine: PandocEngine) -> None:
+    """Test in-memory validation of formats and extensions."""
+    with pytest.raises(ValueError):
+        engine.validate("markdown", "unsupported_format")
+    with pytest.raises(ValueError):
+        engine.validate("markdown+no_such_extension", "html")
+    with pytest.raises(ValueError):
+        engine.validate("markdown", "docx")
+    assert engine.validate("txt", "txt") == ("markdown", "plain")
+
+
+def test_convert_runs_single_process(engine: PandocEngine, test_markdown_content: str) -> None:
+    """Test that a conversion spawns exactly one pandoc process."""
+    with patch("mcp_pandoc.cancel.subprocess.Popen", wraps=subprocess.Popen) as popen:
+        result = engine.convert(test_markdown_content, input_format="markdown", output_format="html")
+    assert popen.call_count == 1
+    assert "<h1" in result
+
+
+def test_convert_file_to_file(engine: PandocEngine, test_markdown_content: str, temp_file_path: str) -> None:
+    """Test converting a file into an output file."""
+    with open(temp_file_path, "w") as f:
+        f.write(test_markdown_content)
+    output_file = temp_file_path.replace(".md", ".html")
+    try:
+        result = engine.convert(
+            input_file=temp_file_path,
+            input_format=None,
+            output_format="html",
+            output_file=output_file,
+        )
+        assert result == ""
+        with open(output_file) as f:
+            assert "Test Document" in f.read()
+    finally:
+        if os.path.exists(output_file):
+            os.unlink(output_file)
+
+
+def test_convert_reports_pandoc_errors(engine: PandocEngine) -> None:
+    """Test that pandoc failures surface as RuntimeError."""
+    with pytest.raises(RuntimeError):
+        engine.convert("# Test", input_format="markdown", output_format="html", extra_args=["--no-such-option"])
+
+
+@pytest.mark.asyncio
+async def test_aconvert_matches_convert(engine: PandocEngine, test_markdown_content: str) -> None:
+    """Test that the asyncio engine path produces the same output without subprocess.run."""
+    expected = engine.convert(test_markdown_content, input_format="markdown", output_format="html")
+    with patch("mcp_pandoc.engine.subprocess.run") as run:
+        results = await asyncio.gather(*[
+            engine.aconvert(test_markdown_content, input_format="markdown", output_format="html")
+            for _ in range(8)
+        ])
+    assert run.call_count == 0
+    assert results == [expected] * 8
+
+
+@pytest.mark.asyncio
+async def test_aconvert_reports_pandoc_errors(engine: PandocEngine, tmp_path) -> None:
+    """Test that pandoc failures and working directories are handled per process."""
+    with pytest.raises(RuntimeError):
+        await engine.aconvert("# Test", output_format="html", extra_args=["--no-such-option"])
+
+    # Relative paths in the arguments resolve against the process' own working directory
+    (tmp_path / "header.html").write_text("<meta name=\"included\">")
+    result = await engine.aconvert(
+        "# Test",
+        output_format="html",
+        extra_args=["--standalone", "--include-in-header=header.html"],
+        cwd=str(tmp_path),
+    )
+    assert 'name="included"' in result
+    assert os.getcwd() != str(tmp_path)
@@ -0,0 +1,98 @@
+"""
+Test suite for the event bus delivering task events to subscriptions.
+"""
+
+import asyncio
+import threading
+from typing import List
+
+import pytest
+
+from fast_mcp_pandoc.events import (EVENT_CHUNK, EVENT_COMPLETE, EVENT_PROGRESS, EVENT_TARGET, EventBus,
+                                    SubscriptionOverflow, TaskEvent)
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import WorkerPool
+from mcp_pandoc.engine import PandocEngine
+
+
+@pytest.mark.asyncio
+async def test_task_callbacks_publish_from_threads_to_all_subscribers() -> None:
+    """Test that events published from a worker thread reach every subscription in order."""
+    bus = EventBus()
+    task = bus.task(ConversionRequest(contents="Text", output_format="html"), "task")
+    first = bus.subscribe("task")
+    second = bus.subscribe("task")
+    recorded: List[TaskEvent] = []
+    bus.subscribe("task", callback=recorded.append)
+    other = bus.subscribe("other")
+
+    def work() -> None:
+        task.eta = 1.5
+        task.chunk_callback("task", 0, "<p>")
+        task.progress_callback("task", 50, "Converting")
+        task.progress_callback("task", 100, "<p>Text</p>")
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    await asyncio.to_thread(thread.join)
+
+    for subscription in (first, second):
+        events = [await subscription.get(timeout=5) for _ in range(3)]
+        assert [event.kind for event in events] == [EVENT_CHUNK, EVENT_PROGRESS, EVENT_COMPLETE]
+        assert events[1].eta == 1.5 and events[2].final and events[2].message == "<p>Text</p>"
+    assert len(recorded) == 3 and len(other) == 0
+    with pytest.raises(asyncio.TimeoutError):
+        await other.get(timeout=0.01)
+
+    first.close()
+    stats = bus.stats()
+    assert stats["published"] == 3 and stats["delivered"] == 9 and stats["subscriptions"] == 3
+
+
+@pytest.mark.asyncio
+async def test_slow_subscribers_get_coalesced_progress_and_overflow() -> None:
+    """Test that pending progress is replaced, surplus progress dropped and other events overflow."""
+    bus = EventBus(maxsize=3)
+    subscription = bus.subscribe("task")
+    for percentage in (10, 20, 30):
+        bus.publish(TaskEvent(EVENT_PROGRESS, "task", percentage))
+    bus.publish(TaskEvent(EVENT_TARGET, "task", 50, "target 0", index=0))
+    bus.publish(TaskEvent(EVENT_TARGET, "task", 60, "target 0", index=0))
+    bus.publish(TaskEvent(EVENT_CHUNK, "task", 0, "a", index=0))
+    # Full: progress of another target is dropped, a chunk overflows the subscription
+    bus.publish(TaskEvent(EVENT_TARGET, "task", 50, "target 1", index=1))
+    bus.publish(TaskEvent(EVENT_CHUNK, "task", 0, "b", index=1))
+    assert subscription.overflowed and subscription.closed
+
+    events = [await subscription.get() for _ in range(3)]
+    assert [(event.kind, event.percentage) for event in events] == [
+        (EVENT_PROGRESS, 30), (EVENT_TARGET, 60), (EVENT_CHUNK, 0)
+    ]
+    with pytest.raises(SubscriptionOverflow):
+        await subscription.get()
+    stats = bus.stats()
+    assert (stats["coalesced"], stats["dropped"], stats["overflowed"], stats["subscriptions"]) == (3, 1, 1, 0)
+
+    # A progress update read in the meantime is not replaced
+    subscription = bus.subscribe("task")
+    bus.publish(TaskEvent(EVENT_PROGRESS, "task", 10))
+    assert (await subscription.get()).percentage == 10
+    bus.publish(TaskEvent(EVENT_PROGRESS, "task", 20))
+    assert (await subscription.get()).percentage == 20
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_events_through_bus() -> None:
+    """Test a conversion on the worker pool reporting through a bus task."""
+    bus = EventBus()
+    pool = WorkerPool(max_workers=1, engine=PandocEngine())
+    try:
+        task = bus.task(ConversionRequest(contents="*Text*", output_format="html"), "convert")
+        subscription = bus.subscribe("convert")
+        await (await pool.submit_task(task))
+        events = []
+        while not events or not events[-1].final:
+            events.append(await subscription.get(timeout=5))
+        assert events[-1].kind == EVENT_COMPLETE and "<em>Text</em>" in events[-1].message
+    finally:
+        await pool.shutdown()
@@ -0,0 +1,120 @@
+"""
+Test suite for incremental re-conversion of edited documents.
+"""
+
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc.incremental import IncrementalConverter
+
+
+def document(sections: int = 8, edited: int = -1, footnotes: bool = False) -> str:
+    """A markdown document with headings, code blocks and lists; one section can be edited."""
+    parts = []
+    for index in range(sections):
+        text = "Edited paragraph." if index == edited else f"Paragraph {index} with *emphasis*."
+        note = f" A claim.[^n{index}]" if footnotes else ""
+        parts.append(f"## Section {index}\n\n{text}{note}\n\n```python\nprint({index})\n```\n\n- a\n- b\n")
+    if footnotes:
+        parts.extend(f"[^n{index}]: Footnote {index}.\n" for index in range(sections))
+    return "\n".join(parts)
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+@pytest.mark.parametrize("output_format", ["html", "markdown", "rst", "latex", "txt"])
+def test_incremental_matches_single_pass(engine: PandocEngine, output_format: str) -> None:
+    """Test that an edited version reuses unchanged blocks and matches a full conversion."""
+    converter = IncrementalConverter(engine)
+    first = converter.convert("doc", document(), output_format=output_format)
+    assert first.reused == 0
+    assert first.output == engine.convert(document(), output_format=output_format, input_format="markdown")
+
+    second = converter.convert("doc", document(edited=3), output_format=output_format)
+    assert second.output == engine.convert(document(edited=3), output_format=output_format, input_format="markdown")
+    assert second.rendered == 1
+    assert second.reused == second.blocks - 1
+
+
+def test_incremental_falls_back_to_whole_document(engine: PandocEngine) -> None:
+    """Test that documents with endnotes are rendered whole and stay correct."""
+    converter = IncrementalConverter(engine)
+    converter.convert("doc", document(footnotes=True), output_format="html")
+    result = converter.convert("doc", document(edited=3, footnotes=True), output_format="html")
+    assert result.reused == 0
+    assert result.output == engine.convert(
+        document(edited=3, footnotes=True), output_format="html", input_format="markdown"
+    )
+
+
+def test_incremental_forgets_documents(engine: PandocEngine) -> None:
+    """Test that documents are evicted by the LRU bound and the TTL."""
+    converter = IncrementalConverter(engine, max_documents=1)
+    converter.convert("a", document(), output_format="html")
+    converter.convert("b", document(), output_format="html")
+    assert converter.stats() == {"documents": 1, "evictions": 1}
+    assert converter.convert("a", document(), output_format="html").reused == 0
+
+    converter = IncrementalConverter(engine, ttl=0)
+    converter.convert("a", document(), output_format="html")
+    assert converter.convert("a", document(), output_format="html").reused == 0
+
+
+def test_incremental_context_change_renders_everything(engine: PandocEngine) -> None:
+    """Test that blocks are not reused across output formats."""
+    converter = IncrementalConverter(engine)
+    converter.convert("doc", document(), output_format="html")
+    assert converter.convert("doc", document(), output_format="rst").reused == 0
+
+
+def test_document_id_validation() -> None:
+    """Test that document_id requires contents and a text output format."""
+    with pytest.raises(ValidationError):
+        ConversionRequest(input_file="doc.md", output_format="html", document_id="doc")
+    with pytest.raises(ValidationError):
+        ConversionRequest(contents="# A", output_format="docx", output_file="a.docx", document_id="doc")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_incremental(engine: PandocEngine, mode: str) -> None:
+    """Test that the worker pool converts requests with a document_id incrementally."""
+    pool = WorkerPool(max_workers=2, engine=engine, mode=mode)
+    progress: List[str] = []
+    try:
+        for version in (document(), document(edited=5)):
+            task = ConversionTask(
+                request=ConversionRequest(contents=version, output_format="html", document_id="doc"),
+                task_id="incremental",
+                progress_callback=lambda task_id, percentage, message: progress.append(str(message))
+            )
+            result = await (await pool.submit_task(task))
+            assert result == engine.convert(version, output_format="html", input_format="markdown")
+        assert task.info["incremental"]["rendered"] == 1
+        assert any("reused" in message for message in progress)
+    finally:
+        await pool.shutdown()
+
+
+def test_convert_endpoint_incremental(test_client: TestClient) -> None:
+    """Test that /convert reports the block reuse of incremental conversions."""
+    payload = {"contents": document(), "output_format": "html", "document_id": "endpoint-doc"}
+    assert test_client.post("/convert", json=payload).json()["incremental"]["reused"] == 0
+
+    payload["contents"] = document(edited=2)
+    response = test_client.post("/convert", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert "Edited paragraph." in data["result"]
+    assert data["incremental"]["rendered"] == 1
+    assert test_client.get("/stats").json()["incremental"]["documents"] >= 1
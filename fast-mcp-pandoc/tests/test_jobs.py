@@ -0,0 +1,145 @@
+"""
+Test suite for durable jobs with retained results and resumable event streams.
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.jobs import JOB_COMPLETE, JOB_ERROR, JOB_QUEUED, JOB_RUNNING, JobStore
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.server import app
+from fast_mcp_pandoc.worker import worker_pool
+
+
+@pytest.fixture(scope="module")
+def client() -> Iterator[TestClient]:
+    """Create a test client whose event loop keeps running between requests, as jobs do."""
+    with TestClient(app) as client:
+        yield client
+
+
+def read_events(client: TestClient, job_id: str, headers: Dict[str, str] = {}) -> List[Tuple[str, Dict[str, Any]]]:
+    """Read the event stream of a job to its end, returning (id, event) pairs without heartbeats."""
+    events = []
+    event_id = ""
+    with client.stream("GET", f"/jobs/{job_id}/events", headers=headers) as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line.startswith("id:"):
+                event_id = line[3:].strip()
+            elif line.startswith("data:"):
+                event = json.loads(line[5:].strip())
+                if event["event"] != "heartbeat":
+                    events.append((event_id, event))
+    return events
+
+
+def wait_for_job(client: TestClient, job_id: str, timeout: float = 30.0) -> Dict[str, Any]:
+    """Poll a job until it has finished."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get(f"/jobs/{job_id}").json()
+        if body["status"] not in (JOB_QUEUED, JOB_RUNNING):
+            return body
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.mark.asyncio
+async def test_job_store_replays_and_wakes_listeners() -> None:
+    """Test that events get increasing IDs, are replayed after an ID and wake up waiting listeners."""
+    store = JobStore(event_log=3)
+    job, created = store.create(ConversionRequest(contents="Text", output_format="html"), idempotency_key="key")
+    assert created and store.create(job.request, idempotency_key="key") == (job, False)
+
+    waiter = asyncio.ensure_future(job.wait(0, timeout=5))
+    await asyncio.sleep(0)
+    for percentage in range(4):
+        job.publish({"event": "progress", "data": {"percentage": percentage}})
+    assert await waiter and job.status == JOB_RUNNING
+    # Only the newest events are kept
+    assert [seq for seq, _ in job.events_after(0)] == [2, 3, 4]
+    assert [seq for seq, _ in job.events_after(3)] == [4]
+    assert not await job.wait(4, timeout=0.05)
+
+    store.finish(job, JOB_COMPLETE, {"event": "complete", "data": {}}, result="<p>Text</p>")
+    assert await job.wait(5, timeout=0.05)
+    assert job.last_event_id == 5 and store.result(job) == "<p>Text</p>"
+    assert store.stats()["states"][JOB_COMPLETE] == 1
+
+
+def test_job_store_spills_and_expires(tmp_path: Path) -> None:
+    """Test that results beyond the memory budget go to disk and that expired jobs are dropped."""
+    store = JobStore(memory_mb=1, spill_dir=str(tmp_path))
+    request = ConversionRequest(contents="Text", output_format="html")
+    jobs = []
+    for index in range(3):
+        job, _ = store.create(request)
+        store.finish(job, JOB_COMPLETE, {"event": "complete", "data": {}}, result=str(index) * (400 * 1024))
+        jobs.append(job)
+    # The oldest result was moved to disk and is read back from there
+    assert jobs[0].spill_path is not None and jobs[0].result is None
+    assert store.result(jobs[0]) == "0" * (400 * 1024)
+    assert jobs[2].spill_path is None
+    assert store.stats()["spilled"] == 1 and store.stats()["result_memory"] <= 1024 * 1024
+
+    assert store.discard(jobs[0].job_id) and not jobs[0].spill_path.exists()
+    # Jobs finished with a TTL of 0 are gone at the next access
+    store.ttl = 0
+    failed, _ = store.create(request)
+    store.finish(failed, JOB_ERROR, {"event": "error", "data": {}}, error="failed")
+    assert store.get(failed.job_id) is None and store.get(jobs[1].job_id) is jobs[1]
+    assert store.stats()["jobs"] == 2 and store.stats()["expired"] == 1
+
+
+def test_job_api_resumes_events_without_converting_again(client: TestClient) -> None:
+    """Test that a job runs without a listener and that reconnecting replays instead of converting again."""
+    response = client.post(
+        "/jobs",
+        json={"contents": "# Title\n\nSome *text*.", "output_format": "html"},
+        headers={"Idempotency-Key": "resume-test"},
+    )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.headers["location"] == f"/jobs/{job_id}"
+
+    body = wait_for_job(client, job_id)
+    assert body["status"] == JOB_COMPLETE and "<em>text</em>" in body["result"]
+    completed = worker_pool.stats()["completed"]
+
+    # The whole log is replayed to a late listener, the result is attached to the final event
+    events = read_events(client, job_id)
+    assert events[-1][1]["event"] == "complete" and "<em>text</em>" in events[-1][1]["data"]["result"]
+    ids = [int(event_id) for event_id, _ in events]
+    assert ids == sorted(ids) and ids[-1] == body["last_event_id"]
+
+    # Resuming after an event only sends the newer ones
+    resumed = read_events(client, job_id, headers={"Last-Event-ID": str(ids[-2])})
+    assert resumed == events[-1:]
+    # A retried submission returns the same job
+    retried = client.post("/jobs", json={"contents": "other", "output_format": "html"},
+                          headers={"Idempotency-Key": "resume-test"})
+    assert retried.json()["job_id"] == job_id
+    assert worker_pool.stats()["completed"] == completed
+
+    assert client.delete(f"/jobs/{job_id}").json()["status"] == "deleted"
+    assert client.get(f"/jobs/{job_id}").status_code == 404
+    assert client.get(f"/jobs/{job_id}/events").status_code == 404
+
+
+def test_job_api_reports_errors(client: TestClient) -> None:
+    """Test that failed jobs keep their error and that streamed jobs are rejected."""
+    response = client.post("/jobs", json={"contents": "Text", "output_format": "html", "input_file": "/nonexistent.md"})
+    body = wait_for_job(client, response.json()["job_id"])
+    assert body["status"] == JOB_ERROR and "nonexistent" in body["error"]
+    events = read_events(client, body["job_id"])
+    assert events[-1][1]["event"] == "error"
+
+    response = client.post("/jobs", json={"contents": "Text", "output_format": "html", "stream": True})
+    assert response.status_code == 422
@@ -0,0 +1,130 @@
+"""
+Test suite for the resource limits of conversions.
+"""
+
+import asyncio
+import os
+import signal
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.scheduler import (DEFAULT_LANE_LIMITS, LANE_PACKAGE, LANE_TEXT, LANE_TYPESET, LANES,
+                                       lane_limits_from_env)
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool, worker_pool
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc.limits import ResourceLimitError, ResourceLimits, check_exit, check_output_size, resource_limits
+from test_cancellation import filter_pid, has_exited, slow_engine  # noqa: F401
+
+# About 800 KB of markdown, converted within a few MB of output
+LARGE_SOURCE = "\n\n".join(f"Paragraph {index} with *emphasis* and `code`." for index in range(20000))
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+def test_engine_enforces_heap_and_output_limits(engine: PandocEngine) -> None:
+    """Test that pandoc runs out of its capped heap and that large outputs are rejected."""
+    with resource_limits(ResourceLimits(heap_mb=8)), pytest.raises(ResourceLimitError) as error:
+        engine.convert(LARGE_SOURCE, output_format="html")
+    assert error.value.limit == "heap_mb"
+
+    with resource_limits(ResourceLimits(output_mb=1)), pytest.raises(ResourceLimitError) as error:
+        engine.convert(LARGE_SOURCE, output_format="html")
+    assert error.value.limit == "output_mb"
+
+    # Generous limits do not get in the way
+    with resource_limits(ResourceLimits(heap_mb=2048, cpu_time=60, output_mb=64)):
+        assert "<em>emphasis</em>" in engine.convert("*emphasis*", output_format="html")
+
+
+def test_check_exit_and_output_size() -> None:
+    """Test that exit codes and messages are attributed to the active limits only."""
+    limits = ResourceLimits(cpu_time=10, memory_mb=100, heap_mb=50, output_mb=1)
+    # Without limits failures are left to the caller
+    check_exit(-signal.SIGXCPU, "")
+    check_output_size(10 * 1024 * 1024)
+    with resource_limits(limits):
+        check_exit(0, "Heap exhausted")
+        check_exit(1, "pandoc: Unknown option")
+        for returncode, output, limit in [
+            (-signal.SIGXCPU, "", "cpu_time"),
+            (-signal.SIGXFSZ, "", "output_mb"),
+            (251, "pandoc: Heap exhausted;", "heap_mb"),
+            (251, "pandoc: out of memory", "memory_mb"),
+        ]:
+            with pytest.raises(ResourceLimitError, match="Resource limit exceeded") as error:
+                check_exit(returncode, output)
+            assert error.value.limit == limit
+        with pytest.raises(ResourceLimitError, match="output size limit of 1 MB"):
+            check_output_size(2 * 1024 * 1024)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_enforces_wall_time(
+    slow_engine: PandocEngine, tmp_path: Path, mode: str  # noqa: F811
+) -> None:
+    """Test that a task running past its wall time is stopped and its processes killed."""
+    pool = WorkerPool(max_workers=1, engine=slow_engine, mode=mode, limits={LANE_TEXT: ResourceLimits(wall_time=1)})
+    updates: List[Any] = []
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(contents="Text", output_format="html"),
+            task_id="slow",
+            progress_callback=lambda task_id, percentage, message: updates.append((percentage, message))
+        )
+        future = await pool.submit_task(task)
+        pid = await asyncio.to_thread(filter_pid, tmp_path)
+        with pytest.raises(ResourceLimitError, match="wall time limit of 1 s"):
+            await asyncio.wait_for(future, timeout=10)
+        assert await asyncio.to_thread(has_exited, pid)
+        assert updates[-1][0] == -1 and "wall time" in updates[-1][1]
+        assert pool.stats()["limit_breaches"]["wall_time"] == 1
+    finally:
+        await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_rejects_large_input(engine: PandocEngine) -> None:
+    """Test that inputs above the limit of their lane are rejected before they are queued."""
+    limits = {LANE_PACKAGE: ResourceLimits(input_mb=1)}
+    pool = WorkerPool(max_workers=1, engine=engine, limits=limits)
+    try:
+        # Large text conversions run in the package lane
+        request = ConversionRequest(contents="x" * (2 * 1024 * 1024), output_format="html")
+        assert pool.limits_for(request) == limits[LANE_PACKAGE]
+        assert pool.limits_for(ConversionRequest(contents="x", output_format="html")) is None
+        task = ConversionTask(request=request, task_id="large", progress_callback=lambda *args: None)
+        with pytest.raises(ResourceLimitError, match="input size"):
+            await pool.submit_task(task)
+        stats = pool.stats()
+        assert stats["queued"] == 0 and stats["limit_breaches"]["input_mb"] == 1
+    finally:
+        await pool.shutdown()
+
+
+def test_lane_limits_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that limits are overridden per lane and disabled with 0."""
+    monkeypatch.setenv("CPU_TIME_TYPESET", "900")
+    monkeypatch.setenv("HEAP_MB_TEXT", "0")
+    monkeypatch.setenv("WALL_TIME_TEXT", "2.5")
+    limits = lane_limits_from_env()
+    assert limits[LANE_TYPESET].cpu_time == 900
+    assert limits[LANE_TEXT].heap_mb is None and limits[LANE_TEXT].wall_time == 2.5
+    assert limits[LANE_TEXT].output_mb == DEFAULT_LANE_LIMITS[LANE_TEXT].output_mb
+
+
+def test_convert_reports_limit(test_client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a conversion exceeding a limit is a 422 naming the limit."""
+    monkeypatch.setattr(worker_pool, "limits", {lane: ResourceLimits(heap_mb=8) for lane in LANES})
+    response = test_client.post("/convert", json={"contents": LARGE_SOURCE, "output_format": "html"})
+    assert response.status_code == 422
+    assert response.json()["limit"] == "heap_mb"
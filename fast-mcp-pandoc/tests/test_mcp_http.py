@@ -0,0 +1,206 @@
+"""
+Test suite for the MCP Streamable HTTP transport (/mcp).
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc import server
+from fast_mcp_pandoc.server import app, worker_pool
+from fast_mcp_pandoc.sessions import SESSION_HEADER, SessionStore, session_store
+from fast_mcp_pandoc.worker import JobCancelledError
+
+ACCEPT = {"Accept": "application/json, text/event-stream"}
+
+
+def rpc(method: str, request_id: Any = None, **params: Any) -> Dict[str, Any]:
+    """Build a JSON-RPC request, or a notification without ``request_id``."""
+    message: Dict[str, Any] = {"jsonrpc": "2.0", "method": method, "params": params}
+    if request_id is not None:
+        message["id"] = request_id
+    return message
+
+
+def call(request_id: int, contents: str, **meta: Any) -> Dict[str, Any]:
+    """Build a tools/call request of convert-contents."""
+    params: Dict[str, Any] = {"name": "convert-contents", "arguments": {"contents": contents, "output_format": "html"}}
+    if meta:
+        params["_meta"] = meta
+    return rpc("tools/call", request_id, **params)
+
+
+def open_session(client: TestClient) -> Dict[str, str]:
+    """Initialize a session and return the headers of its later requests."""
+    response = client.post("/mcp", headers=ACCEPT, json=rpc(
+        "initialize", 0, protocolVersion="2025-03-26", capabilities={}, clientInfo={"name": "test", "version": "1"}
+    ))
+    assert response.status_code == 200
+    assert response.json()["result"]["protocolVersion"] == "2025-03-26"
+    headers = {**ACCEPT, SESSION_HEADER: response.headers[SESSION_HEADER]}
+    assert client.post("/mcp", headers=headers, json=rpc("notifications/initialized")).status_code == 202
+    return headers
+
+
+def sse_messages(body: str) -> List[Dict[str, Any]]:
+    """Parse the JSON-RPC messages of an SSE response body."""
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_session_lifecycle(test_client: TestClient) -> None:
+    """Test initialize, tools/list, missing and unknown sessions and closing a session."""
+    headers = open_session(test_client)
+
+    tools = test_client.post("/mcp", headers=headers, json=rpc("tools/list", 1)).json()["result"]["tools"]
+    assert [tool["name"] for tool in tools] == ["convert-contents", "convert-batch"]
+    schema = tools[0]["inputSchema"]
+    assert schema["required"] == ["contents"] and "stream" not in schema["properties"]
+
+    assert test_client.post("/mcp", headers=ACCEPT, json=rpc("ping", 2)).status_code == 400
+    unknown = test_client.post("/mcp", headers={**ACCEPT, SESSION_HEADER: "unknown"}, json=rpc("ping", 2))
+    assert unknown.status_code == 404
+    assert test_client.post("/mcp", headers=headers, json=rpc("resources/templates", 3)).json()["error"]["code"] == -32601
+    assert test_client.get("/mcp").status_code == 405
+
+    assert test_client.delete("/mcp", headers=headers).status_code == 204
+    assert test_client.post("/mcp", headers=headers, json=rpc("ping", 4)).status_code == 404
+
+
+def test_batched_calls_run_concurrently(test_client: TestClient) -> None:
+    """Test that a batch of tool calls is answered with one response per request, in request order."""
+    headers = open_session(test_client)
+    batch = [call(i, f"# Document {i}") for i in range(1, 5)] + [rpc("ping", 5)]
+    responses = test_client.post("/mcp", headers=headers, json=batch).json()
+
+    assert [response["id"] for response in responses] == [1, 2, 3, 4, 5]
+    for i, response in enumerate(responses[:4], start=1):
+        assert response["result"]["isError"] is False
+        assert f"Document {i}</h1>" in response["result"]["content"][0]["text"]
+
+    invalid = test_client.post("/mcp", headers=headers, json=call(6, "x") | {"params": {"name": "unknown"}})
+    assert invalid.json()["error"]["code"] == -32602
+    failed = test_client.post("/mcp", headers=headers, json=rpc(
+        "tools/call", 7, name="convert-contents", arguments={"contents": "x", "output_format": "docx"}
+    ))
+    assert failed.json()["error"]["code"] == -32602
+
+
+def test_progress_is_streamed_before_the_response(test_client: TestClient) -> None:
+    """Test that a call with a progressToken is answered as SSE with increasing progress notifications."""
+    headers = open_session(test_client)
+    response = test_client.post("/mcp", headers=headers, json=call(1, "# Progress\n\ntext", progressToken="p1"))
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    messages = sse_messages(response.text)
+    progress = [message["params"] for message in messages if message.get("method") == "notifications/progress"]
+    assert progress and all(params["progressToken"] == "p1" for params in progress)
+    assert [params["progress"] for params in progress] == sorted({params["progress"] for params in progress})
+    assert messages[-1]["id"] == 1 and "Progress</h1>" in messages[-1]["result"]["content"][0]["text"]
+
+
+def test_cancellation_and_close_stop_running_calls(test_client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that notifications/cancelled and DELETE cancel the conversion tasks of the session's calls."""
+    cancelled: List[str] = []
+    monkeypatch.setattr(worker_pool, "cancel", lambda task_id, reason="": cancelled.append(task_id) or True)
+    headers = open_session(test_client)
+    session = session_store.get(headers[SESSION_HEADER])
+    session.calls.update({7: "task-7", 8: "task-8"})
+
+    notification = rpc("notifications/cancelled", requestId=7, reason="user aborted")
+    assert test_client.post("/mcp", headers=headers, json=notification).status_code == 202
+    assert cancelled == ["task-7"]
+    assert test_client.delete("/mcp", headers=headers).status_code == 204
+    assert cancelled == ["task-7", "task-7", "task-8"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_gets_no_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a call cancelled with notifications/cancelled is not answered."""
+    loop = asyncio.get_running_loop()
+    futures: Dict[str, asyncio.Future] = {}
+
+    async def submit_task(task: Any) -> asyncio.Future:
+        futures[task.task_id] = loop.create_future()
+        return futures[task.task_id]
+
+    def cancel(task_id: str, reason: str = "") -> bool:
+        futures[task_id].set_exception(JobCancelledError(f"Conversion cancelled: {reason}"))
+        return True
+
+    monkeypatch.setattr(worker_pool, "submit_task", submit_task)
+    monkeypatch.setattr(worker_pool, "cancel", cancel)
+    session = session_store.create("2025-03-26")
+    try:
+        answer = asyncio.ensure_future(server.mcp_request(session, call(1, "# One")))
+        while 1 not in session.calls:
+            await asyncio.sleep(0.01)
+        server.mcp_notification(session, rpc("notifications/cancelled", requestId=1, reason="user aborted"))
+        assert await asyncio.wait_for(answer, timeout=10) is None
+        assert not session.calls and not session.cancelled
+    finally:
+        session_store.close(session.session_id)
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_calls_of_a_json_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the calls of a JSON response are cancelled when the client disconnects."""
+    started = asyncio.Event()
+    cancelled: List[Any] = []
+
+    async def hanging_request(session: Any, message: Dict[str, Any], notify: Any = None) -> Dict[str, Any]:
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(message["id"])
+            raise
+        return {}
+
+    monkeypatch.setattr(server, "mcp_request", hanging_request)
+    session = session_store.create("2025-03-26")
+    body = json.dumps([call(1, "# One"), call(2, "# Two")]).encode()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive() -> Dict[str, Any]:
+        if messages:
+            return messages.pop(0)
+        await started.wait()
+        return {"type": "http.disconnect"}
+
+    sent: List[Dict[str, Any]] = []
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/mcp", "raw_path": b"/mcp", "query_string": b"", "root_path": "", "server": ("test", 80),
+        "client": ("test", 1234),
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"accept", b"application/json"),
+            (SESSION_HEADER.lower().encode(), session.session_id.encode()),
+        ],
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=10)
+    assert sorted(cancelled) == [1, 2]
+    session_store.close(session.session_id)
+
+
+def test_session_store_expires_and_evicts_idle_sessions() -> None:
+    """Test that idle sessions expire and make room, while busy sessions are kept."""
+    store = SessionStore(ttl=60, max_sessions=2)
+    busy = store.create("2025-03-26")
+    busy.calls[1] = "task"
+    idle = store.create("2025-03-26")
+    newest = store.create("2025-03-26")
+    assert store.get(idle.session_id) is None and store.get(busy.session_id) is busy
+
+    newest.last_seen -= 120
+    busy.last_seen -= 120
+    store.sweep()
+    assert store.get(newest.session_id) is None and store.stats()["sessions"] == 1
+    assert store.stats()["evicted"] == 1 and store.stats()["expired"] == 1
@@ -0,0 +1,117 @@
+"""
+Test suite for multi-target conversions (parse once, render many).
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, List, Tuple
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.models import ConversionRequest, ConversionTarget
+from fast_mcp_pandoc.worker import ConversionTask, WorkerPool
+
+
+@pytest_asyncio.fixture
+async def worker_pool() -> WorkerPool:
+    """Create a test worker pool."""
+    pool = WorkerPool(max_workers=3)
+    yield pool
+    await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_multi_target_parses_once(worker_pool: WorkerPool, test_markdown_content: str, tmp_path) -> None:
+    """Test that all targets are rendered from a single parse."""
+    target_updates: List[Tuple[int, int]] = []
+    request = ConversionRequest(
+        contents=test_markdown_content,
+        input_format="markdown",
+        targets=[
+            ConversionTarget(output_format="html"),
+            ConversionTarget(output_format="rst", output_file=str(tmp_path / "out.rst")),
+            ConversionTarget(output_format="docx", output_file=str(tmp_path / "out.docx")),
+        ],
+    )
+    task = ConversionTask(
+        request=request,
+        task_id="multi-target",
+        progress_callback=lambda task_id, percentage, message: None,
+        target_callback=lambda task_id, index, percentage, message: target_updates.append((index, percentage)),
+    )
+
+    with patch.object(worker_pool.engine, "parse", wraps=worker_pool.engine.parse) as parse:
+        results = await asyncio.wait_for(await worker_pool.submit_task(task), timeout=30.0)
+
+    assert parse.call_count == 1
+    assert [entry["status"] for entry in results] == ["complete"] * 3
+    assert "<h1" in results[0]["result"]
+    assert os.path.exists(tmp_path / "out.rst")
+    assert os.path.exists(tmp_path / "out.docx")
+    assert sorted(index for index, percentage in target_updates if percentage == 100) == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_multi_target_reports_failed_target(worker_pool: WorkerPool, tmp_path) -> None:
+    """Test that one failing target does not fail the others."""
+    request = ConversionRequest(
+        contents="# Test",
+        targets=[
+            ConversionTarget(output_format="html"),
+            ConversionTarget(output_format="pdf", output_file=str(tmp_path / "not-a-pdf.txt")),
+        ],
+    )
+    task = ConversionTask(
+        request=request,
+        task_id="multi-target-error",
+        progress_callback=lambda task_id, percentage, message: None,
+    )
+
+    results = await asyncio.wait_for(await worker_pool.submit_task(task), timeout=30.0)
+
+    assert results[0]["status"] == "complete"
+    assert results[1]["status"] == "error"
+
+
+def test_convert_endpoint_with_targets(test_client: TestClient, test_markdown_content: str) -> None:
+    """Test the /convert endpoint with several targets."""
+    response = test_client.post(
+        "/convert",
+        json={
+            "contents": test_markdown_content,
+            "targets": [{"output_format": "html"}, {"output_format": "txt"}],
+        },
+    )
+
+    assert response.status_code == 200
+    result = response.json()["result"]
+    assert [entry["output_format"] for entry in result] == ["html", "txt"]
+    assert "<h1" in result[0]["result"]
+
+
+def test_convert_stream_with_targets(test_client: TestClient, test_markdown_content: str) -> None:
+    """Test per-target and aggregate events on /convert/stream."""
+    events: List[Any] = []
+    with test_client.stream(
+        "GET",
+        "/convert/stream",
+        params={
+            "contents": test_markdown_content,
+            "targets": json.dumps([{"output_format": "html"}, {"output_format": "markdown"}]),
+        },
+    ) as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+                if events[-1]["event"] in ("complete", "error"):
+                    break
+
+    target_complete = [e for e in events if e["event"] == "target_complete"]
+    assert sorted(e["data"]["index"] for e in target_complete) == [0, 1]
+    assert events[-1]["event"] == "complete"
+    assert len(events[-1]["data"]["result"]) == 2
@@ -0,0 +1,130 @@
+"""
+Test suite for the pandoc server backend.
+"""
+
+import threading
+import time
+from typing import Any, List, Tuple
+
+import pytest
+
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc import pandoc_server
+from mcp_pandoc.pandoc_server import PandocServerInstance, PandocServerPool, PandocServerUnavailable
+
+
+class FakePool:
+    """Records conversions instead of talking to pandoc server."""
+
+    def __init__(self, available: bool = True):
+        self.available = available
+        self.calls: List[Tuple[str, str, str]] = []
+
+    def convert(self, text: str, input_format: str, output_format: str) -> str:
+        self.calls.append((text, input_format, output_format))
+        if not self.available:
+            raise PandocServerUnavailable("down")
+        return "<p>from pool</p>"
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FakeProcess:
+    """Stands in for a pandoc server process; records every started process."""
+
+    started: List["FakeProcess"] = []
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        time.sleep(0.05)
+        self.returncode = None
+        FakeProcess.started.append(self)
+
+    def poll(self) -> Any:
+        return self.returncode
+
+    def terminate(self) -> None:
+        self.returncode = -15
+
+    kill = terminate
+
+    def wait(self, timeout: Any = None) -> Any:
+        return self.returncode
+
+
+@pytest.fixture
+def engine() -> PandocEngine:
+    """Create an engine without a server pool."""
+    return PandocEngine()
+
+
+def test_text_conversions_use_pool(engine: PandocEngine) -> None:
+    """Test that text-to-text conversions are routed to the pool."""
+    engine.server_pool = FakePool()
+    assert engine.convert("hello", input_format="markdown", output_format="html") == "<p>from pool</p>"
+    assert engine.server_pool.calls == [("hello", "markdown", "html")]
+
+
+def test_pool_writes_text_output_file(engine: PandocEngine, tmp_path) -> None:
+    """Test that pooled conversions honour output_file."""
+    engine.server_pool = FakePool()
+    output_file = tmp_path / "out.html"
+    assert engine.convert("hello", input_format="markdown", output_format="html", output_file=str(output_file)) == ""
+    assert output_file.read_text() == "<p>from pool</p>"
+
+
+def test_binary_and_extra_args_bypass_pool(engine: PandocEngine, tmp_path) -> None:
+    """Test that binary outputs and custom pandoc arguments run as a subprocess."""
+    engine.server_pool = FakePool()
+    engine.convert("hello", input_format="markdown", output_format="docx", output_file=str(tmp_path / "out.docx"))
+    engine.convert("hello", input_format="markdown", output_format="html", extra_args=["--standalone"])
+    assert engine.server_pool.calls == []
+
+
+def test_unavailable_pool_falls_back_to_subprocess(engine: PandocEngine) -> None:
+    """Test the subprocess fallback when no server instance is reachable."""
+    engine.server_pool = FakePool(available=False)
+    result = engine.convert("# Test", input_format="markdown", output_format="html")
+    assert "<h1" in result
+
+
+def test_live_pool_restarts_crashed_instance(engine: PandocEngine) -> None:
+    """Test conversions and crash recovery against real pandoc server processes."""
+    if "server" not in engine.features:
+        pytest.skip("pandoc was built without server support")
+    pool = PandocServerPool(engine.pandoc_path, size=1, health_interval=60)
+    try:
+        pool.start()
+    except PandocServerUnavailable:
+        pytest.skip("pandoc server cannot run in this environment")
+    try:
+        assert "<em>" in pool.convert("*hi*", "markdown", "html")
+        pool.instances[0].process.kill()
+        pool.instances[0].process.wait()
+        assert pool.health_check() == 1
+        assert pool.instances[0].restarts == 1
+        assert "<em>" in pool.convert("*hi*", "markdown", "html")
+    finally:
+        pool.shutdown()
+
+
+def test_concurrent_restarts_start_one_process(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the monitor and request threads restarting a dead instance start one process."""
+    monkeypatch.setattr(pandoc_server.subprocess, "Popen", FakeProcess)
+    monkeypatch.setattr(FakeProcess, "started", [])
+    instance = PandocServerInstance("pandoc")
+    monkeypatch.setattr(instance, "is_healthy", lambda: instance.process is not None and instance.process.poll() is None)
+    instance.start()
+    instance.process.kill()
+
+    results: List[bool] = []
+    threads = [threading.Thread(target=lambda: results.append(instance.restart())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False, False, False, True] and instance.restarts == 1
+    # The crashed process and the replacement, no orphaned server
+    assert len(FakeProcess.started) == 2
+    assert [process for process in FakeProcess.started if process.poll() is None] == [instance.process]
@@ -0,0 +1,284 @@
+"""
+Test suite for PDF builds with precompiled LaTeX formats.
+"""
+
+import asyncio
+import os
+import stat
+import sys
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from fast_mcp_pandoc.models import ConversionRequest
+from mcp_pandoc.cache import ConversionCache
+from mcp_pandoc.engine import PandocEngine, default_extra_args
+from mcp_pandoc.pdf import (DocumentFeatures, PdfBuilder, document_features, installed_pdf_engines, latex_engine,
+                            needs_rerun, select_pdf_engine, split_preamble, with_pdf_engine)
+
+# Stands in for a LaTeX engine: dumps formats with -ini, otherwise ships out three pages and writes a PDF and a log.
+# Every invocation is appended to $FAKE_TEX_CALLS.
+FAKE_ENGINE = f"""#!{sys.executable}
+import os, sys
+args = sys.argv[1:]
+with open(os.environ["FAKE_TEX_CALLS"], "a") as calls:
+    calls.write(" ".join(args) + "\\n")
+option = lambda name: next((a.split("=", 1)[1] for a in args if a.startswith(name + "=")), None)
+out = option("-output-directory")
+if "-ini" in args:
+    open(os.path.join(out, option("-jobname") + ".fmt"), "w").write("format")
+    sys.exit(0)
+tex = open(args[-1]).read()
+if "\\\\fail" in tex and option("-fmt") or "-halt" in args:
+    sys.exit(1)
+toc = os.path.join(out, "document.toc")
+previous = open(toc).read() if os.path.exists(toc) else None
+if "\\\\tableofcontents" in tex:
+    open(toc, "w").write("contents")
+print("This is FakeTeX [1] [2] [3]", flush=True)
+rerun = "Rerun to get cross-references right" if previous is None and "\\\\ref" in tex else ""
+open(os.path.join(out, "document.log"), "w").write(rerun + "\\nOutput written on document.pdf (3 pages, 1234 bytes).")
+open(os.path.join(out, "document.pdf"), "wb").write(b"%PDF-1.5 fake")
+"""
+
+FAKE_KPSEWHICH = "#!/bin/sh\necho /usr/share/texmf/tex/latex/mylatexformat/mylatexformat.ltx\n"
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+@pytest.fixture
+def fake_tex(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """Put a fake pdflatex, xelatex and kpsewhich first on the PATH and return the call log."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, script in (("pdflatex", FAKE_ENGINE), ("xelatex", FAKE_ENGINE), ("kpsewhich", FAKE_KPSEWHICH)):
+        path = bin_dir / name
+        path.write_text(script)
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    calls = tmp_path / "calls.txt"
+    calls.touch()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_TEX_CALLS", str(calls))
+    installed_pdf_engines.cache_clear()
+    yield calls
+    installed_pdf_engines.cache_clear()
+
+
+def test_latex_engine_splits_pdf_options() -> None:
+    """Test that the engine and its options are taken off the pandoc arguments."""
+    engine, opts, rest = latex_engine(
+        ["--pdf-engine=xelatex", "-V", "geometry:margin=1in", "--pdf-engine-opt", "-shell-escape"]
+    )
+    assert (engine, opts, rest) == ("xelatex", ["-shell-escape"], ["-V", "geometry:margin=1in"])
+    assert latex_engine(["--pdf-engine=/usr/bin/lualatex"])[0] == "lualatex"
+    assert latex_engine([])[0] == "pdflatex"
+
+
+def test_split_preamble_excludes_metadata(engine: PandocEngine) -> None:
+    """Test that the dumped preamble does not depend on the title and ends before fonts for xelatex."""
+    preambles = []
+    for title in ("First", "Second"):
+        latex = engine.convert(f"---\ntitle: {title}\n---\n\nText.\n", output_format="latex", extra_args=["-s"])
+        preamble, rest = split_preamble(latex, "xelatex")
+        assert title not in preamble and rest.lstrip().startswith("\\hypersetup")
+        preambles.append(preamble)
+    assert preambles[0] == preambles[1]
+
+    latex = engine.convert("---\nmainfont: DejaVu Serif\n---\n\nText.\n", output_format="latex", extra_args=["-s"])
+    assert "\\setmainfont" not in split_preamble(latex, "xelatex")[0]
+    assert "\\setmainfont" in split_preamble(latex, "pdflatex")[0]
+    assert split_preamble("Text without preamble\n", "xelatex") is None
+
+
+def test_needs_rerun() -> None:
+    """Test that rerun warnings and changed contents lists trigger another pass."""
+    assert needs_rerun("LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.", {}, {})
+    assert needs_rerun("", {}, {".toc": "a"})
+    assert not needs_rerun("Output written on document.pdf", {".toc": "a"}, {".toc": "a"})
+
+
+def test_builder_reuses_formats(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that the preamble is dumped once and loaded by later builds."""
+    builder = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    assert builder.can_build(["--pdf-engine=xelatex"])
+    assert not builder.can_build(["--pdf-engine=weasyprint"])
+
+    output = tmp_path / "out.pdf"
+    for title in ("First", "Second"):
+        source = f"---\ntitle: {title}\n---\n\nText.\n"
+        result = builder.build(source, "markdown", None, str(output), ["--pdf-engine=xelatex"])
+        assert result.format_used and result.passes == 1
+        assert output.read_bytes().startswith(b"%PDF")
+
+    calls: List[str] = fake_tex.read_text().splitlines()
+    assert sum("-ini" in call for call in calls) == 1
+    builds = [call for call in calls if call.endswith("document.tex") and "-ini" not in call]
+    assert len(builds) == 2 and all("-fmt=pandoc-xelatex-" in call for call in builds)
+    assert builder.stats()["formats_built"] == 1 and builder.stats()["format_hits"] == 2
+
+
+def test_builder_counts_passes(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that cross-references and a table of contents take another pass."""
+    builder = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    source = "---\ntoc: true\n---\n\n# A {#a}\n\nSee [A](#a) and \\ref{a}.\n"
+    result = builder.build(source, "markdown", None, str(tmp_path / "out.pdf"), ["--pdf-engine=xelatex"])
+    assert result.passes == 2
+
+
+def test_builder_reuses_build_state(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that a re-render finds the contents of the previous build and takes one pass."""
+    builder = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    source = "---\ntoc: true\n---\n\n# A {#a}\n\nSee \\ref{a}.\n"
+    output = str(tmp_path / "out.pdf")
+    first = builder.build(source, "markdown", None, output, ["--pdf-engine=xelatex"], document_id="doc")
+    assert first.passes == 2 and not first.state_reused
+    second = builder.build(source + "\nMore.\n", "markdown", None, output, ["--pdf-engine=xelatex"],
+                           document_id="doc")
+    assert second.passes == 1 and second.report()["latex_state_reused"]
+
+    # Without a document id the output file keys the build directory
+    other = builder.build(source, "markdown", None, str(tmp_path / "other.pdf"), ["--pdf-engine=xelatex"])
+    assert other.passes == 2
+    assert builder.stats()["build_dirs"] == 2 and builder.stats()["state_reused"] == 1
+
+
+def test_builder_reports_progress(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that pages shipped out are reported against the page count of the previous build."""
+    builder = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    output = str(tmp_path / "out.pdf")
+    for _ in range(2):
+        updates = []
+        builder.build("Text.\n", "markdown", None, output, ["--pdf-engine=xelatex"], document_id="doc",
+                      progress=lambda fraction, message: updates.append((fraction, message)))
+    messages = [message for _, message in updates]
+    assert messages[:2] == ["Rendering LaTeX", "LaTeX pass 1"]
+    assert "LaTeX pass 1, page 3 of about 3" in messages
+    fractions = [fraction for fraction, _ in updates]
+    assert fractions == sorted(fractions) and fractions[-1] < 1.0
+
+
+def test_builder_evicts_build_dirs(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that build directories are bounded and failed builds leave no state behind."""
+    builder = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"), max_build_dirs=2)
+    output = str(tmp_path / "out.pdf")
+    for document_id in ("a", "b", "c"):
+        builder.build("Text.\n", "markdown", None, output, ["--pdf-engine=xelatex"], document_id=document_id)
+    assert builder.stats()["build_dirs"] == 2 and builder.stats()["build_dirs_evicted"] == 1
+
+    broken = PdfBuilder(engine.pandoc_path, str(tmp_path / "broken"), max_formats=0)
+    with pytest.raises(RuntimeError):
+        broken.build("Text.\n", "markdown", None, output, ["--pdf-engine=xelatex", "--pdf-engine-opt=-halt"])
+    assert broken.stats()["build_dirs"] == 0
+
+    temporary = PdfBuilder(engine.pandoc_path, str(tmp_path / "temporary"), max_build_dirs=0)
+    assert temporary.build("Text.\n", "markdown", None, output, ["--pdf-engine=xelatex"]).passes == 1
+    assert temporary.stats()["build_dirs"] == 0
+
+
+def test_builder_drops_broken_formats(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that a document failing with its format is built without it from then on."""
+    builder = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    source = "---\nheader-includes: \\newcommand{\\fail}{}\n---\n\nText.\n"
+    output = str(tmp_path / "out.pdf")
+    assert not builder.build(source, "markdown", None, output, ["--pdf-engine=xelatex"]).format_used
+    assert not builder.build(source, "markdown", None, output, ["--pdf-engine=xelatex"]).format_used
+    assert sum("-fmt=" in call for call in fake_tex.read_text().splitlines()) == 1
+
+
+def test_engine_uses_builder_for_pdf(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that PDF conversions of the engine go through the builder."""
+    pdf_engine = PandocEngine(engine.pandoc_path)
+    pdf_engine.pdf = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    output = tmp_path / "out.pdf"
+    pdf_engine.convert("# A\n", output_format="pdf", output_file=str(output), extra_args=["--pdf-engine=xelatex"])
+    assert output.read_bytes().startswith(b"%PDF")
+    assert pdf_engine.pdf.stats()["builds"] == 1
+
+
+def test_document_features(engine: PandocEngine) -> None:
+    """Test that scripts, fonts, math, raw LaTeX and tables are detected."""
+    features = document_features(engine.parse("Café naïve – “quoted”.\n\n| a |\n|---|\n| 1 |\n"))
+    assert not features.non_latin and features.tables == 1 and features.simple_layout
+    assert document_features(engine.parse("Привет, мир.")).non_latin
+    assert document_features(engine.parse("---\nmainfont: Noto Serif\n---\n\nText.")).custom_fonts
+    assert document_features(engine.parse("Text."), ["-V", "mainfont=Noto Serif"]).custom_fonts
+    math = document_features(engine.parse("$a$ and $$b$$\n\nText."))
+    assert math.math == 2 and math.math_density == 1.0 and not math.simple_layout
+    assert document_features(engine.parse("\\newpage")).raw_tex
+    assert document_features(engine.parse("Text."), ["-V", "geometry:margin=1in"]).simple_layout
+    assert not document_features(engine.parse("Text."), ["-V", "geometry:a5paper"]).simple_layout
+
+
+def test_select_pdf_engine() -> None:
+    """Test that the fastest installed engine able to render the document is picked."""
+    everything = ["wkhtmltopdf", "weasyprint", "pdflatex", "xelatex", "lualatex"]
+    assert select_pdf_engine(DocumentFeatures(), everything) == "wkhtmltopdf"
+    assert select_pdf_engine(DocumentFeatures(), ["weasyprint", "xelatex"]) == "weasyprint"
+    assert select_pdf_engine(DocumentFeatures(math=3), everything) == "pdflatex"
+    assert select_pdf_engine(DocumentFeatures(math=3, non_latin=True), everything) == "xelatex"
+    assert select_pdf_engine(DocumentFeatures(custom_fonts=True), ["pdflatex", "lualatex"]) == "lualatex"
+    assert select_pdf_engine(DocumentFeatures(), []) == "xelatex"
+
+
+def test_with_pdf_engine_translates_margins() -> None:
+    """Test that the LaTeX margin becomes margin variables for HTML engines."""
+    args = default_extra_args("pdf")
+    assert with_pdf_engine(args, "pdflatex") == ["--pdf-engine=pdflatex", "-V", "geometry:margin=1in"]
+    html = with_pdf_engine(args, "weasyprint")
+    assert html[0] == "--pdf-engine=weasyprint" and "margin-left=1in" in html and "geometry:margin=1in" not in html
+    assert default_extra_args("pdf", "lualatex")[0] == "--pdf-engine=lualatex"
+
+
+def test_engine_reports_selected_engine(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that automatic selection picks pdflatex for Latin text and xelatex otherwise."""
+    pdf_engine = PandocEngine(engine.pandoc_path)
+    pdf_engine.pdf = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    output = str(tmp_path / "out.pdf")
+    for source, expected in (("$x$ in Latin text.", "pdflatex"), ("$x$ по-русски.", "xelatex")):
+        report = {}
+        pdf_engine.convert(source, output_format="pdf", output_file=output, extra_args=default_extra_args("pdf"),
+                           report=report)
+        assert report["pdf_engine"] == expected and report["latex_passes"] == 1
+
+    report = {}
+    pdf_engine.convert("Text.", output_format="pdf", output_file=output,
+                       extra_args=default_extra_args("pdf", "xelatex"), report=report)
+    assert report["pdf_engine"] == "xelatex"
+
+
+def test_auto_engine_is_resolved_on_cache_misses_only(engine: PandocEngine, fake_tex: Path, tmp_path: Path) -> None:
+    """Test that PDF cache hits with --pdf-engine=auto start no process and cache no parsed AST."""
+    pdf_engine = PandocEngine(engine.pandoc_path)
+    pdf_engine.pdf = PdfBuilder(engine.pandoc_path, str(tmp_path / "tex"))
+    pdf_engine.cache = ConversionCache()
+    runs: List[str] = []
+    convert, aconvert = pdf_engine._convert, pdf_engine._aconvert
+    pdf_engine._convert = lambda *args, **kwargs: runs.append(args[2]) or convert(*args, **kwargs)
+
+    async def counted(*args, **kwargs):
+        runs.append(args[2])
+        return await aconvert(*args, **kwargs)
+
+    pdf_engine._aconvert = counted
+    output = str(tmp_path / "out.pdf")
+    arguments = dict(output_format="pdf", output_file=output, extra_args=default_extra_args("pdf"))
+    pdf_engine.convert("$x$ in Latin text.", **arguments)
+    assert runs == ["pdf", "json"]
+
+    pdf_engine.convert("$x$ in Latin text.", **arguments)
+    asyncio.run(pdf_engine.aconvert("$x$ in Latin text.", **arguments))
+    assert runs == ["pdf", "json"] and Path(output).read_bytes().startswith(b"%PDF")
+    assert pdf_engine.cache.stats()["hits"] == 2 and pdf_engine.cache.stats()["memory_entries"] == 1
+
+
+def test_pdf_engine_validation() -> None:
+    """Test that unknown PDF engines are rejected and PDF builds accept a document id."""
+    assert ConversionRequest(input_file="a.md", output_format="pdf", output_file="a.pdf", document_id="a").document_id
+    assert ConversionRequest(contents="x", output_format="html", pdf_engine="XeLaTeX").pdf_engine == "xelatex"
+    with pytest.raises(ValueError):
+        ConversionRequest(contents="x", output_format="html", pdf_engine="word")
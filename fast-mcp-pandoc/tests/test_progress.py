@@ -0,0 +1,108 @@
+"""
+Test suite for progress parsed from pandoc and LaTeX output and the throughput estimates.
+"""
+
+from typing import Any, List, Optional, Tuple
+
+import pytest
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import (CONVERT_PROGRESS_END, CONVERT_PROGRESS_START, DEFAULT_IDLE_TIMEOUT, MODE_ASYNCIO,
+                                    MODE_THREAD, ConversionTask, WorkerPool)
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc.progress import (TRACE_MIN_LINES, LatexProgress, PandocProgress, ThroughputTracker, count_lines,
+                                 log_pages, progress_args)
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+def test_pandoc_progress_parses_trace_and_info() -> None:
+    """Test that trace lines become reading fractions and warnings are passed through."""
+    updates: List[Tuple[Optional[float], str]] = []
+    parser = PandocProgress(lambda fraction, message: updates.append((fraction, message)), total_lines=100)
+    assert parser.feed("[trace] Parsed [Header 1 (\"a\",[],[]) [Str \"A\"]] at line 50")
+    # Updates are throttled
+    assert parser.feed("[trace] Parsed [Para [Str \"b\"]] at line 60")
+    assert parser.feed("[INFO] Fetching https://example.org/image.png...")
+    assert parser.feed("  continued message")
+    assert parser.feed("[INFO] Not rendering RawBlock (Format \"html\") \"<div>\"")
+    assert not parser.feed("[WARNING] Could not fetch resource image.png")
+    assert not parser.feed("  replacing image with description")
+
+    assert updates == [(0.25, "Reading input (line 50 of 100)"), (None, "Fetching https://example.org/image.png")]
+
+
+def test_progress_args_and_counts(tmp_path: Any) -> None:
+    """Test that only long inputs are traced and that lines and pages are counted."""
+    assert "--trace" not in progress_args(10)
+    assert "--trace" in progress_args(TRACE_MIN_LINES)
+    path = tmp_path / "input.md"
+    path.write_text("a\nb\nc\n")
+    assert count_lines(input_file=str(path)) == 4 and count_lines("a\nb") == 2
+    assert count_lines(input_file=str(tmp_path / "missing.md")) == 0
+    assert log_pages("Output written on document.pdf (12 pages, 34567 bytes).") == 12
+    assert log_pages("No pages of output.") is None
+
+
+def test_latex_progress_counts_pages() -> None:
+    """Test that pages shipped out are counted per pass against the expected page count."""
+    updates: List[Tuple[Optional[float], str]] = []
+    tracker = LatexProgress(lambda fraction, message: updates.append((fraction, message)), 4, expected_passes=2)
+    tracker.start_pass()
+    # Bracketed numbers that are not the next page are ignored
+    tracker.feed("(./document.tex [2024/01/01] [1] [2]")
+    tracker.end_pass("Output written on document.pdf (4 pages, 1 bytes).")
+    tracker.start_pass()
+
+    assert updates[0] == (0.0, "LaTeX pass 1")
+    assert updates[1] == (0.25, "LaTeX pass 1, page 2 of about 4")
+    assert updates[2] == (0.5, "LaTeX pass 2")
+    # A third pass raises the expected number of passes
+    tracker.start_pass()
+    assert updates[3] == (2 / 3, "LaTeX pass 3")
+
+
+def test_throughput_tracker() -> None:
+    """Test that estimates scale with the input size and follow recent conversions."""
+    tracker = ThroughputTracker(alpha=0.5)
+    assert tracker.estimate("html", 1000) is None
+    tracker.record("html", 1000, 1.0)
+    assert tracker.estimate("html", 2000) == pytest.approx(2.0)
+    tracker.record("html", 1000, 3.0)
+    assert tracker.estimate("html", 1000) == pytest.approx(2.0)
+    assert tracker.stats() == {"html": {"bytes_per_second": 500.0, "conversions": 2}}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_reports_real_progress(engine: PandocEngine, mode: str) -> None:
+    """Test that long conversions report parsed progress with an ETA and record their throughput."""
+    pool = WorkerPool(max_workers=1, engine=engine, mode=mode, chunk_threshold=0)
+    source = "\n".join(f"Paragraph {index} with *emphasis*.\n" for index in range(TRACE_MIN_LINES))
+    request = ConversionRequest(contents=source, output_format="html")
+    updates: List[Tuple[int, Any, Optional[float]]] = []
+    try:
+        task = ConversionTask(
+            request=request,
+            task_id="progress",
+            progress_callback=lambda task_id, percentage, message: updates.append((percentage, message, task.eta))
+        )
+        assert pool.idle_timeout(request) == DEFAULT_IDLE_TIMEOUT
+        await (await pool.submit_task(task))
+    finally:
+        await pool.shutdown()
+
+    reading = [update for update in updates if str(update[1]).startswith("Reading input")]
+    assert reading and all(CONVERT_PROGRESS_START <= percentage < CONVERT_PROGRESS_END for percentage, _, _ in reading)
+    assert all(eta is not None for _, _, eta in reading)
+    percentages = [percentage for percentage, _, _ in updates]
+    assert percentages == sorted(percentages) and percentages[-1] == 100
+    assert task.eta is None
+
+    assert pool.stats()["throughput"]["html"]["conversions"] == 1
+    assert pool.estimate(request) is not None
+    assert pool.idle_timeout(request, eta=100.0) == 200.0
@@ -0,0 +1,115 @@
+"""
+Test suite for the cost-aware lane scheduler.
+"""
+
+import threading
+import time
+
+import pytest
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.scheduler import (LANE_PACKAGE, LANE_TEXT, LANE_TYPESET,
+                                       LaneScheduler, classify, default_lane_workers,
+                                       estimate_cost)
+from fast_mcp_pandoc.worker import ConversionTask, WorkerPool
+
+
+def test_classify_by_format_and_size() -> None:
+    """Test that jobs are routed by output format and input size."""
+    assert classify("html", 200) == LANE_TEXT
+    assert classify("txt", 200) == LANE_TEXT
+    assert classify("docx", 200) == LANE_PACKAGE
+    assert classify("epub", 200) == LANE_PACKAGE
+    assert classify("pdf", 200) == LANE_TYPESET
+    # A very large text input is moved out of the fast lane
+    assert classify("html", 10 * 1024 * 1024) == LANE_PACKAGE
+
+
+def test_estimate_cost_ordering() -> None:
+    """Test that the cost estimates rank formats, sizes and engines sensibly."""
+    assert estimate_cost("html", 1024) < estimate_cost("docx", 1024) < estimate_cost("pdf", 1024)
+    assert estimate_cost("html", 1024) < estimate_cost("html", 1024 * 1024)
+    assert estimate_cost("html", 1024, use_server=True) < estimate_cost("html", 1024)
+
+
+def test_default_lane_workers() -> None:
+    """Test that every lane gets at least one worker."""
+    assert default_lane_workers(1) == {LANE_TEXT: 1, LANE_PACKAGE: 1, LANE_TYPESET: 1}
+    assert default_lane_workers(8) == {LANE_TEXT: 8, LANE_PACKAGE: 4, LANE_TYPESET: 2}
+
+
+def test_saturated_lane_does_not_block_other_lanes() -> None:
+    """Test that a busy typesetting lane leaves the text lane free."""
+    scheduler = LaneScheduler({LANE_TEXT: 2, LANE_PACKAGE: 1, LANE_TYPESET: 1}, max_workers=2)
+    release = threading.Event()
+    try:
+        heavy = [scheduler.submit(LANE_TYPESET, release.wait, 10) for _ in range(3)]
+        start = time.monotonic()
+        assert scheduler.submit(LANE_TEXT, lambda: "done").result(timeout=5) == "done"
+        assert time.monotonic() - start < 1
+
+        stats = scheduler.stats()
+        assert stats[LANE_TYPESET]["running"] == 1
+        assert stats[LANE_TYPESET]["queued"] == 2
+        assert stats[LANE_TEXT]["completed"] == 1
+    finally:
+        release.set()
+        for future in heavy:
+            future.result(timeout=5)
+        scheduler.shutdown()
+
+
+def test_lanes_share_one_budget_by_weight() -> None:
+    """Test that an idle lane's workers are lent out and contended workers are shared by weight."""
+    scheduler = LaneScheduler({LANE_TEXT: 6, LANE_PACKAGE: 6, LANE_TYPESET: 6}, max_workers=6)
+    first, second = threading.Event(), threading.Event()
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def job(event: threading.Event) -> None:
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        event.wait(10)
+        with lock:
+            running[0] -= 1
+
+    try:
+        # Alone, the text lane borrows the whole budget
+        futures = [scheduler.submit(LANE_TEXT, job, first) for _ in range(6)]
+        futures += [scheduler.submit(lane, job, second) for lane in (LANE_TEXT, LANE_PACKAGE) for _ in range(6)]
+        assert scheduler.stats()[LANE_TEXT]["running"] == 6
+        assert scheduler.stats()[LANE_PACKAGE]["queued"] == 6
+
+        # Freed workers go to the lane furthest below its weighted share, 4:2 for text and package
+        first.set()
+        deadline = time.monotonic() + 5
+        while scheduler.stats()[LANE_TEXT]["completed"] < 6 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = scheduler.stats()
+        assert (stats[LANE_TEXT]["running"], stats[LANE_PACKAGE]["running"]) == (4, 2)
+    finally:
+        first.set()
+        second.set()
+        for future in futures:
+            future.result(timeout=5)
+        scheduler.shutdown()
+    assert running[1] == 6
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_reports_lanes() -> None:
+    """Test that the worker pool routes a conversion through the text lane."""
+    pool = WorkerPool(max_workers=2)
+    try:
+        request = ConversionRequest(contents="# Lane", output_format="html")
+        assert pool.lane_for(request, request.output_format) == LANE_TEXT
+        task = ConversionTask(
+            request=request,
+            task_id="lane-task",
+            progress_callback=lambda task_id, percentage, message: None
+        )
+        assert "<h1" in await (await pool.submit_task(task))
+        assert pool.stats()["lanes"][LANE_TEXT]["completed"] == 1
+    finally:
+        await pool.shutdown()
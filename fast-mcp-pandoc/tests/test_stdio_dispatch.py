@@ -0,0 +1,152 @@
+"""
+Test suite for concurrent tool calls, progress and cancellation in the stdio MCP server.
+"""
+
+import time
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import anyio
+import mcp.types as types
+import pytest
+from mcp.server import NotificationOptions
+from mcp.server.models import InitializationOptions
+
+from mcp_pandoc import dispatch
+from mcp_pandoc import server as stdio_server
+from mcp_pandoc.cancel import run
+
+DELAY = 0.5
+
+
+class SlowEngine:
+    """Stands in for the pandoc engine; each conversion runs ``sleep`` in the request's cancel scope."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.finished = 0
+
+    def convert(self, source: Optional[str] = None, progress: Optional[Any] = None, **kwargs: Any) -> str:
+        if progress is not None:
+            progress(0.5, "halfway")
+        run(["sleep", str(self.seconds)])
+        self.finished += 1
+        return f"<p>{source}</p>"
+
+
+class Client:
+    """A client talking JSON-RPC to :func:`dispatch.serve` over memory streams."""
+
+    def __init__(self, send: Any, receive: Any):
+        self.send_stream = send
+        self.receive_stream = receive
+        self.next_id = 0
+
+    async def request(self, method: str, params: Dict[str, Any]) -> int:
+        self.next_id += 1
+        message = types.JSONRPCRequest(jsonrpc="2.0", id=self.next_id, method=method, params=params)
+        await self.send_stream.send(types.JSONRPCMessage(message))
+        return self.next_id
+
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None) -> None:
+        message = types.JSONRPCNotification(jsonrpc="2.0", method=method, params=params)
+        await self.send_stream.send(types.JSONRPCMessage(message))
+
+    async def receive(self) -> Any:
+        with anyio.fail_after(10):
+            return (await self.receive_stream.receive()).root
+
+    async def responses(self, count: int) -> List[Any]:
+        """Receive messages until ``count`` responses arrived, returning all of them in order."""
+        messages = []
+        while sum(1 for message in messages if not isinstance(message, types.JSONRPCNotification)) < count:
+            messages.append(await self.receive())
+        return messages
+
+
+@asynccontextmanager
+async def serving(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[Client]:
+    """Serve the stdio server with a slow engine and a pool of four workers, and initialize a session."""
+    engine = SlowEngine(DELAY)
+    monkeypatch.setattr(stdio_server, "get_engine", lambda: engine)
+    monkeypatch.setattr(dispatch, "_executor", ThreadPoolExecutor(max_workers=4))
+    client_send, server_receive = anyio.create_memory_object_stream(16)
+    server_send, client_receive = anyio.create_memory_object_stream(16)
+    options = InitializationOptions(
+        server_name="mcp-pandoc",
+        server_version="0.1.0",
+        capabilities=stdio_server.server.get_capabilities(
+            notification_options=NotificationOptions(), experimental_capabilities={}
+        ),
+    )
+    async with anyio.create_task_group() as task_group:
+        task_group.start_soon(dispatch.serve, stdio_server.server, server_receive, server_send, options)
+        session = Client(client_send, client_receive)
+        session.engine = engine
+        await session.request("initialize", {
+            "protocolVersion": types.LATEST_PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "test", "version": "1.0"},
+        })
+        await session.receive()
+        await session.notify("notifications/initialized")
+        yield session
+        task_group.cancel_scope.cancel()
+
+
+def convert(text: str, **meta: Any) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
+        "name": "convert-contents", "arguments": {"contents": text, "output_format": "html"}
+    }
+    if meta:
+        params["_meta"] = meta
+    return params
+
+
+@pytest.mark.asyncio
+async def test_parallel_tool_calls_take_the_longest_not_the_sum(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that four calls of one session finish in about max(t) and tools/list is not blocked."""
+    async with serving(monkeypatch) as client:
+        start = time.monotonic()
+        ids = [await client.request("tools/call", convert(f"call {i}")) for i in range(4)]
+        listed = await client.request("tools/list", {})
+        messages = await client.responses(5)
+        elapsed = time.monotonic() - start
+
+        # tools/list is answered while the conversions are still running
+        assert messages[0].id == listed
+        # One after another they would take 4 * DELAY
+        assert elapsed < 2 * DELAY
+        results = {message.id: message.result["content"][0]["text"] for message in messages[1:]}
+        assert sorted(results) == ids and all(f"<p>call {i}</p>" in results[ids[i]] for i in range(4))
+
+
+@pytest.mark.asyncio
+async def test_progress_notifications(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a call with a progressToken receives notifications/progress before its result."""
+    async with serving(monkeypatch) as client:
+        request_id = await client.request("tools/call", convert("progress", progressToken="token-1"))
+        messages = await client.responses(1)
+
+        progress = [message for message in messages if isinstance(message, types.JSONRPCNotification)]
+        assert progress and progress[0].method == "notifications/progress"
+        assert progress[0].params == {"progressToken": "token-1", "progress": 50.0, "total": 100}
+        assert messages[-1].id == request_id
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_is_stopped_without_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that notifications/cancelled kills the conversion, frees its worker and suppresses the response."""
+    async with serving(monkeypatch) as client:
+        client.engine.seconds = 30
+        cancelled = await client.request("tools/call", convert("cancelled"))
+        await anyio.sleep(0.2)
+        start = time.monotonic()
+        await client.notify("notifications/cancelled", {"requestId": cancelled, "reason": "user aborted"})
+
+        client.engine.seconds = DELAY
+        later = await client.request("tools/call", convert("later"))
+        messages = await client.responses(1)
+        assert [message.id for message in messages] == [later]
+        assert time.monotonic() - start < 5 and client.engine.finished == 1
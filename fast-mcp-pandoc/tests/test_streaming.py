@@ -0,0 +1,112 @@
+"""
+Test suite for streamed conversions emitting their output as chunk events.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool
+from mcp_pandoc.engine import PandocEngine
+
+
+def document(sections: int) -> str:
+    """A markdown document with code blocks, about 1 KB per section."""
+    paragraph = "Text with *emphasis* and ümlauts. " * 30
+    return "\n".join(
+        f"# Section {index}\n\n{paragraph}\n\n```python\nprint({index})\n```\n" for index in range(sections)
+    )
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+def test_engine_stream_matches_convert(engine: PandocEngine) -> None:
+    """Test that the streamed output equals the converted one and is read in bounded pieces."""
+    source = document(50)
+    pieces = list(engine.stream(source, output_format="html", chunk_size=4096))
+    assert len(pieces) > 1
+    assert "".join(pieces) == engine.convert(source, output_format="html")
+
+    with pytest.raises(RuntimeError):
+        list(engine.stream("Text", output_format="html", extra_args=["--lua-filter=/nonexistent.lua"]))
+    with pytest.raises(ValueError):
+        list(engine.stream("Text", output_format="docx"))
+
+
+@pytest.mark.asyncio
+async def test_engine_astream_matches_convert(engine: PandocEngine) -> None:
+    """Test the asyncio variant of streaming."""
+    source = document(50)
+    pieces = [piece async for piece in engine.astream(source, output_format="rst", chunk_size=4096)]
+    assert "".join(pieces) == engine.convert(source, output_format="rst")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+@pytest.mark.parametrize("sections,output_format", [(5, "html"), (160, "html"), (160, "txt")])
+async def test_worker_pool_streams_chunks(engine: PandocEngine, mode: str, sections: int, output_format: str) -> None:
+    """Test that small and sectioned inputs stream ordered, bounded chunks with a checksum."""
+    pool = WorkerPool(max_workers=2, engine=engine, mode=mode, stream_chunk_size=1000)
+    chunks: List[Any] = []
+    source = document(sections)
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(contents=source, output_format=output_format, stream=True),
+            task_id="stream",
+            progress_callback=lambda task_id, percentage, message: None,
+            chunk_callback=lambda task_id, index, text: chunks.append((index, text))
+        )
+        assert await (await pool.submit_task(task)) == ""
+    finally:
+        await pool.shutdown()
+
+    assert [index for index, _ in chunks] == list(range(len(chunks)))
+    assert all(len(text) <= 1000 for _, text in chunks)
+    text = "".join(text for _, text in chunks)
+    assert text == engine.convert(source, output_format=output_format)
+    summary = task.info["stream"]
+    assert summary["length"] == len(text) and summary["chunks"] == len(chunks)
+    assert summary["sha256"] == hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def test_stream_validation() -> None:
+    """Test that streaming requires a text output returned to the client."""
+    assert ConversionRequest(contents="x", output_format="html", stream=True).stream
+    with pytest.raises(ValidationError):
+        ConversionRequest(contents="x", output_format="html", output_file="a.html", stream=True)
+    with pytest.raises(ValidationError):
+        ConversionRequest(contents="x", output_format="pdf", output_file="a.pdf", stream=True)
+
+
+def test_convert_stream_endpoint_chunks(test_client: TestClient, engine: PandocEngine) -> None:
+    """Test chunk events and the result-free complete event on /convert/stream."""
+    source = document(20)
+    events: List[Dict[str, Any]] = []
+    with test_client.stream(
+        "GET", "/convert/stream", params={"contents": source, "output_format": "html", "stream": "true"}
+    ) as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+                if events[-1]["event"] in ("complete", "error"):
+                    break
+
+    chunks = [event["data"] for event in events if event["event"] == "chunk"]
+    text = "".join(chunk["text"] for chunk in chunks)
+    assert text == engine.convert(source, output_format="html")
+    complete = events[-1]
+    assert complete["event"] == "complete" and "result" not in complete["data"]
+    assert complete["data"]["stream"]["sha256"] == hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    response = test_client.post("/convert", json={"contents": source, "output_format": "html", "stream": True})
+    assert response.status_code == 422
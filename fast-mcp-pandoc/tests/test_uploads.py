@@ -0,0 +1,210 @@
+"""
+Test suite for documents streamed from the request body into pandoc.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+from typing import Any, AsyncIterator, Dict, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fast_mcp_pandoc.models import ConversionRequest
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, MODE_THREAD, ConversionTask, WorkerPool
+from mcp_pandoc.engine import PandocEngine
+from mcp_pandoc.limits import ResourceLimits
+from mcp_pandoc.streams import InputStream
+
+SOURCE = "# Upload\n\nA **streamed** document with ümlauts.\n\n" + "Another paragraph of text.\n\n" * 200
+
+# Converts MB of generated markdown streamed through the worker pool and prints the peak RSS in KB
+PEAK_RSS_SCRIPT = textwrap.dedent(
+    """
+    import asyncio, os, resource, sys, tempfile
+    from fast_mcp_pandoc.models import ConversionRequest
+    from fast_mcp_pandoc.worker import ConversionTask, WorkerPool
+    from mcp_pandoc.engine import PandocEngine
+    from mcp_pandoc.streams import InputStream
+
+    async def chunks(size):
+        chunk = ("Paragraph with *emphasis* and a [link](https://example.org). " * 16 + "\\n\\n").encode()
+        for _ in range(size // len(chunk)):
+            await asyncio.sleep(0)
+            yield chunk
+
+    async def main(size):
+        pool = WorkerPool(max_workers=1, engine=PandocEngine(), mode=sys.argv[2])
+        with tempfile.TemporaryDirectory() as directory:
+            task = ConversionTask(
+                request=ConversionRequest(output_format="html", output_file=os.path.join(directory, "out.html")),
+                task_id="upload",
+                progress_callback=lambda task_id, percentage, message: None,
+                body=InputStream(chunks(size)),
+            )
+            try:
+                await (await pool.submit_task(task))
+            finally:
+                await pool.shutdown()
+            assert os.path.getsize(os.path.join(directory, "out.html")) > size
+
+    asyncio.run(main(int(sys.argv[1])))
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    """
+)
+
+
+async def body(data: bytes, chunk_size: int = 1000) -> AsyncIterator[bytes]:
+    """Deliver data in chunks like a request body."""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+def read_events(test_client: TestClient, path: str, **kwargs: Any) -> List[Dict[str, Any]]:
+    """POST to an SSE endpoint and return its events up to the final one."""
+    events: List[Dict[str, Any]] = []
+    with test_client.stream("POST", path, **kwargs) as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[6:]))
+                if events[-1].get("event") in ("complete", "error") or events[-1].get("status") in ("complete", "error"):
+                    break
+    return events
+
+
+@pytest.fixture(scope="module")
+def engine() -> PandocEngine:
+    """Create an engine without result cache."""
+    return PandocEngine()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_converts_body(engine: PandocEngine, mode: str) -> None:
+    """Test that a streamed body converts like the same document passed as contents."""
+    pool = WorkerPool(max_workers=1, engine=engine, mode=mode)
+    stream = InputStream(body(SOURCE.encode("utf-8")))
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(output_format="html"),
+            task_id="upload",
+            progress_callback=lambda task_id, percentage, message: None,
+            body=stream,
+        )
+        result = await (await pool.submit_task(task))
+    finally:
+        await pool.shutdown()
+
+    assert result == engine.convert(SOURCE, output_format="html")
+    assert stream.read_bytes == len(SOURCE.encode("utf-8")) and stream.done
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+async def test_worker_pool_enforces_input_limit_while_reading(engine: PandocEngine, mode: str) -> None:
+    """Test that a body without announced size fails once it exceeds the input size limit."""
+    pool = WorkerPool(max_workers=1, engine=engine, mode=mode)
+    try:
+        task = ConversionTask(
+            request=ConversionRequest(output_format="html"),
+            task_id="upload",
+            progress_callback=lambda task_id, percentage, message: None,
+            limits=ResourceLimits(input_mb=1),
+            body=InputStream(body(b"Some text.\n\n" * 200_000, chunk_size=64 * 1024)),
+        )
+        with pytest.raises(Exception, match="input size limit"):
+            await (await pool.submit_task(task))
+    finally:
+        await pool.shutdown()
+
+
+def test_convert_stream_raw_body(test_client: TestClient, engine: PandocEngine) -> None:
+    """Test POST /convert/stream with the document as raw body."""
+    events = read_events(
+        test_client,
+        "/convert/stream",
+        params={"output_format": "html"},
+        content=SOURCE.encode("utf-8"),
+        headers={"Content-Type": "text/markdown"},
+    )
+
+    assert events[-1]["event"] == "complete"
+    assert events[-1]["data"]["result"] == engine.convert(SOURCE, output_format="html")
+
+
+def test_convert_stream_multipart_body(test_client: TestClient, engine: PandocEngine) -> None:
+    """Test POST /convert/stream with the document as file field of a multipart form."""
+    events = read_events(
+        test_client,
+        "/convert/stream",
+        params={"output_format": "html", "stream": "true"},
+        data={"note": "ignored"},
+        files={"file": ("upload.md", SOURCE.encode("utf-8"), "text/markdown")},
+    )
+
+    text = "".join(event["data"]["text"] for event in events if event["event"] == "chunk")
+    assert events[-1]["event"] == "complete"
+    assert text == engine.convert(SOURCE, output_format="html")
+
+
+def test_convert_stream_spools_seeking_formats(test_client: TestClient, engine: PandocEngine) -> None:
+    """Test that docx bodies, which pandoc cannot read as a stream, are spooled and converted."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "upload.docx")
+        engine.convert(SOURCE, output_format="docx", output_file=path)
+        with open(path, "rb") as f:
+            document = f.read()
+
+    events = read_events(
+        test_client,
+        "/convert/stream",
+        params={"input_format": "docx", "output_format": "markdown"},
+        files={"file": ("upload.docx", document)},
+    )
+
+    assert events[-1]["event"] == "complete"
+    assert "**streamed** document" in events[-1]["data"]["result"]
+
+
+def test_convert_stream_multipart_without_file_field(test_client: TestClient) -> None:
+    """Test the error event for a multipart body without file field."""
+    events = read_events(
+        test_client, "/convert/stream", params={"output_format": "html"}, files={"document": ("upload.md", b"x")}
+    )
+
+    assert events[-1]["event"] == "error"
+    assert "no 'file' field" in events[-1]["data"]["message"]
+
+
+def test_mcp_sse_raw_body(test_client: TestClient, engine: PandocEngine) -> None:
+    """Test POST /sse invoking convert-contents on the request body."""
+    events = read_events(test_client, "/sse", params={"output_format": "html"}, content=SOURCE.encode("utf-8"))
+
+    assert events[-1]["status"] == "complete" and events[-1]["tool"] == "convert-contents"
+    assert events[-1]["output"] == engine.convert(SOURCE, output_format="html")
+
+    events = read_events(test_client, "/sse", params={"tool": "convert-batch"}, content=b"x")
+    assert events[-1]["status"] == "error"
+
+
+@pytest.mark.parametrize("mode", [MODE_THREAD, MODE_ASYNCIO])
+def test_peak_memory_does_not_grow_with_body_size(mode: str) -> None:
+    """Test that streaming a 4 MB body takes no more peak memory than a 1 MB body."""
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+
+    def peak_rss_kb(size: int) -> int:
+        completed = subprocess.run(
+            [sys.executable, "-c", PEAK_RSS_SCRIPT, str(size), mode],
+            capture_output=True, text=True, env=environment, timeout=300,
+        )
+        assert completed.returncode == 0, completed.stderr
+        return int(completed.stdout.split()[-1])
+
+    small = peak_rss_kb(1024 * 1024)
+    large = peak_rss_kb(4 * 1024 * 1024)
+    # Holding the body in memory would add at least the 3 MB difference
+    assert large - small < 2 * 1024, (small, large)
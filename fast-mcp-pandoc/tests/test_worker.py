@@ -9,8 +9,8 @@ from typing import Callable, List
 import pytest
 import pytest_asyncio
 
-from fast_mcp_pandoc.models import ConversionRequest
-from fast_mcp_pandoc.worker import ConversionTask, WorkerPool
+from fast_mcp_pandoc.models import ConversionRequest, ConversionTarget
+from fast_mcp_pandoc.worker import MODE_ASYNCIO, ConversionTask, WorkerPool
 
 
 @pytest.fixture
@@ -157,3 +157,42 @@ async def test_worker_pool_concurrent_tasks(
     for result in results:
         assert isinstance(result, str)
         assert "<h1" in result  # Check for HTML tags
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_asyncio_mode(test_conversion_request: ConversionRequest, tmp_path) -> None:
+    """Test that asyncio mode converts without starting worker threads."""
+    pool = WorkerPool(max_workers=2, mode=MODE_ASYNCIO)
+    progress: List[int] = []
+    try:
+        tasks = [
+            ConversionTask(
+                request=test_conversion_request,
+                task_id=f"asyncio-{i}",
+                progress_callback=lambda task_id, percentage, message: progress.append(percentage)
+            )
+            for i in range(6)
+        ]
+        results = await asyncio.gather(*[await pool.submit_task(task) for task in tasks])
+        assert all("<h1" in result for result in results)
+        assert progress.count(100) == 6
+        
+        multi_request = ConversionRequest(
+            contents="# Multi",
+            targets=[
+                ConversionTarget(output_format="html"),
+                ConversionTarget(output_format="docx", output_file=str(tmp_path / "out.docx")),
+            ],
+        )
+        multi_task = ConversionTask(
+            request=multi_request,
+            task_id="asyncio-multi",
+            progress_callback=lambda task_id, percentage, message: None
+        )
+        results = await (await pool.submit_task(multi_task))
+        assert [entry["status"] for entry in results] == ["complete", "complete"]
+        assert os.path.exists(tmp_path / "out.docx")
+        
+        assert all(not executor._threads for executor in pool.scheduler.executors.values())
+    finally:
+        await pool.shutdown()
@@ -0,0 +1,316 @@
+"""
+Managed store for conversion outputs handed out by reference.
+
+Remote clients cannot read files on the server, so instead of an
+``output_file`` path a conversion can write its output into the artifact
+store and return a reference: the HTTP server serves it as
+``/artifacts/{id}``, the MCP servers expose it as the resource
+``artifact://{id}``. Artifacts are immutable files in one directory; each
+expires a TTL after it was written, and the oldest are evicted once the
+store exceeds its size budget.
+
+An artifact is reserved before the conversion, which writes to its path,
+and committed afterwards; reservations that are never committed are
+deleted by :meth:`ArtifactStore.discard` or expire with the TTL. Large
+artifacts can be read in pages; pages of text artifacts end on character
+boundaries, so each decodes on its own.
+"""
+
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("pandoc-artifacts")
+
+ARTIFACT_URI_PREFIX = "artifact://"
+
+# Page size of paged reads
+DEFAULT_PAGE_SIZE = 256 * 1024
+
+# File extension and media type per output format
+EXTENSIONS = {
+    "markdown": "md",
+    "txt": "txt",
+    "plain": "txt",
+    "rst": "rst",
+    "latex": "tex",
+    "html": "html",
+    "pdf": "pdf",
+    "docx": "docx",
+    "epub": "epub",
+    "odt": "odt",
+    "pptx": "pptx",
+}
+MEDIA_TYPES = {
+    "markdown": "text/markdown; charset=utf-8",
+    "txt": "text/plain; charset=utf-8",
+    "plain": "text/plain; charset=utf-8",
+    "rst": "text/x-rst; charset=utf-8",
+    "latex": "application/x-tex; charset=utf-8",
+    "html": "text/html; charset=utf-8",
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "epub": "application/epub+zip",
+    "odt": "application/vnd.oasis.opendocument.text",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+
+
+@dataclass
+class Artifact:
+    """A conversion output in the artifact store; ``size`` and ``expires_at`` are set on commit."""
+    artifact_id: str
+    output_format: str
+    path: str
+    created_at: float
+    size: int = 0
+    expires_at: float = 0.0
+    ready: bool = False
+
+    @property
+    def uri(self) -> str:
+        """The MCP resource URI of the artifact."""
+        return ARTIFACT_URI_PREFIX + self.artifact_id
+
+    @property
+    def url(self) -> str:
+        """The path of the artifact on the HTTP server."""
+        return f"/artifacts/{self.artifact_id}"
+
+    @property
+    def media_type(self) -> str:
+        """The media type of the output format."""
+        return MEDIA_TYPES.get(self.output_format, "application/octet-stream")
+
+    @property
+    def filename(self) -> str:
+        """A download file name with the extension of the output format."""
+        return os.path.basename(self.path)
+
+    @property
+    def etag(self) -> str:
+        """A strong entity tag; artifacts never change once committed."""
+        return f'"{self.artifact_id}-{self.size:x}"'
+
+    def reference(self) -> Dict[str, Any]:
+        """Return what a client needs to fetch the artifact."""
+        return {
+            "artifact_id": self.artifact_id,
+            "url": self.url,
+            "uri": self.uri,
+            "media_type": self.media_type,
+            "size": self.size,
+            "expires_at": self.expires_at,
+        }
+
+
+class ArtifactStore:
+    """
+    Conversion outputs in a directory, each kept for a TTL.
+
+    All methods are thread-safe; conversions commit their artifacts from
+    worker threads.
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl: float = 3600.0, max_mb: int = 1024):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory of the artifact files, created on first use.
+            ttl: Seconds an artifact is kept after it was written.
+            max_mb: Total size of the artifacts; beyond it the oldest are deleted first.
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "mcp-pandoc-artifacts")
+        self.ttl = ttl
+        self.max_bytes = max_mb * 1024 * 1024
+        self._artifacts: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"created": 0, "discarded": 0, "expired": 0, "evicted": 0}
+
+    def reserve(self, output_format: str) -> Artifact:
+        """Reserve an artifact; the conversion writes its output to the returned artifact's path."""
+        self.sweep()
+        os.makedirs(self.directory, exist_ok=True)
+        artifact_id = uuid.uuid4().hex
+        extension = EXTENSIONS.get(output_format, output_format)
+        artifact = Artifact(
+            artifact_id=artifact_id,
+            output_format=output_format,
+            path=os.path.join(self.directory, f"{artifact_id}.{extension}"),
+            created_at=time.time(),
+        )
+        with self._lock:
+            self._artifacts[artifact_id] = artifact
+        return artifact
+
+    def commit(self, artifact: Artifact) -> Artifact:
+        """
+        Record the output written to a reserved artifact and start its TTL.
+
+        Raises:
+            OSError: If the conversion did not write the file.
+        """
+        size = os.path.getsize(artifact.path)
+        with self._lock:
+            if not artifact.ready:
+                artifact.size = size
+                artifact.expires_at = time.time() + self.ttl
+                artifact.ready = True
+                self._bytes += size
+                self._counters["created"] += 1
+        self.sweep()
+        return artifact
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        """Return a committed artifact that has not expired."""
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+        if artifact is None or not artifact.ready or artifact.expires_at <= time.time():
+            return None
+        return artifact
+
+    def list(self) -> List[Artifact]:
+        """Return the committed artifacts, oldest first."""
+        self.sweep()
+        with self._lock:
+            return [artifact for artifact in self._artifacts.values() if artifact.ready]
+
+    def read(self, artifact_id: str, offset: int = 0, length: Optional[int] = None) -> Optional[bytes]:
+        """Read a range of an artifact, None if it does not exist."""
+        artifact = self.get(artifact_id)
+        if artifact is None:
+            return None
+        try:
+            with open(artifact.path, "rb") as f:
+                f.seek(offset)
+                return f.read(-1 if length is None else length)
+        except OSError:
+            return None
+
+    @staticmethod
+    def pages(artifact: Artifact, page_size: int = DEFAULT_PAGE_SIZE) -> int:
+        """Return the number of pages of an artifact, at least one."""
+        return max(1, math.ceil(artifact.size / page_size))
+
+    def read_page(self, artifact_id: str, page: int, page_size: int = DEFAULT_PAGE_SIZE) -> Optional[bytes]:
+        """
+        Read one page of an artifact, None if it does not exist.
+
+        Pages of text artifacts are moved forward to the next UTF-8
+        character boundary, so they decode on their own and concatenate
+        to the whole text.
+        """
+        artifact = self.get(artifact_id)
+        if artifact is None or not 0 <= page < self.pages(artifact, page_size):
+            return None
+        try:
+            with open(artifact.path, "rb") as f:
+                start, end = page * page_size, min((page + 1) * page_size, artifact.size)
+                if artifact.media_type.endswith("charset=utf-8"):
+                    start, end = _char_start(f, start, artifact.size), _char_start(f, end, artifact.size)
+                f.seek(start)
+                return f.read(end - start)
+        except OSError:
+            return None
+
+    def discard(self, artifact: Artifact) -> None:
+        """Delete an artifact, e.g. the reservation of a failed conversion."""
+        with self._lock:
+            if self._artifacts.get(artifact.artifact_id) is not artifact:
+                return
+            self._pop(artifact)
+            self._counters["discarded"] += 1
+        self._unlink(artifact)
+
+    def sweep(self) -> None:
+        """Delete expired artifacts, stale reservations and the oldest artifacts beyond the size budget."""
+        now = time.time()
+        dropped: List[Artifact] = []
+        with self._lock:
+            for artifact in list(self._artifacts.values()):
+                if artifact.ready and artifact.expires_at <= now:
+                    self._counters["expired"] += 1
+                    dropped.append(self._pop(artifact))
+                elif not artifact.ready and artifact.created_at + self.ttl <= now:
+                    self._counters["discarded"] += 1
+                    dropped.append(self._pop(artifact))
+            for artifact in list(self._artifacts.values()):
+                if self._bytes <= self.max_bytes:
+                    break
+                if artifact.ready:
+                    self._counters["evicted"] += 1
+                    dropped.append(self._pop(artifact))
+        for artifact in dropped:
+            self._unlink(artifact)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number and total size of the artifacts and counters."""
+        with self._lock:
+            return {
+                "artifacts": sum(1 for artifact in self._artifacts.values() if artifact.ready),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._counters,
+            }
+
+    def _pop(self, artifact: Artifact) -> Artifact:
+        """Remove an artifact from the index; the caller holds the lock."""
+        del self._artifacts[artifact.artifact_id]
+        if artifact.ready:
+            self._bytes -= artifact.size
+        return artifact
+
+    @staticmethod
+    def _unlink(artifact: Artifact) -> None:
+        try:
+            os.unlink(artifact.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete artifact {artifact.artifact_id}: {e}")
+
+
+def _char_start(f: Any, offset: int, size: int) -> int:
+    """Return the first offset at or after ``offset`` where a UTF-8 character starts."""
+    if offset <= 0 or offset >= size:
+        return max(0, min(offset, size))
+    f.seek(offset)
+    for index, byte in enumerate(f.read(4)):
+        # Continuation bytes are 10xxxxxx
+        if byte & 0xC0 != 0x80:
+            return offset + index
+    return min(offset + 4, size)
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """
+    Return the process-wide artifact store, creating it on first use.
+
+    Artifacts are written to ``MCP_PANDOC_ARTIFACT_DIR`` (default
+    ``mcp-pandoc-artifacts`` in the temporary directory) and kept for
+    ``MCP_PANDOC_ARTIFACT_TTL`` (default 3600) seconds, at most
+    ``MCP_PANDOC_ARTIFACT_MB`` (default 1024) in total.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore(
+                    directory=os.environ.get("MCP_PANDOC_ARTIFACT_DIR") or None,
+                    ttl=float(os.environ.get("MCP_PANDOC_ARTIFACT_TTL", "3600")),
+                    max_mb=int(os.environ.get("MCP_PANDOC_ARTIFACT_MB", "1024")),
+                )
+    return _store
@@ -0,0 +1,362 @@
+"""
+Content-addressed cache for conversion results.
+
+Results are keyed by a hash of the input (text, or file path, size and
+mtime), the formats, the extra pandoc arguments and the pandoc version.
+A bounded in-memory LRU tier sits in front of an optional on-disk tier
+with size-based eviction. Concurrent identical conversions are coalesced
+onto a single pandoc run.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from .cancel import ConversionCancelled, current_scope
+
+logger = logging.getLogger("pandoc-cache")
+
+# ioctl request number of Linux FICLONE (copy-on-write clone of a whole file).
+FICLONE = 0x40049409
+
+
+def clone_file(src: str, dst: str) -> None:
+    """Copy a file, using a copy-on-write reflink where the filesystem supports it."""
+    try:
+        import fcntl
+
+        with open(src, "rb") as source, open(dst, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dst)
+
+
+@dataclass
+class CachedResult:
+    """A cached conversion result: either converted text or an output file artifact."""
+    kind: str
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @classmethod
+    def from_text(cls, text: str) -> "CachedResult":
+        data = text.encode("utf-8")
+        return cls(kind="text", size=len(data), data=data)
+
+    @classmethod
+    def from_file(cls, path: str) -> "CachedResult":
+        with open(path, "rb") as f:
+            data = f.read()
+        return cls(kind="file", size=len(data), data=data)
+
+    def text(self) -> str:
+        """Return the converted text."""
+        if self.data is None and self.path is not None:
+            with open(self.path, "rb") as f:
+                return f.read().decode("utf-8")
+        return (self.data or b"").decode("utf-8")
+
+
+class _Flight:
+    """
+    A conversion in progress that identical requests wait for.
+
+    A flight that ends with neither a result nor an error was abandoned by
+    its cancelled leader; its followers start over.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[CachedResult] = None
+        self.error: Optional[BaseException] = None
+
+
+def _cancelled(error: BaseException) -> bool:
+    """Return whether a conversion failed because its own caller cancelled it."""
+    scope = current_scope()
+    return (
+        isinstance(error, (ConversionCancelled, asyncio.CancelledError))
+        or (scope is not None and scope.cancelled)
+    )
+
+
+class ConversionCache:
+    """
+    Two-tier LRU cache for conversion results with request coalescing.
+
+    All methods are thread-safe. :meth:`arun` coalesces requests made from
+    the same event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of results kept in memory.
+            max_memory_bytes: Maximum total size of the results kept in memory.
+            disk_dir: Directory of the on-disk tier, disabled if None.
+            max_disk_bytes: Maximum total size of the on-disk tier.
+        """
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(
+                os.path.getsize(os.path.join(disk_dir, name)) for name in os.listdir(disk_dir)
+            )
+
+    @staticmethod
+    def make_key(
+        pandoc_version: str,
+        source: Optional[str],
+        input_file: Optional[str],
+        input_format: Optional[str],
+        output_format: str,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[str] = None,
+    ) -> str:
+        """Return the cache key of a conversion."""
+        header = {
+            "pandoc": pandoc_version,
+            "from": input_format,
+            "to": output_format,
+            "args": list(extra_args),
+            "cwd": cwd,
+        }
+        if input_file:
+            stat = os.stat(input_file)
+            header["input_file"] = [os.path.abspath(input_file), stat.st_size, stat.st_mtime_ns]
+        digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode("utf-8"))
+        if source is not None and not input_file:
+            digest.update(b"\0")
+            digest.update(source.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str, kind: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.{kind}")
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Look up a result in memory, then on disk. Counts hits but not misses."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return result
+
+        if self.disk_dir:
+            for kind in ("text", "file"):
+                path = self._disk_path(key, kind)
+                try:
+                    size = os.path.getsize(path)
+                    os.utime(path)
+                except OSError:
+                    continue
+                with self._lock:
+                    self.hits += 1
+                return CachedResult(kind=kind, size=size, path=path)
+        return None
+
+    def put(self, key: str, result: CachedResult) -> None:
+        """Store a result in the memory tier and, if enabled, the disk tier."""
+        if self.disk_dir and result.data is not None:
+            path = self._disk_path(key, result.kind)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, temp_path = tempfile.mkstemp(dir=self.disk_dir, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(result.data)
+            os.replace(temp_path, path)
+            with self._lock:
+                self._disk_bytes += result.size - replaced
+            self._evict_disk()
+
+        # Entries larger than an eighth of the budget would flush the whole tier
+        if result.data is None or result.size > self.max_memory_bytes // 8:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= self._memory.pop(key).size
+            self._memory[key] = result
+            self._memory_bytes += result.size
+            while len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.size
+                self.evictions += 1
+
+    def _evict_disk(self) -> None:
+        """Remove the least recently used files until the disk tier fits its budget."""
+        with self._lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        with self._lock:
+            self._disk_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                self._disk_bytes -= size
+                self.evictions += 1
+
+    def run(self, key: str, compute: Callable[[], CachedResult]) -> Tuple[CachedResult, bool]:
+        """
+        Return the cached result for a key, computing it at most once.
+
+        Concurrent callers with the same key wait for the first caller's
+        computation instead of starting their own. If that caller is
+        cancelled, one of the waiting callers computes the result instead.
+
+        Args:
+            key: The cache key.
+            compute: Runs the conversion and returns its result.
+
+        Returns:
+            The result and whether this caller computed it.
+        """
+        while True:
+            result = self.get(key)
+            if result is not None:
+                return result, False
+
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+
+            if leader:
+                break
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.result is not None:
+                return flight.result, False
+
+        try:
+            flight.result = compute()
+            self.put(key, flight.result)
+            return flight.result, True
+        except BaseException as e:
+            # A cancellation only concerns this caller, not the ones waiting for it
+            if not _cancelled(e):
+                flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def arun(
+        self, key: str, compute: Callable[[], Awaitable[CachedResult]]
+    ) -> Tuple[CachedResult, bool]:
+        """
+        Asyncio variant of :meth:`run` for conversions driven from an event loop.
+
+        Args:
+            key: The cache key.
+            compute: Coroutine function that runs the conversion and returns its result.
+
+        Returns:
+            The result and whether this caller computed it.
+        """
+        while True:
+            result = self.get(key)
+            if result is not None:
+                return result, False
+
+            flight = self._async_flights.get(key)
+            if flight is None:
+                break
+            with self._lock:
+                self.coalesced += 1
+            # None: the leader was cancelled and abandoned the flight
+            result = await asyncio.shield(flight)
+            if result is not None:
+                return result, False
+
+        flight = self._async_flights[key] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self.misses += 1
+        try:
+            result = await compute()
+            self.put(key, result)
+            flight.set_result(result)
+            return result, True
+        except BaseException as e:
+            if _cancelled(e):
+                flight.set_result(None)
+            else:
+                flight.set_exception(e)
+                # Mark the exception as retrieved when no other caller waits for it
+                flight.exception()
+            raise
+        finally:
+            del self._async_flights[key]
+
+    def materialize(self, result: CachedResult, output_file: str) -> None:
+        """Write a cached file artifact to the requested output path."""
+        if result.path is not None:
+            clone_file(result.path, output_file)
+        else:
+            with open(output_file, "wb") as f:
+                f.write(result.data or b"")
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
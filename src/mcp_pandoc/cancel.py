@@ -0,0 +1,212 @@
+"""
+Cancellation of running conversions.
+
+Pandoc and the LaTeX engines are started in their own process group, so
+killing a conversion also kills the engine pandoc spawned for a PDF and
+the filters it runs. The processes of a conversion are registered with the
+:class:`CancelScope` active in the calling context; the scope is a context
+variable, so it follows the conversion into ``asyncio.to_thread`` and
+tasks it creates. :meth:`CancelScope.cancel` kills every registered
+process group and makes all later process starts in the scope fail, so a
+conversion stops at once instead of running its remaining passes or
+chunks. Processes also get the resource limits of the context applied
+(see :mod:`mcp_pandoc.limits`).
+"""
+
+import asyncio
+import contextlib
+import os
+import signal
+import subprocess
+import threading
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, Sequence, Set
+
+from .limits import apply_limits
+
+
+class ConversionCancelled(RuntimeError):
+    """Raised by a conversion whose cancel scope was cancelled."""
+
+
+class CancelScope:
+    """
+    The processes of one conversion, killed together on cancellation.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._processes: Set[Any] = set()
+        self.cancelled = False
+        self.reason: Optional[str] = None
+        self.error: Optional[Exception] = None
+        self.killed = 0
+
+    def cancel(self, reason: str = "cancelled", error: Optional[Exception] = None) -> int:
+        """
+        Cancel the conversion and kill its running processes.
+
+        Args:
+            reason: Why the conversion was cancelled, used in error messages.
+            error: Raised by :meth:`check` instead of ConversionCancelled,
+                e.g. for a conversion stopped by a resource limit.
+
+        Returns:
+            The number of process groups killed.
+        """
+        with self._lock:
+            if self.cancelled:
+                return 0
+            self.cancelled = True
+            self.reason = reason
+            self.error = error
+            processes = list(self._processes)
+        killed = sum(kill_process_group(process) for process in processes)
+        with self._lock:
+            self.killed += killed
+        return killed
+
+    def check(self) -> None:
+        """
+        Raise if the conversion was cancelled.
+
+        Raises:
+            ConversionCancelled: If :meth:`cancel` has been called, or the
+                error passed to it.
+        """
+        if self.cancelled:
+            raise self.error or ConversionCancelled(f"Conversion cancelled: {self.reason}")
+
+    def register(self, process: Any) -> None:
+        """Track a started process, killing it right away if the scope is already cancelled."""
+        with self._lock:
+            if not self.cancelled:
+                self._processes.add(process)
+                return
+        kill_process_group(process)
+
+    def unregister(self, process: Any) -> None:
+        """Stop tracking a finished process."""
+        with self._lock:
+            self._processes.discard(process)
+
+
+_scope: ContextVar[Optional[CancelScope]] = ContextVar("mcp_pandoc_cancel_scope", default=None)
+
+
+@contextlib.contextmanager
+def cancel_scope(scope: CancelScope) -> Iterator[CancelScope]:
+    """Make ``scope`` the cancel scope of the processes started in this context."""
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Optional[CancelScope]:
+    """Return the cancel scope active in this context, if any."""
+    return _scope.get()
+
+
+def check_cancelled() -> None:
+    """
+    Raise if the active cancel scope was cancelled.
+
+    Raises:
+        ConversionCancelled: If the conversion running in this context was cancelled.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        scope.check()
+
+
+def kill_process_group(process: Any) -> bool:
+    """
+    Kill a process started by this module together with its children.
+
+    Returns:
+        True if the process was still running.
+    """
+    if process.returncode is not None:
+        return False
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        return False
+    return True
+
+
+def popen(args: Sequence[str], **kwargs: Any) -> subprocess.Popen:
+    """
+    Start a process in its own process group within the active cancel scope.
+
+    Takes the arguments of ``subprocess.Popen``. The caller must pass the
+    process to :func:`release` when it has finished.
+
+    Raises:
+        ConversionCancelled: If the active cancel scope was cancelled.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        scope.check()
+    process = subprocess.Popen(args, start_new_session=True, **kwargs)
+    apply_limits(process.pid)
+    if scope is not None:
+        scope.register(process)
+    return process
+
+
+async def create_subprocess_exec(*args: str, **kwargs: Any) -> asyncio.subprocess.Process:
+    """Asyncio variant of :func:`popen`, taking the arguments of ``asyncio.create_subprocess_exec``."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.check()
+    process = await asyncio.create_subprocess_exec(*args, start_new_session=True, **kwargs)
+    apply_limits(process.pid)
+    if scope is not None:
+        scope.register(process)
+    return process
+
+
+def release(process: Any) -> None:
+    """Stop tracking a finished process; callers check for cancellation before using its output."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.unregister(process)
+
+
+def run(
+    args: Sequence[str],
+    input: Optional[bytes] = None,
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+) -> subprocess.CompletedProcess:
+    """
+    Run a process to completion within the active cancel scope, capturing its output.
+
+    Raises:
+        ConversionCancelled: If the active cancel scope was cancelled before or while it ran.
+    """
+    process = popen(
+        args,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+    try:
+        stdout, stderr = process.communicate(input)
+    finally:
+        if process.returncode is None:
+            kill_process_group(process)
+            process.wait()
+        release(process)
+    check_cancelled()
+    return subprocess.CompletedProcess(list(args), process.returncode, stdout, stderr)
@@ -0,0 +1,315 @@
+"""
+Split large documents into chunks that convert independently.
+
+Book-length inputs convert single-threaded in one pandoc process. For
+text outputs without document-level structure, the input can be cut at
+top-level headings, the chunks converted in parallel and the outputs
+concatenated. Markdown is split as text, so parsing runs in parallel too;
+reference-link and footnote definitions and the metadata block are carried
+into every chunk. Inputs that cannot be split safely as text are parsed
+once and the pandoc AST is split at its top-level headers instead.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from .engine import base_format, normalize_format
+
+# Output formats whose body can be concatenated from independently rendered chunks.
+CHUNKED_OUTPUT_FORMATS = frozenset({
+    "commonmark", "gfm", "html", "html4", "html5", "latex", "markdown", "plain", "rst",
+})
+
+# Output formats that number footnotes document-wide and collect them at the end.
+ENDNOTE_OUTPUT_FORMATS = CHUNKED_OUTPUT_FORMATS - {"latex"}
+
+# Output formats that omit heading identifiers equal to the automatically generated ones.
+AUTO_ID_OUTPUT_FORMATS = frozenset({"commonmark", "gfm", "markdown"})
+
+# Input formats split as text at their headings.
+MARKDOWN_INPUT_FORMATS = frozenset({
+    "commonmark", "commonmark_x", "gfm", "markdown", "markdown_mmd", "markdown_phpextra", "markdown_strict",
+})
+
+# Arguments that make the output depend on the whole document.
+WHOLE_DOCUMENT_ARGS = ("--citeproc", "-C", "--bibliography", "--toc", "--table-of-contents", "-s", "--standalone",
+                       "--number-sections", "-N", "--file-scope")
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_ATX_HEADING = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+_SETEXT_H1 = re.compile(r"^ {0,3}=+[ \t]*$")
+_SETEXT_H2 = re.compile(r"^ {0,3}-+[ \t]*$")
+_HEADING_ATTRIBUTES = re.compile(r"[ \t]*\{([^{}]*)\}[ \t]*$")
+_INLINE_TARGET = re.compile(r"\]\([^)]*\)|\[\^[^\]]*\]|<[^>]*>")
+# Bracketed text not followed by a link target or a definition colon
+_BRACKETED = re.compile(r"\[([^\[\]]+)\](?![(:])")
+_DEFINITION = re.compile(r"^ {0,3}\[(\^?)[^\]]+\]:")
+_FRONT_MATTER_END = re.compile(r"^(---|\.\.\.)[ \t]*$")
+_CODE = re.compile(r"^ {0,3}(?:`{3,}|~{3,})|^(?: {4}|\t)", re.MULTILINE)
+# Identifiers the HTML writer numbers document-wide for code blocks without an identifier.
+# The writer emits them as <div class="sourceCode" id="cbN"> and line anchors "cbN-M".
+_HTML_CODE_ID = re.compile(r'(class="sourceCode" id="cb)(\d+)(?=")|((?:id|href)="#?cb)(\d+)(?=-\d+")')
+_ANONYMOUS_CODE_BLOCK = '"t":"CodeBlock","c":[["",'
+# Constructs numbered or defined document-wide (example lists, LaTeX macros) and
+# containers that may span headings (fenced divs, raw HTML blocks).
+_TEXT_SPLIT_HAZARDS = re.compile(
+    r"\(@[\w-]*\)|\\(?:re)?newcommand|\\def\\|^ {0,3}(?::::|<(?:div|section|pre|details)\b)",
+    re.MULTILINE,
+)
+
+
+def can_chunk(output_format: str, extra_args: Sequence[str] = ()) -> bool:
+    """Return True if conversions to this output format may be chunked."""
+    if base_format(normalize_format(output_format)) not in CHUNKED_OUTPUT_FORMATS:
+        return False
+    return not any(arg.split("=", 1)[0] in WHOLE_DOCUMENT_ARGS for arg in extra_args)
+
+
+def _is_html(output_format: str) -> bool:
+    return base_format(normalize_format(output_format)).startswith("html")
+
+
+def join_chunks(outputs: Sequence[str], output_format: str, chunks: Sequence[str] = ()) -> str:
+    """
+    Concatenate chunk outputs with the block separator pandoc uses for the format.
+
+    Args:
+        outputs: The converted chunks, in order.
+        output_format: The output format of the conversion.
+        chunks: The JSON AST chunks the outputs were rendered from, if any.
+            HTML code block identifiers are renumbered across them.
+    """
+    if not _is_html(output_format):
+        return "\n".join(outputs)
+    offset = 0
+    renumbered = []
+    for index, output in enumerate(outputs):
+        renumbered.append(renumber_code_blocks(output, offset))
+        if index < len(chunks):
+            offset += count_anonymous_code_blocks(chunks[index])
+    return "".join(renumbered)
+
+
+def count_anonymous_code_blocks(ast: str) -> int:
+    """Return the number of code blocks without identifier in compact JSON AST text."""
+    return ast.count(_ANONYMOUS_CODE_BLOCK)
+
+
+def renumber_code_blocks(html: str, offset: int) -> str:
+    """Shift the code block identifiers the HTML writer generated ("cbN") by an offset."""
+    if not offset:
+        return html
+    return _HTML_CODE_ID.sub(
+        lambda m: f"{m.group(1)}{int(m.group(2)) + offset}" if m.group(1)
+        else f"{m.group(3)}{int(m.group(4)) + offset}",
+        html,
+    )
+
+
+def _group(sizes: Sequence[int], parts: int) -> List[int]:
+    """Return the indexes at which to cut a list of sections into about ``parts`` equal groups."""
+    target = sum(sizes) / parts
+    cuts = [0]
+    size = 0
+    for index, section_size in enumerate(sizes):
+        if size >= target and index > cuts[-1]:
+            cuts.append(index)
+            size = 0
+        size += section_size
+    return cuts
+
+
+def _heading_text(heading: str) -> str:
+    """Return the raw text of a markdown heading without its attributes."""
+    attributes = _HEADING_ATTRIBUTES.search(heading)
+    return heading[:attributes.start()] if attributes else heading
+
+
+def _identifier_key(heading: str) -> str:
+    """
+    Return a key of the identifier pandoc assigns to a markdown heading.
+
+    Coarser than pandoc's identifiers: only letters and digits from the first
+    letter on are kept, so headings whose identifiers collide ("Foo!" and
+    "Foo?") always share a key.
+    """
+    attributes = _HEADING_ATTRIBUTES.search(heading)
+    explicit = None
+    if attributes:
+        explicit = next((attr[1:] for attr in attributes.group(1).split() if attr.startswith("#")), None)
+    text = explicit or _INLINE_TARGET.sub("", _heading_text(heading))
+    key = "".join(char for char in text.lower() if char.isalnum())
+    while key and not key[0].isalpha():
+        key = key[1:]
+    return key
+
+
+def split_markdown(source: str, parts: int, output_format: str) -> Optional[List[str]]:
+    """
+    Split markdown source at level 1 and 2 headings into about ``parts`` chunks.
+
+    Args:
+        source: The markdown document.
+        parts: The desired number of chunks.
+        output_format: The output format the chunks will be converted to.
+
+    Returns:
+        The chunks, or None if the document cannot be split safely as text
+        (headings whose identifiers pandoc disambiguates across the document,
+        implicit references to headings, document-wide numbering or endnotes
+        in the output).
+    """
+    if _TEXT_SPLIT_HAZARDS.search(source):
+        return None
+    if "[^" in source and base_format(normalize_format(output_format)) in ENDNOTE_OUTPUT_FORMATS:
+        return None
+    # Code block identifiers are numbered document-wide in HTML, which the AST split handles
+    if _is_html(output_format) and _CODE.search(source):
+        return None
+
+    lines = source.splitlines(keepends=True)
+    front_matter = ""
+    start = 0
+    if lines and lines[0].rstrip() == "---":
+        for index in range(1, len(lines)):
+            if _FRONT_MATTER_END.match(lines[index]):
+                front_matter = "".join(lines[:index + 1]) + "\n"
+                start = index + 1
+                break
+
+    boundaries = [start]
+    definitions: List[str] = []
+    identifiers = set()
+    labels = set()
+    fence: Optional[str] = None
+    index = start
+    while index < len(lines):
+        line = lines[index]
+        fence_match = _FENCE.match(line)
+        if fence is not None:
+            if fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+                fence = None
+            index += 1
+            continue
+        if fence_match:
+            fence = fence_match.group(1)
+            index += 1
+            continue
+
+        atx = _ATX_HEADING.match(line)
+        setext = (
+            index > start and lines[index - 1].strip()
+            and (_SETEXT_H1.match(line) or _SETEXT_H2.match(line))
+        )
+        if atx or setext:
+            text = (atx.group(2) or "") if atx else lines[index - 1].strip()
+            # Pandoc numbers colliding identifiers ("foo", "foo-1") across the whole document
+            identifier = _identifier_key(text)
+            if identifier in identifiers:
+                return None
+            identifiers.add(identifier)
+            labels.add(" ".join(_heading_text(text).split()).lower())
+            if atx:
+                level = len(atx.group(1))
+            else:
+                level = 1 if _SETEXT_H1.match(line) else 2
+            heading_start = index if atx else index - 1
+            # Pandoc's markdown only starts a heading after a blank line
+            if level <= 2 and (heading_start == start or not lines[heading_start - 1].strip()):
+                boundaries.append(heading_start)
+
+        definition = _DEFINITION.match(line)
+        if definition:
+            end = index + 1
+            if definition.group(1):
+                # Footnote definitions continue over indented and blank lines
+                while end < len(lines) and (not lines[end].strip() or lines[end].startswith(("    ", "\t"))):
+                    end += 1
+                while end > index + 1 and not lines[end - 1].strip():
+                    end -= 1
+            definitions.append("".join(lines[index:end]).rstrip("\n") + "\n")
+            index = end
+            continue
+        index += 1
+
+    # Implicit header references ("[Details]") only resolve within the chunk of the heading
+    if any(" ".join(label.split()).lower() in labels for label in _BRACKETED.findall(source)):
+        return None
+
+    boundaries = sorted(set(boundaries)) + [len(lines)]
+    sections = ["".join(lines[a:b]) for a, b in zip(boundaries, boundaries[1:])]
+    if len(sections) < 2:
+        return None
+
+    cuts = _group([len(section) for section in sections], parts) + [len(sections)]
+    chunks = []
+    for a, b in zip(cuts, cuts[1:]):
+        body = "".join(sections[a:b])
+        carried = [definition for definition in definitions if definition not in body]
+        chunks.append(front_matter + body + ("\n\n" + "\n".join(carried) if carried else ""))
+    return chunks
+
+
+def blocks_render_independently(ast: str, document: Dict[str, Any], output_format: str) -> bool:
+    """
+    Return True if the top-level blocks of a JSON AST render the same in isolation.
+
+    This does not hold for footnotes in output formats that number them
+    document-wide, nor for header identifiers disambiguated across the
+    document in markdown outputs (which write them out explicitly).
+
+    Args:
+        ast: The JSON AST as written by pandoc.
+        document: The parsed JSON AST.
+        output_format: The output format of the conversion.
+    """
+    fmt = base_format(normalize_format(output_format))
+    if '"t":"Note"' in ast and fmt in ENDNOTE_OUTPUT_FORMATS:
+        return False
+    if fmt in AUTO_ID_OUTPUT_FORMATS:
+        ids = {block["c"][1][0] for block in document["blocks"] if block.get("t") == "Header"}
+        if any(re.sub(r"-\d+$", "", identifier) in ids - {identifier} for identifier in ids):
+            return False
+    return True
+
+
+def split_ast(ast: str, parts: int, output_format: str) -> List[str]:
+    """
+    Split a pandoc JSON AST at level 1 and 2 headers into about ``parts`` documents.
+
+    Header identifiers, links and footnote contents are already resolved in
+    the AST, so every part renders like the corresponding slice of the whole
+    document. Documents with footnotes are not split for output formats that
+    number footnotes document-wide, nor documents with disambiguated header
+    identifiers for markdown outputs.
+
+    Returns:
+        The parts as compact JSON documents like pandoc writes them; a single
+        part if the AST cannot be split. Pass them to :func:`join_chunks`.
+    """
+    document = json.loads(ast)
+    if not blocks_render_independently(ast, document, output_format):
+        return [ast]
+    blocks = document["blocks"]
+    boundaries = [0] + [
+        index for index, block in enumerate(blocks)
+        if index > 0 and block.get("t") == "Header" and block["c"][0] <= 2
+    ]
+    if len(boundaries) < 2:
+        return [ast]
+
+    boundaries.append(len(blocks))
+    sections = [blocks[a:b] for a, b in zip(boundaries, boundaries[1:])]
+    cuts = _group([len(json.dumps(section)) for section in sections], parts) + [len(sections)]
+    return [
+        json.dumps(
+            {
+                "pandoc-api-version": document["pandoc-api-version"],
+                "meta": document["meta"],
+                "blocks": [block for section in sections[a:b] for block in section],
+            },
+            separators=(",", ":"),
+        )
+        for a, b in zip(cuts, cuts[1:])
+    ]
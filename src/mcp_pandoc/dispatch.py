@@ -0,0 +1,213 @@
+"""
+Concurrent request handling for the stdio MCP server.
+
+``Server.run`` of the mcp package awaits each request before it reads the
+next one, so a single PDF build held up ``tools/list`` and every other
+call of the session. :func:`serve` runs each request in its own task
+instead and answers them in the order they finish. Blocking conversions
+run on a bounded pool of worker threads (:func:`run_blocking`), sized by
+``MCP_PANDOC_MAX_WORKERS``.
+
+Every request runs in its own :class:`~mcp_pandoc.cancel.CancelScope`:
+a ``notifications/cancelled`` from the client stops the request, kills
+the pandoc and LaTeX processes it started and suppresses its response.
+Clients that pass a ``progressToken`` receive ``notifications/progress``
+while the conversion runs (see :func:`progress_callback`).
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import anyio
+import mcp.types as types
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+from mcp.server import Server, request_ctx
+from mcp.server.models import InitializationOptions
+from mcp.server.session import ServerSession
+from mcp.shared.context import RequestContext
+from mcp.shared.exceptions import McpError
+from mcp.shared.session import RequestResponder
+
+from .cancel import CancelScope, cancel_scope
+from .progress import ProgressCallback
+
+logger = logging.getLogger("mcp-pandoc-dispatch")
+
+# Sent by clients to abandon a request; older mcp versions do not know it
+CANCELLED_METHOD = "notifications/cancelled"
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the worker pool of the conversions, creating it on first use.
+
+    Its size is ``MCP_PANDOC_MAX_WORKERS`` (default 4); further
+    conversions wait for a free worker.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(os.environ.get("MCP_PANDOC_MAX_WORKERS", "4"))),
+                    thread_name_prefix="mcp-pandoc",
+                )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking function on the worker pool and await its result.
+
+    The function runs in a copy of the caller's context, so processes it
+    starts belong to the request's cancel scope and resource limits.
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), call)
+
+
+def progress_callback() -> Optional[ProgressCallback]:
+    """
+    Return a callback sending ``notifications/progress`` for the current request.
+
+    Progress is reported in percent and only when it increases, as the
+    protocol requires. The callback may be called from worker threads.
+
+    Returns:
+        None outside of a request or if the client passed no progressToken.
+    """
+    try:
+        context = request_ctx.get()
+    except LookupError:
+        return None
+    token = context.meta.progressToken if context.meta is not None else None
+    if token is None:
+        return None
+    loop = asyncio.get_running_loop()
+    lock = threading.Lock()
+    last = [-1.0]
+
+    def report(fraction: Optional[float], message: str) -> None:
+        if fraction is None:
+            return
+        progress = round(min(max(fraction, 0.0), 1.0) * 100, 1)
+        with lock:
+            if progress <= last[0]:
+                return
+            last[0] = progress
+        asyncio.run_coroutine_threadsafe(context.session.send_progress_notification(token, progress, 100), loop)
+
+    return report
+
+
+async def serve(
+    server: Server,
+    read_stream: MemoryObjectReceiveStream[types.JSONRPCMessage | Exception],
+    write_stream: MemoryObjectSendStream[types.JSONRPCMessage],
+    initialization_options: InitializationOptions,
+    raise_exceptions: bool = False,
+) -> None:
+    """
+    Run an MCP server on a pair of streams, handling its requests concurrently.
+
+    Takes the arguments of ``Server.run``. Requests still running when the
+    client closes the stream are cancelled.
+    """
+    running: Dict[types.RequestId, anyio.CancelScope] = {}
+    session_send, session_receive = anyio.create_memory_object_stream[types.JSONRPCMessage | Exception]()
+
+    async def receive() -> None:
+        # Cancellations are handled here, the session would reject them as unknown notifications
+        async with session_send:
+            async for message in read_stream:
+                if (
+                    isinstance(message, types.JSONRPCMessage)
+                    and isinstance(message.root, types.JSONRPCNotification)
+                    and message.root.method == CANCELLED_METHOD
+                ):
+                    request_id = (message.root.params or {}).get("requestId")
+                    scope = running.get(request_id)
+                    if scope is not None:
+                        logger.info(f"Cancelling request {request_id}: {(message.root.params or {}).get('reason')}")
+                        scope.cancel()
+                    continue
+                await session_send.send(message)
+
+    async with ServerSession(session_receive, write_stream, initialization_options) as session:
+        async with anyio.create_task_group() as task_group:
+            task_group.start_soon(receive)
+            async for message in session.incoming_messages:
+                match message:
+                    case RequestResponder():
+                        scope = anyio.CancelScope()
+                        running[message.request_id] = scope
+                        task_group.start_soon(
+                            _handle_request, server, session, message, scope, running, raise_exceptions
+                        )
+                    case types.ClientNotification(root=notification):
+                        handler = server.notification_handlers.get(type(notification))
+                        if handler is not None:
+                            try:
+                                await handler(notification)
+                            except Exception as err:
+                                logger.error(f"Uncaught exception in notification handler: {err}")
+            task_group.cancel_scope.cancel()
+
+
+async def _handle_request(
+    server: Server,
+    session: ServerSession,
+    responder: RequestResponder,
+    scope: anyio.CancelScope,
+    running: Dict[types.RequestId, anyio.CancelScope],
+    raise_exceptions: bool,
+) -> None:
+    """Handle one request in its own task; a cancelled request gets no response."""
+    request = responder.request.root
+    handler = server.request_handlers.get(type(request))
+    conversion = CancelScope()
+    responded = False
+    token = request_ctx.set(RequestContext(responder.request_id, _request_meta(responder), session))
+    try:
+        with scope, cancel_scope(conversion):
+            if handler is None:
+                response = types.ErrorData(code=types.METHOD_NOT_FOUND, message="Method not found")
+            else:
+                logger.info(f"Processing request of type {type(request).__name__}")
+                try:
+                    response = await handler(request)
+                except McpError as err:
+                    response = err.error
+                except Exception as err:
+                    if raise_exceptions:
+                        raise
+                    response = types.ErrorData(code=0, message=str(err), data=None)
+            await responder.respond(response)
+            responded = True
+    finally:
+        request_ctx.reset(token)
+        running.pop(responder.request_id, None)
+        if not responded:
+            # The worker thread may still wait for pandoc, kill it so the worker is freed
+            conversion.cancel("cancelled by the client")
+
+
+def _request_meta(responder: RequestResponder) -> Optional[types.RequestParams.Meta]:
+    """Return the ``_meta`` of a request; mcp 1.1 leaves it among the extra fields of the params."""
+    if responder.request_meta is not None:
+        return responder.request_meta
+    params = responder.request.root.params
+    meta = (params.model_extra or {}).get("_meta") if params is not None else None
+    return types.RequestParams.Meta.model_validate(meta) if isinstance(meta, dict) else None
@@ -0,0 +1,974 @@
+"""
+Pandoc conversion engine shared by the stdio and the SSE server.
+
+pypandoc validates every call by spawning ``pandoc --list-input-formats`` and
+``pandoc --list-output-formats`` before the actual conversion. This module
+locates the pandoc binary and reads its format and extension tables once,
+validates requests against that in-memory table and then runs exactly one
+pandoc process per conversion. The input is a string or an
+:class:`~mcp_pandoc.streams.InputStream` piped into pandoc's stdin while it
+is being received.
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Any, AsyncIterator, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .cache import CachedResult, ConversionCache
+from .pandoc_server import TEXT_FORMATS, PandocServerPool, PandocServerUnavailable
+from .cancel import check_cancelled, create_subprocess_exec, kill_process_group, popen, release
+from .cancel import run as run_process
+from .limits import check_exit, check_output_size, rts_args
+from .progress import PandocProgress, ProgressCallback, count_lines, progress_args
+from .pdf import (AUTO_PDF_ENGINE, DEFAULT_LATEX_ENGINE, PdfBuilder, document_features, installed_pdf_engines,
+                  requested_pdf_engine, select_pdf_engine, with_pdf_engine)
+from .streams import InputStream
+
+# The input of a conversion: text, or a stream that is read once
+Source = Union[str, InputStream]
+# What is written to pandoc's stdin
+Stdin = Union[bytes, InputStream]
+
+logger = logging.getLogger("pandoc-engine")
+
+# Format names used by the MCP tools that pandoc itself does not know.
+# Pandoc writes but cannot read "plain", so plain text input is read as markdown.
+FORMAT_ALIASES = {
+    "md": "markdown",
+    "tex": "latex",
+}
+INPUT_FORMAT_ALIASES = {**FORMAT_ALIASES, "txt": "markdown"}
+OUTPUT_FORMAT_ALIASES = {**FORMAT_ALIASES, "txt": "plain"}
+
+# Output formats pandoc can only write to a file, never to stdout.
+BINARY_OUTPUT_FORMATS = frozenset({"docx", "epub", "epub2", "epub3", "odt", "pdf", "pptx"})
+
+# Arguments both servers pass for PDF output. The engine resolves "auto" per document.
+PDF_ARGS = (f"--pdf-engine={AUTO_PDF_ENGINE}", "-V", "geometry:margin=1in")
+
+# Upper bound in bytes of the pieces read from pandoc's stdout by the stream methods.
+DEFAULT_STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class PandocNotFoundError(RuntimeError):
+    """Raised when no pandoc binary can be located."""
+
+
+def base_format(fmt: str) -> str:
+    """Return the format name without ``+ext``/``-ext`` modifiers."""
+    return re.split(r"[+-]", fmt, maxsplit=1)[0]
+
+
+def normalize_format(fmt: str, output: bool = True) -> str:
+    """Map MCP format aliases (e.g. ``txt``) onto pandoc format names."""
+    aliases = OUTPUT_FORMAT_ALIASES if output else INPUT_FORMAT_ALIASES
+    fmt = fmt.lower()
+    base = base_format(fmt)
+    if base in aliases:
+        fmt = aliases[base] + fmt[len(base):]
+    return fmt
+
+
+def default_extra_args(output_format: str, pdf_engine: Optional[str] = None) -> List[str]:
+    """
+    Return the pandoc arguments the servers use for an output format.
+
+    Args:
+        output_format: The requested output format.
+        pdf_engine: PDF engine requested by the caller, selected automatically if omitted.
+    """
+    if base_format(normalize_format(output_format)) == "pdf":
+        args = list(PDF_ARGS)
+        if pdf_engine:
+            args[0] = f"--pdf-engine={pdf_engine}"
+        return args
+    return []
+
+
+def find_pandoc() -> str:
+    """
+    Locate the pandoc executable.
+
+    The lookup order matches pypandoc: ``PYPANDOC_PANDOC``, ``PATH`` and
+    finally the binary bundled with ``pypandoc_binary``.
+
+    Raises:
+        PandocNotFoundError: If no pandoc binary can be found.
+    """
+    candidate = os.environ.get("PYPANDOC_PANDOC")
+    if candidate and os.path.exists(candidate):
+        return candidate
+
+    candidate = shutil.which("pandoc")
+    if candidate:
+        return candidate
+
+    try:
+        import pypandoc
+
+        return pypandoc.get_pandoc_path()
+    except (ImportError, OSError):
+        pass
+
+    raise PandocNotFoundError("No pandoc was found: install pandoc or set PYPANDOC_PANDOC")
+
+
+class PandocEngine:
+    """
+    Runs pandoc conversions against a cached description of the binary.
+
+    The pandoc version, the input/output format tables and the extension
+    table are read once when the engine is created.
+    """
+
+    def __init__(self, pandoc_path: Optional[str] = None):
+        """
+        Initialize the engine and read the pandoc format tables.
+
+        Args:
+            pandoc_path: Path to the pandoc binary, located automatically if omitted.
+        """
+        self.pandoc_path = pandoc_path or find_pandoc()
+        version_info = self._query(["--version"]).splitlines()
+        self.version = version_info[0].split()[-1]
+        self.features: FrozenSet[str] = frozenset(
+            feature[1:]
+            for line in version_info
+            if line.startswith("Features:")
+            for feature in line.split()[1:]
+            if feature.startswith("+")
+        )
+        self.server_pool: Optional[PandocServerPool] = None
+        self.cache: Optional[ConversionCache] = None
+        self.pdf: Optional[PdfBuilder] = None
+        self.input_formats: FrozenSet[str] = frozenset(
+            self._query(["--list-input-formats"]).split()
+        )
+        self.output_formats: FrozenSet[str] = frozenset(
+            self._query(["--list-output-formats"]).split()
+        )
+        self.extensions: FrozenSet[str] = frozenset(
+            line[1:] for line in self._query(["--list-extensions"]).split()
+        )
+        logger.info(f"Using pandoc {self.version} at {self.pandoc_path}")
+
+    def start_server_pool(self, size: int = 2) -> bool:
+        """
+        Route text-to-text conversions through warm ``pandoc server`` processes.
+
+        Args:
+            size: Number of pandoc server processes to keep running.
+
+        Returns:
+            True if the pool is running, False if the engine stays in subprocess mode.
+        """
+        if "server" not in self.features:
+            logger.warning("pandoc was built without server support, using subprocess mode")
+            return False
+        pool = PandocServerPool(self.pandoc_path, size=size)
+        try:
+            pool.start()
+        except PandocServerUnavailable as e:
+            logger.warning(f"{e}, using subprocess mode")
+            return False
+        self.server_pool = pool
+        return True
+
+    def close(self) -> None:
+        """Stop the pandoc server pool, if any."""
+        if self.server_pool is not None:
+            self.server_pool.shutdown()
+            self.server_pool = None
+
+    def _query(self, args: List[str]) -> str:
+        """Run pandoc with informational arguments and return its stdout."""
+        return subprocess.run(
+            [self.pandoc_path, *args],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    def _check_extensions(self, fmt: str) -> None:
+        """Validate the ``+ext``/``-ext`` modifiers of a format string."""
+        for extension in re.findall(r"[+-]([A-Za-z0-9_]+)", fmt[len(base_format(fmt)):]):
+            if extension not in self.extensions:
+                raise ValueError(f"Unknown pandoc extension '{extension}' in format '{fmt}'")
+
+    def validate(
+        self,
+        input_format: Optional[str],
+        output_format: str,
+        output_file: Optional[str] = None,
+    ) -> Tuple[Optional[str], str]:
+        """
+        Validate and normalize a format pair against the cached tables.
+
+        Args:
+            input_format: Source format, or None to let pandoc infer it from the input file.
+            output_format: Target format.
+            output_file: Output path, required for binary output formats.
+
+        Returns:
+            The normalized (input_format, output_format) pair.
+
+        Raises:
+            ValueError: If a format or extension is not supported.
+        """
+        if input_format is not None:
+            input_format = normalize_format(input_format, output=False)
+            if base_format(input_format) not in self.input_formats:
+                raise ValueError(f"Invalid input format: '{input_format}'")
+            self._check_extensions(input_format)
+
+        output_format = normalize_format(output_format)
+        base_to = base_format(output_format)
+        if base_to not in self.output_formats and base_to != "pdf":
+            raise ValueError(f"Invalid output format: '{output_format}'")
+        self._check_extensions(output_format)
+
+        if base_to in BINARY_OUTPUT_FORMATS and not output_file:
+            raise ValueError(f"Output to {base_to} only works with an output file")
+        if base_to == "pdf" and output_file and not str(output_file).endswith(".pdf"):
+            raise ValueError('PDF output needs an output file with ".pdf" as extension')
+
+        return input_format, output_format
+
+    def build_args(
+        self,
+        input_format: Optional[str],
+        output_format: str,
+        input_file: Optional[str] = None,
+        output_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+    ) -> List[str]:
+        """Build the pandoc command line for an already validated conversion, capping its heap if limited."""
+        args = [self.pandoc_path, *rts_args(self.pandoc_path)]
+        if input_format:
+            args.append(f"--from={input_format}")
+        args.append(f"--to={output_format}")
+        if input_file:
+            args.append(input_file)
+        if output_file:
+            args.append(f"--output={output_file}")
+        args.extend(extra_args)
+        return args
+
+    def convert(
+        self,
+        source: Optional[Source] = None,
+        output_format: str = "markdown",
+        input_format: Optional[str] = "markdown",
+        input_file: Optional[str] = None,
+        output_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """
+        Convert a string or a file with a single pandoc process.
+
+        Args:
+            source: Text to convert, or a stream of it, passed to pandoc on
+                stdin. Streams bypass the result cache and the server pool.
+            output_format: Target format.
+            input_format: Source format, or None to infer it from ``input_file``.
+            input_file: Path of a file to convert instead of ``source``.
+            output_file: Write the result to this path instead of returning it.
+            extra_args: Additional pandoc command line arguments.
+            cwd: Working directory of the pandoc process.
+            report: Receives details of PDF builds (``pdf_engine``, ``latex_passes``).
+            document_id: Keeps the LaTeX state of PDF builds between renders
+                of the same document; PDF builds are keyed by ``output_file``
+                without it.
+            progress: Receives progress parsed from the output of pandoc and
+                the LaTeX engine while the conversion runs.
+
+        Returns:
+            The converted text, or an empty string if ``output_file`` is set.
+
+        Raises:
+            ValueError: If the formats are invalid, the input file is missing
+                or a PDF is built from a stream.
+            RuntimeError: If pandoc exits with an error; ResourceLimitError if
+                it breached a limit active in the calling context. Errors
+                reading a stream are raised as they are.
+        """
+        if source is None and not input_file:
+            raise ValueError("Either 'source' or 'input_file' must be provided")
+        if input_file and not os.path.exists(input_file):
+            raise ValueError(f"Input file not found: {input_file}")
+
+        input_format, output_format = self.validate(input_format, output_format, output_file)
+        if base_format(output_format) == "pdf":
+            if isinstance(source, InputStream):
+                # The document is parsed before the build, spool the stream to a file first
+                raise ValueError("PDF output cannot be built from an input stream")
+
+        if self.cache is None or isinstance(source, InputStream):
+            return self._convert(
+                source, input_format, output_format, input_file, output_file, extra_args, cwd, report, document_id,
+                progress
+            )
+
+        key = self.cache.make_key(
+            self.version, source, input_file, input_format, output_format, extra_args, cwd
+        )
+
+        def compute() -> CachedResult:
+            output = self._convert(
+                source, input_format, output_format, input_file, output_file, extra_args, cwd, report, document_id,
+                progress
+            )
+            if output_file:
+                return CachedResult.from_file(output_file)
+            return CachedResult.from_text(output)
+
+        result, computed = self.cache.run(key, compute)
+        if output_file:
+            # Cache hits and coalesced requests copy the artifact instead of re-rendering it
+            if not computed:
+                self.cache.materialize(result, output_file)
+            return ""
+        return result.text()
+
+    async def aconvert(
+        self,
+        source: Optional[Source] = None,
+        output_format: str = "markdown",
+        input_format: Optional[str] = "markdown",
+        input_file: Optional[str] = None,
+        output_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """
+        Asyncio variant of :meth:`convert`.
+
+        The pandoc process is driven from the event loop with
+        ``asyncio.create_subprocess_exec``; stdin and stdout are streamed
+        without a thread per conversion. Takes the same arguments and raises
+        the same errors as :meth:`convert`.
+        """
+        if source is None and not input_file:
+            raise ValueError("Either 'source' or 'input_file' must be provided")
+        if input_file and not os.path.exists(input_file):
+            raise ValueError(f"Input file not found: {input_file}")
+
+        input_format, output_format = self.validate(input_format, output_format, output_file)
+        if base_format(output_format) == "pdf":
+            if isinstance(source, InputStream):
+                # The document is parsed before the build, spool the stream to a file first
+                raise ValueError("PDF output cannot be built from an input stream")
+
+        if self.cache is None or isinstance(source, InputStream):
+            return await self._aconvert(
+                source, input_format, output_format, input_file, output_file, extra_args, cwd, report, document_id,
+                progress
+            )
+
+        key = self.cache.make_key(
+            self.version, source, input_file, input_format, output_format, extra_args, cwd
+        )
+
+        async def compute() -> CachedResult:
+            output = await self._aconvert(
+                source, input_format, output_format, input_file, output_file, extra_args, cwd, report, document_id,
+                progress
+            )
+            if output_file:
+                return CachedResult.from_file(output_file)
+            return CachedResult.from_text(output)
+
+        result, computed = await self.cache.arun(key, compute)
+        if output_file:
+            if not computed:
+                self.cache.materialize(result, output_file)
+            return ""
+        return result.text()
+
+    def parse(
+        self,
+        source: Optional[Source] = None,
+        input_format: Optional[str] = "markdown",
+        input_file: Optional[str] = None,
+    ) -> str:
+        """
+        Parse the input once into pandoc's JSON AST.
+
+        The AST can be rendered into several formats with :meth:`render`
+        without parsing the input again.
+        """
+        return self.convert(source, output_format="json", input_format=input_format, input_file=input_file)
+
+    def render(
+        self,
+        ast: str,
+        output_format: str,
+        output_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        report: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None,
+    ) -> str:
+        """Render a JSON AST produced by :meth:`parse` into an output format."""
+        return self.convert(
+            ast,
+            output_format=output_format,
+            input_format="json",
+            output_file=output_file,
+            extra_args=extra_args,
+            report=report,
+            document_id=document_id,
+        )
+
+    async def aparse(
+        self,
+        source: Optional[Source] = None,
+        input_format: Optional[str] = "markdown",
+        input_file: Optional[str] = None,
+    ) -> str:
+        """Asyncio variant of :meth:`parse`."""
+        return await self.aconvert(source, output_format="json", input_format=input_format, input_file=input_file)
+
+    async def arender(
+        self,
+        ast: str,
+        output_format: str,
+        output_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        report: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None,
+    ) -> str:
+        """Asyncio variant of :meth:`render`."""
+        return await self.aconvert(
+            ast,
+            output_format=output_format,
+            input_format="json",
+            output_file=output_file,
+            extra_args=extra_args,
+            report=report,
+            document_id=document_id,
+        )
+
+    def stream(
+        self,
+        source: Optional[Source] = None,
+        output_format: str = "markdown",
+        input_format: Optional[str] = "markdown",
+        input_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[str] = None,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+    ) -> Iterator[str]:
+        """
+        Convert to a text format and yield the output as pandoc writes it.
+
+        The output is read from pandoc's stdout in pieces of at most
+        ``chunk_size`` bytes and decoded incrementally, so it is never held
+        in memory as a whole. Streamed conversions bypass the result cache
+        and the server pool. Takes the same arguments as :meth:`convert`.
+
+        Raises:
+            ValueError: If the formats are invalid, the input file is missing
+                or the output format is binary.
+            RuntimeError: If pandoc exits with an error, after the output it wrote.
+        """
+        args, stdin = self._stream_args(source, output_format, input_format, input_file, extra_args)
+        process = popen(
+            args,
+            stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+        )
+        stderr: List[bytes] = []
+        # stdin and stderr are served by threads so a full pipe cannot block the reader
+        helpers = [threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)]
+        if stdin is not None:
+            helpers.append(threading.Thread(target=self._feed, args=(process, stdin), daemon=True))
+        for helper in helpers:
+            helper.start()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        written = 0
+        try:
+            while True:
+                data = process.stdout.read1(chunk_size)
+                if not data:
+                    break
+                written += len(data)
+                check_output_size(written)
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+            process.wait()
+        finally:
+            # Also reached when the consumer stops reading early
+            if process.returncode is None:
+                kill_process_group(process)
+                process.wait()
+            self._close_input(stdin)
+            for helper in helpers:
+                helper.join()
+            process.stdout.close()
+            release(process)
+        self._check_input(stdin)
+        self._check_output(process.returncode, b"", b"".join(stderr))
+
+    async def astream(
+        self,
+        source: Optional[Source] = None,
+        output_format: str = "markdown",
+        input_format: Optional[str] = "markdown",
+        input_file: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[str] = None,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+    ) -> AsyncIterator[str]:
+        """Asyncio variant of :meth:`stream`."""
+        args, stdin = self._stream_args(source, output_format, input_format, input_file, extra_args)
+        process = await create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+        )
+        feeder = asyncio.ensure_future(self._afeed(process, stdin)) if stdin is not None else None
+        stderr = asyncio.ensure_future(process.stderr.read())
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        written = 0
+        try:
+            while True:
+                data = await process.stdout.read(chunk_size)
+                if not data:
+                    break
+                written += len(data)
+                check_output_size(written)
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+            await process.wait()
+        finally:
+            # Also reached on cancellation and when the consumer stops reading early
+            if process.returncode is None:
+                kill_process_group(process)
+                await process.wait()
+            if feeder is not None:
+                await self._aclose_input(stdin, feeder)
+            release(process)
+        self._check_input(stdin)
+        self._check_output(process.returncode, b"", await stderr)
+
+    def _stream_args(
+        self,
+        source: Optional[Source],
+        output_format: str,
+        input_format: Optional[str],
+        input_file: Optional[str],
+        extra_args: Sequence[str],
+    ) -> Tuple[List[str], Optional[Stdin]]:
+        """Validate a streamed conversion and return the pandoc command line and stdin."""
+        if source is None and not input_file:
+            raise ValueError("Either 'source' or 'input_file' must be provided")
+        if input_file and not os.path.exists(input_file):
+            raise ValueError(f"Input file not found: {input_file}")
+        input_format, output_format = self.validate(input_format, output_format)
+        if base_format(output_format) == "pdf":
+            raise ValueError("PDF output cannot be streamed")
+        args = self.build_args(input_format, output_format, input_file, None, extra_args)
+        stdin = self._stdin(source, input_file)
+        return args, stdin
+
+    def _pdf_engine_args(
+        self, ast: Optional[str], extra_args: Sequence[str], report: Optional[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        Resolve an automatic PDF engine from the parsed document.
+
+        Args:
+            ast: The document as JSON AST, only needed if the engine is ``auto``.
+            extra_args: The pandoc arguments of the PDF conversion.
+            report: Receives the engine used.
+
+        Returns:
+            The arguments with a concrete ``--pdf-engine``.
+        """
+        engine = requested_pdf_engine(extra_args) or DEFAULT_LATEX_ENGINE
+        if engine == AUTO_PDF_ENGINE:
+            engine = select_pdf_engine(document_features(ast, extra_args), installed_pdf_engines())
+            extra_args = with_pdf_engine(extra_args, engine)
+            logger.info(f"Selected PDF engine {engine}")
+        if report is not None:
+            report["pdf_engine"] = engine
+        return list(extra_args)
+
+    def _convert(
+        self,
+        source: Optional[Source],
+        input_format: Optional[str],
+        output_format: str,
+        input_file: Optional[str],
+        output_file: Optional[str],
+        extra_args: Sequence[str],
+        cwd: Optional[str],
+        report: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """Run a validated conversion on the server pool, the PDF builder or as a pandoc subprocess."""
+        if base_format(output_format) == "pdf":
+            ast = None
+            if requested_pdf_engine(extra_args) == AUTO_PDF_ENGINE:
+                # Resolved on a cache miss only; the AST is not worth a cache entry of its own
+                ast = self._convert(source, input_format, "json", input_file, None, (), cwd)
+            extra_args = self._pdf_engine_args(ast, extra_args, report)
+
+        if self._use_pdf_builder(output_format, output_file, extra_args):
+            result = self.pdf.build(
+                source, input_format, input_file, output_file, extra_args, cwd, document_id, progress
+            )
+            if report is not None:
+                report.update(result.report())
+            return ""
+
+        if self._use_server(source, input_format, output_format, input_file, extra_args):
+            try:
+                output = self.server_pool.convert(source, input_format, output_format)
+            except PandocServerUnavailable as e:
+                logger.warning(f"{e}, falling back to subprocess")
+            else:
+                if output_file:
+                    with open(output_file, "w", encoding="utf-8") as f:
+                        f.write(output)
+                    return ""
+                return output
+
+        args = self.build_args(input_format, output_format, input_file, output_file, extra_args)
+        stdin = self._stdin(source, input_file)
+        if progress is not None or isinstance(stdin, InputStream):
+            # Streams are fed by a thread of their own, as with progress reporting
+            parser = PandocProgress(progress or _ignore_progress, count_lines(source, input_file))
+            return self._run_with_progress(args, stdin, cwd, parser)
+
+        process = run_process(args, input=stdin, cwd=cwd)
+        return self._check_output(process.returncode, process.stdout, process.stderr)
+
+    def _run_with_progress(self, args: List[str], stdin: Optional[Stdin], cwd: Optional[str],
+                           parser: PandocProgress) -> str:
+        """Run pandoc with progress logging, parsing its stderr while it runs."""
+        process = popen(
+            [*args, *progress_args(parser.total_lines)],
+            stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+        )
+        stdout: List[bytes] = []
+        # stdin and stdout are served by threads so a full pipe cannot block the stderr reader
+        helpers = [threading.Thread(target=lambda: stdout.append(process.stdout.read()), daemon=True)]
+        if stdin is not None:
+            helpers.append(threading.Thread(target=self._feed, args=(process, stdin), daemon=True))
+        for helper in helpers:
+            helper.start()
+        parser.start()
+        messages = []
+        try:
+            for raw in process.stderr:
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if not parser.feed(line):
+                    messages.append(line)
+            process.wait()
+        finally:
+            if process.returncode is None:
+                kill_process_group(process)
+                process.wait()
+            self._close_input(stdin)
+            for helper in helpers:
+                helper.join()
+            release(process)
+        self._check_input(stdin)
+        return self._check_output(process.returncode, b"".join(stdout), "\n".join(messages).encode("utf-8"))
+
+    @staticmethod
+    def _stdin(source: Optional[Source], input_file: Optional[str]) -> Optional[Stdin]:
+        """Return what to write to pandoc's stdin, None if it reads the input file."""
+        if source is None or input_file:
+            return None
+        return source if isinstance(source, InputStream) else source.encode("utf-8")
+
+    @staticmethod
+    def _feed(process: subprocess.Popen, stdin: Stdin) -> None:
+        """Write the input of a pandoc process and close its stdin, stopping pandoc if a stream fails."""
+        try:
+            if isinstance(stdin, InputStream):
+                # One chunk at a time; the write blocks while pandoc's pipe is full
+                for chunk in iter(stdin.read, b""):
+                    process.stdin.write(chunk)
+            else:
+                process.stdin.write(stdin)
+        except (BrokenPipeError, ValueError):
+            pass
+        except Exception:
+            # Reading the stream failed (see _check_input), pandoc must not convert a truncated input
+            kill_process_group(process)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    @staticmethod
+    async def _afeed(process: asyncio.subprocess.Process, stdin: Stdin) -> None:
+        """Asyncio variant of :meth:`_feed`."""
+        try:
+            if isinstance(stdin, InputStream):
+                while True:
+                    chunk = await stdin.aread()
+                    if not chunk:
+                        break
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            else:
+                process.stdin.write(stdin)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception:
+            kill_process_group(process)
+        finally:
+            process.stdin.close()
+
+    @staticmethod
+    def _close_input(stdin: Optional[Stdin]) -> None:
+        """Release a feeder thread still waiting for a stream whose pandoc has exited."""
+        if isinstance(stdin, InputStream):
+            stdin.close()
+
+    @staticmethod
+    async def _aclose_input(stdin: Optional[Stdin], feeder: asyncio.Future) -> None:
+        """Wait for the feeder of a finished pandoc process, cancelling it if it still waits for a stream."""
+        if isinstance(stdin, InputStream):
+            stdin.close()
+            feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+
+    @staticmethod
+    def _check_input(stdin: Optional[Stdin]) -> None:
+        """Raise the error that stopped reading a stream, e.g. a client disconnect or the input size limit."""
+        if isinstance(stdin, InputStream):
+            check_cancelled()
+            stdin.check()
+
+    async def _aconvert(
+        self,
+        source: Optional[Source],
+        input_format: Optional[str],
+        output_format: str,
+        input_file: Optional[str],
+        output_file: Optional[str],
+        extra_args: Sequence[str],
+        cwd: Optional[str],
+        report: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """Run a validated conversion as a pandoc child process of the event loop."""
+        if base_format(output_format) == "pdf":
+            ast = None
+            if requested_pdf_engine(extra_args) == AUTO_PDF_ENGINE:
+                ast = await self._aconvert(source, input_format, "json", input_file, None, (), cwd)
+            extra_args = self._pdf_engine_args(ast, extra_args, report)
+
+        if self._use_pdf_builder(output_format, output_file, extra_args):
+            # Several LaTeX passes with file handling in between, run them on a thread
+            result = await asyncio.to_thread(
+                self.pdf.build, source, input_format, input_file, output_file, extra_args, cwd, document_id,
+                progress
+            )
+            if report is not None:
+                report.update(result.report())
+            return ""
+
+        if self._use_server(source, input_format, output_format, input_file, extra_args):
+            try:
+                # The server pool speaks blocking HTTP, so this path still uses a thread
+                output = await asyncio.to_thread(self.server_pool.convert, source, input_format, output_format)
+            except PandocServerUnavailable as e:
+                logger.warning(f"{e}, falling back to subprocess")
+            else:
+                if output_file:
+                    with open(output_file, "w", encoding="utf-8") as f:
+                        f.write(output)
+                    return ""
+                return output
+
+        args = self.build_args(input_format, output_format, input_file, output_file, extra_args)
+        stdin = self._stdin(source, input_file)
+        if progress is not None or isinstance(stdin, InputStream):
+            parser = PandocProgress(progress or _ignore_progress, count_lines(source, input_file))
+            return await self._arun_with_progress(args, stdin, cwd, parser)
+
+        process = await create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+        )
+        try:
+            stdout, stderr = await process.communicate(stdin)
+        finally:
+            # Do not leave an orphaned pandoc behind a cancelled request
+            if process.returncode is None:
+                kill_process_group(process)
+                await process.wait()
+            release(process)
+        return self._check_output(process.returncode, stdout, stderr)
+
+    async def _arun_with_progress(self, args: List[str], stdin: Optional[Stdin], cwd: Optional[str],
+                                  parser: PandocProgress) -> str:
+        """Asyncio variant of :meth:`_run_with_progress`."""
+        process = await create_subprocess_exec(
+            *args,
+            *progress_args(parser.total_lines),
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            # Warnings may quote large parts of the input on one line
+            limit=1 << 20,
+        )
+        feeder = asyncio.ensure_future(self._afeed(process, stdin)) if stdin is not None else None
+        stdout = asyncio.ensure_future(process.stdout.read())
+        parser.start()
+        messages = []
+        try:
+            async for raw in process.stderr:
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if not parser.feed(line):
+                    messages.append(line)
+            await process.wait()
+        finally:
+            # Also reached on cancellation; do not leave an orphaned pandoc behind
+            if process.returncode is None:
+                kill_process_group(process)
+                await process.wait()
+            if feeder is not None:
+                await self._aclose_input(stdin, feeder)
+            release(process)
+        self._check_input(stdin)
+        return self._check_output(process.returncode, await stdout, "\n".join(messages).encode("utf-8"))
+
+    @staticmethod
+    def _check_output(returncode: int, stdout: bytes, stderr: bytes) -> str:
+        """Decode the output of a finished pandoc process, raising on errors, cancellation and breached limits."""
+        check_cancelled()
+        message = stderr.decode("utf-8", errors="replace")
+        if returncode != 0:
+            check_exit(returncode, message)
+            raise RuntimeError(
+                f'Pandoc died with exitcode "{returncode}" during conversion: {message}'
+            )
+        if message:
+            logger.warning(message.strip())
+
+        check_output_size(len(stdout))
+        return stdout.decode("utf-8", errors="replace")
+
+    def _use_pdf_builder(self, output_format: str, output_file: Optional[str], extra_args: Sequence[str]) -> bool:
+        """Return True if a validated conversion is a PDF build the PDF builder can run."""
+        return (
+            self.pdf is not None
+            and output_file is not None
+            and base_format(output_format) == "pdf"
+            and self.pdf.can_build(extra_args)
+        )
+
+    def _use_server(
+        self,
+        source: Optional[Source],
+        input_format: Optional[str],
+        output_format: str,
+        input_file: Optional[str],
+        extra_args: Sequence[str],
+    ) -> bool:
+        """Return True if a validated conversion can run on the server pool."""
+        return (
+            self.server_pool is not None
+            and isinstance(source, str)
+            and not input_file
+            and not extra_args
+            and input_format is not None
+            and base_format(input_format) in TEXT_FORMATS
+            and base_format(output_format) in TEXT_FORMATS
+        )
+
+
+def _ignore_progress(fraction: Optional[float], message: str) -> None:
+    """Progress callback of conversions nobody reports the progress of."""
+
+
+_engine: Optional[PandocEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> PandocEngine:
+    """
+    Return the process-wide engine, creating it on first use.
+
+    Setting ``MCP_PANDOC_ENGINE=server`` starts a pool of
+    ``MCP_PANDOC_SERVER_POOL_SIZE`` (default 2) warm pandoc server processes.
+    The result cache keeps ``MCP_PANDOC_CACHE_SIZE`` (default 256, 0 disables
+    it) results in memory and spills to ``MCP_PANDOC_CACHE_DIR`` if set.
+    PDF builds keep up to ``MCP_PANDOC_PDF_FORMATS`` (default 16, 0 leaves
+    PDF builds to pandoc) precompiled LaTeX formats and the TeX caches in
+    ``MCP_PANDOC_TEX_CACHE_DIR``, along with up to
+    ``MCP_PANDOC_PDF_BUILD_DIRS`` (default 64, 0 builds in temporary
+    directories) per-document build directories of at most
+    ``MCP_PANDOC_PDF_BUILD_MB`` (default 512) in total.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = PandocEngine()
+                if os.environ.get("MCP_PANDOC_ENGINE", "subprocess") == "server":
+                    engine.start_server_pool(int(os.environ.get("MCP_PANDOC_SERVER_POOL_SIZE", "2")))
+                cache_size = int(os.environ.get("MCP_PANDOC_CACHE_SIZE", "256"))
+                if cache_size > 0:
+                    engine.cache = ConversionCache(
+                        max_entries=cache_size,
+                        max_memory_bytes=int(os.environ.get("MCP_PANDOC_CACHE_MEMORY_MB", "64")) * 1024 * 1024,
+                        disk_dir=os.environ.get("MCP_PANDOC_CACHE_DIR") or None,
+                        max_disk_bytes=int(os.environ.get("MCP_PANDOC_CACHE_DISK_MB", "1024")) * 1024 * 1024,
+                    )
+                max_formats = int(os.environ.get("MCP_PANDOC_PDF_FORMATS", "16"))
+                if max_formats > 0:
+                    engine.pdf = PdfBuilder(
+                        engine.pandoc_path,
+                        os.environ.get("MCP_PANDOC_TEX_CACHE_DIR")
+                        or os.path.join(tempfile.gettempdir(), "mcp-pandoc-tex"),
+                        max_formats=max_formats,
+                        max_build_dirs=int(os.environ.get("MCP_PANDOC_PDF_BUILD_DIRS", "64")),
+                        max_build_bytes=int(os.environ.get("MCP_PANDOC_PDF_BUILD_MB", "512")) * 1024 * 1024,
+                    )
+                _engine = engine
+    return _engine
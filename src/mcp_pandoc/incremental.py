@@ -0,0 +1,273 @@
+"""
+Incremental re-conversion of documents that are edited and re-submitted.
+
+Agents edit long documents a paragraph at a time and convert them again
+after every edit. For a document id the converter keeps the rendered output
+of every top-level block, keyed by a hash of the block's AST. A new version
+is parsed, only blocks with unknown hashes are rendered (in one pandoc run,
+separated by marker paragraphs), and the output is spliced together from
+reused and fresh blocks. HTML code block identifiers, which pandoc numbers
+document-wide, are stored relative to their block and shifted when splicing.
+Documents are evicted by an LRU bound and a TTL.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from .chunking import (CHUNKED_OUTPUT_FORMATS, blocks_render_independently, count_anonymous_code_blocks,
+                       renumber_code_blocks)
+from .engine import PandocEngine, base_format, get_engine, normalize_format
+
+# Output formats that can be converted incrementally.
+INCREMENTAL_OUTPUT_FORMATS = CHUNKED_OUTPUT_FORMATS
+
+
+@dataclass
+class IncrementalResult:
+    """Output of an incremental conversion with its block reuse counts."""
+    output: str
+    blocks: int
+    reused: int
+    rendered: int
+
+    def stats(self) -> Dict[str, int]:
+        """Return the reuse counts for API responses."""
+        return {"blocks": self.blocks, "reused": self.reused, "rendered": self.rendered}
+
+
+@dataclass
+class _DocumentState:
+    """Rendered blocks of the last version of a document."""
+    context: str
+    blocks: Dict[str, str]
+    expires_at: float
+
+
+@dataclass
+class _Plan:
+    """What an incremental conversion has to render, decided after parsing."""
+    document_id: str
+    context: str
+    hashes: List[str]
+    code_blocks: List[int]
+    known: Dict[str, str]
+    missing: List[str] = field(default_factory=list)
+    render_ast: Optional[str] = None
+    marker: Optional[str] = None
+    whole_document: bool = False
+
+
+class IncrementalConverter:
+    """
+    Converts successive versions of documents, re-rendering changed blocks only.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, engine: PandocEngine, max_documents: int = 128, ttl: float = 1800.0):
+        """
+        Initialize the converter.
+
+        Args:
+            engine: The pandoc engine used for parsing and rendering.
+            max_documents: Maximum number of documents whose blocks are kept.
+            ttl: Seconds after which an untouched document is forgotten.
+        """
+        self.engine = engine
+        self.max_documents = max_documents
+        self.ttl = ttl
+        self._documents: "OrderedDict[str, _DocumentState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def convert(
+        self,
+        document_id: str,
+        source: str,
+        input_format: str = "markdown",
+        output_format: str = "html",
+        extra_args: Sequence[str] = (),
+    ) -> IncrementalResult:
+        """
+        Convert a new version of a document, reusing unchanged blocks.
+
+        Args:
+            document_id: Identifies the document across versions.
+            source: The full text of the new version.
+            input_format: Source format.
+            output_format: A text output format from INCREMENTAL_OUTPUT_FORMATS.
+            extra_args: Additional pandoc command line arguments.
+
+        Returns:
+            The converted text and how many blocks were reused or rendered.
+
+        Raises:
+            ValueError: If the output format cannot be converted incrementally.
+            RuntimeError: If pandoc exits with an error.
+        """
+        ast = self.engine.parse(source, input_format=input_format)
+        plan = self._plan(document_id, ast, input_format, output_format, extra_args)
+        output = None
+        if plan.render_ast is not None:
+            output = self.engine.render(plan.render_ast, output_format, extra_args=extra_args)
+        return self._finish(plan, output, output_format)
+
+    async def aconvert(
+        self,
+        document_id: str,
+        source: str,
+        input_format: str = "markdown",
+        output_format: str = "html",
+        extra_args: Sequence[str] = (),
+    ) -> IncrementalResult:
+        """Asyncio variant of :meth:`convert`."""
+        ast = await self.engine.aparse(source, input_format=input_format)
+        plan = self._plan(document_id, ast, input_format, output_format, extra_args)
+        output = None
+        if plan.render_ast is not None:
+            output = await self.engine.arender(plan.render_ast, output_format, extra_args=extra_args)
+        return self._finish(plan, output, output_format)
+
+    def forget(self, document_id: str) -> None:
+        """Drop the state of a document."""
+        with self._lock:
+            self._documents.pop(document_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of tracked documents and evictions."""
+        with self._lock:
+            return {"documents": len(self._documents), "evictions": self.evictions}
+
+    def _plan(
+        self,
+        document_id: str,
+        ast: str,
+        input_format: str,
+        output_format: str,
+        extra_args: Sequence[str],
+    ) -> _Plan:
+        """Hash the blocks of a parsed version and build the AST of the blocks to render."""
+        if base_format(normalize_format(output_format)) not in INCREMENTAL_OUTPUT_FORMATS:
+            raise ValueError(f"Incremental conversion is not supported for {output_format} output")
+
+        document = json.loads(ast)
+        blocks = document["blocks"]
+        context = hashlib.sha256(json.dumps(
+            [self.engine.version, input_format, output_format, list(extra_args), document["meta"]],
+            sort_keys=True,
+        ).encode("utf-8")).hexdigest()
+        encoded = [json.dumps(block, separators=(",", ":")) for block in blocks]
+        plan = _Plan(
+            document_id=document_id,
+            context=context,
+            hashes=[hashlib.sha256(block.encode("utf-8")).hexdigest() for block in encoded],
+            code_blocks=[count_anonymous_code_blocks(block) for block in encoded],
+            known={},
+        )
+        hashes = plan.hashes
+
+        if not blocks or not blocks_render_independently(ast, document, output_format):
+            # The output depends on the whole document, render it in one piece
+            plan.whole_document = True
+            plan.render_ast = ast
+            return plan
+
+        with self._lock:
+            self._expire()
+            state = self._documents.get(document_id)
+            if state is not None and state.context == context:
+                plan.known = {h: state.blocks[h] for h in set(hashes) if h in state.blocks}
+
+        block_by_hash = dict(zip(hashes, blocks))
+        plan.missing = list(dict.fromkeys(h for h in hashes if h not in plan.known))
+        if plan.missing:
+            plan.marker = f"MCPPANDOCBLOCK{uuid.uuid4().hex.upper()}"
+            separator = {"t": "Para", "c": [{"t": "Str", "c": plan.marker}]}
+            render_blocks: List[Any] = []
+            for index, block_hash in enumerate(plan.missing):
+                if index:
+                    render_blocks.append(separator)
+                render_blocks.append(block_by_hash[block_hash])
+            plan.render_ast = json.dumps(
+                {**document, "blocks": render_blocks}, separators=(",", ":")
+            )
+        return plan
+
+    def _finish(self, plan: _Plan, output: Optional[str], output_format: str) -> IncrementalResult:
+        """Splice reused and freshly rendered blocks and remember the new version."""
+        if plan.whole_document:
+            self.forget(plan.document_id)
+            return IncrementalResult(output or "", len(plan.hashes), 0, len(plan.hashes))
+
+        rendered = dict(plan.known)
+        if plan.missing:
+            pieces = re.split(rf"\n?^[^\n]*{plan.marker}[^\n]*$\n?", output, flags=re.MULTILINE)
+            if len(pieces) != len(plan.missing):
+                raise RuntimeError("Pandoc output could not be split into blocks")
+            code_blocks = dict(zip(plan.hashes, plan.code_blocks))
+            offset = 0
+            for block_hash, piece in zip(plan.missing, pieces):
+                # Store code block numbers relative to the block
+                rendered[block_hash] = renumber_code_blocks(piece.strip("\n"), -offset)
+                offset += code_blocks[block_hash]
+
+        is_html = base_format(normalize_format(output_format)).startswith("html")
+        parts = []
+        offset = 0
+        for block_hash, code_blocks in zip(plan.hashes, plan.code_blocks):
+            if rendered[block_hash]:
+                parts.append(renumber_code_blocks(rendered[block_hash], offset) if is_html else rendered[block_hash])
+            offset += code_blocks
+        spliced = ("\n" if is_html else "\n\n").join(parts) + "\n"
+
+        with self._lock:
+            self._documents.pop(plan.document_id, None)
+            self._documents[plan.document_id] = _DocumentState(
+                context=plan.context,
+                blocks={h: rendered[h] for h in plan.hashes},
+                expires_at=time.monotonic() + self.ttl,
+            )
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+
+        reused = sum(1 for h in plan.hashes if h in plan.known)
+        return IncrementalResult(spliced, len(plan.hashes), reused, len(plan.hashes) - reused)
+
+    def _expire(self) -> None:
+        """Forget documents whose TTL has passed. Must be called with the lock held."""
+        now = time.monotonic()
+        for document_id in [d for d, state in self._documents.items() if state.expires_at <= now]:
+            del self._documents[document_id]
+            self.evictions += 1
+
+
+_converter: Optional[IncrementalConverter] = None
+_converter_lock = threading.Lock()
+
+
+def get_incremental_converter() -> IncrementalConverter:
+    """
+    Return the process-wide incremental converter on the shared engine.
+
+    It keeps up to ``MCP_PANDOC_INCREMENTAL_DOCUMENTS`` (default 128)
+    documents for ``MCP_PANDOC_INCREMENTAL_TTL`` (default 1800) seconds.
+    """
+    global _converter
+    if _converter is None:
+        with _converter_lock:
+            if _converter is None:
+                _converter = IncrementalConverter(
+                    get_engine(),
+                    max_documents=int(os.environ.get("MCP_PANDOC_INCREMENTAL_DOCUMENTS", "128")),
+                    ttl=float(os.environ.get("MCP_PANDOC_INCREMENTAL_TTL", "1800")),
+                )
+    return _converter
@@ -0,0 +1,188 @@
+"""
+Resource limits of single conversions.
+
+A pathological input can make pandoc's heap grow to many gigabytes or a
+LaTeX engine loop forever. The limits active in the calling context (a
+context variable, like the cancel scope) are applied to every pandoc and
+LaTeX process of a conversion:
+
+* ``cpu_time``, ``memory_mb`` and ``output_mb`` become the ``RLIMIT_CPU``,
+  ``RLIMIT_AS`` and ``RLIMIT_FSIZE`` of the process, set with ``prlimit``
+  right after it started (Linux only).
+* ``heap_mb`` caps pandoc's Haskell heap with ``+RTS -M``, which fails
+  with a clear message long before the address space limit is hit. It is
+  skipped for pandoc builds without RTS options.
+* ``output_mb`` also bounds the output read from pandoc's stdout.
+
+Breaches raise :class:`ResourceLimitError`. Wall time and input size are
+enforced by the caller, which knows when a conversion starts and what it
+reads.
+"""
+
+import contextlib
+import logging
+import signal
+import subprocess
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("pandoc-limits")
+
+MB = 1024 * 1024
+
+# Seconds between the soft CPU limit (SIGXCPU) and the hard one (SIGKILL)
+CPU_GRACE = 5
+
+# Messages of the GHC runtime when pandoc runs out of heap or address space
+_HEAP_EXHAUSTED = "Heap exhausted"
+_OUT_OF_MEMORY = ("out of memory", "Cannot allocate memory", "memory exhausted")
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """Limits of one conversion; None disables a limit."""
+    wall_time: Optional[float] = None
+    cpu_time: Optional[int] = None
+    memory_mb: Optional[int] = None
+    heap_mb: Optional[int] = None
+    output_mb: Optional[int] = None
+    input_mb: Optional[int] = None
+
+    def describe(self, limit: str) -> str:
+        """Return a limit with its unit, e.g. "CPU time limit of 60 s"."""
+        value = getattr(self, limit)
+        name = LIMIT_NAMES[limit]
+        if limit in ("wall_time", "cpu_time"):
+            return f"{name} limit of {value:g} s"
+        return f"{name} limit of {value} MB"
+
+
+LIMIT_NAMES = {
+    "wall_time": "wall time",
+    "cpu_time": "CPU time",
+    "memory_mb": "memory",
+    "heap_mb": "pandoc heap",
+    "output_mb": "output size",
+    "input_mb": "input size",
+}
+
+
+class ResourceLimitError(RuntimeError):
+    """Raised when a conversion exceeds one of its resource limits."""
+
+    def __init__(self, limit: str, limits: ResourceLimits, detail: str = ""):
+        """
+        Initialize the error.
+
+        Args:
+            limit: Name of the exceeded field of ResourceLimits.
+            limits: The limits of the conversion.
+            detail: What exceeded the limit, appended to the message.
+        """
+        message = f"Resource limit exceeded: {limits.describe(limit)}"
+        super().__init__(f"{message} ({detail})" if detail else message)
+        self.limit = limit
+
+
+_limits: ContextVar[Optional[ResourceLimits]] = ContextVar("mcp_pandoc_resource_limits", default=None)
+
+
+@contextlib.contextmanager
+def resource_limits(limits: Optional[ResourceLimits]) -> Iterator[Optional[ResourceLimits]]:
+    """Make ``limits`` the limits of the processes started in this context; None lifts them."""
+    token = _limits.set(limits)
+    try:
+        yield limits
+    finally:
+        _limits.reset(token)
+
+
+def current_limits() -> Optional[ResourceLimits]:
+    """Return the limits active in this context, if any."""
+    return _limits.get()
+
+
+@lru_cache(maxsize=None)
+def rts_supported(pandoc_path: str) -> bool:
+    """Return True if a pandoc binary accepts ``+RTS`` options on its command line."""
+    try:
+        process = subprocess.run(
+            [pandoc_path, "+RTS", "-M1g", "-RTS", "--version"], capture_output=True, timeout=30
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    if process.returncode != 0:
+        logger.warning("pandoc was built without RTS options, its heap is not capped")
+    return process.returncode == 0
+
+
+def rts_args(pandoc_path: str) -> List[str]:
+    """Return the pandoc arguments capping its heap, empty without a heap limit."""
+    limits = _limits.get()
+    if limits is None or not limits.heap_mb or not rts_supported(pandoc_path):
+        return []
+    return ["+RTS", f"-M{limits.heap_mb}m", "-RTS"]
+
+
+def apply_limits(pid: int) -> None:
+    """Set the rlimits of a just started process from the active limits."""
+    limits = _limits.get()
+    if limits is None or resource is None or not hasattr(resource, "prlimit"):
+        return
+    rlimits = []
+    if limits.cpu_time:
+        rlimits.append((resource.RLIMIT_CPU, (limits.cpu_time, limits.cpu_time + CPU_GRACE)))
+    if limits.memory_mb:
+        rlimits.append((resource.RLIMIT_AS, (limits.memory_mb * MB,) * 2))
+    if limits.output_mb:
+        rlimits.append((resource.RLIMIT_FSIZE, (limits.output_mb * MB,) * 2))
+    for rlimit, values in rlimits:
+        try:
+            resource.prlimit(pid, rlimit, values)
+        except ProcessLookupError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not set resource limit {rlimit} of process {pid}: {e}")
+
+
+def check_exit(returncode: int, output: str) -> None:
+    """
+    Raise if a process failed because it hit one of the active limits.
+
+    Args:
+        returncode: Exit code of the process, negative for a signal.
+        output: Its error output.
+
+    Raises:
+        ResourceLimitError: If the exit code or output shows a breached limit.
+    """
+    limits = _limits.get()
+    if limits is None or returncode == 0:
+        return
+    if limits.cpu_time and returncode == -signal.SIGXCPU:
+        raise ResourceLimitError("cpu_time", limits, f"killed by signal {-returncode}")
+    if limits.output_mb and returncode == -signal.SIGXFSZ:
+        raise ResourceLimitError("output_mb", limits, "file size limit reached")
+    if limits.heap_mb and _HEAP_EXHAUSTED in output:
+        raise ResourceLimitError("heap_mb", limits)
+    if limits.memory_mb and any(message in output for message in _OUT_OF_MEMORY):
+        raise ResourceLimitError("memory_mb", limits)
+
+
+def check_output_size(size: int) -> None:
+    """
+    Raise if ``size`` bytes of output exceed the active output limit.
+
+    Raises:
+        ResourceLimitError: If the output is too large.
+    """
+    limits = _limits.get()
+    if limits is not None and limits.output_mb and size > limits.output_mb * MB:
+        raise ResourceLimitError("output_mb", limits, f"{size / MB:.1f} MB written")
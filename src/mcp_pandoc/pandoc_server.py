@@ -0,0 +1,265 @@
+"""
+Pool of warm ``pandoc server`` processes.
+
+Pandoc 3.x ships an HTTP JSON conversion server. Keeping a few of them
+running removes process startup and Haskell RTS initialization from every
+text-to-text conversion. The pool listens on loopback ports, health-checks
+its instances in the background and restarts instances that crashed.
+"""
+
+import atexit
+import http.client
+import itertools
+import json
+import logging
+import socket
+import subprocess
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger("pandoc-server-pool")
+
+# Formats routed to the pool; everything else (binary outputs, PDF) runs as a subprocess.
+TEXT_FORMATS = frozenset({
+    "commonmark", "gfm", "html", "html4", "html5", "latex", "markdown", "plain", "rst",
+})
+
+
+class PandocServerUnavailable(RuntimeError):
+    """Raised when no healthy pandoc server instance can take a request."""
+
+
+def _free_port() -> int:
+    """Ask the kernel for an unused loopback port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class PandocServerInstance:
+    """A single ``pandoc server`` process listening on a loopback port."""
+
+    def __init__(self, pandoc_path: str, timeout: int = 60):
+        """
+        Initialize the instance without starting it.
+
+        Args:
+            pandoc_path: Path to the pandoc binary.
+            timeout: Conversion timeout enforced by pandoc server, in seconds.
+        """
+        self.pandoc_path = pandoc_path
+        self.timeout = timeout
+        self.port = 0
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        # Serializes start, stop and restart between the monitor and request threads
+        self._lock = threading.RLock()
+
+    def start(self, startup_timeout: float = 10.0) -> None:
+        """
+        Start the process and wait until it answers on its port.
+
+        Raises:
+            PandocServerUnavailable: If the server does not come up in time.
+        """
+        with self._lock:
+            self.port = _free_port()
+            self.process = subprocess.Popen(
+                [self.pandoc_path, "server", f"--port={self.port}", f"--timeout={self.timeout}"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            deadline = time.monotonic() + startup_timeout
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    break
+                if self.is_healthy():
+                    logger.info(f"pandoc server started on port {self.port}")
+                    return
+                time.sleep(0.05)
+            self.stop()
+            raise PandocServerUnavailable(f"pandoc server failed to start on port {self.port}")
+
+    def stop(self) -> None:
+        """Terminate the process."""
+        with self._lock:
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            self.process = None
+
+    def restart(self) -> bool:
+        """
+        Replace a crashed or unresponsive process with a fresh one.
+
+        The health check is repeated under the instance lock, so when the
+        monitor and a request thread both notice a dead process, only the
+        first restarts it.
+
+        Returns:
+            True if the process was restarted, False if it was healthy.
+
+        Raises:
+            PandocServerUnavailable: If the new process does not come up in time.
+        """
+        with self._lock:
+            if self.is_healthy():
+                return False
+            self.stop()
+            self.restarts += 1
+            self.start()
+            return True
+
+    def is_healthy(self) -> bool:
+        """Return True if the process is running and answers ``GET /version``."""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=2)
+        try:
+            connection.request("GET", "/version")
+            return connection.getresponse().status == 200
+        except OSError:
+            return False
+        finally:
+            connection.close()
+
+    def convert(self, text: str, input_format: str, output_format: str) -> str:
+        """
+        Convert text through this instance.
+
+        Raises:
+            OSError: If the instance cannot be reached.
+            RuntimeError: If pandoc reports a conversion error.
+        """
+        body = json.dumps({"text": text, "from": input_format, "to": output_format})
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout + 5)
+        try:
+            connection.request(
+                "POST",
+                "/",
+                body=body.encode("utf-8"),
+                headers={"Content-Type": "application/json", "Accept": "application/json"},
+            )
+            response = connection.getresponse()
+            payload = response.read().decode("utf-8", errors="replace")
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise RuntimeError(f"pandoc server failed with status {response.status}: {payload}")
+        data = json.loads(payload)
+        if "error" in data:
+            raise RuntimeError(f"pandoc server failed during conversion: {data['error']}")
+        return data["output"]
+
+
+class PandocServerPool:
+    """
+    Round-robin pool of warm ``pandoc server`` instances.
+
+    A background thread health-checks the instances and restarts the ones
+    that died. Requests that hit a dead instance restart it and are retried
+    on the next one.
+    """
+
+    def __init__(
+        self,
+        pandoc_path: str,
+        size: int = 2,
+        timeout: int = 60,
+        health_interval: float = 5.0,
+    ):
+        """
+        Initialize the pool without starting it.
+
+        Args:
+            pandoc_path: Path to the pandoc binary.
+            size: Number of pandoc server processes to keep running.
+            timeout: Conversion timeout enforced by pandoc server, in seconds.
+            health_interval: Seconds between background health checks.
+        """
+        self.instances: List[PandocServerInstance] = [
+            PandocServerInstance(pandoc_path, timeout) for _ in range(size)
+        ]
+        self.health_interval = health_interval
+        self._cycle = itertools.cycle(self.instances)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Start all instances and the health-check thread.
+
+        Raises:
+            PandocServerUnavailable: If an instance fails to start.
+        """
+        try:
+            for instance in self.instances:
+                instance.start()
+        except PandocServerUnavailable:
+            self.shutdown()
+            raise
+        self._monitor = threading.Thread(target=self._monitor_loop, name="pandoc-server-health", daemon=True)
+        self._monitor.start()
+        atexit.register(self.shutdown)
+        logger.info(f"pandoc server pool started with {len(self.instances)} instances")
+
+    def _monitor_loop(self) -> None:
+        """Periodically restart instances that stopped answering."""
+        while not self._stopped.wait(self.health_interval):
+            self.health_check()
+
+    def health_check(self) -> int:
+        """
+        Check every instance and restart unhealthy ones.
+
+        Returns:
+            The number of restarted instances.
+        """
+        restarted = 0
+        for instance in self.instances:
+            if self._stopped.is_set():
+                break
+            if not instance.is_healthy():
+                logger.warning(f"pandoc server on port {instance.port} is unhealthy, restarting")
+                try:
+                    if instance.restart():
+                        restarted += 1
+                except PandocServerUnavailable as e:
+                    logger.error(str(e))
+        return restarted
+
+    def _next_instance(self) -> PandocServerInstance:
+        with self._lock:
+            return next(self._cycle)
+
+    def convert(self, text: str, input_format: str, output_format: str) -> str:
+        """
+        Convert text on the next healthy instance.
+
+        Raises:
+            PandocServerUnavailable: If no instance could be reached.
+            RuntimeError: If pandoc reports a conversion error.
+        """
+        for _ in range(len(self.instances)):
+            instance = self._next_instance()
+            try:
+                return instance.convert(text, input_format, output_format)
+            except OSError as e:
+                logger.warning(f"pandoc server on port {instance.port} unreachable: {e}")
+                try:
+                    instance.restart()
+                except PandocServerUnavailable as restart_error:
+                    logger.error(str(restart_error))
+        raise PandocServerUnavailable("No pandoc server instance is reachable")
+
+    def shutdown(self) -> None:
+        """Stop the health-check thread and all instances."""
+        self._stopped.set()
+        for instance in self.instances:
+            instance.stop()
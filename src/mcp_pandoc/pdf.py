@@ -0,0 +1,773 @@
+"""
+PDF builds with precompiled LaTeX formats and a persistent TeX cache.
+
+Pandoc's own PDF path writes the document to a fresh temporary directory
+and runs the LaTeX engine on it, so every build loads the whole preamble
+(fontspec, geometry, hyperref, ...) and looks up fonts from scratch. This
+module renders the document to LaTeX with pandoc instead and drives the
+engine itself:
+
+* The static part of the preamble is dumped once into a format file with
+  the ``mylatexformat`` package and loaded with ``-fmt`` by later builds.
+  Formats are keyed by engine, engine version and the dumped preamble text,
+  so a changed template or variables yields a new format automatically.
+* ``TEXMFVAR``/``TEXMFCACHE`` point at a directory shared by all jobs, so
+  font caches (luaotfload) survive across builds.
+* Every document is built in a persistent directory keyed by its document
+  id or output file. The ``.aux``, ``.toc`` and ``.out`` files of the last
+  build are read by the first pass of the next one, so re-rendering an
+  edited document usually takes one pass instead of two or three. Build
+  directories are evicted least recently used by count and size.
+
+A format that fails to build or to load is remembered and the document is
+built without it; engines that are not installed leave the conversion to
+pandoc.
+
+The PDF engine itself is chosen per document when it is ``auto``: the
+fastest installed engine that renders the document's features correctly.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .cancel import ConversionCancelled, check_cancelled, popen, release
+from .cancel import run as run_process
+from .limits import ResourceLimitError, check_exit, resource_limits, rts_args
+from .progress import LatexProgress, ProgressCallback, log_pages
+
+logger = logging.getLogger("pandoc-pdf")
+
+# LaTeX engines the builder drives itself; other engines run through pandoc.
+LATEX_ENGINES = frozenset({"pdflatex", "xelatex", "lualatex"})
+
+# Engines whose preamble can be dumped with mylatexformat. LuaTeX formats
+# cannot hold the Lua state of luaotfload, so lualatex only uses the TeX cache.
+FORMAT_ENGINES = frozenset({"pdflatex", "xelatex"})
+
+# Pandoc's default engine when no --pdf-engine is given.
+DEFAULT_LATEX_ENGINE = "pdflatex"
+
+# Selects the engine by document features, see select_pdf_engine.
+AUTO_PDF_ENGINE = "auto"
+
+# Used when no engine is installed, so the error is pandoc's usual one.
+FALLBACK_PDF_ENGINE = "xelatex"
+
+# HTML based engines; much faster, but without TeX math or raw LaTeX.
+HTML_PDF_ENGINES = ("wkhtmltopdf", "weasyprint")
+
+# Engines tried by the automatic selection, fastest first.
+AUTO_PDF_ENGINES = (*HTML_PDF_ENGINES, "pdflatex", "xelatex", "lualatex")
+
+# Engines a request may name.
+PDF_ENGINES = frozenset({
+    AUTO_PDF_ENGINE, "context", "latexmk", "lualatex", "pagedjs-cli", "pdflatex", "prince", "tectonic",
+    "typst", "weasyprint", "wkhtmltopdf", "xelatex",
+})
+
+# Metadata and variables that select system fonts through fontspec.
+FONT_VARIABLES = frozenset({
+    "mainfont", "sansfont", "monofont", "mathfont", "CJKmainfont", "CJKsansfont", "CJKmonofont",
+})
+
+# Variables only the LaTeX template understands. A geometry margin is translated for HTML engines.
+LATEX_VARIABLES = frozenset({
+    "documentclass", "classoption", "fontfamily", "header-includes", "include-before",
+})
+
+_GEOMETRY_MARGIN = re.compile(r"geometry[:=]margin=(.+)")
+
+MAX_PASSES = 3
+
+# Share of a build spent rendering the LaTeX source with pandoc, reported before the passes.
+RENDER_SHARE = 0.1
+
+# Marker ending the dumped part of the preamble, \relax if no format is loaded.
+END_OF_DUMP = "\\csname endofdump\\endcsname"
+
+# First preamble lines that depend on the document (metadata) and therefore end the dump.
+_DOCUMENT_SPECIFIC = re.compile(r"^\s*\\(?:hypersetup|title|subtitle|author|date|begin\{document\})\b")
+# Native font instances, which XeTeX cannot store in a format.
+_FONT_SELECTION = re.compile(
+    r"^\s*\\(?:setmainfont|setsansfont|setmonofont|setmathfont|newfontfamily|babelfont|setCJK\w*font)\b"
+)
+# Changed labels and bookmarks are reported in the log.
+_RERUN = re.compile(r"Rerun to get|Label\(s\) may have changed|\(rerunfilecheck\)")
+# Lists read at the start of a pass without a rerun warning when they change.
+CONTENTS_SUFFIXES = (".toc", ".lof", ".lot")
+
+# Files a pass reads from the previous one: labels, contents and PDF bookmarks.
+STATE_SUFFIXES = (".aux", ".toc", ".out")
+
+
+@dataclass
+class DocumentFeatures:
+    """Properties of a document that decide which PDF engines render it correctly."""
+    non_latin: bool = False
+    custom_fonts: bool = False
+    math: int = 0
+    raw_tex: bool = False
+    tables: int = 0
+    blocks: int = 0
+    latex_layout: bool = False
+
+    @property
+    def math_density(self) -> float:
+        """Math elements per top-level block."""
+        return self.math / max(self.blocks, 1)
+
+    @property
+    def simple_layout(self) -> bool:
+        """True if an HTML based engine renders the document like LaTeX would."""
+        return not (self.math or self.raw_tex or self.custom_fonts or self.latex_layout)
+
+
+@dataclass
+class PdfBuildResult:
+    """Outcome of a PDF build."""
+    engine: str
+    passes: int
+    format_used: bool
+    state_reused: bool = False
+
+    def report(self) -> Dict[str, Any]:
+        """Return the build details for API responses."""
+        return {
+            "pdf_engine": self.engine,
+            "latex_passes": self.passes,
+            "latex_format": self.format_used,
+            "latex_state_reused": self.state_reused,
+        }
+
+
+def latex_engine(extra_args: Sequence[str]) -> Tuple[str, List[str], List[str]]:
+    """
+    Split the PDF options off pandoc arguments.
+
+    Returns:
+        The engine name, the ``--pdf-engine-opt`` values and the remaining
+        arguments for rendering LaTeX.
+    """
+    engine = DEFAULT_LATEX_ENGINE
+    engine_opts: List[str] = []
+    remaining: List[str] = []
+    args = iter(extra_args)
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if name in ("--pdf-engine", "--pdf-engine-opt") and not value:
+            value = next(args, "")
+        if name == "--pdf-engine":
+            engine = value
+        elif name == "--pdf-engine-opt":
+            engine_opts.append(value)
+        else:
+            remaining.append(arg)
+    return os.path.basename(engine), engine_opts, remaining
+
+
+def _is_latin(text: str) -> bool:
+    """Return True if pdflatex with T1 fonts and utf8 inputenc can typeset the text."""
+    for char in text:
+        code = ord(char)
+        # ASCII, Latin-1, Latin Extended-A, general punctuation, euro and trade mark signs
+        if code < 0x180 or 0x2010 <= code <= 0x203A or code in (0x20AC, 0x2122):
+            continue
+        return False
+    return True
+
+
+def _variables(extra_args: Sequence[str]) -> List[str]:
+    """Return the variables and metadata fields set on the command line as "name:value"."""
+    variables = []
+    args = iter(extra_args)
+    for arg in args:
+        name, _, value = arg.partition("=")
+        if name in ("-V", "--variable", "-M", "--metadata"):
+            variables.append(value or next(args, ""))
+    return variables
+
+
+def document_features(ast: str, extra_args: Sequence[str] = ()) -> DocumentFeatures:
+    """
+    Inspect a pandoc JSON AST for the features that restrict the PDF engine.
+
+    Args:
+        ast: The document as pandoc JSON.
+        extra_args: The pandoc arguments of the conversion, for variables.
+    """
+    document = json.loads(ast)
+    features = DocumentFeatures(blocks=len(document["blocks"]))
+    variables = _variables(extra_args)
+    keys = set(document["meta"]) | {re.split(r"[:=]", variable, 1)[0] for variable in variables}
+    features.custom_fonts = bool(keys & FONT_VARIABLES)
+    features.latex_layout = (
+        bool(keys & LATEX_VARIABLES)
+        or "geometry" in document["meta"]
+        or any(v.startswith("geometry") and not _GEOMETRY_MARGIN.fullmatch(v) for v in variables)
+        or any(arg.split("=", 1)[0] in ("-H", "--include-in-header", "--template") for arg in extra_args)
+    )
+    text: List[str] = []
+
+    def walk(node: Any) -> None:
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+        elif isinstance(node, dict):
+            kind = node.get("t")
+            if kind == "Str":
+                text.append(node["c"])
+                return
+            if kind == "Math":
+                features.math += 1
+            elif kind in ("RawInline", "RawBlock") and node["c"][0] in ("latex", "tex"):
+                features.raw_tex = True
+            elif kind == "Table":
+                features.tables += 1
+            walk(node.get("c"))
+
+    walk(document["blocks"])
+    walk(list(document["meta"].values()))
+    features.non_latin = not _is_latin("".join(text))
+    return features
+
+
+def select_pdf_engine(features: DocumentFeatures, installed: Iterable[str]) -> str:
+    """
+    Pick the fastest installed engine that renders a document correctly.
+
+    HTML based engines are only used for simple layouts without math, raw
+    LaTeX or custom fonts. pdflatex is faster than xelatex and lualatex but
+    limited to Latin scripts and its own fonts.
+
+    Args:
+        features: The features of the document.
+        installed: The names of the installed engines.
+    """
+    installed = set(installed)
+    for engine in AUTO_PDF_ENGINES:
+        if engine in HTML_PDF_ENGINES and not features.simple_layout:
+            continue
+        if engine == "pdflatex" and (features.non_latin or features.custom_fonts):
+            continue
+        if engine in installed:
+            return engine
+    return FALLBACK_PDF_ENGINE
+
+
+@lru_cache(maxsize=1)
+def installed_pdf_engines() -> FrozenSet[str]:
+    """Return the engines of the automatic selection found on the PATH."""
+    return frozenset(engine for engine in AUTO_PDF_ENGINES if shutil.which(engine))
+
+
+def requested_pdf_engine(extra_args: Sequence[str]) -> Optional[str]:
+    """Return the value of ``--pdf-engine`` in pandoc arguments, if any."""
+    if any(arg.partition("=")[0] == "--pdf-engine" for arg in extra_args):
+        return latex_engine(extra_args)[0]
+    return None
+
+
+def with_pdf_engine(extra_args: Sequence[str], engine: str) -> List[str]:
+    """
+    Return pandoc arguments with the PDF engine replaced.
+
+    For HTML based engines the LaTeX ``geometry`` margin is translated into
+    the margin variables pandoc passes to them.
+    """
+    _, engine_opts, remaining = latex_engine(extra_args)
+    args = [f"--pdf-engine={engine}", *(f"--pdf-engine-opt={opt}" for opt in engine_opts)]
+    if engine not in HTML_PDF_ENGINES:
+        return args + remaining
+    rest = iter(remaining)
+    for arg in rest:
+        if arg in ("-V", "--variable"):
+            value = next(rest, "")
+            match = _GEOMETRY_MARGIN.fullmatch(value)
+            if match:
+                for side in ("top", "right", "bottom", "left"):
+                    args += ["-V", f"margin-{side}={match.group(1)}"]
+            else:
+                args += [arg, value]
+        else:
+            args.append(arg)
+    return args
+
+
+def split_preamble(latex: str, engine: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a standalone LaTeX document where the dumpable preamble ends.
+
+    Everything before the first document-specific line (hyperref setup,
+    title, author, date) can be dumped; for xelatex the dump also ends
+    before the first native font selection.
+
+    Returns:
+        The dumpable preamble and the rest of the document, or None if the
+        document has no preamble worth dumping.
+    """
+    lines = latex.splitlines(keepends=True)
+    for index, line in enumerate(lines):
+        if _DOCUMENT_SPECIFIC.match(line) or (engine != "pdflatex" and _FONT_SELECTION.match(line)):
+            break
+    else:
+        return None
+    if not any(line.lstrip().startswith("\\documentclass") for line in lines[:index]):
+        return None
+    return "".join(lines[:index]), "".join(lines[index:])
+
+
+def needs_rerun(log: str, contents_before: Dict[str, str], contents_after: Dict[str, str]) -> bool:
+    """Return True if a LaTeX pass asked for another one or changed its contents lists."""
+    return bool(_RERUN.search(log)) or contents_before != contents_after
+
+
+def _directory_size(path: Path) -> int:
+    """Return the total size of the files below a directory."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def contents_digests(directory: Path, jobname: str) -> Dict[str, str]:
+    """Return digests of the table of contents and lists of figures and tables of a job."""
+    digests = {}
+    for suffix in CONTENTS_SUFFIXES:
+        path = directory / f"{jobname}{suffix}"
+        if path.exists():
+            digests[suffix] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return digests
+
+
+class PdfBuilder:
+    """
+    Builds PDFs through LaTeX with precompiled preamble formats.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(
+        self,
+        pandoc_path: str,
+        cache_dir: str,
+        max_formats: int = 16,
+        max_build_dirs: int = 64,
+        max_build_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Initialize the builder.
+
+        Args:
+            pandoc_path: The pandoc binary rendering documents to LaTeX.
+            cache_dir: Directory for formats, the TeX cache and build directories, shared by all jobs.
+            max_formats: Maximum number of formats kept, 0 disables formats.
+            max_build_dirs: Maximum number of build directories kept, 0 builds in temporary directories.
+            max_build_bytes: Maximum total size of the build directories.
+        """
+        self.pandoc_path = pandoc_path
+        self.cache_dir = Path(cache_dir)
+        self.format_dir = self.cache_dir / "formats"
+        self.texmf_var = self.cache_dir / "texmf-var"
+        self.build_root = self.cache_dir / "builds"
+        self.max_formats = max_formats
+        self.max_build_dirs = max_build_dirs
+        self.max_build_bytes = max_build_bytes
+        self.format_dir.mkdir(parents=True, exist_ok=True)
+        self.texmf_var.mkdir(parents=True, exist_ok=True)
+        self.build_root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._format_locks: Dict[str, threading.Lock] = {}
+        # Striped, so the locks do not grow with the number of documents
+        self._build_locks = [threading.Lock() for _ in range(64)]
+        self._broken_formats: Set[str] = set()
+        self._engine_versions: Dict[str, Optional[str]] = {}
+        self._mylatexformat: Optional[bool] = None
+        self._counters = {
+            "builds": 0, "passes": 0, "format_hits": 0, "formats_built": 0, "format_failures": 0,
+            "state_reused": 0, "build_dirs_evicted": 0,
+        }
+
+    def can_build(self, extra_args: Sequence[str]) -> bool:
+        """Return True if the PDF engine of a conversion is a LaTeX engine installed here."""
+        engine, _, _ = latex_engine(extra_args)
+        return engine in LATEX_ENGINES and self._engine_version(engine) is not None
+
+    def build(
+        self,
+        source: Optional[str],
+        input_format: Optional[str],
+        input_file: Optional[str],
+        output_file: str,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[str] = None,
+        document_id: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+    ) -> PdfBuildResult:
+        """
+        Convert a document to PDF.
+
+        Args:
+            source: Text to convert, or None to read ``input_file``.
+            input_format: Source format, or None to infer it from ``input_file``.
+            input_file: Path of a file to convert instead of ``source``.
+            output_file: Path of the PDF to write.
+            extra_args: Pandoc arguments including the PDF options.
+            cwd: Working directory of pandoc and LaTeX, for relative resources.
+            document_id: Identifies the document across renders; the build
+                directory is keyed by ``output_file`` if not given.
+            progress: Receives the progress of the LaTeX passes, parsed from
+                the pages the engine ships out.
+
+        Returns:
+            The engine used, the number of LaTeX passes, whether a format was
+            loaded and whether the state of an earlier build was reused.
+
+        Raises:
+            RuntimeError: If pandoc or the LaTeX engine fails.
+        """
+        engine, engine_opts, latex_args = latex_engine(extra_args)
+        if not self.max_build_dirs:
+            with tempfile.TemporaryDirectory(prefix="mcp-pandoc-pdf-") as build_dir:
+                result = self._build_in(
+                    Path(build_dir), engine, engine_opts, source, input_format, input_file, latex_args, cwd,
+                    progress
+                )
+                shutil.copyfile(Path(build_dir) / "document.pdf", output_file)
+            return result
+
+        key = hashlib.sha256(
+            "\0".join([engine, document_id or os.path.abspath(output_file)]).encode("utf-8")
+        ).hexdigest()[:24]
+        build_path = self.build_root / key
+        with self._build_lock(key):
+            build_path.mkdir(parents=True, exist_ok=True)
+            try:
+                result = self._build_in(
+                    build_path, engine, engine_opts, source, input_format, input_file, latex_args, cwd,
+                    progress
+                )
+                shutil.copyfile(build_path / "document.pdf", output_file)
+            except RuntimeError:
+                # Do not carry the state of a failed build into the next one
+                shutil.rmtree(build_path, ignore_errors=True)
+                raise
+            os.utime(build_path)
+        self._prune_build_dirs()
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Return build, pass, format and build directory counters."""
+        with self._lock:
+            return {
+                **self._counters,
+                "formats": len(list(self.format_dir.glob("*.fmt"))),
+                "build_dirs": sum(1 for path in self.build_root.iterdir() if path.is_dir()),
+            }
+
+    def _build_in(
+        self,
+        build_path: Path,
+        engine: str,
+        engine_opts: Sequence[str],
+        source: Optional[str],
+        input_format: Optional[str],
+        input_file: Optional[str],
+        latex_args: Sequence[str],
+        cwd: Optional[str],
+        progress: Optional[ProgressCallback] = None,
+    ) -> PdfBuildResult:
+        """Render and compile a document in a build directory, leaving document.pdf there."""
+        state_reused = any((build_path / f"document{suffix}").exists() for suffix in STATE_SUFFIXES)
+        tracker = None
+        if progress is not None:
+            progress(0.0, "Rendering LaTeX")
+            # The previous build of the document tells how many pages to expect
+            log_path = build_path / "document.log"
+            expected_pages = log_pages(log_path.read_text(errors="replace")) if log_path.exists() else None
+            tracker = LatexProgress(
+                lambda fraction, message: progress(
+                    None if fraction is None else RENDER_SHARE + (1 - RENDER_SHARE) * fraction, message
+                ),
+                expected_pages,
+                expected_passes=1 if state_reused else 2,
+            )
+        latex = self._render_latex(source, input_format, input_file, latex_args, build_path, cwd)
+
+        format_name = None
+        parts = split_preamble(latex, engine)
+        if parts is not None:
+            format_name = self._ensure_format(engine, parts[0])
+            latex = parts[0] + END_OF_DUMP + "\n" + parts[1]
+        (build_path / "document.tex").write_text(latex, encoding="utf-8")
+
+        try:
+            passes = self._compile(engine, engine_opts, build_path, format_name, cwd, tracker)
+        except (ConversionCancelled, ResourceLimitError):
+            raise
+        except RuntimeError:
+            if format_name is None:
+                raise
+            # Some packages do not survive being dumped; never use this format again
+            logger.warning(f"Build with format {format_name} failed, retrying without it")
+            with self._lock:
+                self._broken_formats.add(format_name)
+            format_name = None
+            passes = self._compile(engine, engine_opts, build_path, None, cwd, tracker)
+
+        with self._lock:
+            self._counters["builds"] += 1
+            self._counters["passes"] += passes
+            if format_name is not None:
+                self._counters["format_hits"] += 1
+            if state_reused:
+                self._counters["state_reused"] += 1
+        return PdfBuildResult(
+            engine=engine, passes=passes, format_used=format_name is not None, state_reused=state_reused
+        )
+
+    def _build_lock(self, key: str) -> threading.Lock:
+        """Return the lock serializing builds in the build directory of a key."""
+        return self._build_locks[hash(key) % len(self._build_locks)]
+
+    def _prune_build_dirs(self) -> None:
+        """Delete the least recently used build directories above the count and size budgets."""
+        entries = []
+        for path in self.build_root.iterdir():
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        kept = 0
+        total = 0
+        for _, path in entries:
+            size = _directory_size(path)
+            if kept < self.max_build_dirs and total + size <= self.max_build_bytes:
+                kept += 1
+                total += size
+                continue
+            lock = self._build_lock(path.name)
+            # A directory being built in is evicted by a later prune
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+            finally:
+                lock.release()
+            with self._lock:
+                self._counters["build_dirs_evicted"] += 1
+
+    def _env(self) -> Dict[str, str]:
+        """Return the environment of LaTeX runs with the shared format and cache directories."""
+        env = dict(os.environ)
+        # The trailing separator keeps the default search path
+        env["TEXFORMATS"] = f"{self.format_dir}{os.pathsep}"
+        env["TEXMFVAR"] = str(self.texmf_var)
+        env["TEXMFCACHE"] = str(self.texmf_var)
+        return env
+
+    def _render_latex(
+        self,
+        source: Optional[str],
+        input_format: Optional[str],
+        input_file: Optional[str],
+        latex_args: Sequence[str],
+        build_path: Path,
+        cwd: Optional[str],
+    ) -> str:
+        """Render the document to standalone LaTeX, extracting its media into the build directory."""
+        args = [self.pandoc_path, *rts_args(self.pandoc_path)]
+        if input_format:
+            args.append(f"--from={input_format}")
+        args += ["--to=latex", "--standalone", f"--extract-media={build_path}"]
+        if input_file:
+            args.append(input_file)
+        args.extend(latex_args)
+        process = run_process(
+            args,
+            input=source.encode("utf-8") if source is not None and not input_file else None,
+            cwd=cwd,
+        )
+        if process.returncode != 0:
+            message = process.stderr.decode("utf-8", errors="replace")
+            check_exit(process.returncode, message)
+            raise RuntimeError(f'Pandoc died with exitcode "{process.returncode}" during conversion: {message}')
+        return process.stdout.decode("utf-8")
+
+    def _engine_version(self, engine: str) -> Optional[str]:
+        """Return the version line of an installed engine, None if it is missing."""
+        with self._lock:
+            if engine in self._engine_versions:
+                return self._engine_versions[engine]
+        path = shutil.which(engine)
+        version = None
+        if path is not None:
+            try:
+                output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=30).stdout
+                version = output.splitlines()[0] if output else engine
+            except (OSError, subprocess.SubprocessError):
+                version = None
+        with self._lock:
+            self._engine_versions[engine] = version
+        return version
+
+    def _has_mylatexformat(self) -> bool:
+        """Return True if the TeX installation provides mylatexformat."""
+        if self._mylatexformat is None:
+            kpsewhich = shutil.which("kpsewhich")
+            found = False
+            if kpsewhich is not None:
+                process = subprocess.run([kpsewhich, "mylatexformat.ltx"], capture_output=True, text=True)
+                found = process.returncode == 0 and bool(process.stdout.strip())
+            if not found:
+                logger.info("mylatexformat.ltx not found, PDF builds run without precompiled formats")
+            self._mylatexformat = found
+        return self._mylatexformat
+
+    def _ensure_format(self, engine: str, preamble: str) -> Optional[str]:
+        """
+        Return the name of the format holding a preamble, building it on first use.
+
+        Returns:
+            The format name, or None if formats are disabled or the format cannot be built.
+        """
+        if not self.max_formats or engine not in FORMAT_ENGINES or not self._has_mylatexformat():
+            return None
+        key = hashlib.sha256(
+            "\0".join([engine, self._engine_version(engine) or "", preamble]).encode("utf-8")
+        ).hexdigest()
+        name = f"pandoc-{engine}-{key[:20]}"
+        path = self.format_dir / f"{name}.fmt"
+
+        with self._lock:
+            if name in self._broken_formats:
+                return None
+            lock = self._format_locks.setdefault(name, threading.Lock())
+        with lock:
+            if path.exists():
+                os.utime(path)
+                return name
+            if self._build_format(engine, name, preamble):
+                self._prune_formats()
+                return name
+        with self._lock:
+            self._broken_formats.add(name)
+        return None
+
+    def _build_format(self, engine: str, name: str, preamble: str) -> bool:
+        """Dump a preamble into a format file with mylatexformat."""
+        with tempfile.TemporaryDirectory(prefix="mcp-pandoc-fmt-") as tmp:
+            tex = Path(tmp) / f"{name}.tex"
+            tex.write_text(preamble + END_OF_DUMP + "\n\\begin{document}\n\\end{document}\n", encoding="utf-8")
+            # A cancelled dump raises instead of marking the format as broken. The format
+            # is shared by all documents, so the limits of the one that triggered it do not apply.
+            with resource_limits(None):
+                process = run_process(
+                    [
+                        engine, "-ini", "-interaction=nonstopmode", "-halt-on-error",
+                        f"-jobname={name}", f"-output-directory={tmp}",
+                        f"&{engine}", "mylatexformat.ltx", str(tex),
+                    ],
+                    cwd=tmp,
+                    env=self._env(),
+                )
+            built = Path(tmp) / f"{name}.fmt"
+            if process.returncode != 0 or not built.exists():
+                logger.warning(f"Could not build LaTeX format {name}, building without it")
+                with self._lock:
+                    self._counters["format_failures"] += 1
+                return False
+            # Atomic, so concurrent processes never load a partial format
+            os.replace(built, self.format_dir / f"{name}.fmt")
+        logger.info(f"Built LaTeX format {name}")
+        with self._lock:
+            self._counters["formats_built"] += 1
+        return True
+
+    def _prune_formats(self) -> None:
+        """Delete the least recently used formats above max_formats."""
+        formats = sorted(self.format_dir.glob("*.fmt"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in formats[self.max_formats:]:
+            path.unlink(missing_ok=True)
+
+    def _compile(
+        self,
+        engine: str,
+        engine_opts: Sequence[str],
+        build_path: Path,
+        format_name: Optional[str],
+        cwd: Optional[str],
+        tracker: Optional[LatexProgress] = None,
+    ) -> int:
+        """
+        Run the LaTeX engine until cross-references are stable.
+
+        Returns:
+            The number of passes.
+
+        Raises:
+            RuntimeError: If a pass fails.
+        """
+        args = [engine, "-interaction=nonstopmode", "-halt-on-error", f"-output-directory={build_path}"]
+        if format_name is not None:
+            args.append(f"-fmt={format_name}")
+        args += [*engine_opts, str(build_path / "document.tex")]
+
+        passes = 0
+        while passes < MAX_PASSES:
+            before = contents_digests(build_path, "document")
+            if tracker is not None:
+                tracker.start_pass()
+            returncode, output = self._run_pass(args, cwd, tracker)
+            passes += 1
+            log_path = build_path / "document.log"
+            log = log_path.read_text(encoding="utf-8", errors="replace") if log_path.exists() else ""
+            if tracker is not None:
+                tracker.end_pass(log)
+            if returncode != 0:
+                check_exit(returncode, output)
+                tail = "\n".join(log.splitlines()[-20:]) or output
+                raise RuntimeError(f"Error producing PDF with {engine}:\n{tail}")
+            if not needs_rerun(log, before, contents_digests(build_path, "document")):
+                break
+        return passes
+
+    def _run_pass(self, args: Sequence[str], cwd: Optional[str], tracker: Optional[LatexProgress]) -> Tuple[int, str]:
+        """
+        Run one LaTeX pass, feeding its terminal output to ``tracker`` as it is printed.
+
+        Returns:
+            The exit code and the last lines of the terminal output.
+        """
+        process = popen(
+            args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd,
+            env=self._env(),
+        )
+        tail: deque = deque(maxlen=20)
+        try:
+            with process:
+                for raw in process.stdout:
+                    line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                    tail.append(line)
+                    if tracker is not None:
+                        tracker.feed(line)
+        finally:
+            release(process)
+        check_cancelled()
+        return process.returncode, "\n".join(tail)
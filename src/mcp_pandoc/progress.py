@@ -0,0 +1,220 @@
+"""
+Progress of running conversions, parsed from pandoc and LaTeX output.
+
+Pandoc runs with ``--verbose``, which logs resource fetches and filter
+runs, and for long inputs with ``--trace``, so its readers log every
+parsed top-level block with its source line ("[trace] Parsed ... at
+line N"); compared with the number of input lines that is the reading
+progress. Tracing slows pandoc down by about a fifth, which only pays off
+for inputs that take seconds to convert. LaTeX engines print "[n" when they
+ship out page n; with the pass number and the page count of the previous
+pass (or build) that is the typesetting progress. The time a conversion
+takes is estimated from the throughput of earlier conversions to the same
+format.
+"""
+
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Receives the completed fraction of a conversion (None if unknown) and a message.
+ProgressCallback = Callable[[Optional[float], str], None]
+
+# Arguments making pandoc log its resource fetches and filter runs to stderr.
+PROGRESS_ARGS = ("--verbose",)
+
+# Input lines from which pandoc also logs its reading progress with --trace.
+TRACE_MIN_LINES = 10000
+
+# Share of a pandoc run spent reading the input; writing logs nothing.
+READ_SHARE = 0.5
+
+# Minimum seconds between two updates for the same kind of event.
+MIN_INTERVAL = 0.5
+
+_TRACE = re.compile(r"^\[trace\] Parsed .* at line (\d+)\s*$")
+_INFO = re.compile(r"^\[INFO\] (.*?)(?:\.\.\.)?\s*$")
+# Messages worth passing on; the rest of --verbose is noise for clients.
+_INFO_MESSAGES = re.compile(r"^(Fetching|Running filter|Running Lua filter|Loaded)\b")
+_PAGE = re.compile(r"\[(\d+)")
+_OUTPUT_PAGES = re.compile(r"Output written on .*?\((\d+) pages?")
+
+
+def count_lines(source: Optional[Any] = None, input_file: Optional[str] = None) -> int:
+    """Return the number of lines of a conversion input, 0 if it cannot be read (e.g. a stream)."""
+    if isinstance(source, str) and not input_file:
+        return source.count("\n") + 1
+    try:
+        with open(input_file, "rb") as f:
+            return sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")) + 1
+    except (OSError, TypeError):
+        return 0
+
+
+def progress_args(total_lines: int) -> Tuple[str, ...]:
+    """Return the pandoc arguments for reporting the progress of an input with ``total_lines``."""
+    return (*PROGRESS_ARGS, "--trace") if total_lines >= TRACE_MIN_LINES else PROGRESS_ARGS
+
+
+def log_pages(log: str) -> Optional[int]:
+    """Return the page count a LaTeX log reports for the written PDF."""
+    match = _OUTPUT_PAGES.search(log)
+    return int(match.group(1)) if match else None
+
+
+class PandocProgress:
+    """Turns the stderr lines of a pandoc run with :func:`progress_args` into progress updates."""
+
+    def __init__(self, callback: ProgressCallback, total_lines: int, share: float = 1.0):
+        """
+        Initialize the parser.
+
+        Args:
+            callback: Receives the progress updates.
+            total_lines: Number of input lines, 0 if unknown.
+            share: Fraction of the whole conversion this pandoc run stands for.
+        """
+        self.callback = callback
+        self.total_lines = total_lines
+        self.share = share
+        self._last_update = 0.0
+        self._in_info = False
+
+    def start(self) -> None:
+        """Report that pandoc has been started."""
+        self.callback(0.0, "Running pandoc")
+
+    def feed(self, line: str) -> bool:
+        """
+        Parse one stderr line.
+
+        Returns:
+            True if the line was progress logging, False for warnings and errors.
+        """
+        trace = _TRACE.match(line)
+        if trace:
+            self._in_info = False
+            now = time.monotonic()
+            if self.total_lines and now - self._last_update >= MIN_INTERVAL:
+                self._last_update = now
+                line_number = min(int(trace.group(1)), self.total_lines)
+                self.callback(
+                    self.share * READ_SHARE * line_number / self.total_lines,
+                    f"Reading input (line {line_number} of {self.total_lines})",
+                )
+            return True
+        if line.startswith("[trace]"):
+            return True
+        info = _INFO.match(line)
+        if info:
+            self._in_info = True
+            if _INFO_MESSAGES.match(info.group(1)):
+                self.callback(None, info.group(1))
+            return True
+        # Messages continue on indented lines
+        if self._in_info and line[:1].isspace():
+            return True
+        self._in_info = False
+        return False
+
+
+class LatexProgress:
+    """Turns the terminal output of LaTeX passes into progress updates."""
+
+    def __init__(self, callback: ProgressCallback, expected_pages: Optional[int], expected_passes: int):
+        """
+        Initialize the parser.
+
+        Args:
+            callback: Receives the progress updates, as fraction of the LaTeX run.
+            expected_pages: Page count of an earlier build of the document, if any.
+            expected_passes: Number of passes the build will probably take.
+        """
+        self.callback = callback
+        self.expected_pages = expected_pages
+        self.expected_passes = expected_passes
+        self.passes = 0
+        self.pages = 0
+        self._last_update = 0.0
+
+    def start_pass(self) -> None:
+        """Begin the next pass."""
+        self.passes += 1
+        self.pages = 0
+        self.expected_passes = max(self.expected_passes, self.passes)
+        self.callback((self.passes - 1) / self.expected_passes, f"LaTeX pass {self.passes}")
+
+    def feed(self, line: str) -> None:
+        """Count the pages shipped out in a line of terminal output."""
+        shipped = False
+        for match in _PAGE.finditer(line):
+            # Pages are shipped in order, which skips dates and other bracketed numbers
+            if int(match.group(1)) == self.pages + 1:
+                self.pages += 1
+                shipped = True
+        now = time.monotonic()
+        if not shipped or now - self._last_update < MIN_INTERVAL:
+            return
+        self._last_update = now
+        if self.expected_pages:
+            page_fraction = min(self.pages / self.expected_pages, 0.99)
+            message = f"LaTeX pass {self.passes}, page {self.pages} of about {self.expected_pages}"
+        else:
+            page_fraction = 0.0
+            message = f"LaTeX pass {self.passes}, page {self.pages}"
+        self.callback((self.passes - 1 + page_fraction) / self.expected_passes, message)
+
+    def end_pass(self, log: str) -> None:
+        """Take the page count of a finished pass as expectation for the next one."""
+        self.expected_pages = log_pages(log) or self.pages or self.expected_pages
+
+
+class ThroughputTracker:
+    """
+    Moving averages of conversion throughput per output format.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        """
+        Initialize the tracker.
+
+        Args:
+            alpha: Weight of the newest conversion in the moving averages.
+        """
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        # key -> [average input bytes, average seconds, conversions]
+        self._averages: Dict[str, list] = {}
+
+    def record(self, key: str, size: int, seconds: float) -> None:
+        """Record a finished conversion of ``size`` input bytes."""
+        with self._lock:
+            averages = self._averages.get(key)
+            if averages is None:
+                self._averages[key] = [float(size), seconds, 1]
+                return
+            averages[0] += self.alpha * (size - averages[0])
+            averages[1] += self.alpha * (seconds - averages[1])
+            averages[2] += 1
+
+    def estimate(self, key: str, size: int) -> Optional[float]:
+        """Return the expected seconds for converting ``size`` input bytes, None without history."""
+        with self._lock:
+            averages = self._averages.get(key)
+            if averages is None or averages[0] <= 0 or averages[1] <= 0:
+                return None
+            return averages[1] * max(size, 1) / averages[0]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the average throughput per key in bytes per second."""
+        with self._lock:
+            return {
+                key: {
+                    "bytes_per_second": round(size / seconds, 1) if seconds > 0 else 0.0,
+                    "conversions": count,
+                }
+                for key, (size, seconds, count) in self._averages.items()
+            }
@@ -1,13 +1,27 @@
-import pypandoc
 from mcp.server.models import InitializationOptions
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from pydantic import AnyUrl
 import mcp.server.stdio
+import asyncio
 import os
+from urllib.parse import parse_qs, urlsplit
+
+from .artifacts import ARTIFACT_URI_PREFIX, get_artifact_store
+from .dispatch import get_executor, progress_callback, run_blocking, serve
+from .engine import default_extra_args, get_engine
+from .incremental import get_incremental_converter
+from .pdf import PDF_ENGINES
 
 server = Server("mcp-pandoc")
 
+# Converted contents larger than this are returned as resource instead of inline text
+INLINE_RESULT_LIMIT = int(os.environ.get("MCP_PANDOC_INLINE_RESULT_KB", "64")) * 1024
+# Characters of a resource result shown as preview
+PREVIEW_CHARS = 1000
+# Bytes per page when a resource is read with ?page=N
+RESOURCE_PAGE_SIZE = int(os.environ.get("MCP_PANDOC_RESOURCE_PAGE_KB", "256")) * 1024
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """
@@ -88,6 +102,43 @@ async def handle_list_tools() -> list[types.Tool]:
                     "output_file": {
                         "type": "string",
                         "description": "Complete path where to save the output including filename and extension (required for pdf, docx, rst, latex, epub formats)"
+                    },
+                    "artifact": {
+                        "type": "boolean",
+                        "description": "Store the output as an MCP resource (artifact://...) instead of saving it to output_file. Use this when the file should not be written to a path on the server's machine; read the resource to get the document.",
+                        "default": False
+                    },
+                    "targets": {
+                        "type": "array",
+                        "description": "Convert into several formats at once (the input is parsed only once). Replaces output_format and output_file.",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "output_format": {
+                                    "type": "string",
+                                    "enum": ["markdown", "html", "pdf", "docx", "rst", "latex", "epub", "txt"]
+                                },
+                                "output_file": {
+                                    "type": "string",
+                                    "description": "Complete output path (required for pdf, docx, rst, latex, epub formats)"
+                                },
+                                "artifact": {
+                                    "type": "boolean",
+                                    "description": "Store this output as an MCP resource instead of saving it to output_file"
+                                }
+                            },
+                            "required": ["output_format"]
+                        }
+                    },
+                    "document_id": {
+                        "type": "string",
+                        "description": "Identifies a document you convert repeatedly while editing it. Only the blocks changed since the previous version are converted again (contents with markdown, html, rst, latex or txt output); PDF builds reuse the LaTeX cross-reference and table of contents state of the previous version."
+                    },
+                    "pdf_engine": {
+                        "type": "string",
+                        "description": "PDF engine. 'auto' (default) picks the fastest installed engine that renders the document correctly, e.g. pdflatex for Latin text or xelatex for other scripts and custom fonts.",
+                        "default": "auto",
+                        "enum": sorted(PDF_ENGINES)
                     }
                 },
                 "oneOf": [
@@ -100,6 +151,9 @@ async def handle_list_tools() -> list[types.Tool]:
                             "properties": {
                                 "output_format": {
                                     "enum": ["pdf", "docx", "rst", "latex", "epub"]
+                                },
+                                "artifact": {
+                                    "const": False
                                 }
                             }
                         },
@@ -122,8 +176,6 @@ async def handle_call_tool(
     """
     if name not in ["convert-contents"]:
         raise ValueError(f"Unknown tool: {name}")
-    
-    print(arguments)
 
     if not arguments:
         raise ValueError("Missing arguments")
@@ -132,8 +184,12 @@ async def handle_call_tool(
     contents = arguments.get("contents")
     input_file = arguments.get("input_file")
     output_file = arguments.get("output_file")
+    artifact = bool(arguments.get("artifact"))
     output_format = arguments.get("output_format", "markdown").lower()
     input_format = arguments.get("input_format", "markdown").lower()
+    targets = arguments.get("targets")
+    document_id = arguments.get("document_id")
+    pdf_engine = arguments.get("pdf_engine")
     
     # Validate input parameters
     if not contents and not input_file:
@@ -146,71 +202,120 @@ async def handle_call_tool(
     
     # Validate output_file requirement for advanced formats
     ADVANCED_FORMATS = {'pdf', 'docx', 'rst', 'latex', 'epub'}
-    if output_format in ADVANCED_FORMATS and not output_file:
+    if output_format in ADVANCED_FORMATS and not output_file and not artifact:
         raise ValueError(f"output_file path is required for {output_format} format")
+    if artifact and output_file:
+        raise ValueError("output_file cannot be combined with artifact")
+    
+    if pdf_engine and pdf_engine not in PDF_ENGINES:
+        raise ValueError(f"Unsupported PDF engine: '{pdf_engine}'. Supported engines are: {', '.join(sorted(PDF_ENGINES))}")
+    
+    if targets:
+        for target in targets:
+            target_format = target.get("output_format", "").lower()
+            if target_format not in SUPPORTED_FORMATS:
+                raise ValueError(f"Unsupported output format: '{target_format}'. Supported formats are: {', '.join(SUPPORTED_FORMATS)}")
+            if target_format in ADVANCED_FORMATS and not target.get("output_file") and not target.get("artifact"):
+                raise ValueError(f"output_file path is required for {target_format} format")
+        return await convert_targets(contents, input_file, input_format, targets, pdf_engine)
+    
+    INCREMENTAL_FORMATS = {'markdown', 'html', 'rst', 'latex', 'txt'}
+    if document_id and output_format != 'pdf' and (not contents or output_format not in INCREMENTAL_FORMATS):
+        raise ValueError(f"document_id requires pdf output or contents and one of these output formats: {', '.join(INCREMENTAL_FORMATS)}")
+    
+    # Large inputs are streamed into an artifact, so the output is never held in memory
+    if not output_file and not artifact and not document_id:
+        input_size = os.path.getsize(input_file) if input_file and os.path.isfile(input_file) else len(contents or "")
+        if input_size >= INLINE_RESULT_LIMIT:
+            return await stream_result(contents, input_file, input_format, output_format)
+    
+    # The output is written into a reserved artifact and returned as resource
+    stored = get_artifact_store().reserve(output_format) if artifact else None
+    if stored is not None:
+        output_file = stored.path
     
     try:
         # Prepare conversion arguments
         extra_args = []
         
         # Handle PDF-specific conversion if needed
-        if output_format == "pdf":
-            extra_args.extend([
-                "--pdf-engine=xelatex",
-                "-V", "geometry:margin=1in"
-            ])
+        extra_args.extend(default_extra_args(output_format, pdf_engine))
+        # Receives the PDF engine the conversion used
+        report = {}
+        # Sends notifications/progress if the client asked for them
+        progress = progress_callback()
         
-        # Convert content using pypandoc
+        # Convert content with the shared pandoc engine
+        engine = get_engine()
         if input_file:
             if not os.path.exists(input_file):
                 raise ValueError(f"Input file not found: {input_file}")
             
+            # The input format is inferred from the file extension
+            converted_output = await run_blocking(
+                engine.convert,
+                input_file=input_file,
+                input_format=None,
+                output_format=output_format,
+                output_file=output_file,
+                extra_args=extra_args,
+                report=report,
+                document_id=document_id,
+                progress=progress
+            )
             if output_file:
-                # Convert file to file
-                converted_output = pypandoc.convert_file(
-                    input_file,
-                    output_format,
-                    outputfile=output_file,
-                    extra_args=extra_args
-                )
                 result_message = f"File successfully converted and saved to: {output_file}"
-            else:
-                # Convert file to string
-                converted_output = pypandoc.convert_file(
-                    input_file,
-                    output_format,
-                    extra_args=extra_args
+        elif document_id and output_format in INCREMENTAL_FORMATS:
+            # Only blocks changed since the previous version are converted
+            incremental = await run_blocking(
+                get_incremental_converter().convert,
+                document_id,
+                contents,
+                input_format=input_format,
+                output_format=output_format,
+                extra_args=extra_args
+            )
+            converted_output = incremental.output
+            if output_file:
+                with open(output_file, "w", encoding="utf-8") as f:
+                    f.write(converted_output)
+                result_message = (
+                    f"Content successfully converted and saved to: {output_file} "
+                    f"(reused {incremental.reused} of {incremental.blocks} blocks)"
                 )
         else:
+            converted_output = await run_blocking(
+                engine.convert,
+                contents,
+                input_format=input_format,
+                output_format=output_format,
+                output_file=output_file,
+                extra_args=extra_args,
+                report=report,
+                document_id=document_id,
+                progress=progress
+            )
             if output_file:
-                # Convert content to file
-                pypandoc.convert_text(
-                    contents,
-                    output_format,
-                    format=input_format,
-                    outputfile=output_file,
-                    extra_args=extra_args
-                )
                 result_message = f"Content successfully converted and saved to: {output_file}"
-            else:
-                # Convert content to string
-                converted_output = pypandoc.convert_text(
-                    contents,
-                    output_format,
-                    format=input_format,
-                    extra_args=extra_args
-                )
+        
+        if stored is not None:
+            get_artifact_store().commit(stored)
+            result_message = artifact_message(stored)
+        
+        if "latex_passes" in report:
+            result_message += f" (PDF engine: {report['pdf_engine']}, LaTeX passes: {report['latex_passes']})"
+        elif "pdf_engine" in report:
+            result_message += f" (PDF engine: {report['pdf_engine']})"
         
         if output_file:
             notify_with_result = result_message
         else:
             if not converted_output:
                 raise ValueError(f"Conversion resulted in empty output")
-            notify_with_result = (
-                f'Following are the converted contents in {output_format} format.\n'
-                f'Ask user if they expect to save this file. If so, provide the output_file parameter with complete path.\n'
-                f'Converted Contents:\n\n{converted_output}'
-            )
+            if len(converted_output) > INLINE_RESULT_LIMIT:
+                stored = await asyncio.to_thread(store_result, output_format, converted_output)
+                return resource_result(stored, converted_output[:PREVIEW_CHARS])
+            notify_with_result = inline_result(output_format, converted_output)
         
         return [
             types.TextContent(
@@ -219,23 +324,230 @@ async def handle_call_tool(
             )
         ]
         
-    except Exception as e:
+    except BaseException as e:
+        if stored is not None:
+            get_artifact_store().discard(stored)
+        if not isinstance(e, Exception):
+            # The call was cancelled, there is no conversion error to report
+            raise
         # Handle Pandoc conversion errors
         error_msg = f"Error converting {'file' if input_file else 'contents'} from {input_format} to {output_format}: {str(e)}"
         raise ValueError(error_msg)
 
+async def convert_targets(
+    contents: str | None, input_file: str | None, input_format: str, targets: list[dict], pdf_engine: str | None = None
+) -> list[types.TextContent]:
+    """
+    Parse the input once into pandoc's JSON AST and render every target in parallel.
+    """
+    engine = get_engine()
+    if input_file and not os.path.exists(input_file):
+        raise ValueError(f"Input file not found: {input_file}")
+    
+    try:
+        if input_file:
+            ast = await run_blocking(engine.parse, input_file=input_file, input_format=None)
+        else:
+            ast = await run_blocking(engine.parse, contents, input_format=input_format)
+    except Exception as e:
+        raise ValueError(f"Error parsing {'file' if input_file else 'contents'} from {input_format}: {str(e)}")
+    
+    async def render(target: dict) -> str:
+        target_format = target["output_format"].lower()
+        target_file = target.get("output_file")
+        stored = get_artifact_store().reserve(target_format) if target.get("artifact") else None
+        if stored is not None:
+            target_file = stored.path
+        try:
+            converted_output = await run_blocking(
+                engine.render,
+                ast,
+                target_format,
+                output_file=target_file,
+                extra_args=default_extra_args(target_format, pdf_engine)
+            )
+            if stored is not None:
+                get_artifact_store().commit(stored)
+        except BaseException as e:
+            if stored is not None:
+                get_artifact_store().discard(stored)
+            if not isinstance(e, Exception):
+                raise
+            return f"[{target_format}] Error: {str(e)}"
+        if stored is not None:
+            return f"[{target_format}] {artifact_message(stored)}"
+        if target_file:
+            return f"[{target_format}] Content successfully converted and saved to: {target_file}"
+        if len(converted_output) > INLINE_RESULT_LIMIT:
+            stored = await asyncio.to_thread(store_result, target_format, converted_output)
+            return f"[{target_format}] {resource_message(stored, converted_output[:PREVIEW_CHARS])}"
+        return f"[{target_format}] Converted Contents:\n\n{converted_output}"
+    
+    results = await asyncio.gather(*(render(target) for target in targets))
+    return [
+        types.TextContent(
+            type="text",
+            text=f"Converted input into {len(targets)} formats.\n\n" + "\n\n".join(results)
+        )
+    ]
+
+async def stream_result(
+    contents: str | None, input_file: str | None, input_format: str, output_format: str
+) -> list[types.TextContent]:
+    """
+    Stream a conversion into an artifact and return it as resource, or inline if it stays small.
+
+    Only the first INLINE_RESULT_LIMIT bytes of UTF-8 output are kept in memory.
+    """
+    if input_file and not os.path.exists(input_file):
+        raise ValueError(f"Input file not found: {input_file}")
+    store = get_artifact_store()
+    stored = store.reserve(output_format)
+    
+    def write() -> tuple[list[str], int]:
+        head, size = [], 0
+        with open(stored.path, "w", encoding="utf-8", newline="") as f:
+            for chunk in get_engine().stream(
+                None if input_file else contents,
+                output_format=output_format,
+                input_format=None if input_file else input_format,
+                input_file=input_file,
+                extra_args=default_extra_args(output_format, None),
+            ):
+                if size <= INLINE_RESULT_LIMIT:
+                    head.append(chunk)
+                size += len(chunk.encode("utf-8"))
+                f.write(chunk)
+        return head, size
+    
+    try:
+        head, size = await run_blocking(write)
+        if not size:
+            raise ValueError("Conversion resulted in empty output")
+        if size <= INLINE_RESULT_LIMIT:
+            store.discard(stored)
+            return [types.TextContent(type="text", text=inline_result(output_format, "".join(head)))]
+        store.commit(stored)
+    except BaseException as e:
+        store.discard(stored)
+        if not isinstance(e, Exception):
+            raise
+        raise ValueError(
+            f"Error converting {'file' if input_file else 'contents'} from {input_format} to {output_format}: {str(e)}"
+        )
+    return resource_result(stored, "".join(head)[:PREVIEW_CHARS])
+
+def store_result(output_format: str, text: str):
+    """Write converted contents into a new artifact."""
+    store = get_artifact_store()
+    stored = store.reserve(output_format)
+    try:
+        with open(stored.path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        return store.commit(stored)
+    except Exception:
+        store.discard(stored)
+        raise
+
+def inline_result(output_format: str, text: str) -> str:
+    """Return converted contents as tool result text."""
+    return (
+        f'Following are the converted contents in {output_format} format.\n'
+        f'Ask user if they expect to save this file. If so, provide the output_file parameter with complete path.\n'
+        f'Converted Contents:\n\n{text}'
+    )
+
+def resource_message(stored, preview: str) -> str:
+    """Describe converted contents too large to return inline, with their page URIs and a preview."""
+    pages = get_artifact_store().pages(stored, RESOURCE_PAGE_SIZE)
+    paging = (
+        f"Read it in {pages} pages: {stored.uri}?page=0 to {stored.uri}?page={pages - 1}."
+        if pages > 1 else "Read the resource to get the whole document."
+    )
+    return (
+        f"The converted contents ({stored.size} bytes, {stored.media_type}) are too large to return inline "
+        f"and are stored as resource {stored.uri}. {paging}\n"
+        f"Preview:\n\n{preview}"
+    )
+
+def resource_result(stored, preview: str) -> list[types.TextContent]:
+    """Return converted contents too large to inline as resource reference."""
+    return [types.TextContent(type="text", text=resource_message(stored, preview))]
+
+def artifact_message(stored) -> str:
+    """Describe an output stored as artifact, for the tool result."""
+    return (
+        f"Content successfully converted and stored as resource {stored.uri} "
+        f"({stored.size} bytes, {stored.media_type}). Read the resource to get the document."
+    )
+
+@server.list_resources()
+async def handle_list_resources() -> list[types.Resource]:
+    """
+    List the conversion outputs stored as artifacts.
+    """
+    store = get_artifact_store()
+    return [
+        types.Resource(
+            uri=AnyUrl(stored.uri),
+            name=stored.filename,
+            description=(
+                f"Converted {stored.output_format} document, {stored.size} bytes "
+                f"in {store.pages(stored, RESOURCE_PAGE_SIZE)} pages of {RESOURCE_PAGE_SIZE} bytes (?page=N)"
+            ),
+            mimeType=stored.media_type,
+        )
+        for stored in store.list()
+    ]
+
+@server.read_resource()
+async def handle_read_resource(uri: AnyUrl) -> str | bytes:
+    """
+    Read a conversion output stored as artifact; text formats as text, others as blob.
+
+    ``?page=N`` reads a single page of RESOURCE_PAGE_SIZE bytes, so large
+    outputs are never loaded as a whole.
+    """
+    parts = urlsplit(str(uri).removeprefix(ARTIFACT_URI_PREFIX))
+    artifact_id = parts.path.rstrip("/")
+    page = parse_qs(parts.query).get("page")
+    store = get_artifact_store()
+    stored = store.get(artifact_id)
+    if stored is None:
+        raise ValueError(f"Unknown or expired resource: {uri}")
+    if page is None:
+        data = await asyncio.to_thread(store.read, artifact_id)
+    else:
+        pages = store.pages(stored, RESOURCE_PAGE_SIZE)
+        if not page[0].isdigit() or int(page[0]) >= pages:
+            raise ValueError(f"Invalid page of resource {stored.uri}: {page[0]} (pages 0 to {pages - 1})")
+        data = await asyncio.to_thread(store.read_page, artifact_id, int(page[0]), RESOURCE_PAGE_SIZE)
+    if data is None:
+        raise ValueError(f"Unknown or expired resource: {uri}")
+    if stored.media_type.endswith("charset=utf-8"):
+        return data.decode("utf-8")
+    return data
+
 async def main():
+    # Locate pandoc and read its format tables once before serving requests
+    engine = get_engine()
     # Run the server using stdin/stdout streams
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="mcp-pandoc",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            # Requests are handled concurrently, conversions run on the worker pool
+            await serve(
+                server,
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="mcp-pandoc",
+                    server_version="0.1.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
\ No newline at end of file
+            )
+    finally:
+        get_executor().shutdown(wait=False, cancel_futures=True)
+        engine.close()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Conversion input streamed from a client instead of held as a string.
+
+An :class:`InputStream` wraps the async iterator delivering an upload (an
+HTTP request body, say) and is passed to the engine in place of the source
+text. Nothing is read ahead: pandoc's stdin is fed one chunk at a time as
+pandoc consumes it, so at most one chunk and the pipe buffer are in memory
+whatever the size of the document, and a slow pandoc slows down the upload.
+The chunks are read on the event loop that created the stream; threads
+feeding pandoc in thread mode hand each read over to that loop.
+
+A stream can be read only once. Inputs that have to be read more than once
+or need seeking (ZIP containers such as docx, PDF builds that parse the
+document to select their engine) are spooled to a temporary file first with
+:meth:`InputStream.spool`.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import tempfile
+import threading
+from typing import AsyncIterator, Optional
+
+from .limits import MB, ResourceLimitError, ResourceLimits
+
+logger = logging.getLogger("pandoc-streams")
+
+# Input formats pandoc reads from ZIP containers, whose directory is at the end of the file
+SEEKING_INPUT_FORMATS = frozenset({"docx", "epub", "odt", "pptx", "xlsx"})
+
+
+class InputStream:
+    """
+    A conversion input read on demand from an async iterator of byte chunks.
+
+    ``aread`` runs on the event loop that created the stream, ``read`` and
+    ``spool`` on any other thread. After :meth:`close`, pending and later
+    reads return the end of the input.
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[bytes],
+        size: Optional[int] = None,
+        limits: Optional[ResourceLimits] = None,
+    ):
+        """
+        Initialize the stream on the running event loop.
+
+        Args:
+            chunks: The input, e.g. the body of a request.
+            size: The announced size of the input in bytes (Content-Length), None if unknown.
+            limits: Limits of the conversion; reading fails once the input exceeds ``input_mb``.
+        """
+        self._chunks = chunks
+        self.size = size
+        self.limits = limits
+        self.loop = asyncio.get_running_loop()
+        self.read_bytes = 0
+        self.path: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pending: Optional[concurrent.futures.Future] = None
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        """Whether the input has been read to its end, failed or been closed."""
+        return self._done.is_set()
+
+    async def wait_done(self) -> None:
+        """Wait until the input has been read to its end, failed or been closed."""
+        await self._done.wait()
+
+    async def aread(self) -> bytes:
+        """
+        Return the next chunk of the input, empty at its end.
+
+        Raises:
+            ResourceLimitError: If the input exceeds the input size limit.
+            Exception: Whatever the iterator raised, e.g. a client disconnect.
+        """
+        if self._closed or self.error is not None:
+            return b""
+        try:
+            chunk = b""
+            while not chunk:
+                chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._finish()
+            return b""
+        except Exception as e:
+            self._finish(e)
+            raise
+        self.read_bytes += len(chunk)
+        limits = self.limits
+        if limits is not None and limits.input_mb and self.read_bytes > limits.input_mb * MB:
+            error = ResourceLimitError("input_mb", limits, f"more than {self.read_bytes / MB:.1f} MB input")
+            self._finish(error)
+            raise error
+        return chunk
+
+    def read(self) -> bytes:
+        """Blocking variant of :meth:`aread` for threads other than the event loop's."""
+        with self._lock:
+            if self._closed:
+                return b""
+            future = asyncio.run_coroutine_threadsafe(self.aread(), self.loop)
+            self._pending = future
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            return b""
+        finally:
+            self._pending = None
+
+    def spool(self, directory: Optional[str] = None, suffix: str = "") -> str:
+        """
+        Write the whole input to a temporary file, deleted by :meth:`close`.
+
+        Returns:
+            The path of the file, also kept in ``path``.
+        """
+        fd, path = tempfile.mkstemp(prefix="mcp-pandoc-input-", suffix=suffix, dir=directory)
+        self.path = path
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = self.read()
+                if not chunk:
+                    break
+                f.write(chunk)
+        self.check()
+        return path
+
+    async def aspool(self, directory: Optional[str] = None, suffix: str = "") -> str:
+        """Asyncio variant of :meth:`spool`; the file is written on a thread."""
+        return await asyncio.to_thread(self.spool, directory, suffix)
+
+    def check(self) -> None:
+        """
+        Raise the error that stopped reading the input, if any.
+
+        Raises:
+            Exception: The error raised by :meth:`aread`.
+        """
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        """Stop reading the input, release a blocked reader and delete the spool file; thread-safe."""
+        with self._lock:
+            self._closed = True
+            pending = self._pending
+        if pending is not None:
+            pending.cancel()
+        self._finish()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        """Record the end of the input and wake up waiters on the event loop."""
+        if error is not None and self.error is None:
+            logger.warning(f"Reading the input stream failed: {error!r}")
+            self.error = error
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._done.set)